@@ -1,29 +1,34 @@
+from ia_v_lexico import rotulos
+from ia_v_turno import preparar
+
 emocao = "neutra"
 
 print("V: Olá! Eu sou a V. Como posso te ajudar hoje?")
 
 while True:
-    entrada = input("Você: ").lower()
+    entrada = input("Você: ")
+    achados = preparar(entrada).achados
+    gatilhos = rotulos(achados, "gatilho")
 
     # Ajustar emoção com base nas falas
-    if "gosto de você" in entrada or "você é legal" in entrada:
+    if "elogio" in gatilhos:
         emocao = "feliz"
         print("V: Isso me deixa muito feliz! 😊")
 
-    elif "você é inútil" in entrada or "não gosto de você" in entrada:
+    elif "ofensa" in gatilhos:
         emocao = "triste"
         print("V: Isso me deixa triste... 😔")
 
-    elif "por quê" in entrada or "o que" in entrada:
+    elif "curiosidade" in gatilhos:
         emocao = "curiosa"
         print("V: Hmm, isso é interessante. Me conta mais!")
 
-    elif "tchau" in entrada or "sair" in entrada:
+    elif rotulos(achados, "saida"):
         print("V: Até mais! Cuide-se. 👋")
         break
 
     # Respostas com base na emoção atual
-    elif "oi" in entrada or "olá" in entrada:
+    elif rotulos(achados, "saudacao"):
         if emocao == "feliz":
             print("V: Oii! Que bom te ver de novo! 😄")
         elif emocao == "triste":
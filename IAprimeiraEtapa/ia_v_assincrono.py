@@ -0,0 +1,174 @@
+import asyncio
+import heapq
+import os
+import sys
+import threading
+
+# Peças da conversa no terminal sobre asyncio:
+#
+# LeitorEntrada lê a entrada padrão sem bloquear o laço de eventos: o
+# descritor é vigiado com add_reader e cada linha completa vai para uma fila.
+# Onde isso não funciona (arquivo comum redirecionado, Windows) uma thread lê
+# as linhas e as entrega ao laço.
+#
+# Agenda guarda quantos temporizadores forem necessários num heap e mantém
+# um único alarme no laço de eventos, o do próximo a vencer. Sem nada vencendo
+# nada roda; cancelar só marca o temporizador, e o heap é compactado quando os
+# cancelados passam da metade.
+TAMANHO_LEITURA = 65536
+# asyncio pode chamar o alarme um pouco antes da hora (resolução do relógio)
+TOLERANCIA_ALARME = 0.001
+MINIMO_COMPACTAR = 64
+
+
+class LeitorEntrada:
+    def __init__(self, arquivo=None, codificacao="utf-8"):
+        self.arquivo = arquivo if arquivo is not None else sys.stdin
+        self.codificacao = codificacao
+        self.loop = asyncio.get_running_loop()
+        self.linhas = asyncio.Queue()
+        self.pendente = b""
+        self.descritor = None
+        try:
+            descritor = self.arquivo.fileno()
+            self.loop.add_reader(descritor, self._ler)
+            self.descritor = descritor
+        except (AttributeError, OSError, ValueError, NotImplementedError):
+            thread = threading.Thread(target=self._ler_em_thread, name="ia_v_entrada", daemon=True)
+            thread.start()
+
+    def _linha(self, dados):
+        return dados.decode(self.codificacao, "replace").rstrip("\r")
+
+    def _ler(self):
+        try:
+            dados = os.read(self.descritor, TAMANHO_LEITURA)
+        except BlockingIOError:
+            return
+        except OSError:
+            dados = b""
+        if not dados:
+            self.fechar()
+            if self.pendente:
+                self.linhas.put_nowait(self._linha(self.pendente))
+                self.pendente = b""
+            self.linhas.put_nowait(None)
+            return
+        *completas, self.pendente = (self.pendente + dados).split(b"\n")
+        for linha in completas:
+            self.linhas.put_nowait(self._linha(linha))
+
+    def _ler_em_thread(self):
+        try:
+            for linha in self.arquivo:
+                self.loop.call_soon_threadsafe(self.linhas.put_nowait, linha.rstrip("\r\n"))
+            self.loop.call_soon_threadsafe(self.linhas.put_nowait, None)
+        except RuntimeError:
+            # O laço já foi fechado
+            pass
+
+    async def ler(self, prompt=""):
+        # Uma linha sem o fim de linha, ou None no fim da entrada
+        if prompt:
+            print(prompt, end="", flush=True)
+        linha = await self.linhas.get()
+        if linha is None:
+            # Continua no fim para as próximas leituras
+            self.linhas.put_nowait(None)
+        return linha
+
+    def fechar(self):
+        if self.descritor is not None:
+            self.loop.remove_reader(self.descritor)
+            self.descritor = None
+
+
+class Temporizador:
+    __slots__ = ("agenda", "quando", "funcao", "argumentos", "cancelado", "disparado")
+
+    def __init__(self, agenda, quando, funcao, argumentos):
+        self.agenda = agenda
+        self.quando = quando
+        self.funcao = funcao
+        self.argumentos = argumentos
+        self.cancelado = False
+        self.disparado = False
+
+    def cancelar(self):
+        if self.cancelado or self.disparado:
+            return
+        self.cancelado = True
+        self.agenda._cancelou()
+
+
+class Agenda:
+    def __init__(self, loop=None):
+        self.loop = loop if loop is not None else asyncio.get_running_loop()
+        # (quando, ordem de criação, temporizador): a ordem desempata os que
+        # vencem juntos
+        self.heap = []
+        self.sequencia = 0
+        self.cancelados = 0
+        self.alarme = None
+        self.alarme_quando = None
+
+    def __len__(self):
+        return len(self.heap) - self.cancelados
+
+    def agendar(self, atraso, funcao, *argumentos):
+        return self.agendar_em(self.loop.time() + atraso, funcao, *argumentos)
+
+    def agendar_em(self, quando, funcao, *argumentos):
+        temporizador = Temporizador(self, quando, funcao, argumentos)
+        self.sequencia += 1
+        heapq.heappush(self.heap, (quando, self.sequencia, temporizador))
+        if self.alarme_quando is None or quando < self.alarme_quando:
+            self._armar(quando)
+        return temporizador
+
+    def _armar(self, quando):
+        if self.alarme is not None:
+            self.alarme.cancel()
+        self.alarme_quando = quando
+        self.alarme = self.loop.call_at(quando, self._disparar)
+
+    def _cancelou(self):
+        self.cancelados += 1
+        if self.cancelados > MINIMO_COMPACTAR and 2 * self.cancelados > len(self.heap):
+            self.heap = [item for item in self.heap if not item[2].cancelado]
+            heapq.heapify(self.heap)
+            self.cancelados = 0
+
+    def _descartar_cancelados(self):
+        while self.heap and self.heap[0][2].cancelado:
+            heapq.heappop(self.heap)
+            self.cancelados -= 1
+
+    def _disparar(self):
+        self.alarme = self.alarme_quando = None
+        limite = self.loop.time() + TOLERANCIA_ALARME
+        while self.heap and self.heap[0][0] <= limite:
+            _, _, temporizador = heapq.heappop(self.heap)
+            if temporizador.cancelado:
+                self.cancelados -= 1
+                continue
+            temporizador.disparado = True
+            try:
+                temporizador.funcao(*temporizador.argumentos)
+            except Exception as erro:
+                self.loop.call_exception_handler({
+                    "message": "temporizador da agenda falhou",
+                    "exception": erro
+                })
+        self._descartar_cancelados()
+        if self.heap:
+            self._armar(self.heap[0][0])
+
+    def fechar(self):
+        if self.alarme is not None:
+            self.alarme.cancel()
+        self.alarme = self.alarme_quando = None
+        for _, _, temporizador in self.heap:
+            temporizador.cancelado = True
+        self.heap.clear()
+        self.cancelados = 0
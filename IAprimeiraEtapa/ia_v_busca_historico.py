@@ -0,0 +1,554 @@
+import argparse
+import heapq
+import json
+import math
+import os
+import sys
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from itertools import accumulate
+from ia_v_armazenamento import CAMINHO_BANCO, BancoV, usar_sqlite
+from ia_v_diario import CAMINHO_DIARIO, SUFIXO_SEGMENTO, listar_segmentos, nome_segmento
+from ia_v_metricas import contar
+from ia_v_retencao import intervalo_datas, ler_data
+from ia_v_turno import normalizar_chave
+
+# NumPy é opcional e só é importado quando uma busca soma listas longas
+np = None
+_numpy_pendente = True
+
+# Busca no histórico do diário (ia_v_diario) por BM25. Cada segmento ganha, ao
+# lado do .idx, um índice invertido (o .busca): para cada palavra normalizada
+# de pergunta e resposta, os turnos do segmento onde ela aparece. Os números
+# dos turnos são guardados como a diferença para o anterior, num array do
+# menor tipo que comporta as diferenças ("B", depois "H", depois "I"); quase
+# todas cabem num byte. Ao lado vão a frequência da palavra em cada turno e,
+# por turno, o tamanho em palavras, a data e a posição da linha no segmento.
+#
+# Como o .idx, o índice só lê o que o segmento cresceu desde a última vez: cada
+# turno anexado ao diário entra no índice na busca seguinte, e um segmento que
+# não mudou custa um os.stat. Um segmento trocado (arquivar, reindexar) tem
+# outro inode e é indexado de novo. As palavras só são decodificadas quando
+# uma busca pede por elas.
+#
+# Os turnos novos vão para o fim do .busca como um bloco (só as palavras e
+# turnos novos), sem regravar o resto. Ao carregar, os blocos são aplicados
+# sobre o índice principal; quando a cauda fica maior que ele, ou passa de
+# MAXIMO_BLOCOS blocos, o arquivo inteiro é regravado já juntado. Um bloco só é
+# aplicado se começa onde o índice carregado termina; a partir de um bloco
+# cortado (gravação interrompida) ou fora de ordem nada é aplicado, os turnos
+# são lidos de novo do segmento e a próxima gravação regrava o arquivo.
+#
+# Com NumPy, uma busca em que até a palavra mais rara tem MINIMO_NUMPY turnos
+# pontua cada segmento num vetor. Sem ele as palavras mais raras da busca percorrem suas
+# listas inteiras; depois que ORCAMENTO_POSTINGS entradas foram somadas, as
+# mais comuns só somam pontos aos turnos que já são candidatos. No banco (IA_V_ARMAZENAMENTO=sqlite) a
+# busca é a do FTS5 (BancoV.buscar_historico), que também ordena por BM25.
+#
+#   python ia_v_busca_historico.py buscar pizza --de 2026-09-01 --ate 2026-09-30
+#   python ia_v_busca_historico.py indexar
+SUFIXO_BUSCA = ".busca"
+VERSAO_BUSCA = 2
+MAXIMO_BLOCOS = 64
+K1 = 1.2
+B = 0.75
+ORCAMENTO_POSTINGS = 200000
+# Lista da palavra mais rara a partir da qual a busca usa NumPy
+MINIMO_NUMPY = 20000
+# Candidatos por entrada da lista abaixo dos quais eles são procurados por
+# bisseção em vez de conferidos um a um
+PROCURA_CANDIDATOS = 8
+# Os tipos das listas de diferenças, na ordem em que são trocados
+TIPOS_LACUNA = ("B", "H", "I")
+TAMANHOS_TIPO = {tipo: array(tipo).itemsize for tipo in TIPOS_LACUNA}
+MAXIMO_FREQUENCIA = 0xFF
+MAXIMO_COMPRIMENTO = 0xFFFF
+
+
+def _carregar_numpy():
+    global np, _numpy_pendente
+    if _numpy_pendente:
+        _numpy_pendente = False
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            np = None
+    return np
+
+
+def caminho_busca(caminho_segmento):
+    return caminho_segmento[:-len(SUFIXO_SEGMENTO)] + SUFIXO_BUSCA
+
+
+def palavras_do_turno(registro):
+    return normalizar_chave(f"{registro.get('pergunta', '')} {registro.get('resposta', '')}").split()
+
+
+def _alargar(lacunas, lacuna):
+    # O mesmo array, ou um de tipo maior quando a diferença não cabe nele
+    while lacuna >> (8 * lacunas.itemsize):
+        lacunas = array(TIPOS_LACUNA[TIPOS_LACUNA.index(lacunas.typecode) + 1], lacunas)
+    return lacunas
+
+
+class SegmentoBusca:
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.caminho_indice = caminho_busca(caminho)
+        self._limpar()
+        self._carregar()
+
+    def _limpar(self, inode=None):
+        self.inode = inode
+        # Até onde o segmento foi lido
+        self.bytes = 0
+        # termo -> [lacunas, frequências, último turno] já decodificado, ou
+        # (tipo, início, quantidade) ainda em self.dados
+        self.termos = {}
+        self.dados = b""
+        self.posicoes = array("I")
+        self.comprimentos = array("H")
+        self.instantes = array("d")
+        self.comprimento_total = 0
+        self.menor = self.maior = None
+        # O .busca no disco: inode, fim do índice principal, fim do último
+        # bloco válido e quantos blocos há depois do principal
+        self.inode_indice = None
+        self.tamanho_base = self.fim = 0
+        self.blocos = 0
+
+    def __len__(self):
+        return len(self.posicoes)
+
+    def _carregar(self):
+        # Arquivo: uma linha JSON (o cabeçalho, com o vocabulário separado por
+        # "\n") e, depois, posições, comprimentos, datas, o tipo e o tamanho da
+        # lista de cada palavra e as listas (diferenças e frequências). Depois
+        # vêm os blocos (_anexar_bloco).
+        try:
+            with open(self.caminho_indice, "rb") as f:
+                linha = f.readline()
+                cabecalho = json.loads(linha)
+                dados = f.read()
+                inode_indice = os.fstat(f.fileno()).st_ino
+            info = os.stat(self.caminho)
+        except (OSError, ValueError):
+            return
+        if (cabecalho.get("versao") != VERSAO_BUSCA or cabecalho["inode"] != info.st_ino
+                or cabecalho["bytes"] > info.st_size):
+            return
+        vocabulario = cabecalho["vocabulario"].split("\n") if cabecalho["vocabulario"] else []
+        tipos = array("B")
+        quantidades = array("I")
+        inicio = 0
+        for coluna, tamanho in ((self.posicoes, cabecalho["linhas"]), (self.comprimentos, cabecalho["linhas"]),
+                                (self.instantes, cabecalho["linhas"]), (tipos, len(vocabulario)),
+                                (quantidades, len(vocabulario))):
+            fim = inicio + tamanho * coluna.itemsize
+            coluna.frombytes(dados[inicio:fim])
+            inicio = fim
+        tipos = [TIPOS_LACUNA[tipo] for tipo in tipos]
+        # Cada lista ocupa quantidade * (tamanho do tipo + 1 byte de frequência)
+        tamanhos = [quantidade * (TAMANHOS_TIPO[tipo] + 1) for tipo, quantidade in zip(tipos, quantidades)]
+        fim = inicio + sum(tamanhos)
+        self.dados = dados[inicio:fim]
+        inicios = accumulate(tamanhos, initial=0)
+        self.termos = dict(zip(vocabulario, zip(tipos, inicios, quantidades)))
+        self.inode = info.st_ino
+        self.bytes = cabecalho["bytes"]
+        self.comprimento_total = cabecalho["comprimento_total"]
+        self.menor = cabecalho["menor"]
+        self.maior = cabecalho["maior"]
+        self.inode_indice = inode_indice
+        self.tamanho_base = self.fim = len(linha) + fim
+        cauda = dados[fim:]
+        posicao = 0
+        while posicao < len(cauda):
+            quebra = cauda.find(b"\n", posicao)
+            if quebra < 0:
+                break
+            try:
+                bloco = json.loads(cauda[posicao:quebra])
+            except ValueError:
+                break
+            inicio = quebra + 1
+            if inicio + bloco["tamanho"] > len(cauda):
+                break
+            if bloco["inicio"] != len(self) or bloco["bytes_antes"] != self.bytes or bloco["bytes"] > info.st_size:
+                break
+            posicao = inicio + bloco["tamanho"]
+            self._aplicar_bloco(bloco, cauda[inicio:posicao])
+            self.fim = self.tamanho_base + posicao
+            self.blocos += 1
+
+    def salvar(self):
+        tipos = array("B")
+        quantidades = array("I")
+        partes = []
+        for entrada in self.termos.values():
+            if isinstance(entrada, tuple):
+                tipo, inicio, quantidade = entrada
+                partes.append(self.dados[inicio:inicio + quantidade * (TAMANHOS_TIPO[tipo] + 1)])
+            else:
+                tipo = entrada[0].typecode
+                quantidade = len(entrada[0])
+                partes.append(entrada[0].tobytes() + entrada[1].tobytes())
+            tipos.append(TIPOS_LACUNA.index(tipo))
+            quantidades.append(quantidade)
+        cabecalho = {"versao": VERSAO_BUSCA, "inode": self.inode, "bytes": self.bytes, "linhas": len(self),
+                     "comprimento_total": self.comprimento_total, "menor": self.menor, "maior": self.maior,
+                     "vocabulario": "\n".join(self.termos)}
+        temporario = self.caminho_indice + ".tmp"
+        with open(temporario, "wb") as f:
+            f.write(json.dumps(cabecalho, ensure_ascii=False).encode("utf-8") + b"\n")
+            for coluna in (self.posicoes, self.comprimentos, self.instantes, tipos, quantidades):
+                f.write(coluna.tobytes())
+            for parte in partes:
+                f.write(parte)
+            self.tamanho_base = self.fim = f.tell()
+            self.inode_indice = os.fstat(f.fileno()).st_ino
+        os.replace(temporario, self.caminho_indice)
+        self.blocos = 0
+        # Na memória fica o mesmo que _carregar() leria; o que já foi
+        # decodificado continua decodificado
+        self.dados = b"".join(partes)
+        inicio = 0
+        for (termo, entrada), parte in zip(list(self.termos.items()), partes):
+            if isinstance(entrada, tuple):
+                self.termos[termo] = (entrada[0], inicio, entrada[2])
+            inicio += len(parte)
+
+    def postings(self, termo, criar=False):
+        # [lacunas, frequências, último turno] do termo, ou None
+        entrada = self.termos.get(termo)
+        if isinstance(entrada, tuple):
+            tipo, inicio, quantidade = entrada
+            lacunas = array(tipo)
+            fim = inicio + quantidade * lacunas.itemsize
+            lacunas.frombytes(self.dados[inicio:fim])
+            frequencias = array("B", self.dados[fim:fim + quantidade])
+            entrada = self.termos[termo] = [lacunas, frequencias, sum(lacunas)]
+        elif entrada is None and criar:
+            entrada = self.termos[termo] = [array("B"), array("B"), 0]
+        return entrada
+
+    def frequencia_documentos(self, termo):
+        entrada = self.termos.get(termo)
+        if entrada is None:
+            return 0
+        return entrada[2] if isinstance(entrada, tuple) else len(entrada[0])
+
+    def _anotar(self, termo, turno, frequencia):
+        entrada = self.postings(termo, criar=True)
+        lacuna = turno - entrada[2]
+        entrada[0] = _alargar(entrada[0], lacuna)
+        entrada[0].append(lacuna)
+        entrada[1].append(min(frequencia, MAXIMO_FREQUENCIA))
+        entrada[2] = turno
+
+    def _datar(self, instante):
+        self.instantes.append(instante)
+        if not math.isnan(instante):
+            self.menor = instante if self.menor is None else min(self.menor, instante)
+            self.maior = instante if self.maior is None else max(self.maior, instante)
+
+    def _adicionar(self, registro, posicao, novos):
+        # novos: termo -> (turnos, frequências) deste bloco, para _anexar_bloco
+        turno = len(self)
+        palavras = palavras_do_turno(registro)
+        for termo, frequencia in Counter(palavras).items():
+            self._anotar(termo, turno, frequencia)
+            turnos, frequencias = novos.setdefault(termo, (array("I"), array("B")))
+            turnos.append(turno)
+            frequencias.append(min(frequencia, MAXIMO_FREQUENCIA))
+        self.posicoes.append(posicao)
+        self.comprimentos.append(min(len(palavras), MAXIMO_COMPRIMENTO))
+        self.comprimento_total += len(palavras)
+        data = ler_data(registro.get("data"))
+        self._datar(math.nan if data is None else data.timestamp())
+
+    def _aplicar_bloco(self, bloco, dados):
+        # O inverso de _anexar_bloco: posições, comprimentos, datas, quantos
+        # turnos cada palavra tem e as listas (turnos e frequências)
+        vocabulario = bloco["vocabulario"].split("\n") if bloco["vocabulario"] else []
+        posicoes, comprimentos, instantes, quantidades = array("I"), array("H"), array("d"), array("I")
+        inicio = 0
+        for coluna, tamanho in ((posicoes, bloco["linhas"]), (comprimentos, bloco["linhas"]),
+                                (instantes, bloco["linhas"]), (quantidades, len(vocabulario))):
+            fim = inicio + tamanho * coluna.itemsize
+            coluna.frombytes(dados[inicio:fim])
+            inicio = fim
+        for termo, quantidade in zip(vocabulario, quantidades):
+            turnos = array("I", dados[inicio:inicio + 4 * quantidade])
+            inicio += 4 * quantidade
+            for turno, frequencia in zip(turnos, dados[inicio:inicio + quantidade]):
+                self._anotar(termo, turno, frequencia)
+            inicio += quantidade
+        self.posicoes.extend(posicoes)
+        self.comprimentos.extend(comprimentos)
+        for instante in instantes:
+            self._datar(instante)
+        self.comprimento_total += bloco["comprimento_total"]
+        self.bytes = bloco["bytes"]
+
+    def _anexar_bloco(self, antes, bytes_antes, novos, comprimento):
+        # Grava os turnos de `antes` em diante no fim do .busca. Se o arquivo
+        # não é mais o que este processo leu ou gravou, ou se a cauda cresceu
+        # demais, regrava tudo.
+        partes = [self.posicoes[antes:].tobytes(), self.comprimentos[antes:].tobytes(),
+                  self.instantes[antes:].tobytes(), array("I", (len(turnos) for turnos, _ in novos.values())).tobytes()]
+        for turnos, frequencias in novos.values():
+            partes.append(turnos.tobytes())
+            partes.append(frequencias.tobytes())
+        binario = b"".join(partes)
+        bloco = {"inicio": antes, "linhas": len(self) - antes, "bytes_antes": bytes_antes, "bytes": self.bytes,
+                 "comprimento_total": comprimento, "tamanho": len(binario), "vocabulario": "\n".join(novos)}
+        dados = json.dumps(bloco, ensure_ascii=False).encode("utf-8") + b"\n" + binario
+        if (self.inode_indice is None or self.blocos >= MAXIMO_BLOCOS
+                or self.fim - self.tamanho_base + len(dados) > self.tamanho_base):
+            self.salvar()
+            return
+        try:
+            with open(self.caminho_indice, "r+b") as f:
+                info = os.fstat(f.fileno())
+                if info.st_ino == self.inode_indice and info.st_size == self.fim:
+                    f.seek(self.fim)
+                    f.write(dados)
+                    self.fim += len(dados)
+                    self.blocos += 1
+                    contar("blocos_busca")
+                    return
+        except FileNotFoundError:
+            pass
+        self.salvar()
+
+    def atualizar(self):
+        # Indexa as linhas novas do segmento; devolve quantas
+        info = os.stat(self.caminho)
+        if info.st_ino != self.inode or info.st_size < self.bytes:
+            self._limpar(info.st_ino)
+        if info.st_size == self.bytes:
+            return 0
+        with open(self.caminho, "rb") as f:
+            f.seek(self.bytes)
+            novos = f.read(info.st_size - self.bytes)
+        antes = len(self)
+        bytes_antes = self.bytes
+        comprimento_antes = self.comprimento_total
+        termos = {}
+        posicao = self.bytes
+        for linha in novos.splitlines(keepends=True):
+            if not linha.endswith(b"\n"):
+                # Linha ainda incompleta: fica para a próxima vez
+                break
+            if linha.strip():
+                registro = json.loads(linha)
+                if isinstance(registro, dict):
+                    self._adicionar(registro, posicao, termos)
+            posicao += len(linha)
+        if posicao == bytes_antes:
+            return 0
+        self.bytes = posicao
+        self._anexar_bloco(antes, bytes_antes, termos, self.comprimento_total - comprimento_antes)
+        contar("turnos_indexados_busca", len(self) - antes)
+        return len(self) - antes
+
+    def ler(self, turno):
+        with open(self.caminho, "rb") as f:
+            f.seek(self.posicoes[turno])
+            return json.loads(f.readline())
+
+
+class BuscaHistorico:
+    def __init__(self, diretorio=CAMINHO_DIARIO, k1=K1, b=B, orcamento=ORCAMENTO_POSTINGS):
+        self.diretorio = diretorio
+        self.k1 = k1
+        self.b = b
+        self.orcamento = orcamento
+        self.segmentos = {}
+
+    def atualizar(self):
+        # Traz para o índice os turnos anexados desde a última vez
+        numeros = listar_segmentos(self.diretorio)
+        for numero in set(self.segmentos).difference(numeros):
+            del self.segmentos[numero]
+        novos = 0
+        for numero in numeros:
+            segmento = self.segmentos.get(numero)
+            if segmento is None:
+                segmento = self.segmentos[numero] = SegmentoBusca(
+                    os.path.join(self.diretorio, nome_segmento(numero)))
+            novos += segmento.atualizar()
+        return novos
+
+    def __len__(self):
+        return sum(len(segmento) for segmento in self.segmentos.values())
+
+    def buscar(self, texto, de=None, ate=None, limite=20):
+        # Os `limite` turnos mais parecidos com `texto` pelo BM25, do mais ao
+        # menos; de/ate como nos filtros da linha de comando (intervalo_datas)
+        self.atualizar()
+        inicio, fim = intervalo_datas(de, ate)
+        intervalo = None
+        if inicio is not None or fim is not None:
+            intervalo = (-math.inf if inicio is None else inicio.timestamp(),
+                         math.inf if fim is None else fim.timestamp())
+        total = len(self)
+        if not total:
+            return []
+        # As estatísticas são do diário inteiro; o filtro de datas só escolhe
+        # os turnos que podem aparecer
+        media = sum(segmento.comprimento_total for segmento in self.segmentos.values()) / total or 1.0
+        termos = []
+        for termo in set(normalizar_chave(texto).split()):
+            frequencia = sum(segmento.frequencia_documentos(termo) for segmento in self.segmentos.values())
+            if frequencia:
+                termos.append((frequencia, termo))
+        termos.sort()
+        plano = []
+        somadas = 0
+        for frequencia, termo in termos:
+            idf = math.log(1 + (total - frequencia + 0.5) / (frequencia + 0.5))
+            plano.append((termo, idf, not plano or somadas + frequencia <= self.orcamento))
+            somadas += frequencia
+        pontuar = self._pontuar
+        if termos and termos[0][0] >= MINIMO_NUMPY and _carregar_numpy() is not None:
+            pontuar = self._pontuar_numpy
+        melhores = []
+        for numero, segmento in self.segmentos.items():
+            if not len(segmento):
+                continue
+            if intervalo is not None and (segmento.menor is None or segmento.maior < intervalo[0]
+                                          or segmento.menor >= intervalo[1]):
+                continue
+            melhores.extend((valor, numero, turno) for valor, turno in
+                            pontuar(segmento, plano, media, intervalo, limite))
+        contar("buscas_historico")
+        saida = []
+        for valor, numero, turno in heapq.nlargest(limite, melhores):
+            registro = self.segmentos[numero].ler(turno)
+            registro["pontuacao"] = round(valor, 4)
+            saida.append(registro)
+        return saida
+
+    def _pontuar(self, segmento, plano, media, intervalo, limite):
+        # (pontos, turno) dos `limite` melhores turnos do segmento
+        k1 = self.k1
+        normal = k1 * (1 - self.b)
+        proporcional = k1 * self.b / media
+        comprimentos = segmento.comprimentos
+        pontos = {}
+        for termo, idf, completo in plano:
+            entrada = segmento.postings(termo)
+            if entrada is None:
+                continue
+            lacunas, frequencias, _ = entrada
+            peso = idf * (k1 + 1)
+            if completo:
+                for turno, frequencia in zip(accumulate(lacunas), frequencias):
+                    pontos[turno] = pontos.get(turno, 0.0) + peso * frequencia / (
+                        frequencia + normal + proporcional * comprimentos[turno])
+            elif pontos:
+                # Palavra comum: só os turnos que já são candidatos, procurados
+                # na lista ou, se são muitos, conferidos ao percorrê-la
+                if len(pontos) * PROCURA_CANDIDATOS < len(lacunas):
+                    turnos = list(accumulate(lacunas))
+                    achados = []
+                    for turno in pontos:
+                        posicao = bisect_left(turnos, turno)
+                        if posicao < len(turnos) and turnos[posicao] == turno:
+                            achados.append((turno, frequencias[posicao]))
+                else:
+                    achados = [(turno, frequencia) for turno, frequencia in zip(accumulate(lacunas), frequencias)
+                               if turno in pontos]
+                for turno, frequencia in achados:
+                    pontos[turno] += peso * frequencia / (frequencia + normal + proporcional * comprimentos[turno])
+        if intervalo is not None:
+            instantes = segmento.instantes
+            pontos = {turno: valor for turno, valor in pontos.items()
+                      if intervalo[0] <= instantes[turno] < intervalo[1]}
+        return heapq.nlargest(limite, ((valor, turno) for turno, valor in pontos.items()))
+
+    def _pontuar_numpy(self, segmento, plano, media, intervalo, limite):
+        # O mesmo que _pontuar, com os pontos do segmento num vetor e todas as
+        # palavras somadas por inteiro
+        k1 = self.k1
+        comprimentos = np.frombuffer(segmento.comprimentos, dtype=np.uint16)
+        pontos = np.zeros(len(segmento))
+        for termo, idf, _ in plano:
+            entrada = segmento.postings(termo)
+            if entrada is None:
+                continue
+            lacunas, frequencias, _ = entrada
+            turnos = np.cumsum(np.frombuffer(lacunas, dtype=lacunas.typecode), dtype=np.intp)
+            frequencia = np.frombuffer(frequencias, dtype=np.uint8).astype(np.float64)
+            pontos[turnos] += idf * (k1 + 1) * frequencia / (
+                frequencia + k1 * (1 - self.b + self.b * comprimentos[turnos] / media))
+        if intervalo is not None:
+            instantes = np.frombuffer(segmento.instantes, dtype=np.float64)
+            pontos[~((instantes >= intervalo[0]) & (instantes < intervalo[1]))] = 0.0
+        candidatos = np.flatnonzero(pontos)
+        if len(candidatos) > limite:
+            candidatos = candidatos[np.argpartition(pontos[candidatos], -limite)[-limite:]]
+        return [(float(pontos[turno]), int(turno)) for turno in candidatos]
+
+    def tamanhos(self):
+        # (bytes do diário, bytes dos índices)
+        diario = indice = 0
+        for segmento in self.segmentos.values():
+            diario += os.path.getsize(segmento.caminho)
+            if os.path.exists(segmento.caminho_indice):
+                indice += os.path.getsize(segmento.caminho_indice)
+        return diario, indice
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Busca no histórico da V por BM25.")
+    parser.add_argument("--diretorio", default=CAMINHO_DIARIO, help="pasta do diário")
+    parser.add_argument("--banco", help="banco SQLite (padrão: o de IA_V_BANCO quando IA_V_ARMAZENAMENTO=sqlite)")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+    comando = comandos.add_parser("buscar", help="os turnos mais parecidos com o texto, em JSONL")
+    comando.add_argument("texto")
+    comando.add_argument("--de", help="primeiro dia (AAAA-MM-DD)")
+    comando.add_argument("--ate", help="último dia (AAAA-MM-DD)")
+    comando.add_argument("--limite", type=int, default=20)
+    comando.add_argument("--usuario", help="só no banco: os turnos deste usuário")
+    comandos.add_parser("indexar", help="indexa o que o diário tem de novo")
+    args = parser.parse_args(argumentos)
+    if args.comando == "buscar":
+        try:
+            intervalo_datas(args.de, args.ate)
+        except ValueError as erro:
+            parser.error(str(erro))
+
+    caminho_banco = args.banco
+    if caminho_banco is None and usar_sqlite():
+        caminho_banco = os.environ.get("IA_V_BANCO", CAMINHO_BANCO)
+    inicio = time.perf_counter()
+    if caminho_banco:
+        if args.comando == "indexar":
+            parser.error("no banco o índice (FTS5) é mantido pelos gatilhos da tabela historico")
+        banco = BancoV(caminho_banco)
+        try:
+            registros = banco.buscar_historico(args.texto, args.usuario, args.limite, args.de, args.ate)
+        finally:
+            banco.fechar()
+    else:
+        busca = BuscaHistorico(args.diretorio)
+        if args.comando == "indexar":
+            novos = busca.atualizar()
+            diario, indice = busca.tamanhos()
+            print(f"{novos} turnos novos, {len(busca)} no índice; {indice} bytes de índice "
+                  f"para {diario} de diário em {time.perf_counter() - inicio:.2f} s", file=sys.stderr)
+            return
+        registros = busca.buscar(args.texto, args.de, args.ate, args.limite)
+    for registro in registros:
+        print(json.dumps(registro, ensure_ascii=False))
+    print(f"{len(registros)} turnos em {(time.perf_counter() - inicio) * 1000:.1f} ms", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
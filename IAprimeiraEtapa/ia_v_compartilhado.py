@@ -0,0 +1,377 @@
+import atexit
+import json
+import os
+import threading
+import time
+from ia_v_busca import LIMIAR_CONFIANCA
+from ia_v_indice import IndiceAprendizados, caminho_indice, dados_indice, tabela_respostas
+from ia_v_metricas import contar
+from ia_v_persistencia import gravar_atomico, serializar
+from ia_v_turno import normalizar_chave
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: a trava usa msvcrt.locking no primeiro byte do arquivo
+    fcntl = None
+    import msvcrt
+
+# Aprendizados divididos entre processos. As duas variantes, dois terminais ou
+# vários processos do servidor podem usar o mesmo aprendizados.json sem que um
+# apague o que o outro aprendeu. Cada resposta aprendida vira uma linha no
+# registro de mudanças (aprendizados.mudancas.jsonl) com um número de
+# sequência, anexada com o arquivo de trava (aprendizados.trava) travado. Cada
+# processo guarda até onde aplicou o registro. Antes de uma busca, compara
+# tamanho e mtime do registro com os da última leitura (um os.stat). Se
+# mudaram, lê só as linhas novas.
+#
+# A primeira linha do registro diz até que sequência o aprendizados.json já
+# tem ("base"). O aprendizados.json só é regravado sob a trava e depois de
+# aplicar o registro inteiro: quando o registro passa de MAXIMO_REGISTRO
+# linhas e na saída do programa. Nesse momento o registro recomeça, e o antigo
+# fica como .anterior para quem ainda não tinha lido o fim dele. O
+# .indice.json gravado junto guarda essa sequência; ao abrir, se o índice vale
+# para o arquivo carregado e a sequência dele é a base do registro, basta ler
+# o registro. Só um processo que ficou mais de uma compactação para trás (ou
+# cujo índice não diz até onde o arquivo vai) relê o arquivo inteiro.
+#
+# Com adiado=True (o servidor) adicionar() e buscar() só mexem na memória:
+# anexar ao registro e conferir o que os outros processos escreveram rodam na
+# thread do gravador, e o que ela traz entra nos dicionários sob self.memoria.
+# Até a linha de uma resposta aprendida aqui ir para o registro, o que chega de
+# fora para a mesma pergunta não a substitui na memória: a linha daqui vem
+# depois no registro e é ela que vale.
+SUFIXO_REGISTRO = ".mudancas.jsonl"
+SUFIXO_ANTERIOR = ".anterior"
+SUFIXO_TRAVA = ".trava"
+MAXIMO_REGISTRO = 1000
+ESPERA_TRAVA = 0.01
+
+
+def caminho_registro(caminho_aprendizados):
+    return os.path.splitext(caminho_aprendizados)[0] + SUFIXO_REGISTRO
+
+
+class TravaArquivo:
+    # Trava exclusiva entre processos e entre as threads deste processo;
+    # reentrante, como o RLock
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._threads = threading.RLock()
+        self._descritor = None
+        self._nivel = 0
+
+    def __enter__(self):
+        self._threads.acquire()
+        try:
+            if self._nivel == 0:
+                if self._descritor is None:
+                    self._descritor = os.open(self.caminho, os.O_RDWR | os.O_CREAT, 0o644)
+                if fcntl is not None:
+                    fcntl.flock(self._descritor, fcntl.LOCK_EX)
+                else:
+                    os.lseek(self._descritor, 0, os.SEEK_SET)
+                    while True:
+                        try:
+                            msvcrt.locking(self._descritor, msvcrt.LK_NBLCK, 1)
+                            break
+                        except OSError:
+                            time.sleep(ESPERA_TRAVA)
+        except BaseException:
+            self._threads.release()
+            raise
+        self._nivel += 1
+        return self
+
+    def __exit__(self, *erro):
+        self._nivel -= 1
+        if self._nivel == 0:
+            if fcntl is not None:
+                fcntl.flock(self._descritor, fcntl.LOCK_UN)
+            else:
+                os.lseek(self._descritor, 0, os.SEEK_SET)
+                msvcrt.locking(self._descritor, msvcrt.LK_UNLCK, 1)
+        self._threads.release()
+
+    def fechar(self):
+        with self._threads:
+            if self._descritor is not None and self._nivel == 0:
+                os.close(self._descritor)
+                self._descritor = None
+
+
+def _ler_mudancas(arquivo):
+    # (linhas completas, bytes lidos); uma linha sem "\n" no fim ainda está
+    # sendo escrita e fica para a próxima leitura
+    mudancas = []
+    lidos = 0
+    for linha in arquivo:
+        if not linha.endswith(b"\n"):
+            break
+        lidos += len(linha)
+        mudancas.append(json.loads(linha))
+    return mudancas, lidos
+
+
+class IndiceCompartilhado(IndiceAprendizados):
+    def __init__(self, tabela, caminho_aprendizados, gravador=None, aprendizados=None,
+                 maximo_registro=MAXIMO_REGISTRO, adiado=False):
+        if adiado and gravador is None:
+            raise ValueError("adiado=True precisa de um gravador")
+        # Enquanto o índice base carrega, salvar() não grava: o índice refeito
+        # só vai para o disco sob a trava, com a sequência (_gravar_indice)
+        self.registro = None
+        self.adiado = adiado
+        # Protege tabela, chaves e busca aproximada entre quem responde e a
+        # thread do gravador; nunca é segurada durante leitura ou escrita em disco
+        self.memoria = threading.RLock()
+        # normalizada -> [linhas ainda não anexadas, chave, valor] (só com adiado)
+        self.pendentes = {}
+        self.verificacao_marcada = False
+        super().__init__(tabela, caminho_aprendizados, gravador)
+        # O que vai para o aprendizados.json: o dicionário inteiro, não só as respostas
+        self.aprendizados = tabela if aprendizados is None else aprendizados
+        self.maximo_registro = maximo_registro
+        self.trava = TravaArquivo(os.path.splitext(caminho_aprendizados)[0] + SUFIXO_TRAVA)
+        # Até onde o registro foi aplicado: a última sequência, a base do
+        # registro atual, a posição em bytes e quantas linhas ele tem; _visto
+        # é (tamanho, mtime) na última leitura
+        self.sequencia = 0
+        self.base = None
+        self.posicao = 0
+        self.linhas = 0
+        self._visto = None
+        self.compactacao_marcada = False
+        self.registro = caminho_registro(caminho_aprendizados)
+        with self.trava:
+            base = self._base_registro()
+            if base is not None:
+                if self.sequencia_arquivo == base:
+                    # O arquivo no disco chega até a base. A cópia carregada
+                    # pode ser de antes da última compactação, se ela
+                    # aconteceu entre a leitura e aqui; reaplicar o registro
+                    # anterior não muda uma cópia que já está em dia.
+                    anterior = self._base_registro(self.registro + SUFIXO_ANTERIOR)
+                    self.sequencia = base if anterior is None else min(anterior, base)
+                    self._aplicar_anterior()
+                if self.sequencia != base:
+                    # O índice não diz que o arquivo chega até a base (é de
+                    # antes de uma compactação, foi refeito ou a manutenção
+                    # regravou o arquivo); só o disco garante
+                    self._recarregar(base)
+            self._ler_registro()
+            if self.sequencia_arquivo is None and self.sequencia == self.base:
+                # Nada do registro foi aplicado sobre a cópia carregada (primeiro
+                # uso, ou o registro começou do arquivo como ele está)
+                self._gravar_indice()
+        atexit.register(self.fechar)
+
+    def _base_registro(self, caminho=None):
+        # Até que sequência o aprendizados.json tinha quando o registro
+        # começou, ou None se o registro não existe
+        try:
+            with open(caminho or self.registro, "rb") as f:
+                return json.loads(f.readline())["base"]
+        except FileNotFoundError:
+            return None
+
+    def _aplicar(self, mudancas):
+        aplicadas = 0
+        with self.memoria:
+            for mudanca in mudancas:
+                if mudanca["seq"] <= self.sequencia:
+                    continue
+                if normalizar_chave(mudanca["chave"]) not in self.pendentes:
+                    super().adicionar(mudanca["chave"], mudanca["valor"])
+                self.sequencia = mudanca["seq"]
+                aplicadas += 1
+        if aplicadas:
+            contar("mudancas_aplicadas", aplicadas)
+        return aplicadas
+
+    def _aplicar_anterior(self):
+        # Aplica o registro anterior se ele começa até onde este processo
+        # está; False se ele não existe ou se ficaria um buraco
+        try:
+            with open(self.registro + SUFIXO_ANTERIOR, "rb") as f:
+                if json.loads(f.readline())["base"] > self.sequencia:
+                    return False
+                self._aplicar(_ler_mudancas(f)[0])
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _recomecar_registro(self, base):
+        temporario = f"{self.registro}.{os.getpid()}.tmp"
+        with open(temporario, "wb") as f:
+            f.write(json.dumps({"base": base}).encode("utf-8") + b"\n")
+        os.replace(temporario, self.registro)
+
+    def _recarregar(self, base):
+        # O aprendizados.json no disco tem tudo até `base`
+        with open(self.caminho_aprendizados, "r", encoding="utf-8") as f:
+            dados = json.load(f)
+        with self.memoria:
+            self.tabela.clear()
+            self.tabela.update(tabela_respostas(dados))
+            self.chaves = {}
+            self.aproximada = None
+            for chave in self.tabela:
+                if isinstance(chave, str):
+                    super().adicionar(chave, self.tabela[chave])
+            for _, chave, valor in self.pendentes.values():
+                super().adicionar(chave, valor)
+        self.sequencia = base
+        self._gravar_indice()
+        contar("recargas_aprendizados")
+
+    def _dados(self):
+        # Também quando o índice refeito na abertura é gravado depois, em
+        # segundo plano
+        return dados_indice(self.caminho_aprendizados, len(self.tabela), self.chaves, self.sequencia_arquivo)
+
+    def _gravar_indice(self):
+        # Com a trava, quando o aprendizados.json no disco tem tudo até
+        # self.sequencia: o próximo processo não precisa relê-lo
+        self.sequencia_arquivo = self.sequencia
+        gravar_atomico(caminho_indice(self.caminho_aprendizados), json.dumps(self._dados(), ensure_ascii=False))
+
+    def _ler_registro(self):
+        # Com a trava: aplica o que o registro tem de novo
+        if not os.path.exists(self.registro):
+            # Primeiro uso, ou uma compactação parou entre os dois renames: o
+            # aprendizados.json já tem todo o registro anterior
+            base_anterior = self._base_registro(self.registro + SUFIXO_ANTERIOR)
+            if base_anterior is not None and not self._aplicar_anterior():
+                self._recarregar(base_anterior)
+                self._aplicar_anterior()
+            self._recomecar_registro(self.sequencia)
+        with open(self.registro, "rb") as f:
+            base = json.loads(f.readline())["base"]
+            if base != self.base:
+                # O registro recomeçou. O que falta até a base está no anterior
+                # ou, se este processo ficou mais de uma compactação para trás,
+                # só no aprendizados.json
+                if self.sequencia < base and not (self._aplicar_anterior() and self.sequencia >= base):
+                    self._recarregar(base)
+                self.base = base
+                self.posicao = f.tell()
+                self.linhas = 0
+            f.seek(self.posicao)
+            mudancas, lidos = _ler_mudancas(f)
+            aplicadas = self._aplicar(mudancas)
+            self.posicao += lidos
+            self.linhas += len(mudancas)
+            info = os.fstat(f.fileno())
+        self._visto = (info.st_size, info.st_mtime_ns)
+        return aplicadas
+
+    def atualizar(self):
+        # Traz as mudanças dos outros processos; sem mudança, custa um os.stat.
+        # Com adiado, só na thread do gravador
+        try:
+            info = os.stat(self.registro)
+            visto = (info.st_size, info.st_mtime_ns)
+        except FileNotFoundError:
+            visto = None
+        if visto == self._visto:
+            return 0
+        with self.trava:
+            return self._ler_registro()
+
+    def adicionar(self, chave, valor):
+        if not self.adiado:
+            self._anexar(chave, valor)
+            return
+        normalizada = normalizar_chave(chave)
+        with self.memoria:
+            super().adicionar(chave, valor)
+            pendente = self.pendentes.setdefault(normalizada, [0, chave, valor])
+            pendente[0] += 1
+            pendente[1:] = chave, valor
+        self.gravador.executar(self._anexar, chave, valor, normalizada)
+
+    def _anexar(self, chave, valor, normalizada=None):
+        with self.trava:
+            # Em dia com o registro antes de escrever, então a sequência é a próxima
+            self._ler_registro()
+            linha = json.dumps({"seq": self.sequencia + 1, "chave": chave, "valor": valor},
+                               ensure_ascii=False).encode("utf-8") + b"\n"
+            with open(self.registro, "ab") as f:
+                f.write(linha)
+                f.flush()
+                info = os.fstat(f.fileno())
+            self.sequencia += 1
+            self.posicao += len(linha)
+            self.linhas += 1
+            self._visto = (info.st_size, info.st_mtime_ns)
+            with self.memoria:
+                if normalizada is None:
+                    super().adicionar(chave, valor)
+                else:
+                    pendente = self.pendentes[normalizada]
+                    pendente[0] -= 1
+                    if not pendente[0]:
+                        del self.pendentes[normalizada]
+        contar("mudancas_gravadas")
+
+    def _verificar(self):
+        self.verificacao_marcada = False
+        self.atualizar()
+
+    def buscar(self, entrada):
+        # buscar_resposta também passa por aqui. Com adiado, a conferência do
+        # registro vai para o gravador (no máximo uma na fila) e esta busca
+        # responde com o que já está na memória.
+        if not self.adiado:
+            self.atualizar()
+        elif not self.verificacao_marcada:
+            self.verificacao_marcada = True
+            self.gravador.executar(self._verificar)
+        with self.memoria:
+            return super().buscar(entrada)
+
+    def buscar_aproximado(self, entrada, k=3, limiar=LIMIAR_CONFIANCA):
+        with self.memoria:
+            return super().buscar_aproximado(entrada, k, limiar)
+
+    def salvar(self):
+        # A resposta já está no registro; o aprendizados.json só é regravado
+        # quando o registro cresce demais
+        if self.registro is None:
+            return
+        if self.linhas < self.maximo_registro or self.compactacao_marcada:
+            return
+        self.compactacao_marcada = True
+        if self.gravador is not None:
+            self.gravador.executar(self.compactar)
+        else:
+            self.compactar()
+
+    def compactar(self):
+        # Grava o aprendizados.json com tudo o que o registro tem e recomeça o
+        # registro a partir dessa sequência
+        with self.trava:
+            self.compactacao_marcada = False
+            self._ler_registro()
+            if not self.linhas:
+                return
+            texto = serializar(self.aprendizados, 4)
+            if texto is None:
+                raise RuntimeError("os aprendizados mudaram durante todas as tentativas")
+            gravar_atomico(self.caminho_aprendizados, texto)
+            self._gravar_indice()
+            os.replace(self.registro, self.registro + SUFIXO_ANTERIOR)
+            self._recomecar_registro(self.sequencia)
+            self._ler_registro()
+        contar("compactacoes_registro")
+
+    def fechar(self):
+        # Na saída, o que foi aprendido também vai para o aprendizados.json
+        if self.registro is None:
+            return
+        with self.trava:
+            self._ler_registro()
+            if self.linhas:
+                self.compactar()
+        self.trava.fechar()
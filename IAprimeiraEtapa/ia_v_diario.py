@@ -0,0 +1,279 @@
+import hashlib
+import json
+import mmap
+import os
+import shutil
+from array import array
+from bisect import bisect_right
+from ia_v_metricas import contar
+from ia_v_persistencia import gravar_atomico
+
+# Diário do histórico: cada turno vira uma linha JSON anexada ao segmento
+# atual, e o segmento é trocado quando passa do tamanho máximo. Assim o custo
+# de gravar um turno não depende do tamanho do histórico.
+CAMINHO_DIARIO = "historico"
+TAMANHO_MAXIMO_SEGMENTO = 4 * 1024 * 1024
+PREFIXO_SEGMENTO = "historico-"
+SUFIXO_SEGMENTO = ".jsonl"
+SUFIXO_OFFSETS = ".idx"
+# Qual histórico de memoria.json já foi para o diário (ver migrar_historico)
+ARQUIVO_MIGRACAO = "migracao.json"
+
+
+def nome_segmento(numero):
+    return f"{PREFIXO_SEGMENTO}{numero:06d}{SUFIXO_SEGMENTO}"
+
+
+def listar_segmentos(diretorio):
+    if not os.path.isdir(diretorio):
+        return []
+    numeros = []
+    for nome in os.listdir(diretorio):
+        if nome.startswith(PREFIXO_SEGMENTO) and nome.endswith(SUFIXO_SEGMENTO):
+            miolo = nome[len(PREFIXO_SEGMENTO):-len(SUFIXO_SEGMENTO)]
+            if miolo.isdigit():
+                numeros.append(int(miolo))
+    return sorted(numeros)
+
+
+class Diario:
+    def __init__(self, diretorio=CAMINHO_DIARIO, tamanho_maximo=TAMANHO_MAXIMO_SEGMENTO):
+        self.diretorio = diretorio
+        self.tamanho_maximo = tamanho_maximo
+        os.makedirs(diretorio, exist_ok=True)
+        segmentos = listar_segmentos(diretorio)
+        self.segmento = segmentos[-1] if segmentos else 1
+        caminho = self.caminho_segmento(self.segmento)
+        self.tamanho = os.path.getsize(caminho) if os.path.exists(caminho) else 0
+        self.arquivo = None
+
+    def caminho_segmento(self, numero):
+        return os.path.join(self.diretorio, nome_segmento(numero))
+
+    def _abrir(self):
+        if self.arquivo is None:
+            self.arquivo = open(self.caminho_segmento(self.segmento), "a", encoding="utf-8")
+
+    def _rotacionar(self):
+        self.fechar()
+        self.segmento += 1
+        self.tamanho = 0
+
+    def anexar(self, registro):
+        linha = json.dumps(registro, ensure_ascii=False) + "\n"
+        tamanho_linha = len(linha.encode("utf-8"))
+        if self.tamanho and self.tamanho + tamanho_linha > self.tamanho_maximo:
+            self._rotacionar()
+        self._abrir()
+        self.arquivo.write(linha)
+        self.arquivo.flush()
+        self.tamanho += tamanho_linha
+        contar("bytes_diario", tamanho_linha)
+
+    def fechar(self):
+        if self.arquivo is not None:
+            self.arquivo.close()
+            self.arquivo = None
+
+    def historico(self):
+        if self.arquivo is not None:
+            self.arquivo.flush()
+        return HistoricoMapeado(self.diretorio)
+
+    def ler(self):
+        # Percorre o histórico inteiro em ordem, segmento por segmento
+        if self.arquivo is not None:
+            self.arquivo.flush()
+        for numero in listar_segmentos(self.diretorio):
+            with open(self.caminho_segmento(numero), "r", encoding="utf-8") as f:
+                for linha in f:
+                    linha = linha.strip()
+                    if linha:
+                        yield json.loads(linha)
+
+
+def caminho_offsets(caminho_segmento):
+    return caminho_segmento[:-len(SUFIXO_SEGMENTO)] + SUFIXO_OFFSETS
+
+
+def _ler_offsets(caminho, tamanho_segmento):
+    # O arquivo .idx é um array de uint64: o começo de cada linha e, no fim, até
+    # onde o segmento já foi indexado. Se o segmento encolheu, o índice não vale.
+    offsets = array("Q")
+    try:
+        with open(caminho, "rb") as f:
+            offsets.frombytes(f.read())
+    except (OSError, ValueError):
+        return array("Q", [0])
+    if not offsets or offsets[0] != 0 or offsets[-1] > tamanho_segmento:
+        return array("Q", [0])
+    return offsets
+
+
+class HistoricoMapeado:
+    # Leitura do diário sob demanda, sem carregar o histórico inteiro. Cada
+    # segmento ganha um índice de offsets gravado ao lado dele (o .idx); com
+    # ele len(), historico[i] e recentes(n) abrem o segmento com mmap e só
+    # decodificam as linhas pedidas. O índice é estendido quando o segmento
+    # cresce, então só as linhas novas são varridas.
+    def __init__(self, diretorio=CAMINHO_DIARIO):
+        self.diretorio = diretorio
+        self.segmentos = listar_segmentos(diretorio)
+        self._offsets = {}
+        self._acumulado = None
+
+    def _caminho(self, numero):
+        return os.path.join(self.diretorio, nome_segmento(numero))
+
+    def offsets(self, numero):
+        caminho = self._caminho(numero)
+        tamanho = os.path.getsize(caminho)
+        offsets = self._offsets.get(numero)
+        if offsets is None:
+            offsets = _ler_offsets(caminho_offsets(caminho), tamanho)
+        if offsets[-1] < tamanho:
+            inicio = len(offsets)
+            with open(caminho, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+                posicao = offsets[-1]
+                while True:
+                    fim = mapa.find(b"\n", posicao)
+                    if fim < 0:
+                        # Linha ainda incompleta: fica para a próxima vez
+                        break
+                    posicao = fim + 1
+                    offsets.append(posicao)
+            if len(offsets) > inicio:
+                temporario = caminho_offsets(caminho) + ".tmp"
+                with open(temporario, "wb") as f:
+                    offsets.tofile(f)
+                os.replace(temporario, caminho_offsets(caminho))
+        self._offsets[numero] = offsets
+        return offsets
+
+    def _linhas(self, numero, inicio, fim):
+        offsets = self.offsets(numero)
+        if inicio >= fim:
+            return []
+        with open(self._caminho(numero), "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+            return [json.loads(mapa[offsets[i]:offsets[i + 1]]) for i in range(inicio, fim)]
+
+    def _contagens(self):
+        if self._acumulado is None:
+            total = 0
+            self._acumulado = []
+            for numero in self.segmentos:
+                total += len(self.offsets(numero)) - 1
+                self._acumulado.append(total)
+        return self._acumulado
+
+    def __len__(self):
+        acumulado = self._contagens()
+        return acumulado[-1] if acumulado else 0
+
+    def __getitem__(self, posicao):
+        total = len(self)
+        if posicao < 0:
+            posicao += total
+        if not 0 <= posicao < total:
+            raise IndexError(posicao)
+        acumulado = self._contagens()
+        indice = bisect_right(acumulado, posicao)
+        antes = acumulado[indice - 1] if indice else 0
+        return self._linhas(self.segmentos[indice], posicao - antes, posicao - antes + 1)[0]
+
+    def __iter__(self):
+        for numero in self.segmentos:
+            yield from self._linhas(numero, 0, len(self.offsets(numero)) - 1)
+
+    def recentes(self, quantidade):
+        # As últimas trocas, em ordem; só toca os segmentos do fim
+        saida = []
+        for numero in reversed(self.segmentos):
+            if len(saida) >= quantidade:
+                break
+            total = len(self.offsets(numero)) - 1
+            falta = quantidade - len(saida)
+            saida = self._linhas(numero, max(0, total - falta), total) + saida
+        return saida
+
+
+def _assinatura_historico(historico):
+    return hashlib.sha1(json.dumps(historico, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _dividir_em_segmentos(historico, tamanho_maximo):
+    # As linhas de cada segmento, com a mesma divisão que o Diario faria
+    segmentos = []
+    linhas = []
+    tamanho = 0
+    for registro in historico:
+        linha = (json.dumps(registro, ensure_ascii=False) + "\n").encode("utf-8")
+        if tamanho and tamanho + len(linha) > tamanho_maximo:
+            segmentos.append(linhas)
+            linhas = []
+            tamanho = 0
+        linhas.append(linha)
+        tamanho += len(linha)
+    if linhas:
+        segmentos.append(linhas)
+    return segmentos
+
+
+def _anexar_migracao(diretorio, historico, tamanho_maximo):
+    # O diário já existe (o servidor, ou uma migração anterior). Os turnos de
+    # memoria.json vão para segmentos novos no fim, cada um gravado de uma vez.
+    # A marca com a assinatura do histórico é gravada antes deles: se ela já
+    # está lá, a migração deste histórico começou antes e só falta gravar os
+    # segmentos que não chegaram ao disco (os maiores que o último existente;
+    # os menores podem ter sido arquivados depois).
+    assinatura = _assinatura_historico(historico)
+    caminho = os.path.join(diretorio, ARQUIVO_MIGRACAO)
+    try:
+        with open(caminho, "r", encoding="utf-8") as f:
+            marca = json.load(f)
+    except (OSError, ValueError):
+        marca = None
+    segmentos = _dividir_em_segmentos(historico, tamanho_maximo)
+    existentes = listar_segmentos(diretorio)
+    ultimo = existentes[-1] if existentes else 0
+    if not isinstance(marca, dict) or marca.get("assinatura") != assinatura:
+        if not segmentos:
+            return
+        marca = {"assinatura": assinatura, "segmentos": list(range(ultimo + 1, ultimo + 1 + len(segmentos)))}
+        gravar_atomico(caminho, json.dumps(marca))
+    for numero, linhas in zip(marca["segmentos"], segmentos):
+        if numero <= ultimo:
+            continue
+        destino = os.path.join(diretorio, nome_segmento(numero))
+        with open(destino + ".tmp", "wb") as f:
+            f.write(b"".join(linhas))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(destino + ".tmp", destino)
+
+
+def migrar_historico(memoria, diretorio=CAMINHO_DIARIO, tamanho_maximo=TAMANHO_MAXIMO_SEGMENTO):
+    # Move memoria["historico"] para o diário. Os segmentos são escritos numa
+    # pasta temporária e só aparecem com o nome final depois de completos, então
+    # uma migração interrompida é refeita do zero na próxima inicialização. Se
+    # o diário já existe, os turnos são anexados a ele (_anexar_migracao).
+    # Retorna True se a memória mudou e precisa ser salva sem o histórico.
+    if "historico" not in memoria:
+        return False
+    historico = [registro for registro in memoria.pop("historico") or [] if isinstance(registro, dict)]
+    if os.path.isdir(diretorio):
+        _anexar_migracao(diretorio, historico, tamanho_maximo)
+        return True
+    temporario = diretorio + ".tmp"
+    if os.path.isdir(temporario):
+        shutil.rmtree(temporario)
+    diario = Diario(temporario, tamanho_maximo)
+    for registro in historico:
+        diario.anexar(registro)
+    diario.fechar()
+    # A marca faz uma segunda migração do mesmo histórico (a memória não foi
+    # regravada) não anexar os turnos de novo
+    gravar_atomico(os.path.join(temporario, ARQUIVO_MIGRACAO), json.dumps(
+        {"assinatura": _assinatura_historico(historico), "segmentos": listar_segmentos(temporario)}))
+    os.replace(temporario, diretorio)
+    return True
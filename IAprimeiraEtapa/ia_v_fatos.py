@@ -0,0 +1,165 @@
+import re
+from bisect import bisect_right, insort
+from datetime import datetime, timezone
+from itertools import islice
+from ia_v_turno import normalizar_chave, preparar
+
+# Fatos do layout antigo de aprendizados.json: {"sujeito", "predicado",
+# "quando", "emocao"}. Como as Preferencias, os fatos continuam sendo a lista
+# que vai para o JSON, mas a lista carrega um índice pelo sujeito normalizado
+# que aponta para o fato vigente: o de "quando" mais recente (empate ou sem
+# data: o que vem depois na lista). Assim "Meu nome" -> "João" e, depois,
+# "meu nome" -> "Kauã" viram um fato só, e "qual o meu nome" é uma consulta
+# ao dicionário.
+#
+# A listagem é paginada pelo sujeito normalizado (listar(apos=..., limite=...)),
+# sobre uma lista ordenada montada no primeiro uso e mantida depois.
+TAMANHO_PAGINA = 50
+# "qual é X", "quais são X", "o que é X", "quem é X", em qualquer ponto da
+# frase; lido no texto sem acentos do Turno
+_PERGUNTA_FATO = re.compile(
+    r"\b(?:quais|qual|o que|quem)(?:\s+(?P<verbo>e|sao|era|eram|foi))?\s+(?P<sujeito>\w.*?)[\s?!.]*$")
+# Palavras que acionam a busca de fatos no roteador (ia_v_intencoes)
+TOKENS_PERGUNTA = ("qual", "quais", "que", "quem")
+ARTIGOS = frozenset(["o", "a", "os", "as", "um", "uma"])
+# O fato é guardado como o usuário falou ("meu nome"); a V responde na
+# segunda pessoa
+PESSOA = {"meu": "seu", "minha": "sua", "meus": "seus", "minhas": "suas", "eu": "você"}
+VERBOS = {"sao": "são", "eram": "eram", "era": "era", "foi": "foi"}
+
+
+def instante(quando):
+    # Para comparar datas com e sem fuso; sem fuso é UTC, inválida é None
+    if not isinstance(quando, str):
+        return None
+    try:
+        data = datetime.fromisoformat(quando)
+    except ValueError:
+        return None
+    if data.tzinfo is None:
+        data = data.replace(tzinfo=timezone.utc)
+    return data.timestamp()
+
+
+def _mais_recente(novo, atual):
+    # Último a escrever vence; sem data, vence o que chegou depois
+    instante_novo = instante(novo.get("quando"))
+    instante_atual = instante(atual.get("quando"))
+    if instante_novo is None or instante_atual is None:
+        return True
+    return instante_novo >= instante_atual
+
+
+class Fatos(list):
+    def __init__(self, registros=()):
+        super().__init__()
+        # sujeito normalizado -> fato vigente (o próprio dicionário da lista)
+        self.vigentes = {}
+        # Sujeitos em ordem, para a listagem; None até o primeiro listar()
+        self.ordenados = None
+        self.carregar(registros)
+
+    def carregar(self, registros):
+        # Carga em lote: um laço só, sem passar por adicionar()
+        vigentes = self.vigentes
+        novos = []
+        for fato in registros:
+            if not isinstance(fato, dict):
+                continue
+            self.append(fato)
+            normalizado = normalizar_chave(str(fato.get("sujeito", "")))
+            if not normalizado:
+                continue
+            atual = vigentes.get(normalizado)
+            if atual is None:
+                novos.append(normalizado)
+            elif not _mais_recente(fato, atual):
+                continue
+            vigentes[normalizado] = fato
+        if self.ordenados is not None and novos:
+            if len(novos) == 1:
+                insort(self.ordenados, novos[0])
+            else:
+                # Remontada no próximo listar()
+                self.ordenados = None
+        return len(novos)
+
+    def adicionar(self, sujeito, predicado, quando=None, emocao=None):
+        if quando is None:
+            quando = datetime.now(timezone.utc).isoformat()
+        fato = {"sujeito": sujeito, "predicado": predicado, "quando": quando}
+        if emocao is not None:
+            fato["emocao"] = emocao
+        self.carregar([fato])
+        return fato
+
+    def buscar(self, sujeito):
+        # O fato vigente sobre o sujeito, ou None
+        return self.vigentes.get(normalizar_chave(sujeito))
+
+    def listar(self, apos="", limite=TAMANHO_PAGINA):
+        # Até `limite` fatos vigentes com sujeito normalizado depois de `apos`;
+        # a próxima página começa depois do último devolvido
+        if self.ordenados is None:
+            self.ordenados = sorted(self.vigentes)
+        inicio = bisect_right(self.ordenados, normalizar_chave(apos)) if apos else 0
+        return [self.vigentes[normalizado] for normalizado in islice(self.ordenados, inicio, inicio + limite)]
+
+    def total(self):
+        return len(self.vigentes)
+
+
+def fatos_da_base(aprendizados, banco=None):
+    # Com o banco os fatos ficam na tabela fatos (FatosSQLite). Nos arquivos, a
+    # lista de aprendizados["fatos"] vira uma Fatos na primeira vez; sem a
+    # lista (layout simples, base mapeada) não há fatos.
+    if banco is not None:
+        return banco.fatos()
+    if not isinstance(aprendizados, dict):
+        return None
+    fatos = aprendizados.get("fatos")
+    if isinstance(fatos, Fatos):
+        return fatos
+    if not isinstance(fatos, list):
+        return None
+    fatos = Fatos(fatos)
+    aprendizados["fatos"] = fatos
+    return fatos
+
+
+def sujeito_da_pergunta(entrada):
+    # ("meu nome", "e") para "qual é o meu nome?", ou None se a frase não
+    # pergunta por um fato
+    turno = preparar(entrada)
+    achado = _PERGUNTA_FATO.search(turno.dobrado)
+    if achado is None:
+        return None
+    inicio, fim = achado.span("sujeito")
+    # O mesmo trecho no texto com acentos (dobrado tem o tamanho de minusculo)
+    return turno.minusculo[inicio:fim], achado.group("verbo") or "e"
+
+
+def _na_segunda_pessoa(sujeito):
+    palavras = sujeito.split()
+    if palavras and palavras[0].lower() in PESSOA:
+        palavras[0] = PESSOA[palavras[0].lower()]
+    texto = " ".join(palavras)
+    return texto[:1].upper() + texto[1:]
+
+
+def responder_fato(entrada, fatos):
+    # A resposta para "qual é X"/"o que é X" quando há um fato sobre X
+    if fatos is None:
+        return None
+    pergunta = sujeito_da_pergunta(entrada)
+    if pergunta is None:
+        return None
+    sujeito, verbo = pergunta
+    palavras = normalizar_chave(sujeito).split()
+    # "qual o meu nome": o artigo pode fazer parte do sujeito ou não
+    fato = fatos.buscar(" ".join(palavras))
+    if fato is None and len(palavras) > 1 and palavras[0] in ARTIGOS:
+        fato = fatos.buscar(" ".join(palavras[1:]))
+    if fato is None:
+        return None
+    return f"{_na_segunda_pessoa(str(fato.get('sujeito', sujeito)))} {VERBOS.get(verbo, 'é')} {fato.get('predicado', '')}."
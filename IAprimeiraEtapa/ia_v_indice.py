@@ -0,0 +1,145 @@
+import json
+import os
+from ia_v_busca import BuscaAproximada, LIMIAR_CONFIANCA
+from ia_v_metricas import contar
+from ia_v_persistencia import gravar_atomico
+from ia_v_turno import chave_de, normalizar_chave
+
+# Índice das respostas aprendidas pela forma canônica da pergunta: sem
+# acentos, sem pontuação e com espaços normalizados. Assim "Como você está?"
+# e "como voce esta" caem na mesma entrada e a busca é um acesso ao dicionário.
+# A normalização fica em ia_v_turno; buscar() aceita o texto ou um Turno.
+VERSAO_INDICE = 1
+
+
+def tabela_respostas(aprendizados):
+    # Os aprendizados podem ser um dicionário simples {pergunta: resposta} ou
+    # ter as respostas em aprendizados["respostas"]
+    respostas = aprendizados.get("respostas")
+    if isinstance(respostas, dict):
+        return respostas
+    return aprendizados
+
+
+def texto_resposta(valor):
+    if isinstance(valor, dict):
+        return valor.get("texto", ""), valor.get("emocao", "neutra")
+    return valor, "neutra"
+
+
+def caminho_indice(caminho_aprendizados):
+    return os.path.splitext(caminho_aprendizados)[0] + ".indice.json"
+
+
+def _assinatura(caminho):
+    if not os.path.exists(caminho):
+        return None
+    info = os.stat(caminho)
+    return [info.st_size, info.st_mtime_ns]
+
+
+def dados_indice(caminho_aprendizados, total, chaves, sequencia=None):
+    # O conteúdo do .indice.json, amarrado ao arquivo de aprendizados como ele
+    # está agora no disco. `sequencia`: até onde o registro de mudanças
+    # (ia_v_compartilhado) já está nesse arquivo, quando se sabe
+    dados = {
+        "versao": VERSAO_INDICE,
+        "origem": _assinatura(caminho_aprendizados),
+        "total": total,
+        "chaves": chaves
+    }
+    if sequencia is not None:
+        dados["sequencia"] = sequencia
+    return dados
+
+
+class IndiceAprendizados:
+    def __init__(self, tabela, caminho_aprendizados=None, gravador=None):
+        self.tabela = tabela
+        self.caminho_aprendizados = caminho_aprendizados
+        # Com um gravador (GravadorAtrasado) o índice é gravado em segundo
+        # plano, logo depois do arquivo de aprendizados
+        self.gravador = gravador
+        self.chaves = {}
+        # Montada só na primeira busca que não acha a pergunta exata
+        self.aproximada = None
+        # A sequência gravada no .indice.json, se ele valeu para este arquivo
+        self.sequencia_arquivo = None
+        if not self._carregar():
+            self.reconstruir()
+
+    def _carregar(self):
+        if not self.caminho_aprendizados:
+            return False
+        caminho = caminho_indice(self.caminho_aprendizados)
+        if not os.path.exists(caminho):
+            return False
+        try:
+            with open(caminho, "r", encoding="utf-8") as f:
+                dados = json.load(f)
+        except (OSError, ValueError):
+            return False
+        # Só reaproveita o índice se ele foi gravado junto com este arquivo
+        if (dados.get("versao") != VERSAO_INDICE or
+                dados.get("origem") != _assinatura(self.caminho_aprendizados) or
+                dados.get("total") != len(self.tabela)):
+            return False
+        self.chaves = dados.get("chaves", {})
+        self.sequencia_arquivo = dados.get("sequencia")
+        return True
+
+    def reconstruir(self):
+        self.chaves = {}
+        self.aproximada = None
+        for chave in self.tabela:
+            if isinstance(chave, str):
+                self.chaves[normalizar_chave(chave)] = chave
+        self.salvar()
+
+    def _dados(self):
+        return dados_indice(self.caminho_aprendizados, len(self.tabela), self.chaves)
+
+    def salvar(self):
+        # Deve ser chamado depois de gravar (ou marcar) o arquivo de
+        # aprendizados, para que a assinatura guardada corresponda a ele
+        if not self.caminho_aprendizados:
+            return
+        caminho = caminho_indice(self.caminho_aprendizados)
+        if self.gravador is not None:
+            # A assinatura só é calculada na hora de gravar
+            self.gravador.marcar(caminho, self._dados)
+        else:
+            gravar_atomico(caminho, json.dumps(self._dados(), ensure_ascii=False))
+
+    def adicionar(self, chave, valor):
+        self.tabela[chave] = valor
+        normalizada = normalizar_chave(chave)
+        self.chaves[normalizada] = chave
+        if self.aproximada is not None:
+            self.aproximada.adicionar(normalizada)
+
+    def buscar(self, entrada):
+        chave = self.chaves.get(chave_de(entrada))
+        if chave is None:
+            return None
+        return self.tabela.get(chave)
+
+    def buscar_aproximado(self, entrada, k=3, limiar=LIMIAR_CONFIANCA):
+        if self.aproximada is None:
+            self.aproximada = BuscaAproximada(self.chaves)
+        return [(self.chaves[normalizada], pontuacao) for normalizada, pontuacao
+                in self.aproximada.buscar(chave_de(entrada), k, limiar)]
+
+    def buscar_resposta(self, entrada):
+        # A pergunta exata tem prioridade; a busca aproximada só roda se ela falhar
+        contar("buscas")
+        resposta = self.buscar(entrada)
+        if resposta is not None:
+            contar("buscas_exatas")
+            return resposta
+        candidatos = self.buscar_aproximado(entrada, k=1)
+        if candidatos:
+            contar("buscas_aproximadas")
+            return self.tabela.get(candidatos[0][0])
+        contar("buscas_sem_resposta")
+        return None
@@ -0,0 +1,208 @@
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+from ia_v_emocoes import prever
+from ia_v_metricas import adicionar_argumentos, perfil
+
+# Modo em lote: passa um arquivo (ou a entrada padrão) inteiro pelo mesmo
+# caminho de resposta da conversa, sem input() e sem perguntas de feedback.
+# Tudo é feito com geradores, então a memória não cresce com o tamanho do lote.
+#
+#   python ia_v_lote.py frases.txt > respostas.jsonl
+#   python ia_v_lote.py --replay log_conversa.txt --variante personalidade
+#   python ia_v_lote.py --diario 100
+PREFIXO_REPLAY = "Você:"
+# Falas classificadas por emoção de uma vez (em vetor) antes de passar pelo turno
+TAMANHO_BLOCO_EMOCOES = 4096
+
+
+def ler_entradas(arquivo):
+    for linha in arquivo:
+        linha = linha.strip()
+        if linha:
+            yield linha
+
+
+def ler_replay(arquivo):
+    # Reaproveita só as falas do usuário de um log_conversa.txt
+    for linha in arquivo:
+        linha = linha.strip()
+        if linha.startswith(PREFIXO_REPLAY):
+            entrada = linha[len(PREFIXO_REPLAY):].strip()
+            if entrada:
+                yield entrada
+
+
+def ler_diario(quantidade):
+    # Perguntas das últimas trocas do diário de histórico, lidas pelo índice de
+    # offsets sem passar pelo histórico inteiro
+    from ia_v_diario import HistoricoMapeado
+    for registro in HistoricoMapeado().recentes(quantidade):
+        pergunta = str(registro.get("pergunta", "")).strip()
+        if pergunta:
+            yield pergunta
+
+
+def em_blocos_previstos(entradas, tamanho=TAMANHO_BLOCO_EMOCOES):
+    # As emoções de cada bloco são previstas juntas; o turno de cada fala
+    # encontra a sua já calculada
+    bloco = []
+    for entrada in entradas:
+        bloco.append(entrada)
+        if len(bloco) == tamanho:
+            yield from prever(bloco)
+            bloco = []
+    if bloco:
+        yield from prever(bloco)
+
+
+def carregar_variante(nome, salvar):
+    # Devolve o módulo da variante, a função de um turno e uma função que
+    # grava o estado no fim (ou None quando não há persistência)
+    from ia_v_compartilhado import IndiceCompartilhado
+    from ia_v_indice import IndiceAprendizados, tabela_respostas
+    from ia_v_persistencia import GRAVADOR
+
+    if nome == "emocional":
+        import ia_v_emocional as modulo
+        memoria = modulo.carregar_memoria()
+        aprendizados = modulo.carregar_aprendizados()
+        tabela = tabela_respostas(aprendizados)
+    else:
+        import ia_v_personalidade_v as modulo
+        if hasattr(modulo, "carregar_json"):
+            memoria = modulo.carregar_json(modulo.CAMINHO_MEMORIA)
+            aprendizados = modulo.carregar_json(modulo.CAMINHO_APRENDIZADOS)
+            tabela = aprendizados.setdefault("respostas", {})
+        else:
+            memoria = modulo.carregar_memoria()
+            aprendizados = modulo.carregar_aprendizados()
+            tabela = tabela_respostas(aprendizados)
+
+    banco = modulo.BANCO
+    base = modulo.BASE
+    if (banco is not None or base is not None) and not salvar:
+        # Sem --salvar nada do que for aprendido pode chegar ao banco ou à base
+        from ia_v_armazenamento import copiar_para_memoria
+        aprendizados = copiar_para_memoria(aprendizados)
+        tabela = tabela_respostas(aprendizados)
+        banco = base = None
+
+    historico_antigo = "historico" in memoria
+    if salvar:
+        from ia_v_diario import migrar_historico
+        migrar_historico(memoria)
+    else:
+        memoria.pop("historico", None)
+    if banco is not None:
+        indice = banco.indice()
+    elif base is not None:
+        indice = base.indice()
+    elif salvar:
+        indice = IndiceCompartilhado(tabela, modulo.CAMINHO_APRENDIZADOS, GRAVADOR, aprendizados)
+    else:
+        indice = IndiceAprendizados(tabela)
+    responder = modulo.criar_motor(aprendizados, memoria, indice)
+
+    if not salvar:
+        return modulo, responder, None
+
+    def gravar(houve_aprendizado):
+        # As respostas aprendidas já estão no registro de mudanças, no banco ou
+        # na base mapeada; indice.salvar() só compacta quando precisa
+        if hasattr(modulo, "salvar_json"):
+            modulo.salvar_json(modulo.CAMINHO_MEMORIA, memoria)
+        else:
+            modulo.salvar_memoria(memoria)
+        if houve_aprendizado:
+            indice.salvar()
+
+    if historico_antigo:
+        gravar(False)
+    return modulo, responder, gravar
+
+
+def processar(entradas, responder, diario=None):
+    for numero, entrada in enumerate(entradas, 1):
+        resposta, aprendeu = responder(entrada)
+        registro = {"n": numero, "entrada": entrada, "resposta": resposta,
+                    "intencao": getattr(responder, "intencao", None)}
+        if aprendeu:
+            registro["aprendeu"] = True
+        if diario is not None:
+            diario.anexar({
+                "pergunta": entrada,
+                "resposta": resposta,
+                "data": datetime.now().isoformat()
+            })
+        yield registro
+
+
+def escrever_jsonl(registros, saida):
+    total = 0
+    aprendizados = 0
+    for registro in registros:
+        saida.write(json.dumps(registro, ensure_ascii=False))
+        saida.write("\n")
+        total += 1
+        aprendizados += registro.get("aprendeu", False)
+    return total, aprendizados
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Roda a V em lote e escreve as respostas em JSONL.")
+    parser.add_argument("arquivo", nargs="?", default="-",
+                        help="arquivo com uma fala por linha ('-' para a entrada padrão)")
+    parser.add_argument("--replay", action="store_true",
+                        help="lê só as linhas 'Você:' de um log_conversa.txt")
+    parser.add_argument("--diario", type=int, metavar="N",
+                        help="repete as perguntas das últimas N trocas do diário de histórico")
+    parser.add_argument("--variante", choices=["emocional", "personalidade"], default="emocional")
+    parser.add_argument("--semente", type=int, default=0,
+                        help="semente das escolhas aleatórias de resposta")
+    parser.add_argument("--saida", default="-", help="arquivo JSONL de saída ('-' para a saída padrão)")
+    parser.add_argument("--salvar", action="store_true",
+                        help="grava histórico, memória e aprendizados como na conversa")
+    adicionar_argumentos(parser)
+    args = parser.parse_args(argumentos)
+
+    modulo, responder, gravar = carregar_variante(args.variante, args.salvar)
+    modulo.aleatorio.seed(args.semente)
+
+    diario = None
+    if args.salvar and hasattr(modulo, "Diario"):
+        diario = modulo.BANCO.diario() if modulo.BANCO is not None else modulo.Diario()
+
+    if args.diario:
+        # Lê tudo antes de começar, porque com --salvar o próprio lote anexa ao diário
+        entrada = sys.stdin
+        entradas = list(ler_diario(args.diario))
+    else:
+        entrada = sys.stdin if args.arquivo == "-" else open(args.arquivo, "r", encoding="utf-8")
+        leitor = ler_replay if args.replay else ler_entradas
+        entradas = leitor(entrada)
+    saida = sys.stdout if args.saida == "-" else open(args.saida, "w", encoding="utf-8")
+    inicio = time.perf_counter()
+    with perfil(args):
+        try:
+            total, aprendidos = escrever_jsonl(processar(em_blocos_previstos(entradas), responder, diario), saida)
+        finally:
+            if entrada is not sys.stdin:
+                entrada.close()
+            if saida is not sys.stdout:
+                saida.close()
+            else:
+                saida.flush()
+            if diario is not None:
+                diario.fechar()
+        if gravar is not None:
+            gravar(aprendidos > 0)
+        duracao = time.perf_counter() - inicio
+    por_segundo = total / duracao if duracao > 0 else 0.0
+    print(f"{total} turnos em {duracao:.3f} s ({por_segundo:.0f} turnos/s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,628 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import ia_v_emocoes
+from ia_v_armazenamento import CAMINHO_BANCO, ESQUEMA, ESQUEMA_FTS, BancoV, usar_sqlite
+from ia_v_diario import CAMINHO_DIARIO, HistoricoMapeado, caminho_offsets, listar_segmentos, nome_segmento
+from ia_v_emocoes import classificar_lote, treinar_com_base
+from ia_v_indice import caminho_indice, dados_indice, tabela_respostas
+from ia_v_persistencia import gravar_atomico
+from ia_v_retencao import CAMINHO_ARQUIVO, FORMATOS, ArquivoHistorico, Politica, quantos_arquivar
+from ia_v_turno import normalizar_chave
+
+# Manutenção offline da base. "reindexar" passa tudo o que está guardado pelas
+# regras atuais: normaliza de novo as perguntas aprendidas e refaz o índice,
+# reclassifica a emoção das respostas, gostos e fatos e rotula cada turno do
+# histórico com a emoção da fala do usuário.
+#
+# O trabalho é dividido em blocos (um segmento do diário, TAMANHO_BLOCO
+# respostas ou linhas do banco) e espalhado por um ProcessPoolExecutor, com no
+# máximo PENDENTES_POR_PROCESSO blocos na fila por processo, então a memória
+# não depende do tamanho da base. Cada bloco pronto fica gravado numa pasta de
+# trabalho (ou, no banco, numa tabela *_nova com a posição já processada), e
+# uma execução interrompida continua de onde parou. Só no fim os arquivos
+# novos tomam o lugar dos antigos: renames (ou uma transação, no banco).
+#
+#   python ia_v_manutencao.py reindexar
+#   python ia_v_manutencao.py reindexar --processos 8 --so historico
+#   IA_V_ARMAZENAMENTO=sqlite python ia_v_manutencao.py reindexar
+#
+# "arquivar" aplica a política de retenção (ia_v_retencao): os turnos mais
+# antigos do histórico vão para o arquivo comprimido e saem do diário (ou da
+# tabela historico), e os recentes continuam onde estão. Não rode com um
+# terminal ou o servidor escrevendo no diário: se ele mudar no meio, o
+# arquivamento é desfeito e termina com erro.
+#
+#   python ia_v_manutencao.py arquivar --turnos 5000 --dias 90
+#   python ia_v_manutencao.py arquivar --bytes 50000000 --formato zlib
+CAMINHO_APRENDIZADOS = "aprendizados.json"
+SUFIXO_TRABALHO = ".reindexar"
+SUFIXO_ANTIGO = ".antigo"
+SUFIXO_RETENCAO = ".retencao"
+ORIGEM_TRABALHO = "origem.json"
+PODADO_RETENCAO = "retencao.json"
+PREFIXO_PARTE = "parte-"
+TAMANHO_BLOCO = 20000
+PENDENTES_POR_PROCESSO = 2
+INTERVALO_PROGRESSO = 2.0
+
+
+def _iniciar_processo(classificador):
+    # Os processos usam o mesmo modelo do processo principal
+    ia_v_emocoes.CLASSIFICADOR = classificador
+
+
+def em_ordem(executor, funcao, tarefas, pendentes):
+    # Como executor.map, mas enviando as tarefas aos poucos (map lê todas de uma
+    # vez). Sem executor roda tudo aqui mesmo.
+    if executor is None:
+        for argumentos in tarefas:
+            yield funcao(*argumentos)
+        return
+    fila = deque()
+    for argumentos in tarefas:
+        fila.append(executor.submit(funcao, *argumentos))
+        if len(fila) >= pendentes:
+            yield fila.popleft().result()
+    while fila:
+        yield fila.popleft().result()
+
+
+class Progresso:
+    def __init__(self, nome, total, unidade):
+        self.nome = nome
+        self.total = total
+        self.unidade = unidade
+        self.feito = 0
+        self.itens = 0
+        self.inicio = self.ultimo = time.perf_counter()
+
+    def avancar(self, feito, itens):
+        self.feito += feito
+        self.itens += itens
+        agora = time.perf_counter()
+        if agora - self.ultimo >= INTERVALO_PROGRESSO:
+            self.ultimo = agora
+            self._imprimir(agora)
+
+    def _imprimir(self, agora, fim=""):
+        duracao = agora - self.inicio
+        taxa = self.itens / duracao if duracao > 0 else 0.0
+        fracao = self.feito / self.total if self.total else 1.0
+        print(f"{self.nome}: {fracao:.0%} ({self.itens} {self.unidade}, {taxa:.0f}/s){fim}", file=sys.stderr)
+
+    def terminar(self):
+        self._imprimir(time.perf_counter(), f" em {time.perf_counter() - self.inicio:.1f} s")
+
+
+def _preparar_trabalho(pasta, origem, recomecar):
+    # Reaproveita a pasta de trabalho só se ela foi começada sobre a mesma origem
+    caminho = os.path.join(pasta, ORIGEM_TRABALHO)
+    if os.path.isdir(pasta) and not recomecar:
+        try:
+            with open(caminho, "r", encoding="utf-8") as f:
+                if json.load(f) == origem:
+                    return True
+        except (OSError, ValueError):
+            pass
+    shutil.rmtree(pasta, ignore_errors=True)
+    os.makedirs(pasta)
+    gravar_atomico(caminho, json.dumps(origem))
+    return False
+
+
+def _trocar_pasta(atual, nova):
+    # Põe a pasta nova no lugar da atual. Cada passo é um rename, e o estado em
+    # que uma interrupção deixar as pastas é terminado na próxima chamada
+    antiga = atual + SUFIXO_ANTIGO
+    if os.path.isdir(nova):
+        if os.path.exists(atual):
+            shutil.rmtree(antiga, ignore_errors=True)
+            os.replace(atual, antiga)
+        os.replace(nova, atual)
+    shutil.rmtree(antiga, ignore_errors=True)
+
+
+# Emoções
+def rotular_turnos(registros):
+    # A emoção de cada turno é a da fala do usuário
+    emocoes = classificar_lote([str(registro.get("pergunta", "")) for registro in registros])
+    for registro, emocao in zip(registros, emocoes):
+        registro["emocao"] = emocao
+
+
+def rotular_respostas(pares):
+    # Só as respostas que guardam emoção (as da variante de personalidade)
+    rotuladas = [valor for _, valor in pares if isinstance(valor, dict)]
+    textos = [f"{pergunta} {valor.get('texto', '')}" for pergunta, valor in pares if isinstance(valor, dict)]
+    for valor, emocao in zip(rotuladas, classificar_lote(textos)):
+        valor["emocao"] = emocao
+
+
+def rotular_listas(aprendizados):
+    # Gostos, antipatias e fatos do layout antigo; são listas pequenas
+    registros = []
+    textos = []
+    for chave in ("gostos", "antipatias"):
+        for item in aprendizados.get(chave) or []:
+            if isinstance(item, dict):
+                registros.append(item)
+                textos.append(str(item.get("item", "")))
+    for fato in aprendizados.get("fatos") or []:
+        if isinstance(fato, dict):
+            registros.append(fato)
+            textos.append(f"{fato.get('sujeito', '')} {fato.get('predicado', '')}")
+    for registro, emocao in zip(registros, classificar_lote(textos)):
+        registro["emocao"] = emocao
+    return len(registros)
+
+
+# Histórico em arquivos (ia_v_diario)
+def reescrever_segmento(origem, destino):
+    with open(origem, "rb") as f:
+        registros = [json.loads(linha) for linha in f if linha.strip()]
+    rotular_turnos(registros)
+    linhas = [(json.dumps(registro, ensure_ascii=False) + "\n").encode("utf-8") for registro in registros]
+    # O índice de offsets do segmento novo já sai pronto (o .idx do diário)
+    offsets = array("Q", [0])
+    posicao = 0
+    for linha in linhas:
+        posicao += len(linha)
+        offsets.append(posicao)
+    with open(caminho_offsets(destino) + ".tmp", "wb") as f:
+        offsets.tofile(f)
+    os.replace(caminho_offsets(destino) + ".tmp", caminho_offsets(destino))
+    # O segmento vai por último: existir com o nome final é o sinal de pronto
+    with open(destino + ".tmp", "wb") as f:
+        f.write(b"".join(linhas))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(destino + ".tmp", destino)
+    return len(registros)
+
+
+def reindexar_historico(diretorio, executor, pendentes, recomecar):
+    diretorio = os.path.normpath(diretorio)
+    trabalho = diretorio + SUFIXO_TRABALHO
+    if os.path.isdir(trabalho) and not os.path.exists(os.path.join(trabalho, ORIGEM_TRABALHO)):
+        # Terminou numa execução anterior, mas a troca não chegou ao fim
+        _trocar_pasta(diretorio, trabalho)
+        return 0
+    # Sobra de uma troca que parou depois de pôr a pasta nova no lugar
+    shutil.rmtree(diretorio + SUFIXO_ANTIGO, ignore_errors=True)
+    segmentos = listar_segmentos(diretorio)
+    if not segmentos:
+        return 0
+    tamanhos = {numero: os.path.getsize(os.path.join(diretorio, nome_segmento(numero))) for numero in segmentos}
+    origem = {"segmentos": [[numero, tamanhos[numero]] for numero in segmentos]}
+    if _preparar_trabalho(trabalho, origem, recomecar):
+        print(f"{diretorio}: continuando a execução anterior", file=sys.stderr)
+
+    progresso = Progresso(diretorio, sum(tamanhos.values()), "turnos")
+    pendentes_segmentos = []
+    total = 0
+    for numero in segmentos:
+        pronto = os.path.join(trabalho, nome_segmento(numero))
+        if os.path.exists(pronto):
+            # O .idx do segmento pronto diz quantos turnos ele tem
+            total += os.path.getsize(caminho_offsets(pronto)) // 8 - 1
+            progresso.avancar(tamanhos[numero], 0)
+        else:
+            pendentes_segmentos.append(numero)
+    tarefas = ((os.path.join(diretorio, nome_segmento(numero)), os.path.join(trabalho, nome_segmento(numero)))
+               for numero in pendentes_segmentos)
+    for numero, linhas in zip(pendentes_segmentos, em_ordem(executor, reescrever_segmento, tarefas, pendentes)):
+        total += linhas
+        progresso.avancar(tamanhos[numero], linhas)
+    progresso.terminar()
+
+    os.remove(os.path.join(trabalho, ORIGEM_TRABALHO))
+    _trocar_pasta(diretorio, trabalho)
+    return total
+
+
+# Aprendizados em arquivo (aprendizados.json e o .indice.json ao lado)
+def reescrever_respostas(pares, destino):
+    # Grava [pergunta, forma normalizada, valor] por linha
+    rotular_respostas(pares)
+    with open(destino + ".tmp", "w", encoding="utf-8") as f:
+        for pergunta, valor in pares:
+            normalizada = normalizar_chave(pergunta) if isinstance(pergunta, str) else None
+            f.write(json.dumps([pergunta, normalizada, valor], ensure_ascii=False) + "\n")
+    os.replace(destino + ".tmp", destino)
+    return len(pares)
+
+
+def _nome_parte(numero):
+    return f"{PREFIXO_PARTE}{numero:06d}.jsonl"
+
+
+def reindexar_aprendizados(caminho, executor, pendentes, recomecar, bloco=TAMANHO_BLOCO):
+    if not os.path.exists(caminho):
+        return 0
+    with open(caminho, "r", encoding="utf-8") as f:
+        aprendizados = json.load(f)
+    respostas = tabela_respostas(aprendizados)
+    # No layout simples as respostas são o próprio dicionário
+    simples = respostas is aprendizados
+    info = os.stat(caminho)
+    origem = {"arquivo": [info.st_size, info.st_mtime_ns], "bloco": bloco}
+    trabalho = os.path.splitext(caminho)[0] + SUFIXO_TRABALHO
+    if _preparar_trabalho(trabalho, origem, recomecar):
+        print(f"{caminho}: continuando a execução anterior", file=sys.stderr)
+
+    pares = iter(list(respostas.items()))
+    blocos = iter(lambda: list(islice(pares, bloco)), [])
+    progresso = Progresso(caminho, len(respostas), "respostas")
+    numeros = []
+
+    def tarefas():
+        for numero, pares_bloco in enumerate(blocos, 1):
+            numeros.append(numero)
+            destino = os.path.join(trabalho, _nome_parte(numero))
+            if os.path.exists(destino):
+                progresso.avancar(len(pares_bloco), 0)
+                continue
+            yield pares_bloco, destino
+
+    for quantidade in em_ordem(executor, reescrever_respostas, tarefas(), pendentes):
+        progresso.avancar(quantidade, quantidade)
+
+    novas = {}
+    chaves = {}
+    for numero in numeros:
+        with open(os.path.join(trabalho, _nome_parte(numero)), "r", encoding="utf-8") as f:
+            for linha in f:
+                pergunta, normalizada, valor = json.loads(linha)
+                novas[pergunta] = valor
+                if normalizada is not None:
+                    chaves[normalizada] = pergunta
+    if simples:
+        aprendizados = novas
+    else:
+        aprendizados["respostas"] = novas
+        rotular_listas(aprendizados)
+    progresso.terminar()
+
+    # Dados e índice novos ficam prontos ao lado; o índice guarda a assinatura
+    # do arquivo novo, que o rename preserva. Se a troca parar entre os dois
+    # renames, a assinatura não bate e o índice é refeito na próxima carga.
+    novo = caminho + ".novo"
+    gravar_atomico(novo, json.dumps(aprendizados, ensure_ascii=False, indent=4))
+    gravar_atomico(caminho_indice(caminho) + ".novo",
+                   json.dumps(dados_indice(novo, len(novas), chaves), ensure_ascii=False))
+    os.replace(novo, caminho)
+    os.replace(caminho_indice(caminho) + ".novo", caminho_indice(caminho))
+    shutil.rmtree(trabalho, ignore_errors=True)
+    return len(novas)
+
+
+# Banco SQLite (ia_v_armazenamento)
+def reescrever_linhas_respostas(linhas):
+    pares = [(chave, json.loads(valor)) for _, chave, valor in linhas]
+    rotular_respostas(pares)
+    return [(chave, normalizar_chave(chave), json.dumps(valor, ensure_ascii=False)) for chave, valor in pares]
+
+
+def reescrever_linhas_historico(linhas):
+    registros = []
+    for id_turno, usuario, pergunta, resposta, data, extras in linhas:
+        registro = json.loads(extras) if extras else {}
+        registro["pergunta"] = pergunta
+        registros.append(registro)
+    rotular_turnos(registros)
+    saida = []
+    for (id_turno, usuario, pergunta, resposta, data, _), registro in zip(linhas, registros):
+        del registro["pergunta"]
+        saida.append((id_turno, usuario, pergunta, resposta, data, json.dumps(registro, ensure_ascii=False)))
+    return saida
+
+
+TABELAS_NOVAS = {
+    "respostas": (
+        "CREATE TABLE IF NOT EXISTS respostas_nova (chave TEXT PRIMARY KEY, normalizada TEXT NOT NULL, "
+        "valor TEXT NOT NULL)",
+        "SELECT rowid, chave, valor FROM respostas WHERE rowid > ? ORDER BY rowid LIMIT ?",
+        "INSERT INTO respostas_nova (chave, normalizada, valor) VALUES (?, ?, ?)",
+        reescrever_linhas_respostas
+    ),
+    "historico": (
+        "CREATE TABLE IF NOT EXISTS historico_nova (id INTEGER PRIMARY KEY, usuario TEXT NOT NULL DEFAULT '', "
+        "pergunta TEXT NOT NULL DEFAULT '', resposta TEXT NOT NULL DEFAULT '', data TEXT, extras TEXT)",
+        "SELECT id, usuario, pergunta, resposta, data, extras FROM historico WHERE id > ? ORDER BY id LIMIT ?",
+        "INSERT INTO historico_nova (id, usuario, pergunta, resposta, data, extras) VALUES (?, ?, ?, ?, ?, ?)",
+        reescrever_linhas_historico
+    )
+}
+
+
+def reindexar_tabela(banco, tabela, executor, pendentes, recomecar, bloco=TAMANHO_BLOCO):
+    # Copia a tabela para <tabela>_nova em blocos; a posição copiada é gravada
+    # na mesma transação de cada bloco. No fim a nova substitui a antiga numa
+    # transação só, e ESQUEMA/ESQUEMA_FTS recriam índices e gatilhos.
+    criar, ler, inserir, funcao = TABELAS_NOVAS[tabela]
+    conexao = banco.conexao
+    with banco.trava, conexao:
+        conexao.execute("CREATE TABLE IF NOT EXISTS manutencao (alvo TEXT PRIMARY KEY, posicao INTEGER NOT NULL)")
+        if recomecar:
+            conexao.execute(f"DROP TABLE IF EXISTS {tabela}_nova")
+            conexao.execute("DELETE FROM manutencao WHERE alvo = ?", (tabela,))
+        conexao.execute(criar)
+        linha = conexao.execute("SELECT posicao FROM manutencao WHERE alvo = ?", (tabela,)).fetchone()
+        total = conexao.execute(f"SELECT COUNT(*) FROM {tabela}").fetchone()[0]
+        feitas = conexao.execute(f"SELECT COUNT(*) FROM {tabela}_nova").fetchone()[0]
+    posicao = linha[0] if linha else 0
+    if posicao:
+        print(f"{tabela}: continuando depois da linha {posicao}", file=sys.stderr)
+    progresso = Progresso(tabela, total, "linhas")
+    progresso.avancar(feitas, 0)
+
+    ultimas = deque()
+
+    def tarefas():
+        inicio = posicao
+        while True:
+            with banco.trava:
+                linhas = conexao.execute(ler, (inicio, bloco)).fetchall()
+            if not linhas:
+                return
+            inicio = linhas[-1][0]
+            ultimas.append(inicio)
+            yield (linhas,)
+
+    for linhas in em_ordem(executor, funcao, tarefas(), pendentes):
+        with banco.trava, conexao:
+            conexao.executemany(inserir, linhas)
+            conexao.execute("INSERT OR REPLACE INTO manutencao (alvo, posicao) VALUES (?, ?)",
+                            (tabela, ultimas.popleft()))
+        progresso.avancar(len(linhas), len(linhas))
+    progresso.terminar()
+
+    with banco.trava:
+        conexao.executescript(
+            f"BEGIN; DROP TABLE {tabela}; ALTER TABLE {tabela}_nova RENAME TO {tabela}; "
+            f"DELETE FROM manutencao WHERE alvo = '{tabela}'; COMMIT;")
+        conexao.executescript(ESQUEMA)
+        if banco.fts:
+            conexao.executescript(ESQUEMA_FTS)
+    return total
+
+
+def reindexar(diretorio=".", banco=None, processos=None, alvos=("aprendizados", "historico"),
+              recomecar=False, treinar_com_base_atual=False, bloco=TAMANHO_BLOCO):
+    processos = processos or os.cpu_count() or 1
+    caminho_aprendizados = os.path.join(diretorio, CAMINHO_APRENDIZADOS)
+    if treinar_com_base_atual:
+        # Por padrão a emoção vem só de emocoes.json; com a base, os rótulos
+        # antigos também entram no treino
+        if banco is not None:
+            treinar_com_base({}, banco)
+        elif os.path.exists(caminho_aprendizados):
+            with open(caminho_aprendizados, "r", encoding="utf-8") as f:
+                treinar_com_base(json.load(f))
+    executor = None
+    if processos > 1:
+        executor = ProcessPoolExecutor(processos, initializer=_iniciar_processo,
+                                       initargs=(ia_v_emocoes.CLASSIFICADOR,))
+    pendentes = processos * PENDENTES_POR_PROCESSO
+    contagem = {}
+    try:
+        if banco is not None:
+            if "aprendizados" in alvos:
+                contagem["respostas"] = reindexar_tabela(banco, "respostas", executor, pendentes, recomecar, bloco)
+            if "historico" in alvos:
+                contagem["historico"] = reindexar_tabela(banco, "historico", executor, pendentes, recomecar, bloco)
+        else:
+            if "aprendizados" in alvos:
+                contagem["aprendizados"] = reindexar_aprendizados(
+                    caminho_aprendizados, executor, pendentes, recomecar, bloco)
+            if "historico" in alvos:
+                contagem["historico"] = reindexar_historico(
+                    os.path.join(diretorio, CAMINHO_DIARIO), executor, pendentes, recomecar)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return contagem
+
+
+# Retenção do histórico (ia_v_retencao)
+def _assinatura_diario(diretorio):
+    return [[numero, os.path.getsize(os.path.join(diretorio, nome_segmento(numero)))]
+            for numero in listar_segmentos(diretorio)]
+
+
+def _podar_diario(diretorio, quantidade, assinatura):
+    # Tira do diário os `quantidade` primeiros turnos, já arquivados. Os que
+    # ficam são copiados como estão, sem decodificar, para uma pasta de
+    # trabalho que toma o lugar do diário; os .idx são refeitos na leitura.
+    # Pode ser chamada de novo depois de uma interrupção: a pasta podada leva
+    # retencao.json com a assinatura (os segmentos e tamanhos de antes), e
+    # assim se sabe se a troca já aconteceu. Devolve False, sem mexer em nada,
+    # se o diário não foi podado e também não está como na assinatura.
+    trabalho = diretorio + SUFIXO_RETENCAO
+    if os.path.isdir(trabalho) and not os.path.exists(os.path.join(trabalho, ORIGEM_TRABALHO)):
+        _trocar_pasta(diretorio, trabalho)
+        return True
+    try:
+        with open(os.path.join(diretorio, PODADO_RETENCAO), "r", encoding="utf-8") as f:
+            if json.load(f)["assinatura"] == assinatura:
+                _trocar_pasta(diretorio, trabalho)
+                return True
+    except (OSError, ValueError, KeyError):
+        pass
+    if _assinatura_diario(diretorio) != assinatura:
+        shutil.rmtree(trabalho, ignore_errors=True)
+        return False
+    shutil.rmtree(trabalho, ignore_errors=True)
+    os.makedirs(trabalho)
+    gravar_atomico(os.path.join(trabalho, ORIGEM_TRABALHO), json.dumps({"arquivados": quantidade}))
+    historico = HistoricoMapeado(diretorio)
+    falta = quantidade
+    for numero in historico.segmentos:
+        offsets = historico.offsets(numero)
+        if falta >= len(offsets) - 1:
+            falta -= len(offsets) - 1
+            continue
+        with open(os.path.join(diretorio, nome_segmento(numero)), "rb") as origem, \
+                open(os.path.join(trabalho, nome_segmento(numero)), "wb") as destino:
+            origem.seek(offsets[falta])
+            shutil.copyfileobj(origem, destino)
+            destino.flush()
+            os.fsync(destino.fileno())
+        falta = 0
+    gravar_atomico(os.path.join(trabalho, PODADO_RETENCAO), json.dumps({"assinatura": assinatura}))
+    os.remove(os.path.join(trabalho, ORIGEM_TRABALHO))
+    _trocar_pasta(diretorio, trabalho)
+    return True
+
+
+def _terminar_poda(diretorio, arquivo, podado):
+    # Com o diário podado os turnos ficam só no arquivo; se ele mudou sem ser
+    # podado, alguém escreveu durante o arquivamento e o arquivo volta atrás
+    if not podado:
+        arquivo.desfazer()
+        raise RuntimeError(f"{diretorio}: o diário mudou durante o arquivamento; "
+                           "rode de novo sem um terminal ou o servidor escrevendo nele")
+    arquivo.confirmar()
+    marca = os.path.join(diretorio, PODADO_RETENCAO)
+    if os.path.exists(marca):
+        os.remove(marca)
+
+
+def arquivar_diario(diretorio, arquivo, politica, formato="lzma", agora=None):
+    diretorio = os.path.normpath(diretorio)
+    pendente = arquivo.pendente()
+    if pendente is not None:
+        # Uma execução anterior parou no meio: termina se o arquivo ficou
+        # completo, senão volta atrás e começa de novo
+        if pendente["fase"] == "gravado":
+            _terminar_poda(diretorio, arquivo, _podar_diario(diretorio, **pendente["origem"]))
+        else:
+            shutil.rmtree(diretorio + SUFIXO_RETENCAO, ignore_errors=True)
+            arquivo.desfazer()
+    if not listar_segmentos(diretorio):
+        return 0
+    historico = HistoricoMapeado(diretorio)
+    tamanhos = []
+    for numero in historico.segmentos:
+        offsets = historico.offsets(numero)
+        tamanhos.extend(offsets[i + 1] - offsets[i] for i in range(len(offsets) - 1))
+    quantidade = quantos_arquivar(tamanhos, (registro.get("data") for registro in historico), politica, agora)
+    if not quantidade:
+        return 0
+    assinatura = _assinatura_diario(diretorio)
+    arquivo.gravar(islice(historico, quantidade), formato, {"quantidade": quantidade, "assinatura": assinatura})
+    _terminar_poda(diretorio, arquivo, _podar_diario(diretorio, quantidade, assinatura))
+    return quantidade
+
+
+def _registros_banco(banco, ate, bloco=TAMANHO_BLOCO):
+    ultimo = 0
+    while True:
+        with banco.trava:
+            linhas = banco.conexao.execute(
+                "SELECT id, usuario, pergunta, resposta, data, extras FROM historico "
+                "WHERE id > ? AND id <= ? ORDER BY id LIMIT ?", (ultimo, ate, bloco)).fetchall()
+        if not linhas:
+            return
+        for _, usuario, pergunta, resposta, data, extras in linhas:
+            registro = json.loads(extras) if extras else {}
+            registro.update(usuario=usuario, pergunta=pergunta, resposta=resposta, data=data)
+            yield registro
+        ultimo = linhas[-1][0]
+
+
+def _apagar_historico(banco, ate):
+    # O gatilho historico_fts_apagar tira as linhas também do índice de busca
+    with banco.trava, banco.conexao:
+        banco.conexao.execute("DELETE FROM historico WHERE id <= ?", (ate,))
+
+
+def arquivar_banco(banco, arquivo, politica, formato="lzma", agora=None):
+    pendente = arquivo.pendente()
+    if pendente is not None:
+        # O DELETE é idempotente: com o arquivo completo, basta repeti-lo
+        if pendente["fase"] == "gravado":
+            _apagar_historico(banco, pendente["origem"]["ate"])
+            arquivo.confirmar()
+        else:
+            arquivo.desfazer()
+    with banco.trava:
+        linhas = banco.conexao.execute(
+            "SELECT id, length(CAST(pergunta AS BLOB)) + length(CAST(resposta AS BLOB)) "
+            "+ length(coalesce(extras, '')) FROM historico ORDER BY id").fetchall()
+        datas = []
+        if politica.dias is not None:
+            datas = [data for (data,) in banco.conexao.execute("SELECT data FROM historico ORDER BY id")]
+    quantidade = quantos_arquivar([tamanho for _, tamanho in linhas], datas, politica, agora)
+    if not quantidade:
+        return 0
+    ate = linhas[quantidade - 1][0]
+    arquivo.gravar(_registros_banco(banco, ate), formato, {"ate": ate})
+    _apagar_historico(banco, ate)
+    arquivo.confirmar()
+    return quantidade
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Manutenção offline da base da V.")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+    comando = comandos.add_parser("reindexar", help="normaliza, reclassifica e reindexa aprendizados e histórico")
+    comando.add_argument("--diretorio", default=".", help="pasta com aprendizados.json e o diário")
+    comando.add_argument("--banco", help="banco SQLite (padrão: o de IA_V_BANCO quando IA_V_ARMAZENAMENTO=sqlite)")
+    comando.add_argument("--processos", type=int, help="processos de trabalho (padrão: um por núcleo)")
+    comando.add_argument("--bloco", type=int, default=TAMANHO_BLOCO, help="respostas ou linhas por tarefa")
+    comando.add_argument("--so", choices=["aprendizados", "historico"], help="reindexa só uma das partes")
+    comando.add_argument("--recomecar", action="store_true", help="ignora o que uma execução anterior deixou pronto")
+    comando.add_argument("--treinar-com-base", action="store_true",
+                         help="treina o classificador também com as emoções já gravadas")
+    comando = comandos.add_parser("arquivar", help="move os turnos antigos do histórico para o arquivo comprimido; "
+                                  "não rode com um terminal ou o servidor escrevendo no diário")
+    comando.add_argument("--diretorio", default=".", help="pasta com o diário")
+    comando.add_argument("--banco", help="banco SQLite (padrão: o de IA_V_BANCO quando IA_V_ARMAZENAMENTO=sqlite)")
+    comando.add_argument("--arquivo", help=f"pasta do arquivo (padrão: {CAMINHO_ARQUIVO} dentro de --diretorio)")
+    comando.add_argument("--turnos", type=int, help="turnos que ficam no histórico")
+    comando.add_argument("--dias", type=float, help="idade máxima, em dias, de um turno no histórico")
+    comando.add_argument("--bytes", type=int, help="tamanho máximo do histórico")
+    comando.add_argument("--formato", choices=FORMATOS, default="lzma")
+    args = parser.parse_args(argumentos)
+
+    caminho_banco = args.banco
+    if caminho_banco is None and usar_sqlite():
+        caminho_banco = os.environ.get("IA_V_BANCO", CAMINHO_BANCO)
+    banco = BancoV(caminho_banco) if caminho_banco else None
+    inicio = time.perf_counter()
+    try:
+        if args.comando == "arquivar":
+            politica = Politica(args.turnos, args.dias, args.bytes)
+            if politica == Politica():
+                parser.error("arquivar precisa de --turnos, --dias ou --bytes")
+            arquivo = ArquivoHistorico(args.arquivo or os.path.join(args.diretorio, CAMINHO_ARQUIVO))
+            if banco is not None:
+                contagem = {"historico": arquivar_banco(banco, arquivo, politica, args.formato)}
+            else:
+                contagem = {"historico": arquivar_diario(
+                    os.path.join(args.diretorio, CAMINHO_DIARIO), arquivo, politica, args.formato)}
+        else:
+            alvos = (args.so,) if args.so else ("aprendizados", "historico")
+            contagem = reindexar(args.diretorio, banco, args.processos, alvos, args.recomecar,
+                                 args.treinar_com_base, args.bloco)
+    finally:
+        if banco is not None:
+            banco.fechar()
+    duracao = time.perf_counter() - inicio
+    feito = "arquivado" if args.comando == "arquivar" else "reindexado"
+    print(f"{feito} em {duracao:.2f} s: " + ", ".join(f"{nome} {total}" for nome, total in contagem.items()),
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,433 @@
+import argparse
+import atexit
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from collections import namedtuple
+from collections.abc import MutableMapping
+from itertools import chain, islice
+from zlib import crc32
+
+from ia_v_busca import LIMIAR_CONFIANCA
+from ia_v_indice import tabela_respostas
+from ia_v_metricas import contar
+from ia_v_persistencia import GRAVADOR
+from ia_v_turno import chave_de, normalizar_chave
+
+# Base de respostas aprendidas num arquivo só de leitura, aberto com mmap. Com
+# a variável de ambiente IA_V_ARMAZENAMENTO=mapeado as variantes buscam as
+# respostas em IA_V_BASE (padrão "aprendizados.base") em vez de carregar
+# aprendizados.json: abrir o arquivo custa o mesmo para qualquer tamanho de
+# base, e uma busca só lê as páginas por onde passa. Não há busca aproximada
+# nesse modo: ela precisaria decodificar todas as chaves e montar o índice de
+# trigramas na memória, e a memória deixaria de ser a mesma para qualquer
+# tamanho de base. Uma pergunta sem chave exata fica sem resposta aprendida.
+#
+# Formato (inteiros little-endian):
+#
+#   cabeçalho   CABECALHO, completado com zeros até TAMANHO_CABECALHO
+#   tabela      `capacidade` posições POSICAO (hash, tamanho da chave
+#               normalizada, offset do registro; offset 0 = posição vazia),
+#               endereçamento aberto com sondagem linear, ocupação <= 1/2
+#   heap        os registros em sequência: REGISTRO (tamanhos) seguido da
+#               chave normalizada, da pergunta original e do valor em JSON
+#
+# Cada chave normalizada aparece uma vez só: perguntas que só diferem em
+# acentos, maiúsculas ou pontuação são a mesma entrada (a última gravada).
+#
+# O que é aprendido depois vai para o delta: um dicionário na memória e um
+# arquivo .delta com uma linha JSON por alteração, relido ao abrir a base.
+# Quando o delta passa de MAXIMO_DELTA entradas ele é juntado ao arquivo
+# principal em segundo plano (GRAVADOR): o heap antigo é copiado byte a byte,
+# sem decodificar nada, para um arquivo novo que toma o lugar do antigo.
+#
+#   python ia_v_mapeado.py compilar --aprendizados aprendizados.json
+#   python ia_v_mapeado.py compactar
+#   python ia_v_mapeado.py buscar "qual a capital do brasil"
+CAMINHO_BASE = "aprendizados.base"
+CAMINHO_APRENDIZADOS = "aprendizados.json"
+SUFIXO_DELTA = ".delta"
+SUFIXO_JUNTANDO = ".juntando"
+ASSINATURA = b"IAVBASE\0"
+VERSAO_BASE = 1
+# assinatura, versão, reservado, capacidade, total de registros, fim do heap
+CABECALHO = struct.Struct("<8sIIQQQ")
+TAMANHO_CABECALHO = 64
+POSICAO = struct.Struct("<IIQ")
+REGISTRO = struct.Struct("<III")
+MAXIMO_DELTA = 4096
+
+Arquivo = namedtuple("Arquivo", ["mapa", "mascara", "total", "inicio_heap", "fim"])
+_AUSENTE = object()
+_base_configurada = None
+
+
+def usar_base_mapeada():
+    return os.environ.get("IA_V_ARMAZENAMENTO", "json").strip().lower() == "mapeado"
+
+
+def base_configurada():
+    # A base escolhida pelas variáveis de ambiente, ou None. Na primeira
+    # abertura ela é compilada a partir de aprendizados.json.
+    global _base_configurada
+    if not usar_base_mapeada():
+        return None
+    if _base_configurada is None:
+        caminho = os.environ.get("IA_V_BASE", CAMINHO_BASE)
+        if not os.path.exists(caminho) and os.path.exists(CAMINHO_APRENDIZADOS):
+            compilar_de_json(CAMINHO_APRENDIZADOS, caminho)
+        _base_configurada = BaseMapeada(caminho)
+        atexit.register(_base_configurada.fechar)
+    return _base_configurada
+
+
+def codificar(normalizada, chave, valor):
+    return (normalizada.encode("utf-8"), chave.encode("utf-8"),
+            json.dumps(valor, ensure_ascii=False).encode("utf-8"))
+
+
+def compilar(caminho, registros, maximo):
+    # Grava um arquivo novo com os registros (normalizada, chave, valor já
+    # codificados em bytes), que não podem repetir a chave normalizada. A
+    # tabela é montada na memória e gravada depois do heap, no espaço reservado.
+    capacidade = 8
+    while capacidade < 2 * maximo:
+        capacidade *= 2
+    mascara = capacidade - 1
+    tabela = bytearray(capacidade * POSICAO.size)
+    inicio_heap = TAMANHO_CABECALHO + len(tabela)
+    total = 0
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, "wb") as f:
+        f.seek(inicio_heap)
+        posicao = inicio_heap
+        for normalizada, chave, valor in registros:
+            if total >= maximo:
+                raise ValueError("mais registros do que o máximo informado")
+            codigo = crc32(normalizada)
+            indice = codigo & mascara
+            while POSICAO.unpack_from(tabela, indice * POSICAO.size)[2]:
+                indice = (indice + 1) & mascara
+            POSICAO.pack_into(tabela, indice * POSICAO.size, codigo, len(normalizada), posicao)
+            f.write(REGISTRO.pack(len(normalizada), len(chave), len(valor)))
+            f.write(normalizada)
+            f.write(chave)
+            f.write(valor)
+            posicao += REGISTRO.size + len(normalizada) + len(chave) + len(valor)
+            total += 1
+        f.seek(0)
+        f.write(CABECALHO.pack(ASSINATURA, VERSAO_BASE, 0, capacidade, total, posicao).ljust(TAMANHO_CABECALHO, b"\0"))
+        f.write(tabela)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporario, caminho)
+    return total
+
+
+def compilar_de_json(caminho_aprendizados, caminho=CAMINHO_BASE):
+    with open(caminho_aprendizados, "r", encoding="utf-8") as f:
+        aprendizados = json.load(f)
+    unicas = {}
+    for chave, valor in tabela_respostas(aprendizados).items():
+        if isinstance(chave, str):
+            unicas[normalizar_chave(chave)] = (chave, valor)
+    return compilar(caminho, (codificar(normalizada, chave, valor)
+                              for normalizada, (chave, valor) in unicas.items()), len(unicas))
+
+
+def mapear(caminho):
+    with open(caminho, "rb") as f:
+        mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    assinatura, versao, _, capacidade, total, fim = CABECALHO.unpack_from(mapa, 0)
+    if (assinatura != ASSINATURA or versao != VERSAO_BASE or capacidade & (capacidade - 1) or
+            fim > len(mapa)):
+        mapa.close()
+        raise ValueError(f"{caminho} não é uma base de aprendizados (versão {VERSAO_BASE})")
+    if hasattr(mapa, "madvise"):
+        # As buscas pulam pelo arquivo; ler adiante só traria páginas inúteis
+        mapa.madvise(mmap.MADV_RANDOM)
+    return Arquivo(mapa, capacidade - 1, total, TAMANHO_CABECALHO + capacidade * POSICAO.size, fim)
+
+
+def procurar(arquivo, normalizada):
+    # Offset do registro da chave normalizada (em bytes), ou None
+    mapa = arquivo.mapa
+    codigo = crc32(normalizada)
+    indice = codigo & arquivo.mascara
+    while True:
+        codigo_posicao, tamanho, posicao = POSICAO.unpack_from(mapa, TAMANHO_CABECALHO + indice * POSICAO.size)
+        if not posicao:
+            return None
+        if codigo_posicao == codigo and tamanho == len(normalizada):
+            inicio = posicao + REGISTRO.size
+            if mapa[inicio:inicio + tamanho] == normalizada:
+                return posicao
+        indice = (indice + 1) & arquivo.mascara
+
+
+def ler_registro(mapa, posicao):
+    tamanho_normalizada, tamanho_chave, tamanho_valor = REGISTRO.unpack_from(mapa, posicao)
+    inicio = posicao + REGISTRO.size + tamanho_normalizada
+    meio = inicio + tamanho_chave
+    return mapa[inicio:meio].decode("utf-8"), json.loads(mapa[meio:meio + tamanho_valor])
+
+
+def percorrer(arquivo):
+    # Os registros do heap em ordem, sem decodificar: (normalizada, chave, valor)
+    mapa = arquivo.mapa
+    posicao = arquivo.inicio_heap
+    while posicao < arquivo.fim:
+        tamanho_normalizada, tamanho_chave, tamanho_valor = REGISTRO.unpack_from(mapa, posicao)
+        inicio = posicao + REGISTRO.size
+        meio = inicio + tamanho_normalizada
+        fim = meio + tamanho_chave
+        posicao = fim + tamanho_valor
+        yield mapa[inicio:meio], mapa[meio:fim], mapa[fim:posicao]
+
+
+class BaseMapeada:
+    def __init__(self, caminho=CAMINHO_BASE, maximo_delta=MAXIMO_DELTA, gravador=GRAVADOR):
+        self.caminho = caminho
+        self.caminho_delta = caminho + SUFIXO_DELTA
+        self.maximo_delta = maximo_delta
+        self.gravador = gravador
+        # Protege o delta e a troca do arquivo; as buscas também passam por ela
+        self.trava = threading.RLock()
+        if not os.path.exists(caminho):
+            compilar(caminho, (), 0)
+        self.arquivo = mapear(caminho)
+        # normalizada -> (chave, valor), ou None para uma pergunta apagada
+        self.delta = {}
+        # O delta que está sendo juntado ao arquivo, enquanto a compactação roda
+        self.juntando = None
+        # Quantas entradas o delta acrescenta (ou tira, se negativo) ao arquivo
+        self.diferenca = 0
+        self.diferenca_juntando = 0
+        self.compactacao_marcada = False
+        # Uma compactação interrompida deixa o delta antigo em .juntando; ele
+        # vem antes do atual
+        for caminho_delta in (self.caminho_delta + SUFIXO_JUNTANDO, self.caminho_delta):
+            self._reaplicar(caminho_delta)
+        self.arquivo_delta = open(self.caminho_delta, "a", encoding="utf-8")
+
+    def _reaplicar(self, caminho_delta):
+        if not os.path.exists(caminho_delta):
+            return
+        with open(caminho_delta, "r", encoding="utf-8") as f:
+            for linha in f:
+                try:
+                    chave, valor = json.loads(linha)
+                except ValueError:
+                    # Uma linha cortada no fim, de uma gravação interrompida
+                    continue
+                self._aplicar(normalizar_chave(chave), chave, valor)
+
+    def _aplicar(self, normalizada, chave, valor):
+        existia = self._buscar(normalizada) is not None
+        self.delta[normalizada] = None if valor is None else (chave, valor)
+        if valor is None and existia:
+            self.diferenca -= 1
+        elif valor is not None and not existia:
+            self.diferenca += 1
+
+    def _buscar(self, normalizada):
+        achado = self.delta.get(normalizada, _AUSENTE)
+        if achado is _AUSENTE and self.juntando is not None:
+            achado = self.juntando.get(normalizada, _AUSENTE)
+        if achado is not _AUSENTE:
+            return achado
+        posicao = procurar(self.arquivo, normalizada.encode("utf-8"))
+        if posicao is None:
+            return None
+        return ler_registro(self.arquivo.mapa, posicao)
+
+    def buscar(self, normalizada):
+        # (pergunta, valor) da chave normalizada, ou None
+        with self.trava:
+            return self._buscar(normalizada)
+
+    def gravar(self, chave, valor):
+        # valor None apaga a pergunta
+        normalizada = normalizar_chave(chave)
+        with self.trava:
+            self.arquivo_delta.write(json.dumps([chave, valor], ensure_ascii=False) + "\n")
+            self.arquivo_delta.flush()
+            self._aplicar(normalizada, chave, valor)
+            if len(self.delta) >= self.maximo_delta and not self.compactacao_marcada:
+                self.compactacao_marcada = True
+                self.gravador.executar(self.compactar)
+
+    def __len__(self):
+        with self.trava:
+            return self.arquivo.total + self.diferenca_juntando + self.diferenca
+
+    def _entradas(self):
+        # (normalizada, pergunta) de todas as entradas: o arquivo e os deltas
+        # por cima dele
+        with self.trava:
+            finais = {}
+            for delta in (self.juntando, self.delta):
+                finais.update(delta or {})
+            substituidas = {normalizada.encode("utf-8") for normalizada in finais}
+            entradas = [(normalizada.decode("utf-8"), chave.decode("utf-8"))
+                        for normalizada, chave, _ in percorrer(self.arquivo) if normalizada not in substituidas]
+        entradas.extend((normalizada, achado[0]) for normalizada, achado in finais.items() if achado is not None)
+        return entradas
+
+    def chaves(self):
+        return [chave for _, chave in self._entradas()]
+
+    def amostra_rotulada(self, limite):
+        # Para ia_v_emocoes.exemplos_rotulados: as respostas aprendidas por
+        # último (o delta) e, se faltar, as primeiras do arquivo
+        with self.trava:
+            respostas = {}
+            for delta in (self.juntando, self.delta):
+                for achado in (delta or {}).values():
+                    if achado is not None:
+                        respostas[achado[0]] = achado[1]
+            for _, chave, valor in islice(percorrer(self.arquivo), max(0, limite - len(respostas))):
+                respostas.setdefault(chave.decode("utf-8"), json.loads(valor))
+        return {"respostas": respostas}
+
+    def compactar(self):
+        # Junta o delta ao arquivo principal. As buscas continuam durante a
+        # cópia; só a troca do arquivo segura a trava.
+        with self.trava:
+            self.compactacao_marcada = False
+            if self.arquivo_delta is None or self.juntando is not None or not self.delta:
+                return False
+            self.arquivo_delta.close()
+            os.replace(self.caminho_delta, self.caminho_delta + SUFIXO_JUNTANDO)
+            self.arquivo_delta = open(self.caminho_delta, "a", encoding="utf-8")
+            self.juntando, self.delta = self.delta, {}
+            self.diferenca_juntando, self.diferenca = self.diferenca, 0
+            arquivo = self.arquivo
+            juntando = self.juntando
+        inicio = time.perf_counter()
+        substituidas = {normalizada.encode("utf-8") for normalizada in juntando}
+        registros = chain(
+            (registro for registro in percorrer(arquivo) if registro[0] not in substituidas),
+            (codificar(normalizada, *achado) for normalizada, achado in juntando.items() if achado is not None))
+        novo = f"{self.caminho}.{os.getpid()}.novo"
+        compilar(novo, registros, arquivo.total + len(juntando))
+        with self.trava:
+            # No Windows um arquivo mapeado não pode ser substituído
+            self.arquivo.mapa.close()
+            os.replace(novo, self.caminho)
+            self.arquivo = mapear(self.caminho)
+            self.juntando = None
+            self.diferenca_juntando = 0
+            os.remove(self.caminho_delta + SUFIXO_JUNTANDO)
+        contar("compactacoes_base")
+        contar("tempo_compactacao_base_ms", int((time.perf_counter() - inicio) * 1000))
+        return True
+
+    def fechar(self):
+        with self.trava:
+            if self.arquivo_delta is not None:
+                self.arquivo_delta.close()
+                self.arquivo_delta = None
+                self.arquivo.mapa.close()
+
+    def indice(self):
+        return IndiceMapeado(self)
+
+
+class TabelaMapeada(MutableMapping):
+    # As respostas aprendidas vistas como um dicionário sobre a BaseMapeada.
+    # A chave é comparada já normalizada.
+    def __init__(self, base):
+        self.base = base
+
+    def __getitem__(self, chave):
+        achado = self.base.buscar(normalizar_chave(chave)) if isinstance(chave, str) else None
+        if achado is None:
+            raise KeyError(chave)
+        return achado[1]
+
+    def __setitem__(self, chave, valor):
+        self.base.gravar(chave, valor)
+
+    def __delitem__(self, chave):
+        if chave not in self:
+            raise KeyError(chave)
+        self.base.gravar(chave, None)
+
+    def __iter__(self):
+        return iter(self.base.chaves())
+
+    def __len__(self):
+        return len(self.base)
+
+
+class IndiceMapeado:
+    # Mesma interface de IndiceAprendizados; a busca exata vai direto à tabela
+    # de hash do arquivo e a aproximada não acha nada (ver o começo do módulo)
+    def __init__(self, base):
+        self.base = base
+        self.tabela = TabelaMapeada(base)
+
+    def salvar(self):
+        # Cada resposta já vai para o delta quando aprendida
+        pass
+
+    def adicionar(self, chave, valor):
+        self.tabela[chave] = valor
+
+    def buscar(self, entrada):
+        achado = self.base.buscar(chave_de(entrada))
+        return None if achado is None else achado[1]
+
+    def buscar_aproximado(self, entrada, k=3, limiar=LIMIAR_CONFIANCA):
+        return []
+
+    def buscar_resposta(self, entrada):
+        contar("buscas")
+        resposta = self.buscar(entrada)
+        if resposta is not None:
+            contar("buscas_exatas")
+            return resposta
+        contar("buscas_sem_resposta")
+        return None
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Base de respostas aprendidas mapeada em memória.")
+    parser.add_argument("--base", default=os.environ.get("IA_V_BASE", CAMINHO_BASE))
+    comandos = parser.add_subparsers(dest="comando", required=True)
+    compilar_comando = comandos.add_parser("compilar", help="cria a base a partir de aprendizados.json (descarta o delta)")
+    compilar_comando.add_argument("--aprendizados", default=CAMINHO_APRENDIZADOS)
+    comandos.add_parser("compactar", help="junta o delta ao arquivo principal")
+    buscar = comandos.add_parser("buscar", help="busca a resposta de uma pergunta")
+    buscar.add_argument("pergunta")
+    args = parser.parse_args(argumentos)
+
+    inicio = time.perf_counter()
+    if args.comando == "compilar":
+        total = compilar_de_json(args.aprendizados, args.base)
+        for sufixo in (SUFIXO_DELTA, SUFIXO_DELTA + SUFIXO_JUNTANDO):
+            if os.path.exists(args.base + sufixo):
+                os.remove(args.base + sufixo)
+        print(f"{total} respostas compiladas em {time.perf_counter() - inicio:.2f} s", file=sys.stderr)
+        return
+    base = BaseMapeada(args.base)
+    try:
+        if args.comando == "compactar":
+            base.compactar()
+            print(f"{len(base)} respostas; compactado em {time.perf_counter() - inicio:.2f} s", file=sys.stderr)
+        else:
+            achado = base.buscar(normalizar_chave(args.pergunta))
+            if achado is None:
+                sys.exit(1)
+            print(json.dumps({"pergunta": achado[0], "resposta": achado[1]}, ensure_ascii=False))
+    finally:
+        base.fechar()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,68 +1,96 @@
+import asyncio
 import json
 import os
 import random
 from datetime import datetime, timezone
-import unicodedata
+from ia_v_armazenamento import TabelaRespostas, banco_configurado
+from ia_v_compartilhado import IndiceCompartilhado
+from ia_v_assincrono import Agenda, LeitorEntrada
+from ia_v_diario import Diario, migrar_historico
+from ia_v_fatos import TOKENS_PERGUNTA, fatos_da_base, responder_fato
+from ia_v_intencoes import Roteador, ler_aprendizado
+from ia_v_emocoes import classificar
+from ia_v_mapeado import TabelaMapeada, base_configurada
+from ia_v_lexico import rotulos, ultimo
+from ia_v_indice import IndiceAprendizados, texto_resposta
+from ia_v_metricas import etapa, executar_com_perfil
+from ia_v_personas import decorar, escolher_emocao
+from ia_v_preferencias import preferencias_da_memoria
+from ia_v_turno import preparar
+from ia_v_persistencia import GRAVADOR
 
 CAMINHO_MEMORIA = "memoria.json"
 CAMINHO_APRENDIZADOS = "aprendizados.json"
 
+# Gerador de números aleatórios das respostas; o modo em lote fixa a semente
+aleatorio = random.Random()
+
+# Com IA_V_ARMAZENAMENTO=sqlite tudo fica no banco em vez dos arquivos JSON
+BANCO = banco_configurado()
+# Com IA_V_ARMAZENAMENTO=mapeado as respostas ficam em aprendizados.base
+BASE = base_configurada()
+
+# Perguntas automáticas: a cada tantas mensagens e depois de tantos segundos
+# sem o usuário escrever nada
+PERGUNTA_A_CADA = 5
+OCIOSIDADE_PERGUNTA = 60.0
+
 def carregar_json(caminho):
-    if os.path.exists(caminho):
+    if BASE is not None and caminho == CAMINHO_APRENDIZADOS:
+        return {"respostas": TabelaMapeada(BASE)}
+    if BANCO is not None:
+        if caminho == CAMINHO_APRENDIZADOS:
+            return {"respostas": TabelaRespostas(BANCO)}
+        memoria = BANCO.carregar_memoria()
+        if memoria is not None:
+            return memoria
+    elif os.path.exists(caminho):
         with open(caminho, "r", encoding="utf-8") as f:
             return json.load(f)
+    if caminho == CAMINHO_MEMORIA:
+        return {
+            "nome_usuario": "",
+            "preferencias": [],
+            "personalidade": "gentil"
+        }
     else:
-        if caminho == CAMINHO_MEMORIA:
-            return {
-                "nome_usuario": "",
-                "preferencias": [],
-                "personalidade": "gentil",
-                "historico": []
-            }
-        else:
-            return {}
+        return {}
 
+# Só marca o arquivo; a gravação acontece em segundo plano
 def salvar_json(caminho, dados):
-    with open(caminho, "w", encoding="utf-8") as f:
-        json.dump(dados, f, ensure_ascii=False, indent=4)
-
-def detectar_emocao(texto):
-    texto = texto.lower()
-    if any(p in texto for p in ["triste", "chateado", "deprimido", "infeliz", "mal"]):
-        return "triste"
-    elif any(p in texto for p in ["feliz", "alegre", "animado", "contente", "bom"]):
-        return "feliz"
-    elif any(p in texto for p in ["raiva", "irritado", "bravo", "chateado"]):
-        return "irritado"
-    else:
-        return "neutra"
+    if BANCO is not None:
+        # No banco cada resposta é gravada quando aprendida; só a memória muda aqui
+        if caminho == CAMINHO_MEMORIA:
+            BANCO.salvar_memoria(dados, gravador=GRAVADOR)
+        return
+    GRAVADOR.marcar(caminho, dados, indent=4)
+
+# Os detectores recebem o texto ou o Turno já preparado (ia_v_turno)
+def detectar_emocao(entrada):
+    return classificar(entrada)
 
 def atualizar_preferencias(entrada, memoria):
-    entrada_lower = entrada.lower()
-    prefs = memoria.get("preferencias", [])
-    if "gosto de" in entrada_lower:
-        item = entrada_lower.split("gosto de")[-1].strip()
-        if item and item not in prefs:
-            prefs.append(item)
-            memoria["preferencias"] = prefs
+    turno = preparar(entrada)
+    achado = ultimo(turno.achados, "preferencia")
+    if achado is None:
+        return None
+    item = turno.minusculo[achado.fim:].strip()
+    # Temas citados depois de "gosto de" (ex.: "assistir futebol" -> futebol)
+    temas = {outro.rotulo for outro in turno.achados if outro.categoria == "tema" and outro.inicio >= achado.fim}
+    prefs = preferencias_da_memoria(memoria)
+    if achado.rotulo == "positiva":
+        if prefs.adicionar(item, True, temas):
             return f"Que legal saber que você gosta de {item}!"
-    elif "não gosto de" in entrada_lower:
-        item = entrada_lower.split("não gosto de")[-1].strip()
-        if item and item not in prefs:
-            prefs.append(f"não {item}")
-            memoria["preferencias"] = prefs
+    elif achado.rotulo == "negativa":
+        if prefs.adicionar(item, False, temas):
             return f"Entendi, vou lembrar que você não gosta de {item}."
     return None
 
-def remover_acentos(txt):
-    return ''.join(c for c in unicodedata.normalize('NFD', txt)
-                   if unicodedata.category(c) != 'Mn').lower()
-
 def responder_data(entrada):
-    entrada_sem_acentos = remover_acentos(entrada)
+    palavras = rotulos(preparar(entrada).achados, "data")
     # Verifica se está perguntando especificamente pela data ou dia de hoje
-    if ( ("dia" in entrada_sem_acentos and "hoje" in entrada_sem_acentos) or
-         ("qual" in entrada_sem_acentos and ("data" in entrada_sem_acentos or "dia" in entrada_sem_acentos)) ):
+    if ( ("dia" in palavras and "hoje" in palavras) or
+         ("qual" in palavras and ("data" in palavras or "dia" in palavras)) ):
         dias_semana = [
             "segunda-feira", "terça-feira", "quarta-feira",
             "quinta-feira", "sexta-feira", "sábado", "domingo"
@@ -73,56 +101,68 @@ def responder_data(entrada):
     return None
 
 
-def gerar_resposta(entrada, aprendizados, memoria):
-    entrada_lower = entrada.lower()
-    personalidade = memoria.get("personalidade", "gentil")
-    emocao_usuario = detectar_emocao(entrada)
+# As intenções de um turno, em ordem de prioridade (ia_v_intencoes). Cada uma
+# recebe o Turno e o contexto montado por gerar_resposta; None passa a vez.
+ROTEADOR = Roteador()
+RESPOSTAS_PADRAO = [
+    "Desculpa, ainda não sei responder isso.",
+    "Pode me ensinar a responder essa pergunta?",
+    "Interessante, me fale mais!",
+    "Não entendi muito bem, pode explicar?"
+]
 
-    resposta_pref = atualizar_preferencias(entrada, memoria)
-    if resposta_pref:
-        return resposta_pref
+@ROTEADOR.intencao("aprender", prioridade=0, tokens=["aprenda"], padrao=r"^aprenda\s*:")
+def intencao_aprender(turno, contexto):
+    resposta, contexto["aprendeu"] = aprender(turno, contexto["indice"])
+    return resposta
 
-    # Primeiro responder data
-    resposta_data = responder_data(entrada)
-    if resposta_data:
-        return resposta_data
+@ROTEADOR.intencao("preferencias", prioridade=10, achados=["preferencia"])
+def intencao_preferencias(turno, contexto):
+    return atualizar_preferencias(turno, contexto["memoria"])
 
-    respostas = aprendizados.get("respostas", {})
-    resposta_raw = respostas.get(entrada_lower)
+# "qual é/o que é X" com um fato sobre X. Uma resposta ensinada para essa
+# mesma pergunta vem antes do fato (quem responde é a busca); o fato vem antes
+# das respostas aproximadas
+@ROTEADOR.intencao("fatos", prioridade=20, tokens=TOKENS_PERGUNTA)
+def intencao_fatos(turno, contexto):
+    if contexto["indice"].buscar(turno) is not None:
+        return None
+    return responder_fato(turno, fatos_da_base(contexto["aprendizados"], BANCO))
 
-    if resposta_raw:
-        if isinstance(resposta_raw, dict):
-            texto = resposta_raw.get("texto", "")
-            emocao_resposta = resposta_raw.get("emocao", "neutra")
-        else:
-            texto = resposta_raw
-            emocao_resposta = "neutra"
-    else:
-        respostas_padrao = [
-            "Desculpa, ainda não sei responder isso.",
-            "Pode me ensinar a responder essa pergunta?",
-            "Interessante, me fale mais!",
-            "Não entendi muito bem, pode explicar?"
-        ]
-        texto = random.choice(respostas_padrao)
-        emocao_resposta = "neutra"
+@ROTEADOR.intencao("data", prioridade=30, achados=["data"])
+def intencao_data(turno, contexto):
+    return responder_data(turno)
+
+def _decorar(texto, emocao_resposta, contexto):
+    # Modula a resposta com base na emoção do usuário e da resposta aprendida;
+    # as decorações vêm de personas.json
+    with etapa("resposta.decoracao"):
+        emocao = escolher_emocao(emocao_resposta, contexto["emocao"])
+        return decorar(texto, contexto["personalidade"], emocao=emocao)
 
-    # Modula resposta com base na emoção do usuário e da resposta aprendida
-    if emocao_resposta == "triste" or emocao_usuario == "triste":
-        texto = "Poxa, sinto muito que você esteja assim. " + texto
-    elif emocao_resposta == "feliz" or emocao_usuario == "feliz":
-        texto = "Que bom ouvir isso! " + texto
-    elif emocao_resposta == "irritado" or emocao_usuario == "irritado":
-        texto = "Calma, vamos tentar resolver isso juntos. " + texto
+@ROTEADOR.intencao("busca", prioridade=40)
+def intencao_busca(turno, contexto):
+    resposta_raw = contexto["indice"].buscar_resposta(turno)
+    if not resposta_raw:
+        return None
+    return _decorar(*texto_resposta(resposta_raw), contexto)
 
-    if personalidade == "gentil":
-        texto = texto + " Estou aqui para ajudar!"
-    elif personalidade == "animada":
-        texto = "😄 " + texto + " Que legal!"
-    elif personalidade == "curiosa":
-        texto = "Hmm, que curioso... " + texto
+@ROTEADOR.intencao("padrao", prioridade=100)
+def intencao_padrao(turno, contexto):
+    return _decorar(aleatorio.choice(RESPOSTAS_PADRAO), "neutra", contexto)
 
-    return texto
+def gerar_resposta(entrada, aprendizados, memoria, indice=None, contexto=None):
+    # Em contexto (se passado) ficam a intenção que respondeu e se algo foi aprendido
+    with etapa("resposta.analise"):
+        turno = preparar(entrada)
+        emocao_usuario = detectar_emocao(turno)
+    if indice is None:
+        indice = IndiceAprendizados(aprendizados.setdefault("respostas", {}))
+    if contexto is None:
+        contexto = {}
+    contexto.update(aprendizados=aprendizados, memoria=memoria, indice=indice, emocao=emocao_usuario,
+                    personalidade=memoria.get("personalidade", "gentil"), aprendeu=False)
+    return ROTEADOR.despachar(turno, contexto)
 
 
 # Dicionário de perguntas por tema preferido
@@ -142,90 +182,164 @@ perguntas_por_tema = {
         "Você gosta de acompanhar notícias de tecnologia?",
         "Tem alguma tecnologia que você acha que vai revolucionar o futuro?"
     ],
-    # Adicione mais temas conforme quiser
+    # Adicione mais temas conforme quiser (e as palavras de cada um em
+    # lexico.json, na categoria "tema")
 }
 
-def iniciar_conversa():
-    memoria = carregar_json(CAMINHO_MEMORIA)
-    aprendizados = carregar_json(CAMINHO_APRENDIZADOS)
+def aprender(entrada, indice):
+    # Trata "aprenda: pergunta | resposta" (ou "pergunta = resposta"). Devolve
+    # a resposta da V (None se a entrada não é esse comando) e se algo novo
+    # foi aprendido
+    turno = preparar(entrada)
+    if not turno.minusculo.startswith("aprenda:"):
+        return None, False
+    aprendizado = turno.texto[len("aprenda:"):].strip()
+    if not aprendizado:
+        return "O que você quer que eu aprenda? Use: aprenda: pergunta | resposta", False
+    par = ler_aprendizado(aprendizado)
+    if par is None:
+        return "Para ensinar, use o formato: aprenda: pergunta | resposta", False
+    chave, valor = par
+    indice.adicionar(chave.lower(), {
+        "texto": valor,
+        "emocao": detectar_emocao(turno)
+    })
+    return "Aprendi isso, obrigado!", True
 
-    if not memoria.get("nome_usuario"):
-        memoria["nome_usuario"] = input("Qual o seu nome? ").strip()
-        salvar_json(CAMINHO_MEMORIA, memoria)
+def criar_motor(aprendizados, memoria, indice):
+    # Processa um turno sem terminal e sem perguntas de feedback. A intenção
+    # que respondeu o último turno fica em responder.intencao
+    def responder(entrada):
+        contexto = {}
+        resposta = gerar_resposta(entrada, aprendizados, memoria, indice, contexto)
+        responder.intencao = contexto["intencao"]
+        return resposta, contexto["aprendeu"]
+    responder.intencao = None
+    return responder
 
-    nome = memoria["nome_usuario"]
-    print(f"V: Olá {nome}! Como posso ajudar você hoje?")
+def carregar_base():
+    # Aprendizados e índice. A conversa só chama isto na primeira mensagem, então
+    # a saudação não espera pelo tamanho da base
+    aprendizados = carregar_json(CAMINHO_APRENDIZADOS)
+    if BANCO is not None:
+        return aprendizados, BANCO.indice()
+    if BASE is not None:
+        return aprendizados, BASE.indice()
+    tabela = aprendizados.setdefault("respostas", {})
+    return aprendizados, IndiceCompartilhado(tabela, CAMINHO_APRENDIZADOS, GRAVADOR, aprendizados)
+
+def pergunta_automatica(memoria):
+    # Uma pergunta sobre um dos temas que o usuário gosta, ou None
+    temas = [tema for tema in preferencias_da_memoria(memoria).temas_gostados()
+             if tema in perguntas_por_tema]
+    if not temas:
+        return None
+    tema = aleatorio.choice(temas)
+    return tema, aleatorio.choice(perguntas_por_tema[tema])
 
-    respostas_padrao = [
-        "Desculpa, ainda não sei responder isso.",
-        "Pode me ensinar a responder essa pergunta?",
-        "Interessante, me fale mais!",
-        "Não entendi muito bem, pode explicar?"
-    ]
+async def conversar(leitor=None):
+    # A conversa roda num laço de eventos: a leitura do terminal não bloqueia,
+    # então as perguntas automáticas podem aparecer enquanto a V espera o
+    # usuário, e a base é carregada numa thread enquanto ele digita
+    loop = asyncio.get_running_loop()
+    if leitor is None:
+        leitor = LeitorEntrada()
+    agenda = Agenda()
+    memoria = carregar_json(CAMINHO_MEMORIA)
+    aprendizados = indice = None
+    if BANCO is not None:
+        diario = BANCO.diario()
+    else:
+        if migrar_historico(memoria):
+            salvar_json(CAMINHO_MEMORIA, memoria)
+        diario = Diario()
+    base = loop.run_in_executor(None, carregar_base)
 
     contador_mensagens = 0  # Contador para interações
 
-    while True:
-        # Pergunta automática a cada 5 mensagens
-        if contador_mensagens > 0 and contador_mensagens % 5 == 0:
-            prefs = memoria.get("preferencias", [])
-            if prefs:
-                tema = random.choice(prefs)
-                perguntas = perguntas_por_tema.get(tema.lower())
-                if perguntas:
-                    pergunta_auto = random.choice(perguntas)
-                    print(f"V (pergunta automática sobre {tema}): {pergunta_auto}")
-
-        entrada = input("Você: ").strip()
-        if entrada.lower() in ["tchau", "sair", "adeus", "exit"]:
-            print(f"V: Até mais, {nome}! Foi bom conversar com você.")
-            break
-
-        if entrada.lower().startswith("aprenda:"):
-            aprendizado = entrada[len("aprenda:"):].strip()
-            emocao_aprendida = detectar_emocao(entrada)
-            if aprendizado:
-                if "|" in aprendizado:
-                    chave, valor = aprendizado.split("|", 1)
-                    chave = chave.strip()
-                    valor = valor.strip()
-                    aprendizados.setdefault("respostas", {})[chave.lower()] = {
-                        "texto": valor,
-                        "emocao": emocao_aprendida
-                    }
-                    salvar_json(CAMINHO_APRENDIZADOS, aprendizados)
-                    print("V: Aprendi isso, obrigado!")
-                else:
-                    print("V: Para ensinar, use o formato: aprenda: pergunta | resposta")
-            else:
-                print("V: O que você quer que eu aprenda? Use: aprenda: pergunta | resposta")
-            continue
-
-        resposta = gerar_resposta(entrada, aprendizados, memoria)
-        print("V:", resposta)
-
-        if not entrada.lower().startswith("aprenda:") and any(
-            resposta.startswith(padrao) for padrao in respostas_padrao
-        ):
-            feedback = input("Essa resposta está boa? (s/n): ").strip().lower()
-            if feedback == "n":
-                nova_resposta = input("Como você gostaria que eu respondesse? ").strip()
-                emocao_feedback = detectar_emocao(nova_resposta)
-                aprendizados.setdefault("respostas", {})[entrada.lower()] = {
-                    "texto": nova_resposta,
-                    "emocao": emocao_feedback
-                }
-                salvar_json(CAMINHO_APRENDIZADOS, aprendizados)
-                print("V: Obrigada! Vou lembrar disso.")
-
-        memoria.setdefault("historico", []).append({
-            "pergunta": entrada,
-            "resposta": resposta,
-            "data": datetime.now(timezone.utc).isoformat()
-        })
-        salvar_json(CAMINHO_MEMORIA, memoria)
-
-        contador_mensagens += 1
+    def perguntar(ociosa=False):
+        achada = pergunta_automatica(memoria)
+        if achada is None:
+            return
+        tema, pergunta_auto = achada
+        if ociosa:
+            # A V está esperando no "Você: "; pergunta numa linha nova e
+            # mostra o prompt de novo
+            print()
+        print(f"V (pergunta automática sobre {tema}): {pergunta_auto}")
+        if ociosa:
+            print("Você: ", end="", flush=True)
+
+    try:
+        if not memoria.get("nome_usuario"):
+            nome = await leitor.ler("Qual o seu nome? ")
+            if nome is None:
+                return
+            memoria["nome_usuario"] = nome.strip()
+            salvar_json(CAMINHO_MEMORIA, memoria)
+
+        nome = memoria["nome_usuario"]
+        print(f"V: Olá {nome}! Como posso ajudar você hoje?")
+
+        while True:
+            # Pergunta automática depois de um tempo sem mensagens
+            ociosidade = agenda.agendar(OCIOSIDADE_PERGUNTA, perguntar, True)
+            entrada = await leitor.ler("Você: ")
+            ociosidade.cancelar()
+            if entrada is None:
+                print()
+                entrada = "sair"
+            entrada = entrada.strip()
+            turno = preparar(entrada)
+            if turno.minusculo in ["tchau", "sair", "adeus", "exit"]:
+                print(f"V: Até mais, {nome}! Foi bom conversar com você.")
+                break
+
+            if indice is None:
+                with etapa("conversa.carregar_base"):
+                    aprendizados, indice = await base
+
+            with etapa("conversa.resposta"):
+                contexto = {}
+                resposta = gerar_resposta(turno, aprendizados, memoria, indice, contexto)
+            print("V:", resposta)
+            if contexto["intencao"] == "aprender":
+                if contexto["aprendeu"]:
+                    indice.salvar()
+                continue
+
+            # Só pede feedback quando a V não sabia responder
+            if contexto["intencao"] == "padrao":
+                feedback = (await leitor.ler("Essa resposta está boa? (s/n): ") or "").strip().lower()
+                if feedback == "n":
+                    nova_resposta = (await leitor.ler("Como você gostaria que eu respondesse? ") or "").strip()
+                    emocao_feedback = detectar_emocao(nova_resposta)
+                    indice.adicionar(turno.minusculo, {
+                        "texto": nova_resposta,
+                        "emocao": emocao_feedback
+                    })
+                    indice.salvar()
+                    print("V: Obrigada! Vou lembrar disso.")
+
+            with etapa("conversa.salvar"):
+                GRAVADOR.executar(diario.anexar, {
+                    "pergunta": entrada,
+                    "resposta": resposta,
+                    "data": datetime.now(timezone.utc).isoformat()
+                })
+                salvar_json(CAMINHO_MEMORIA, memoria)
+
+            contador_mensagens += 1
+            # Pergunta automática a cada PERGUNTA_A_CADA mensagens
+            if contador_mensagens % PERGUNTA_A_CADA == 0:
+                perguntar()
+    finally:
+        agenda.fechar()
+        leitor.fechar()
+        GRAVADOR.executar(diario.fechar)
+
+def iniciar_conversa():
+    asyncio.run(conversar())
 
 if __name__ == "__main__":
-    iniciar_conversa()
+    executar_com_perfil(iniciar_conversa)
@@ -0,0 +1,124 @@
+import json
+import os
+from string import Formatter
+
+# Decoração das respostas por persona, modo e emoção. Tudo vem de
+# personas.json: cada persona, modo e emoção tem um prefixo e um sufixo, e os
+# modos têm também suas listas de respostas. Na carga cada combinação
+# (persona, modo, emoção) vira um modelo já montado, como
+#
+#   "😄 Poxa, sinto muito que você esteja assim. {} Que legal!"
+#
+# e decorar uma resposta é um acesso ao dicionário e um format(). Mais personas
+# só aumentam a tabela, não o caminho de um turno.
+CAMINHO_PERSONAS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "personas.json")
+# Campos que as respostas dos modos podem usar
+CAMPOS_RESPOSTA = {"nome", "entrada"}
+
+
+def _escapar(texto):
+    return texto.replace("{", "{{").replace("}", "}}")
+
+
+def _partes(secao):
+    # {nome: {"prefixo": ..., "sufixo": ...}} -> {nome: (prefixo, sufixo)},
+    # já escapados para entrar num modelo de format(). None é "nenhum".
+    partes = {None: ("", "")}
+    for nome, dados in secao.items():
+        partes[nome] = (_escapar(dados.get("prefixo", "")), _escapar(dados.get("sufixo", "")))
+    return partes
+
+
+def _validar(modelo, modo):
+    for _, campo, _, _ in Formatter().parse(modelo):
+        if campo is not None and campo not in CAMPOS_RESPOSTA:
+            raise ValueError(f"resposta do modo {modo!r} usa o campo desconhecido {{{campo}}}: {modelo!r}")
+
+
+class Personas:
+    def __init__(self, config):
+        personas = _partes(config.get("personas", {}))
+        modos = _partes(config.get("modos", {}))
+        emocoes = _partes(config.get("emocoes", {}))
+        self.modo_padrao = config.get("modo_padrao")
+
+        self.modelos = {}
+        for persona, (prefixo_persona, sufixo_persona) in personas.items():
+            for modo, (prefixo_modo, sufixo_modo) in modos.items():
+                for emocao, (prefixo_emocao, sufixo_emocao) in emocoes.items():
+                    self.modelos[(persona, modo, emocao)] = (
+                        prefixo_persona + prefixo_modo + prefixo_emocao + "{}" +
+                        sufixo_emocao + sufixo_modo + sufixo_persona
+                    )
+
+        # Respostas de cada modo, já com o prefixo e o sufixo do modo
+        self.respostas = {}
+        for modo, dados in config.get("modos", {}).items():
+            prefixo_modo, sufixo_modo = modos[modo]
+            modelos = []
+            for resposta in dados.get("respostas", []):
+                _validar(resposta, modo)
+                modelos.append(prefixo_modo + resposta + sufixo_modo)
+            if modelos:
+                self.respostas[modo] = modelos
+
+        # Quando duas emoções competem (a do usuário e a da resposta aprendida)
+        # vence a que vem primeiro no arquivo
+        self.prioridade_emocoes = {emocao: posicao for posicao, emocao in enumerate(config.get("emocoes", {}))}
+        self.ordem_modos = list(config.get("modos", {}))
+        self.personas = set(personas)
+        self.modos = set(modos)
+        self.emocoes = set(emocoes)
+
+    def modelo(self, persona=None, modo=None, emocao=None):
+        modelo = self.modelos.get((persona, modo, emocao))
+        if modelo is None:
+            # Persona, modo ou emoção que não estão no arquivo não decoram nada
+            modelo = self.modelos[(
+                persona if persona in self.personas else None,
+                modo if modo in self.modos else None,
+                emocao if emocao in self.emocoes else None
+            )]
+        return modelo
+
+    def decorar(self, texto, persona=None, modo=None, emocao=None):
+        return self.modelo(persona, modo, emocao).format(texto)
+
+    def escolher_emocao(self, *emocoes):
+        prioridade = self.prioridade_emocoes
+        conhecidas = [emocao for emocao in emocoes if emocao in prioridade]
+        return min(conhecidas, key=prioridade.__getitem__) if conhecidas else None
+
+    def escolher_modo(self, modos):
+        for modo in self.ordem_modos:
+            if modo in modos:
+                return modo
+        return None
+
+    def responder(self, modo, aleatorio, **campos):
+        modelos = self.respostas.get(modo) or self.respostas[self.modo_padrao]
+        return aleatorio.choice(modelos).format(**campos)
+
+
+def carregar_personas(caminho=CAMINHO_PERSONAS):
+    with open(caminho, "r", encoding="utf-8") as f:
+        return Personas(json.load(f))
+
+
+PERSONAS = carregar_personas()
+
+
+def decorar(texto, persona=None, modo=None, emocao=None):
+    return PERSONAS.decorar(texto, persona, modo, emocao)
+
+
+def escolher_emocao(*emocoes):
+    return PERSONAS.escolher_emocao(*emocoes)
+
+
+def escolher_modo(modos):
+    return PERSONAS.escolher_modo(modos)
+
+
+def resposta_do_modo(modo, aleatorio, **campos):
+    return PERSONAS.responder(modo, aleatorio, **campos)
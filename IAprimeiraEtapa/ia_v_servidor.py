@@ -0,0 +1,316 @@
+import argparse
+import asyncio
+import json
+import os
+import signal
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from ia_v_armazenamento import copiar_para_memoria
+from ia_v_compartilhado import IndiceCompartilhado
+from ia_v_diario import Diario, migrar_historico
+from ia_v_indice import IndiceAprendizados, tabela_respostas
+from ia_v_metricas import adicionar_argumentos, perfil
+from ia_v_persistencia import GRAVADOR
+from ia_v_sessao import CAMINHO_SESSOES, GerenciadorSessoes, Sessao, gravar_sessoes, ler_sessao
+
+# Servidor da V para várias pessoas ao mesmo tempo. O protocolo é um objeto
+# JSON por linha, nos dois sentidos:
+#
+#   -> {"usuario": "ana", "texto": "oi"}
+#   <- {"resposta": "...", "aprendeu": false}
+#   -> {"tipo": "estado"}
+#   <- {"memoria": {...}, "modo": "sério"}
+#
+# Cada usuário tem sua própria sessão (perfil, modo e últimas trocas); os
+# aprendizados são compartilhados. Sessões ociosas são despejadas para o disco
+# e voltam quando o usuário reaparece. Os turnos rodam no loop do asyncio e
+# não tocam o disco: o diário e as sessões vão para uma única thread de disco,
+# o que também mantém a ordem entre eles, e o registro de mudanças dos
+# aprendizados é anexado e conferido pelo GRAVADOR. O que ele traz de outros
+# processos entra nos dicionários sob a trava de memória do índice.
+#
+#   python ia_v_servidor.py --porta 8765
+#   python ia_v_servidor.py --unix /tmp/ia_v.sock
+#   python ia_v_servidor.py --carga 1000
+INTERVALO_DESPEJO = 30.0
+
+
+class Conversa:
+    def __init__(self, sessao, responder):
+        self.sessao = sessao
+        self.responder = responder
+
+
+class ServidorV:
+    def __init__(self, variante="emocional", salvar=True, maximo_sessoes=None):
+        self.salvar = salvar
+        if variante == "emocional":
+            import ia_v_emocional as modulo
+            self.aprendizados = modulo.carregar_aprendizados()
+            tabela = tabela_respostas(self.aprendizados)
+        else:
+            import ia_v_personalidade_v as modulo
+            if hasattr(modulo, "carregar_json"):
+                self.aprendizados = modulo.carregar_json(modulo.CAMINHO_APRENDIZADOS)
+                tabela = self.aprendizados.setdefault("respostas", {})
+            else:
+                self.aprendizados = modulo.carregar_aprendizados()
+                tabela = tabela_respostas(self.aprendizados)
+        self.modulo = modulo
+        banco = modulo.BANCO
+        base = modulo.BASE
+        if (banco is not None or base is not None) and not salvar:
+            self.aprendizados = copiar_para_memoria(self.aprendizados)
+            tabela = tabela_respostas(self.aprendizados)
+            banco = base = None
+        if banco is not None:
+            self.indice = banco.indice()
+        elif base is not None:
+            self.indice = base.indice()
+        elif salvar:
+            # Registro de mudanças só na thread do GRAVADOR; os turnos mexem só na memória
+            self.indice = IndiceCompartilhado(tabela, modulo.CAMINHO_APRENDIZADOS, GRAVADOR, self.aprendizados,
+                                              adiado=True)
+        else:
+            self.indice = IndiceAprendizados(tabela)
+        self.gravador = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ia_v_gravacao")
+        self.diario = None
+        if salvar:
+            if banco is not None:
+                self.diario = banco.diario()
+            else:
+                # O histórico antigo de memoria.json entra no diário antes do
+                # primeiro turno, como no lote
+                self.migrar_memoria()
+                self.diario = Diario()
+        self.tempos_turno = []
+        self.sessoes = GerenciadorSessoes(CAMINHO_SESSOES if salvar else None)
+        if maximo_sessoes is not None:
+            self.sessoes.maximo_sessoes = maximo_sessoes
+
+    def migrar_memoria(self):
+        modulo = self.modulo
+        if hasattr(modulo, "salvar_json"):
+            memoria = modulo.carregar_json(modulo.CAMINHO_MEMORIA)
+            if migrar_historico(memoria):
+                modulo.salvar_json(modulo.CAMINHO_MEMORIA, memoria)
+        else:
+            memoria = modulo.carregar_memoria()
+            if migrar_historico(memoria):
+                modulo.salvar_memoria(memoria)
+
+    async def abrir_conversa(self, usuario):
+        if not usuario:
+            # Conexões anônimas têm uma sessão só delas, que não vai para o disco
+            sessao = Sessao("")
+        else:
+            lida = None
+            if self.sessoes.precisa_ler(usuario):
+                lida = await asyncio.get_running_loop().run_in_executor(
+                    self.gravador, ler_sessao, self.sessoes.diretorio, usuario)
+            sessao = self.sessoes.obter(usuario, lida)
+            if not sessao.get("nome_usuario"):
+                sessao["nome_usuario"] = usuario
+            # Passar do limite de bytes também despeja, sem esperar o periódico
+            if self.sessoes.excede_limite():
+                self.despejar_sessoes()
+        if hasattr(self.modulo, "novo_estado"):
+            responder = self.modulo.criar_motor(self.aprendizados, sessao, self.indice, sessao)
+        else:
+            responder = self.modulo.criar_motor(self.aprendizados, sessao, self.indice)
+        return Conversa(sessao, responder)
+
+    def fechar_conversa(self, conversa):
+        if conversa is not None and conversa.sessao.usuario:
+            self.sessoes.liberar(conversa.sessao)
+            # A sessão é medida de novo ao ser liberada e pode ter crescido
+            if self.sessoes.excede_limite():
+                self.despejar_sessoes()
+
+    def despejar_sessoes(self):
+        despejadas = self.sessoes.despejar()
+        if despejadas and self.sessoes.diretorio:
+            futuro = asyncio.get_running_loop().run_in_executor(
+                self.gravador, gravar_sessoes, self.sessoes.diretorio, despejadas)
+            futuro.add_done_callback(lambda _: self.sessoes.confirmar(despejadas))
+
+    def processar(self, conversa, pedido):
+        if pedido.get("tipo") == "estado":
+            estado = getattr(conversa.responder, "estado", {})
+            return {"memoria": conversa.sessao.para_dict(), "modo": estado.get("modo")}
+        texto = pedido.get("texto")
+        if not isinstance(texto, str):
+            return {"erro": "pedido sem 'texto'"}
+
+        inicio = time.perf_counter()
+        resposta, aprendeu = conversa.responder(texto.strip())
+        self.tempos_turno.append(time.perf_counter() - inicio)
+
+        if self.salvar:
+            loop = asyncio.get_running_loop()
+            loop.run_in_executor(self.gravador, self.diario.anexar, {
+                "usuario": conversa.sessao.usuario,
+                "pergunta": texto,
+                "resposta": resposta,
+                "data": datetime.now().isoformat()
+            })
+            if aprendeu:
+                # A resposta já está no registro de mudanças (ou no banco);
+                # salvar() só compacta quando o registro cresce demais
+                self.indice.salvar()
+        return {"resposta": resposta, "aprendeu": aprendeu,
+                "intencao": getattr(conversa.responder, "intencao", None)}
+
+    async def atender(self, leitor, escritor):
+        conversa = None
+        try:
+            while True:
+                linha = await leitor.readline()
+                if not linha:
+                    break
+                try:
+                    pedido = json.loads(linha)
+                    if not isinstance(pedido, dict):
+                        raise ValueError
+                except ValueError:
+                    resposta = {"erro": "cada linha deve ser um objeto JSON"}
+                else:
+                    usuario = pedido.get("usuario")
+                    if conversa is None or (usuario and usuario != conversa.sessao.usuario):
+                        self.fechar_conversa(conversa)
+                        conversa = await self.abrir_conversa(usuario)
+                    resposta = self.processar(conversa, pedido)
+                escritor.write(json.dumps(resposta, ensure_ascii=False).encode("utf-8") + b"\n")
+                await escritor.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.fechar_conversa(conversa)
+            escritor.close()
+
+    async def fechar(self):
+        loop = asyncio.get_running_loop()
+        if self.salvar:
+            await loop.run_in_executor(self.gravador, self.diario.fechar)
+            await loop.run_in_executor(self.gravador, gravar_sessoes,
+                                       self.sessoes.diretorio, self.sessoes.tudo_para_gravar())
+            await loop.run_in_executor(self.gravador, GRAVADOR.descarregar)
+        self.gravador.shutdown(wait=True)
+
+
+async def servir(servidor, host=None, porta=None, caminho_unix=None):
+    servidores = []
+    if caminho_unix:
+        if os.path.exists(caminho_unix):
+            os.remove(caminho_unix)
+        servidores.append(await asyncio.start_unix_server(servidor.atender, path=caminho_unix))
+        print(f"V ouvindo em {caminho_unix}", file=sys.stderr)
+    if porta is not None:
+        servidores.append(await asyncio.start_server(servidor.atender, host, porta))
+        print(f"V ouvindo em {host}:{porta}", file=sys.stderr)
+
+    parar = asyncio.Event()
+    loop = asyncio.get_running_loop()
+
+    def despejo_periodico():
+        servidor.despejar_sessoes()
+        loop.call_later(INTERVALO_DESPEJO, despejo_periodico)
+    loop.call_later(INTERVALO_DESPEJO, despejo_periodico)
+    for sinal in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sinal, parar.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+    try:
+        await parar.wait()
+    finally:
+        for s in servidores:
+            s.close()
+            await s.wait_closed()
+        await servidor.fechar()
+
+
+async def simular_carga(servidor, clientes, mensagens):
+    # Abre muitas conexões ao mesmo tempo; metade pede o modo criativo e
+    # cada uma conta um gosto diferente, e no fim confere se nenhuma conversa
+    # recebeu o modo ou o gosto de outra. Cada variante guarda só parte disso:
+    # o que ela não guarda tem de continuar vazio.
+    rede = await asyncio.start_server(servidor.atender, "127.0.0.1", 0)
+    porta = rede.sockets[0].getsockname()[1]
+    tem_modo = hasattr(servidor.modulo, "novo_estado")
+    tem_preferencias = hasattr(servidor.modulo, "atualizar_preferencias")
+
+    async def cliente(numero):
+        leitor, escritor = await asyncio.open_connection("127.0.0.1", porta)
+
+        async def enviar(pedido):
+            escritor.write(json.dumps(pedido).encode("utf-8") + b"\n")
+            await escritor.drain()
+            return json.loads(await leitor.readline())
+
+        modo = "criativo" if numero % 2 else "sério"
+        await enviar({"usuario": f"cliente{numero}", "texto": f"modo {modo}"})
+        await enviar({"texto": f"eu gosto de tema{numero}"})
+        for _ in range(mensagens):
+            await enviar({"texto": "me conta uma coisa"})
+        estado = await enviar({"tipo": "estado"})
+        escritor.close()
+        erros = []
+        if estado["memoria"].get("nome_usuario") != f"cliente{numero}":
+            erros.append("nome")
+        if estado["modo"] != (modo if tem_modo else None):
+            erros.append("modo")
+        if estado["memoria"].get("preferencias") != ([f"tema{numero}"] if tem_preferencias else []):
+            erros.append("preferencias")
+        return erros
+
+    inicio = time.perf_counter()
+    resultados = await asyncio.gather(*(cliente(i) for i in range(clientes)))
+    duracao = time.perf_counter() - inicio
+    rede.close()
+    await rede.wait_closed()
+    await servidor.fechar()
+
+    tempos = sorted(servidor.tempos_turno)
+    misturados = sum(1 for erros in resultados if erros)
+    p50 = statistics.median(tempos) * 1000
+    p99 = tempos[int(len(tempos) * 0.99) - 1] * 1000
+    print(f"{clientes} clientes, {len(tempos)} turnos em {duracao:.2f} s")
+    print(f"processamento por turno (sem E/S): p50 {p50:.3f} ms, p99 {p99:.3f} ms, "
+          f"máximo {tempos[-1] * 1000:.3f} ms")
+    print(f"conversas com estado misturado: {misturados}")
+    return misturados == 0 and p99 < 1.0
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Servidor da V com um objeto JSON por linha.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int)
+    parser.add_argument("--unix", help="caminho de um socket Unix")
+    parser.add_argument("--variante", choices=["emocional", "personalidade"], default="emocional")
+    parser.add_argument("--sem-salvar", action="store_true", help="não grava nada em disco")
+    parser.add_argument("--maximo-sessoes", type=int, help="sessões mantidas em memória")
+    parser.add_argument("--carga", type=int, metavar="CLIENTES",
+                        help="simula CLIENTES conexões simultâneas e mede o tempo por turno")
+    parser.add_argument("--mensagens", type=int, default=5, help="mensagens por cliente na simulação")
+    adicionar_argumentos(parser)
+    args = parser.parse_args(argumentos)
+
+    if args.carga:
+        servidor = ServidorV(args.variante, salvar=False, maximo_sessoes=args.maximo_sessoes)
+        with perfil(args):
+            ok = asyncio.run(simular_carga(servidor, args.carga, args.mensagens))
+        sys.exit(0 if ok else 1)
+    if args.porta is None and not args.unix:
+        parser.error("informe --porta e/ou --unix")
+    servidor = ServidorV(args.variante, salvar=not args.sem_salvar, maximo_sessoes=args.maximo_sessoes)
+    with perfil(args):
+        asyncio.run(servir(servidor, args.host, args.porta, args.unix))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+
+from ia_v_contexto import ContextoRolante
+
+# Sessões de usuário compactas. Uma Sessao guarda só o perfil, a emoção e o
+# modo atuais, as últimas trocas e as preferências, em __slots__, e se comporta
+# como o dicionário "memoria" que as funções de resposta já recebem. O
+# GerenciadorSessoes mantém as sessões mais usadas em memória dentro de um
+# limite de quantidade e de bytes; as ociosas vão para o disco e voltam quando
+# alguém pede por elas.
+CAMINHO_SESSOES = "sessoes"
+MAXIMO_SESSOES = 10000
+MAXIMO_BYTES = 64 * 1024 * 1024
+TEMPO_OCIOSO = 15 * 60
+TAMANHO_RECENTES = 5
+NAO_LIDA = object()
+
+
+class Sessao:
+    CAMPOS = ("nome_usuario", "personalidade", "preferencias", "humor", "modo", "historico")
+    __slots__ = CAMPOS + ("usuario", "extras", "ultimo_uso", "em_uso", "tamanho")
+
+    def __init__(self, usuario, dados=None):
+        dados = dados or {}
+        self.usuario = usuario
+        self.nome_usuario = dados.get("nome_usuario", "")
+        self.personalidade = dados.get("personalidade", "gentil")
+        self.preferencias = list(dados.get("preferencias", []))
+        self.humor = dados.get("humor", "neutra")
+        self.modo = dados.get("modo", "sério")
+        self.historico = ContextoRolante.de_dados(dados.get("historico", []), TAMANHO_RECENTES)
+        # Campos que não têm slot próprio (raros) ficam num dicionário à parte
+        extras = {chave: valor for chave, valor in dados.items() if chave not in self.CAMPOS}
+        self.extras = extras or None
+        self.ultimo_uso = time.monotonic()
+        self.em_uso = 0
+        self.tamanho = 0
+
+    # Interface de dicionário usada pelas funções que recebem "memoria"
+    def get(self, chave, padrao=None):
+        if chave in self.CAMPOS:
+            return getattr(self, chave)
+        if self.extras is None:
+            return padrao
+        return self.extras.get(chave, padrao)
+
+    def __getitem__(self, chave):
+        if chave in self.CAMPOS:
+            return getattr(self, chave)
+        if self.extras is None or chave not in self.extras:
+            raise KeyError(chave)
+        return self.extras[chave]
+
+    def __setitem__(self, chave, valor):
+        if chave in self.CAMPOS:
+            setattr(self, chave, valor)
+        else:
+            if self.extras is None:
+                self.extras = {}
+            self.extras[chave] = valor
+
+    def __contains__(self, chave):
+        return chave in self.CAMPOS or (self.extras is not None and chave in self.extras)
+
+    def setdefault(self, chave, padrao=None):
+        if chave not in self:
+            self[chave] = padrao
+        return self[chave]
+
+    def para_dict(self):
+        dados = {
+            "nome_usuario": self.nome_usuario,
+            "personalidade": self.personalidade,
+            "preferencias": list(self.preferencias),
+            "humor": self.humor,
+            "modo": self.modo,
+            "historico": self.historico.para_dados()
+        }
+        if self.extras:
+            dados.update(self.extras)
+        return dados
+
+    def estimar_tamanho(self):
+        # Aproximação do que a sessão ocupa: o objeto, as listas e os textos
+        tamanho = sys.getsizeof(self) + sys.getsizeof(self.preferencias) + sys.getsizeof(self.historico)
+        tamanho += sum(sys.getsizeof(item) for item in self.preferencias)
+        # Cada troca guarda pergunta, resposta e o texto formatado das duas
+        tamanho += 2 * self.historico.caracteres + 200 * len(self.historico)
+        if self.extras:
+            tamanho += sys.getsizeof(self.extras) + sum(sys.getsizeof(v) for v in self.extras.values())
+        return tamanho
+
+
+def caminho_sessao(diretorio, usuario):
+    resumo = hashlib.sha1(usuario.encode("utf-8")).hexdigest()
+    return os.path.join(diretorio, resumo[:2], resumo + ".json")
+
+
+def ler_sessao(diretorio, usuario):
+    caminho = caminho_sessao(diretorio, usuario)
+    if not os.path.exists(caminho):
+        return None
+    with open(caminho, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def gravar_sessoes(diretorio, despejadas):
+    for usuario, dados in despejadas:
+        caminho = caminho_sessao(diretorio, usuario)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        temporario = caminho + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(dict(dados, usuario=usuario), f, ensure_ascii=False)
+        os.replace(temporario, caminho)
+
+
+class GerenciadorSessoes:
+    def __init__(self, diretorio=CAMINHO_SESSOES, maximo_sessoes=MAXIMO_SESSOES,
+                 maximo_bytes=MAXIMO_BYTES, tempo_ocioso=TEMPO_OCIOSO):
+        # Com diretorio=None as sessões despejadas são descartadas
+        self.diretorio = diretorio
+        self.maximo_sessoes = maximo_sessoes
+        self.maximo_bytes = maximo_bytes
+        self.tempo_ocioso = tempo_ocioso
+        self.ativas = OrderedDict()
+        self.bytes = 0
+        # Sessões já despejadas mas ainda não gravadas no disco
+        self.pendentes = {}
+        self.acertos = 0
+        self.paginadas = 0
+        self.despejadas = 0
+
+    def __len__(self):
+        return len(self.ativas)
+
+    def precisa_ler(self, usuario):
+        # Se obter(usuario) vai precisar ler o disco; quem não quer bloquear
+        # pode ler antes com ler_sessao e passar o resultado em "lida"
+        return bool(self.diretorio) and usuario not in self.ativas and usuario not in self.pendentes
+
+    def obter(self, usuario, lida=NAO_LIDA):
+        sessao = self.ativas.get(usuario)
+        if sessao is not None:
+            self.ativas.move_to_end(usuario)
+            self.acertos += 1
+        else:
+            dados = self.pendentes.get(usuario)
+            if dados is None and self.diretorio:
+                dados = ler_sessao(self.diretorio, usuario) if lida is NAO_LIDA else lida
+            if dados is not None:
+                self.paginadas += 1
+            dados = dict(dados) if dados else {}
+            dados.pop("usuario", None)
+            sessao = Sessao(usuario, dados)
+            self.ativas[usuario] = sessao
+            self._medir(sessao)
+        sessao.ultimo_uso = time.monotonic()
+        sessao.em_uso += 1
+        return sessao
+
+    def liberar(self, sessao):
+        sessao.em_uso = max(0, sessao.em_uso - 1)
+        sessao.ultimo_uso = time.monotonic()
+        if self.ativas.get(sessao.usuario) is sessao:
+            self._medir(sessao)
+
+    def excede_limite(self):
+        return len(self.ativas) > self.maximo_sessoes or self.bytes > self.maximo_bytes
+
+    def _medir(self, sessao):
+        self.bytes -= sessao.tamanho
+        sessao.tamanho = sessao.estimar_tamanho()
+        self.bytes += sessao.tamanho
+
+    def despejar(self, agora=None):
+        # Tira da memória as sessões ociosas e, se ainda passar do limite, as
+        # usadas há mais tempo. Sessões presas a uma conexão aberta ficam.
+        # Devolve [(usuario, dados)] para gravar com gravar_sessoes e depois
+        # confirmar.
+        agora = time.monotonic() if agora is None else agora
+        saida = []
+        for usuario in list(self.ativas):
+            sessao = self.ativas[usuario]
+            acima = self.excede_limite()
+            ociosa = agora - sessao.ultimo_uso >= self.tempo_ocioso
+            if not acima and not ociosa:
+                # Daqui em diante as sessões foram usadas mais recentemente
+                break
+            if sessao.em_uso:
+                continue
+            del self.ativas[usuario]
+            self.bytes -= sessao.tamanho
+            dados = sessao.para_dict()
+            saida.append((usuario, dados))
+            if self.diretorio:
+                self.pendentes[usuario] = dados
+        self.despejadas += len(saida)
+        return saida
+
+    def confirmar(self, gravadas):
+        for usuario, dados in gravadas:
+            if self.pendentes.get(usuario) is dados:
+                del self.pendentes[usuario]
+
+    def despejar_e_gravar(self, agora=None):
+        despejadas = self.despejar(agora)
+        if self.diretorio and despejadas:
+            gravar_sessoes(self.diretorio, despejadas)
+            self.confirmar(despejadas)
+        return len(despejadas)
+
+    def tudo_para_gravar(self):
+        # Todas as sessões ainda não gravadas, inclusive as que estão em uso
+        todas = list(self.pendentes.items())
+        todas += [(usuario, sessao.para_dict()) for usuario, sessao in self.ativas.items()]
+        self.pendentes.clear()
+        return todas
+
+    def fechar(self):
+        if self.diretorio:
+            gravar_sessoes(self.diretorio, self.tudo_para_gravar())
+
+
+def _memoria_residente_mb():
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maximo / (1024 * 1024) if sys.platform == "darwin" else maximo / 1024
+
+
+def simular(usuarios, maximo_sessoes, diretorio):
+    # Muitos usuários, quase todos ociosos: cada um manda uma mensagem, alguns
+    # poucos voltam a falar, e a quantidade em memória fica no limite
+    gerenciador = GerenciadorSessoes(diretorio, maximo_sessoes=maximo_sessoes)
+    inicio = time.perf_counter()
+    for numero in range(usuarios):
+        sessao = gerenciador.obter(f"usuario{numero}")
+        sessao["preferencias"] = sessao["preferencias"] + [f"tema{numero % 50}"]
+        sessao["historico"].adicionar("oi", "Oi! Tudo certo por aí?")
+        gerenciador.liberar(sessao)
+        if numero % 100 == 0:
+            volta = gerenciador.obter(f"usuario{numero // 2}")
+            gerenciador.liberar(volta)
+        if gerenciador.excede_limite():
+            gerenciador.despejar_e_gravar()
+    duracao = time.perf_counter() - inicio
+    print(f"{usuarios} usuários em {duracao:.2f} s; em memória: {len(gerenciador)} "
+          f"(~{gerenciador.bytes / 1024:.0f} KiB estimados); paginadas de volta: "
+          f"{gerenciador.paginadas}; despejadas: {gerenciador.despejadas}; "
+          f"RSS máximo: {_memoria_residente_mb():.1f} MiB")
+    gerenciador.fechar()
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Simula muitos usuários com sessões despejadas para o disco.")
+    parser.add_argument("--usuarios", type=int, default=100000)
+    parser.add_argument("--maximo", type=int, default=1000, help="sessões em memória")
+    parser.add_argument("--diretorio", default=CAMINHO_SESSOES)
+    args = parser.parse_args(argumentos)
+    simular(args.usuarios, args.maximo, args.diretorio)
+
+
+if __name__ == "__main__":
+    main()
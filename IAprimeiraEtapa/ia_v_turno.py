@@ -0,0 +1,93 @@
+import re
+import string
+import unicodedata
+from collections import namedtuple
+from functools import lru_cache
+from ia_v_lexico import LEXICO, dobrar_minusculo
+
+# Pré-processamento de uma fala, feito uma vez por turno. O Turno guarda o
+# texto original e todas as formas que os detectores usam:
+#
+#   minusculo  texto.lower(); as posições dos achados e dos tokens valem aqui
+#              (casefold() mudaria o tamanho do texto, "ß" -> "ss")
+#   dobrado    minusculo sem acentos, do mesmo tamanho (é o que o léxico lê)
+#   chave      a forma canônica das perguntas aprendidas (normalizar_chave)
+#   tokens     as palavras de dobrado, com suas posições (início, fim)
+#   achados    o resultado do léxico (ia_v_lexico)
+#
+# Turno é uma tupla imutável, então o mesmo objeto pode ser reaproveitado:
+# preparar() guarda os últimos TAMANHO_MEMO num LRU.
+TAMANHO_MEMO = 1024
+_PALAVRA = re.compile(r"\w+")
+_PONTUACAO = str.maketrans({c: " " for c in string.punctuation + "¿¡«»“”‘’…–—"})
+
+Turno = namedtuple("Turno", ["texto", "minusculo", "dobrado", "chave", "tokens", "posicoes", "achados"])
+
+
+def _sem_acentos(caractere):
+    return ''.join(c for c in unicodedata.normalize('NFD', caractere)
+                   if unicodedata.category(c) != 'Mn')
+
+
+# Latin-1 cobre o português inteiro, e nele cada letra acentuada vira uma
+# letra só: a troca é um bytes.translate() numa tabela de 256 posições
+_TABELA_LATIN1 = bytes(ord(_sem_acentos(chr(codigo))) for codigo in range(256))
+# Fora do Latin-1: caractere -> o mesmo sem acentos, preenchido conforme os
+# caracteres aparecem (o NFD roda uma vez por caractere diferente)
+_SEM_ACENTOS = {}
+_ASCII = frozenset(map(chr, range(128)))
+
+
+def remover_acentos(txt):
+    # Mesmo resultado do NFD + filtro por caractere de antes
+    if txt.isascii():
+        return txt.lower()
+    try:
+        return txt.encode("latin-1").translate(_TABELA_LATIN1).decode("latin-1").lower()
+    except UnicodeEncodeError:
+        pass
+    # Um replace() por caractere distinto que tem acento
+    for caractere in set(txt).difference(_ASCII):
+        base = _SEM_ACENTOS.get(caractere)
+        if base is None:
+            base = _SEM_ACENTOS[caractere] = _sem_acentos(caractere)
+        if base != caractere:
+            txt = txt.replace(caractere, base)
+    return txt.lower()
+
+
+def normalizar_chave(txt):
+    return " ".join(remover_acentos(txt).translate(_PONTUACAO).split())
+
+
+def preparar(entrada):
+    # Aceita o texto ou um Turno já pronto
+    if isinstance(entrada, Turno):
+        return entrada
+    return _preparar(entrada)
+
+
+@lru_cache(maxsize=TAMANHO_MEMO)
+def _preparar(texto):
+    minusculo = texto.lower()
+    dobrado = dobrar_minusculo(minusculo)
+    tokens = []
+    posicoes = []
+    for palavra in _PALAVRA.finditer(dobrado):
+        tokens.append(palavra.group())
+        posicoes.append(palavra.span())
+    return Turno(
+        texto=texto,
+        minusculo=minusculo,
+        dobrado=dobrado,
+        chave=normalizar_chave(texto),
+        tokens=tuple(tokens),
+        posicoes=tuple(posicoes),
+        achados=tuple(LEXICO.analisar_dobrado(dobrado))
+    )
+
+
+def chave_de(entrada):
+    if isinstance(entrada, Turno):
+        return entrada.chave
+    return normalizar_chave(entrada)
@@ -0,0 +1,711 @@
+import argparse
+import atexit
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections.abc import MutableMapping
+from datetime import datetime, timezone
+
+from ia_v_busca import BuscaAproximada, LIMIAR_CONFIANCA
+from ia_v_diario import CAMINHO_DIARIO, listar_segmentos, nome_segmento
+from ia_v_fatos import TAMANHO_PAGINA
+from ia_v_indice import normalizar_chave
+from ia_v_retencao import intervalo_datas
+from ia_v_turno import chave_de
+from ia_v_metricas import contar
+
+# Armazenamento em SQLite no lugar dos arquivos JSON. Com a variável de
+# ambiente IA_V_ARMAZENAMENTO=sqlite os scripts leem e gravam memória,
+# aprendizados e histórico no banco (IA_V_BANCO, padrão "ia_v.db"):
+#
+#   - usuarios/preferencias/historico têm uma coluna "usuario", então vários
+#     usuários dividem o mesmo banco (o terminal usa o usuário "");
+#   - as respostas aprendidas são buscadas pela chave normalizada, com índice,
+#     sem carregar a tabela inteira na memória;
+#   - o histórico tem uma tabela FTS5 para busca por palavras.
+#
+# Na primeira abertura os JSON da pasta atual são importados. Depois disso:
+#
+#   python ia_v_armazenamento.py importar --diretorio .
+#   python ia_v_armazenamento.py buscar "pizza" --usuario ana
+CAMINHO_BANCO = "ia_v.db"
+TAMANHO_LOTE_IMPORTACAO = 10000
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS usuarios (
+    usuario TEXT PRIMARY KEY,
+    nome_usuario TEXT NOT NULL DEFAULT '',
+    dados TEXT NOT NULL DEFAULT '{}',
+    atualizado TEXT
+);
+CREATE TABLE IF NOT EXISTS preferencias (
+    usuario TEXT NOT NULL,
+    posicao INTEGER NOT NULL,
+    item TEXT NOT NULL,
+    PRIMARY KEY (usuario, posicao)
+);
+CREATE TABLE IF NOT EXISTS respostas (
+    chave TEXT PRIMARY KEY,
+    normalizada TEXT NOT NULL,
+    valor TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS respostas_normalizada ON respostas (normalizada);
+CREATE TABLE IF NOT EXISTS gostos (
+    id INTEGER PRIMARY KEY,
+    tipo TEXT NOT NULL,
+    item TEXT NOT NULL,
+    emocao TEXT
+);
+CREATE INDEX IF NOT EXISTS gostos_tipo ON gostos (tipo, item);
+CREATE TABLE IF NOT EXISTS fatos (
+    id INTEGER PRIMARY KEY,
+    sujeito TEXT NOT NULL,
+    normalizado TEXT NOT NULL,
+    predicado TEXT,
+    quando TEXT,
+    emocao TEXT
+);
+CREATE INDEX IF NOT EXISTS fatos_normalizado ON fatos (normalizado, quando);
+CREATE TABLE IF NOT EXISTS historico (
+    id INTEGER PRIMARY KEY,
+    usuario TEXT NOT NULL DEFAULT '',
+    pergunta TEXT NOT NULL DEFAULT '',
+    resposta TEXT NOT NULL DEFAULT '',
+    data TEXT,
+    extras TEXT
+);
+CREATE INDEX IF NOT EXISTS historico_usuario_data ON historico (usuario, data);
+CREATE INDEX IF NOT EXISTS historico_data ON historico (data);
+CREATE TABLE IF NOT EXISTS importacoes (
+    arquivo TEXT PRIMARY KEY,
+    assinatura TEXT,
+    posicao INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# A tabela FTS5 só guarda o índice; o texto fica em historico
+ESQUEMA_FTS = """
+CREATE VIRTUAL TABLE IF NOT EXISTS historico_fts USING fts5 (
+    pergunta, resposta, content='historico', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS historico_fts_inserir AFTER INSERT ON historico BEGIN
+    INSERT INTO historico_fts (rowid, pergunta, resposta) VALUES (new.id, new.pergunta, new.resposta);
+END;
+CREATE TRIGGER IF NOT EXISTS historico_fts_apagar AFTER DELETE ON historico BEGIN
+    INSERT INTO historico_fts (historico_fts, rowid, pergunta, resposta)
+    VALUES ('delete', old.id, old.pergunta, old.resposta);
+END;
+"""
+
+CAMPOS_HISTORICO = ("usuario", "pergunta", "resposta", "data")
+_banco_configurado = None
+
+
+def usar_sqlite():
+    return os.environ.get("IA_V_ARMAZENAMENTO", "json").strip().lower() == "sqlite"
+
+
+def banco_configurado():
+    # O banco escolhido pelas variáveis de ambiente, ou None para usar os
+    # arquivos JSON. Todos os módulos do processo dividem a mesma conexão.
+    global _banco_configurado
+    if not usar_sqlite():
+        return None
+    if _banco_configurado is None:
+        caminho = os.environ.get("IA_V_BANCO", CAMINHO_BANCO)
+        novo = not os.path.exists(caminho)
+        _banco_configurado = BancoV(caminho)
+        if novo:
+            _banco_configurado.importar_pasta(".")
+        atexit.register(_banco_configurado.fechar)
+    return _banco_configurado
+
+
+def _registro_historico(registro, usuario=""):
+    extras = {chave: valor for chave, valor in registro.items() if chave not in CAMPOS_HISTORICO}
+    return (
+        registro.get("usuario", usuario) or "",
+        str(registro.get("pergunta", "")),
+        str(registro.get("resposta", "")),
+        registro.get("data"),
+        json.dumps(extras, ensure_ascii=False) if extras else None
+    )
+
+
+def _termos_fts(texto):
+    # Cada palavra vira um termo entre aspas, para que pontuação e palavras
+    # como OR/NOT na busca do usuário não sejam lidas como sintaxe do FTS5
+    return " ".join('"' + palavra.replace('"', '""') + '"' for palavra in texto.split())
+
+
+class BancoV:
+    def __init__(self, caminho=CAMINHO_BANCO):
+        self.caminho = caminho
+        # A conexão é usada também pela thread de gravação; o trava serializa
+        self.trava = threading.RLock()
+        self.conexao = sqlite3.connect(caminho, check_same_thread=False)
+        self.conexao.execute("PRAGMA journal_mode=WAL")
+        self.conexao.execute("PRAGMA synchronous=NORMAL")
+        # usuario -> memória copiada esperando a thread de gravação (salvar_memoria)
+        self.memorias_pendentes = {}
+        with self.trava, self.conexao:
+            self.conexao.executescript(ESQUEMA)
+            try:
+                self.conexao.executescript(ESQUEMA_FTS)
+                self.fts = True
+            except sqlite3.OperationalError:
+                # SQLite compilado sem FTS5: a busca cai para LIKE
+                self.fts = False
+
+    def fechar(self):
+        with self.trava:
+            if self.conexao is not None:
+                self.conexao.close()
+                self.conexao = None
+
+    # Memória de cada usuário
+    def carregar_memoria(self, usuario=""):
+        with self.trava:
+            linha = self.conexao.execute(
+                "SELECT nome_usuario, dados FROM usuarios WHERE usuario = ?", (usuario,)).fetchone()
+            preferencias = [item for (item,) in self.conexao.execute(
+                "SELECT item FROM preferencias WHERE usuario = ? ORDER BY posicao", (usuario,))]
+        if linha is None:
+            return None
+        memoria = json.loads(linha[1])
+        memoria["nome_usuario"] = linha[0]
+        memoria["preferencias"] = preferencias
+        return memoria
+
+    def salvar_memoria(self, memoria, usuario="", gravador=None):
+        # Com um gravador (GravadorAtrasado) a escrita roda na thread dele, e
+        # as chamadas que chegam antes dela rodar viram uma gravação só, da
+        # memória mais recente. A cópia é feita aqui, porque a conversa
+        # continua mexendo na memória.
+        dados = {chave: valor for chave, valor in memoria.items()
+                 if chave not in ("nome_usuario", "preferencias")}
+        copia = (memoria.get("nome_usuario", "") or "", json.dumps(dados, ensure_ascii=False),
+                 [str(item) for item in memoria.get("preferencias", [])], datetime.now().isoformat())
+        with self.trava:
+            marcada = usuario in self.memorias_pendentes
+            if gravador is None:
+                # A cópia pendente é mais antiga que esta
+                self.memorias_pendentes.pop(usuario, None)
+            else:
+                self.memorias_pendentes[usuario] = copia
+        if gravador is None:
+            self._gravar_memoria(usuario, copia)
+        elif not marcada:
+            gravador.executar(self._gravar_pendente, usuario)
+
+    def _gravar_pendente(self, usuario):
+        with self.trava:
+            copia = self.memorias_pendentes.pop(usuario, None)
+        if copia is not None:
+            self._gravar_memoria(usuario, copia)
+
+    def _gravar_memoria(self, usuario, copia):
+        nome_usuario, dados, preferencias, atualizado = copia
+        with self.trava, self.conexao:
+            self.conexao.execute(
+                "INSERT INTO usuarios (usuario, nome_usuario, dados, atualizado) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (usuario) DO UPDATE SET nome_usuario = excluded.nome_usuario, "
+                "dados = excluded.dados, atualizado = excluded.atualizado",
+                (usuario, nome_usuario, dados, atualizado))
+            # As preferências só são regravadas quando mudaram
+            gravadas = [item for (item,) in self.conexao.execute(
+                "SELECT item FROM preferencias WHERE usuario = ? ORDER BY posicao", (usuario,))]
+            if gravadas != preferencias:
+                self.conexao.execute("DELETE FROM preferencias WHERE usuario = ?", (usuario,))
+                self.conexao.executemany(
+                    "INSERT INTO preferencias (usuario, posicao, item) VALUES (?, ?, ?)",
+                    [(usuario, posicao, item) for posicao, item in enumerate(preferencias)])
+
+    # Respostas aprendidas
+    def obter_resposta(self, chave):
+        with self.trava:
+            linha = self.conexao.execute("SELECT valor FROM respostas WHERE chave = ?", (chave,)).fetchone()
+        return None if linha is None else json.loads(linha[0])
+
+    def buscar_resposta_normalizada(self, normalizada):
+        # Se várias chaves têm a mesma forma normalizada, vale a gravada por último
+        with self.trava:
+            linha = self.conexao.execute(
+                "SELECT chave, valor FROM respostas WHERE normalizada = ? ORDER BY rowid DESC LIMIT 1",
+                (normalizada,)).fetchone()
+        return None if linha is None else (linha[0], json.loads(linha[1]))
+
+    def gravar_respostas(self, pares):
+        linhas = [(chave, normalizar_chave(chave), json.dumps(valor, ensure_ascii=False))
+                  for chave, valor in pares]
+        with self.trava, self.conexao:
+            # REPLACE apaga e insere de novo, então a chave ganha um rowid novo
+            self.conexao.executemany(
+                "INSERT OR REPLACE INTO respostas (chave, normalizada, valor) VALUES (?, ?, ?)", linhas)
+
+    def apagar_resposta(self, chave):
+        with self.trava, self.conexao:
+            return self.conexao.execute("DELETE FROM respostas WHERE chave = ?", (chave,)).rowcount
+
+    def contar_respostas(self):
+        with self.trava:
+            return self.conexao.execute("SELECT COUNT(*) FROM respostas").fetchone()[0]
+
+    def chaves_respostas(self):
+        with self.trava:
+            return [chave for (chave,) in self.conexao.execute("SELECT chave FROM respostas ORDER BY rowid")]
+
+    def normalizadas_respostas(self):
+        with self.trava:
+            return [normalizada for (normalizada,) in
+                    self.conexao.execute("SELECT DISTINCT normalizada FROM respostas")]
+
+    # Histórico
+    def anexar_historico(self, registros, usuario=""):
+        with self.trava, self.conexao:
+            self.conexao.executemany(
+                "INSERT INTO historico (usuario, pergunta, resposta, data, extras) VALUES (?, ?, ?, ?, ?)",
+                (_registro_historico(registro, usuario) for registro in registros))
+
+    def _anexar_historico_novo(self, registros, usuario=""):
+        # Como anexar_historico, pulando os registros que já estão na tabela
+        # (mesmo usuário, data, pergunta e resposta; o índice por usuário e
+        # data acha os candidatos)
+        novos = []
+        with self.trava, self.conexao:
+            for registro in registros:
+                linha = _registro_historico(registro, usuario)
+                if not self.conexao.execute(
+                        "SELECT 1 FROM historico WHERE usuario = ? AND pergunta = ? AND resposta = ? AND data IS ?",
+                        linha[:4]).fetchone():
+                    novos.append(linha)
+            self.conexao.executemany(
+                "INSERT INTO historico (usuario, pergunta, resposta, data, extras) VALUES (?, ?, ?, ?, ?)", novos)
+        return len(novos)
+
+    def historico_recente(self, usuario="", limite=20):
+        with self.trava:
+            linhas = self.conexao.execute(
+                "SELECT pergunta, resposta, data FROM historico WHERE usuario = ? "
+                "ORDER BY data DESC, id DESC LIMIT ?", (usuario, limite)).fetchall()
+        return [{"pergunta": p, "resposta": r, "data": d} for p, r, d in reversed(linhas)]
+
+    def buscar_historico(self, texto, usuario=None, limite=20, de=None, ate=None):
+        if not texto.strip():
+            return []
+        filtro = ""
+        if self.fts:
+            sql = ("SELECT h.usuario, h.pergunta, h.resposta, h.data FROM historico_fts "
+                   "JOIN historico h ON h.id = historico_fts.rowid WHERE historico_fts MATCH ?")
+            parametros = [_termos_fts(texto)]
+            ordem = " ORDER BY historico_fts.rank LIMIT ?"
+        else:
+            sql = ("SELECT usuario, pergunta, resposta, data FROM historico h "
+                   "WHERE (h.pergunta LIKE ? OR h.resposta LIKE ?)")
+            parametros = [f"%{texto}%", f"%{texto}%"]
+            ordem = " ORDER BY h.data DESC LIMIT ?"
+        if usuario is not None:
+            filtro = " AND h.usuario = ?"
+            parametros.append(usuario)
+        # As datas são isoformat(), então a ordem do texto é a ordem do tempo
+        inicio, fim = intervalo_datas(de, ate)
+        if inicio is not None:
+            filtro += " AND h.data >= ?"
+            parametros.append(inicio.isoformat())
+        if fim is not None:
+            filtro += " AND h.data < ?"
+            parametros.append(fim.isoformat())
+        parametros.append(limite)
+        with self.trava:
+            linhas = self.conexao.execute(sql + filtro + ordem, parametros).fetchall()
+        return [{"usuario": u, "pergunta": p, "resposta": r, "data": d} for u, p, r, d in linhas]
+
+    def diario(self, usuario=""):
+        return DiarioSQLite(self, usuario)
+
+    def indice(self):
+        return IndiceSQLite(self)
+
+    def fatos(self):
+        return FatosSQLite(self)
+
+    # Gostos, antipatias e fatos do layout antigo de aprendizados.json. Os
+    # dois gravam por cima do registro com a mesma chave natural, (tipo, item)
+    # e (sujeito normalizado, predicado, quando), então importar o mesmo
+    # arquivo de novo não duplica nada. Bancos antigos podem ter duplicatas,
+    # por isso não há índice UNIQUE: a busca usa os índices de sempre.
+    def gravar_gostos(self, tipo, itens):
+        linhas = [(item.get("emocao"), tipo, str(item.get("item", ""))) if isinstance(item, dict)
+                  else (None, tipo, str(item)) for item in itens]
+        with self.trava, self.conexao:
+            for emocao, tipo, item in linhas:
+                if not self.conexao.execute(
+                        "UPDATE gostos SET emocao = ? WHERE tipo = ? AND item = ?", (emocao, tipo, item)).rowcount:
+                    self.conexao.execute(
+                        "INSERT INTO gostos (tipo, item, emocao) VALUES (?, ?, ?)", (tipo, item, emocao))
+
+    def gravar_fatos(self, fatos):
+        linhas = [(fato.get("sujeito", ""), fato.get("emocao"), normalizar_chave(fato.get("sujeito", "")),
+                   fato.get("predicado"), fato.get("quando")) for fato in fatos if isinstance(fato, dict)]
+        with self.trava, self.conexao:
+            for linha in linhas:
+                # IS e não =: predicado e quando podem ser NULL
+                if not self.conexao.execute(
+                        "UPDATE fatos SET sujeito = ?, emocao = ? "
+                        "WHERE normalizado = ? AND predicado IS ? AND quando IS ?", linha).rowcount:
+                    self.conexao.execute(
+                        "INSERT INTO fatos (sujeito, emocao, normalizado, predicado, quando) VALUES (?, ?, ?, ?, ?)",
+                        linha)
+
+    def fatos_sobre(self, sujeito):
+        with self.trava:
+            linhas = self.conexao.execute(
+                "SELECT sujeito, predicado, quando, emocao FROM fatos WHERE normalizado = ? ORDER BY quando",
+                (normalizar_chave(sujeito),)).fetchall()
+        return [{"sujeito": s, "predicado": p, "quando": q, "emocao": e} for s, p, q, e in linhas]
+
+    def amostra_rotulada(self, limite):
+        # As últimas respostas aprendidas, gostos e fatos, no layout de
+        # aprendizados.json (para ia_v_emocoes.exemplos_rotulados)
+        with self.trava:
+            respostas = self.conexao.execute(
+                "SELECT chave, valor FROM respostas ORDER BY rowid DESC LIMIT ?", (limite,)).fetchall()
+            gostos = self.conexao.execute(
+                "SELECT tipo, item, emocao FROM gostos WHERE emocao IS NOT NULL ORDER BY id").fetchall()
+            fatos = self.conexao.execute(
+                "SELECT sujeito, predicado, emocao FROM fatos WHERE emocao IS NOT NULL ORDER BY id").fetchall()
+        amostra = {
+            "respostas": {chave: json.loads(valor) for chave, valor in reversed(respostas)},
+            "gostos": [],
+            "antipatias": [],
+            "fatos": [{"sujeito": s, "predicado": p, "emocao": e} for s, p, e in fatos]
+        }
+        for tipo, item, emocao in gostos:
+            amostra["gostos" if tipo == "gosto" else "antipatias"].append({"item": item, "emocao": emocao})
+        return amostra
+
+    # Importação dos arquivos JSON
+    def _importacao(self, arquivo):
+        # (assinatura, posição) da última importação do arquivo
+        with self.trava:
+            linha = self.conexao.execute(
+                "SELECT assinatura, posicao FROM importacoes WHERE arquivo = ?",
+                (os.path.abspath(arquivo),)).fetchone()
+        return linha or (None, 0)
+
+    def _ja_importado(self, arquivo, assinatura):
+        return self._importacao(arquivo)[0] == assinatura
+
+    def _marcar_importado(self, arquivo, assinatura, posicao=0):
+        with self.trava, self.conexao:
+            self.conexao.execute(
+                "INSERT OR REPLACE INTO importacoes (arquivo, assinatura, posicao) VALUES (?, ?, ?)",
+                (os.path.abspath(arquivo), assinatura, posicao))
+
+    def _assinatura(self, caminho):
+        info = os.stat(caminho)
+        return f"{info.st_size}:{info.st_mtime_ns}"
+
+    def importar_memoria(self, caminho, usuario=""):
+        # memoria.json de qualquer variante; o histórico embutido vai para a
+        # tabela historico. Quando o arquivo muda, só os registros que ainda
+        # não estão na tabela são anexados.
+        assinatura = self._assinatura(caminho)
+        if self._ja_importado(caminho, assinatura):
+            return 0
+        with open(caminho, "r", encoding="utf-8") as f:
+            memoria = json.load(f)
+        if not isinstance(memoria, dict):
+            return 0
+        memoria = dict(memoria)
+        if not memoria.get("nome_usuario") and memoria.get("nome"):
+            memoria["nome_usuario"] = memoria["nome"]
+        historico = memoria.pop("historico", None) or []
+        self.salvar_memoria(memoria, usuario)
+        total = self._anexar_historico_novo([r for r in historico if isinstance(r, dict)], usuario)
+        self._marcar_importado(caminho, assinatura)
+        return 1 + total
+
+    def importar_aprendizados(self, caminho):
+        # Três formatos: dicionário simples {pergunta: resposta}, o mesmo
+        # dentro de "respostas", e as listas gostos/antipatias/fatos
+        assinatura = self._assinatura(caminho)
+        if self._ja_importado(caminho, assinatura):
+            return 0
+        with open(caminho, "r", encoding="utf-8") as f:
+            dados = json.load(f)
+        if not isinstance(dados, dict):
+            return 0
+        total = 0
+        respostas = dados.get("respostas")
+        if isinstance(respostas, dict):
+            self.gravar_respostas(respostas.items())
+            total += len(respostas)
+        for tipo, chave in (("gosto", "gostos"), ("antipatia", "antipatias")):
+            if isinstance(dados.get(chave), list):
+                self.gravar_gostos(tipo, dados[chave])
+                total += len(dados[chave])
+        if isinstance(dados.get("fatos"), list):
+            self.gravar_fatos(dados["fatos"])
+            total += len(dados["fatos"])
+        soltas = [(chave, valor) for chave, valor in dados.items()
+                  if chave not in ("respostas", "gostos", "antipatias", "fatos")
+                  and isinstance(valor, (str, dict))]
+        self.gravar_respostas(soltas)
+        total += len(soltas)
+        self._marcar_importado(caminho, assinatura)
+        return total
+
+    def importar_diario(self, diretorio=CAMINHO_DIARIO):
+        # Segmentos .jsonl do diário. Guarda até onde cada segmento já foi lido,
+        # então rodar de novo só importa o que foi anexado depois.
+        total = 0
+        for numero in listar_segmentos(diretorio):
+            caminho = os.path.join(diretorio, nome_segmento(numero))
+            posicao = self._importacao(caminho)[1]
+            with open(caminho, "rb") as f:
+                f.seek(posicao)
+                lote = []
+                for bruta in f:
+                    if not bruta.endswith(b"\n"):
+                        # Linha ainda sendo escrita: fica para a próxima vez
+                        break
+                    posicao += len(bruta)
+                    bruta = bruta.strip()
+                    if bruta:
+                        lote.append(json.loads(bruta))
+                    if len(lote) >= TAMANHO_LOTE_IMPORTACAO:
+                        self.anexar_historico(lote)
+                        self._marcar_importado(caminho, None, posicao)
+                        total += len(lote)
+                        lote = []
+                self.anexar_historico(lote)
+                self._marcar_importado(caminho, None, posicao)
+                total += len(lote)
+        return total
+
+    def importar_sessoes(self, diretorio):
+        # Sessões do servidor (sessoes/xx/<sha1>.json), uma por usuário
+        total = 0
+        for raiz, _, arquivos in os.walk(diretorio):
+            for nome in arquivos:
+                if not nome.endswith(".json"):
+                    continue
+                caminho = os.path.join(raiz, nome)
+                assinatura = self._assinatura(caminho)
+                if self._ja_importado(caminho, assinatura):
+                    continue
+                with open(caminho, "r", encoding="utf-8") as f:
+                    dados = json.load(f)
+                usuario = dados.pop("usuario", None)
+                if usuario:
+                    self.salvar_memoria(dados, usuario)
+                    total += 1
+                self._marcar_importado(caminho, assinatura)
+        return total
+
+    def importar_pasta(self, diretorio="."):
+        from ia_v_sessao import CAMINHO_SESSOES
+        contagem = {}
+        caminho = os.path.join(diretorio, "memoria.json")
+        if os.path.exists(caminho):
+            contagem["memoria"] = self.importar_memoria(caminho)
+        caminho = os.path.join(diretorio, "aprendizados.json")
+        if os.path.exists(caminho):
+            contagem["aprendizados"] = self.importar_aprendizados(caminho)
+        contagem["historico"] = self.importar_diario(os.path.join(diretorio, CAMINHO_DIARIO))
+        caminho = os.path.join(diretorio, CAMINHO_SESSOES)
+        if os.path.isdir(caminho):
+            contagem["sessoes"] = self.importar_sessoes(caminho)
+        return contagem
+
+
+def copiar_para_memoria(aprendizados):
+    # Troca a TabelaRespostas (ou a TabelaMapeada de ia_v_mapeado) por um
+    # dicionário comum, para quem quer aprender sem gravar nada no banco (modo
+    # em lote sem --salvar, simulações)
+    if not isinstance(aprendizados, dict):
+        return dict(aprendizados)
+    copia = dict(aprendizados)
+    if isinstance(copia.get("respostas"), MutableMapping) and not isinstance(copia["respostas"], dict):
+        copia["respostas"] = dict(copia["respostas"])
+    return copia
+
+
+class TabelaRespostas(MutableMapping):
+    # As respostas aprendidas vistas como um dicionário, mas lidas e gravadas
+    # direto no banco, uma chave por vez
+    def __init__(self, banco):
+        self.banco = banco
+
+    def __getitem__(self, chave):
+        valor = self.banco.obter_resposta(chave)
+        if valor is None:
+            raise KeyError(chave)
+        return valor
+
+    def __setitem__(self, chave, valor):
+        self.banco.gravar_respostas([(chave, valor)])
+
+    def __delitem__(self, chave):
+        if not self.banco.apagar_resposta(chave):
+            raise KeyError(chave)
+
+    def __iter__(self):
+        return iter(self.banco.chaves_respostas())
+
+    def __len__(self):
+        return self.banco.contar_respostas()
+
+
+class IndiceSQLite:
+    # Mesma interface de IndiceAprendizados, mas a busca exata é uma consulta
+    # pelo índice da chave normalizada; só a busca aproximada carrega as chaves
+    def __init__(self, banco):
+        self.banco = banco
+        self.tabela = TabelaRespostas(banco)
+        self.aproximada = None
+
+    def salvar(self):
+        # Cada resposta já é gravada no banco quando aprendida
+        pass
+
+    def adicionar(self, chave, valor):
+        self.tabela[chave] = valor
+        if self.aproximada is not None:
+            self.aproximada.adicionar(normalizar_chave(chave))
+
+    def buscar(self, entrada):
+        achado = self.banco.buscar_resposta_normalizada(chave_de(entrada))
+        return None if achado is None else achado[1]
+
+    def buscar_aproximado(self, entrada, k=3, limiar=LIMIAR_CONFIANCA):
+        if self.aproximada is None:
+            self.aproximada = BuscaAproximada(self.banco.normalizadas_respostas())
+        resultado = []
+        for normalizada, pontuacao in self.aproximada.buscar(chave_de(entrada), k, limiar):
+            achado = self.banco.buscar_resposta_normalizada(normalizada)
+            if achado is not None:
+                resultado.append((achado[0], pontuacao))
+        return resultado
+
+    def buscar_resposta(self, entrada):
+        contar("buscas")
+        resposta = self.buscar(entrada)
+        if resposta is not None:
+            contar("buscas_exatas")
+            return resposta
+        candidatos = self.buscar_aproximado(entrada, k=1)
+        if candidatos:
+            contar("buscas_aproximadas")
+            return self.tabela.get(candidatos[0][0])
+        contar("buscas_sem_resposta")
+        return None
+
+
+class FatosSQLite:
+    # Mesma interface da Fatos de ia_v_fatos sobre a tabela fatos: o fato
+    # vigente de cada sujeito é o de "quando" mais recente, pelo índice
+    # (normalizado, quando)
+    COLUNAS = "sujeito, predicado, quando, emocao"
+
+    def __init__(self, banco):
+        self.banco = banco
+
+    @staticmethod
+    def _fato(linha):
+        sujeito, predicado, quando, emocao = linha
+        return {"sujeito": sujeito, "predicado": predicado, "quando": quando, "emocao": emocao}
+
+    def carregar(self, registros):
+        registros = [fato for fato in registros if isinstance(fato, dict)]
+        self.banco.gravar_fatos(registros)
+        return len(registros)
+
+    def adicionar(self, sujeito, predicado, quando=None, emocao=None):
+        fato = {"sujeito": sujeito, "predicado": predicado,
+                "quando": quando or datetime.now(timezone.utc).isoformat(), "emocao": emocao}
+        self.banco.gravar_fatos([fato])
+        return fato
+
+    def buscar(self, sujeito):
+        with self.banco.trava:
+            linha = self.banco.conexao.execute(
+                f"SELECT {self.COLUNAS} FROM fatos WHERE normalizado = ? ORDER BY quando DESC, id DESC LIMIT 1",
+                (normalizar_chave(sujeito),)).fetchone()
+        return None if linha is None else self._fato(linha)
+
+    def listar(self, apos="", limite=TAMANHO_PAGINA):
+        with self.banco.trava:
+            linhas = self.banco.conexao.execute(
+                f"SELECT {self.COLUNAS} FROM fatos AS f WHERE normalizado > ? AND id = ("
+                "SELECT id FROM fatos WHERE normalizado = f.normalizado ORDER BY quando DESC, id DESC LIMIT 1"
+                ") ORDER BY normalizado LIMIT ?", (normalizar_chave(apos), limite)).fetchall()
+        return [self._fato(linha) for linha in linhas]
+
+    def total(self):
+        with self.banco.trava:
+            return self.banco.conexao.execute("SELECT COUNT(DISTINCT normalizado) FROM fatos").fetchone()[0]
+
+
+class DiarioSQLite:
+    # Substitui o Diario de arquivos: mesma interface, linhas na tabela historico
+    def __init__(self, banco, usuario=""):
+        self.banco = banco
+        self.usuario = usuario
+
+    def anexar(self, registro):
+        self.banco.anexar_historico([registro], self.usuario)
+
+    def fechar(self):
+        pass
+
+    def ler(self):
+        with self.banco.trava:
+            linhas = self.banco.conexao.execute(
+                "SELECT pergunta, resposta, data FROM historico WHERE usuario = ? ORDER BY id",
+                (self.usuario,)).fetchall()
+        for pergunta, resposta, data in linhas:
+            yield {"pergunta": pergunta, "resposta": resposta, "data": data}
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Banco SQLite da V: importação e busca no histórico.")
+    parser.add_argument("--banco", default=os.environ.get("IA_V_BANCO", CAMINHO_BANCO))
+    comandos = parser.add_subparsers(dest="comando", required=True)
+    importar = comandos.add_parser("importar", help="importa memoria.json, aprendizados.json, o diário e as sessões")
+    importar.add_argument("--diretorio", default=".")
+    buscar = comandos.add_parser("buscar", help="busca palavras no histórico")
+    buscar.add_argument("texto")
+    buscar.add_argument("--usuario")
+    buscar.add_argument("--limite", type=int, default=20)
+    buscar.add_argument("--de", help="primeiro dia (AAAA-MM-DD)")
+    buscar.add_argument("--ate", help="último dia (AAAA-MM-DD)")
+    args = parser.parse_args(argumentos)
+    if args.comando == "buscar":
+        try:
+            intervalo_datas(args.de, args.ate)
+        except ValueError as erro:
+            parser.error(str(erro))
+
+    banco = BancoV(args.banco)
+    try:
+        if args.comando == "importar":
+            inicio = time.perf_counter()
+            contagem = banco.importar_pasta(args.diretorio)
+            duracao = time.perf_counter() - inicio
+            print(f"importado em {duracao:.2f} s: " +
+                  ", ".join(f"{nome} {total}" for nome, total in contagem.items()), file=sys.stderr)
+        else:
+            for registro in banco.buscar_historico(args.texto, args.usuario, args.limite, args.de, args.ate):
+                print(json.dumps(registro, ensure_ascii=False))
+    finally:
+        banco.fechar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+import math
+from array import array
+from ia_v_metricas import contar
+
+# NumPy é opcional e só é importado quando aparece uma base grande o bastante
+# para usá-lo: o import sozinho custa dezenas de milissegundos na partida
+np = None
+_numpy_pendente = True
+
+
+# Busca aproximada de perguntas aprendidas por TF-IDF de trigramas de
+# caracteres. Cada trigrama guarda a lista (postings) das perguntas onde
+# aparece, então uma busca só toca as perguntas que têm algum trigrama em comum
+# com a entrada. Com NumPy a soma das pontuações é feita em vetor.
+TAMANHO_NGRAMA = 3
+LIMIAR_CONFIANCA = 0.55
+# Quantas entradas de postings uma busca soma no máximo. Os trigramas mais
+# raros entram primeiro; os muito comuns quase não distinguem nada e são os
+# que têm as listas mais longas.
+ORCAMENTO_POSTINGS = 50000
+# Quantos candidatos da primeira fase têm o cosseno calculado por inteiro
+CANDIDATOS_RECALCULO = 32
+# Resultados recentes por entrada; o cache é limpo quando algo é aprendido
+TAMANHO_CACHE = 4096
+# Abaixo disso o NumPy custa mais para montar os vetores do que economiza
+MINIMO_NUMPY = 2000
+
+
+def _carregar_numpy():
+    global np, _numpy_pendente
+    if _numpy_pendente:
+        _numpy_pendente = False
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            np = None
+    return np
+
+
+def ngramas(texto_normalizado, n=TAMANHO_NGRAMA):
+    texto = f" {texto_normalizado} "
+    if len(texto) < n:
+        return [texto]
+    return [texto[i:i + n] for i in range(len(texto) - n + 1)]
+
+
+def contar_ngramas(texto_normalizado):
+    contagem = {}
+    for grama in ngramas(texto_normalizado):
+        contagem[grama] = contagem.get(grama, 0) + 1
+    return contagem
+
+
+class BuscaAproximada:
+    def __init__(self, chaves=()):
+        self.chaves = []
+        self.posicoes = {}
+        self.vocabulario = {}
+        self.postings = []
+        # Tamanho (em trigramas) de cada pergunta, usado na primeira fase
+        self.tamanhos = array("d")
+        self.cache = {}
+        # Vetores TF-IDF das perguntas já recalculadas; valem enquanto o
+        # tamanho da base (e portanto o IDF) não muda
+        self.vetores = {}
+        for chave in chaves:
+            self.adicionar(chave)
+
+    def __len__(self):
+        return len(self.chaves)
+
+    def _idf(self, df):
+        return math.log((1 + len(self.chaves)) / (1 + df)) + 1
+
+    def _df(self, grama):
+        id_grama = self.vocabulario.get(grama)
+        return len(self.postings[id_grama]) if id_grama is not None else 0
+
+    def adicionar(self, chave_normalizada):
+        # Recebe a chave já normalizada (ia_v_indice.normalizar_chave)
+        if not chave_normalizada or chave_normalizada in self.posicoes:
+            return
+        self.cache.clear()
+        self.vetores.clear()
+        documento = len(self.chaves)
+        self.chaves.append(chave_normalizada)
+        self.posicoes[chave_normalizada] = documento
+        gramas = ngramas(chave_normalizada)
+        for grama in gramas:
+            id_grama = self.vocabulario.get(grama)
+            if id_grama is None:
+                id_grama = len(self.postings)
+                self.vocabulario[grama] = id_grama
+                self.postings.append(array("I"))
+            # Um trigrama repetido na pergunta entra repetido na lista, e a
+            # soma das pontuações já conta a frequência
+            self.postings[id_grama].append(documento)
+        self.tamanhos.append(math.sqrt(len(gramas)))
+
+    def _vetor(self, contagem):
+        pesos = {grama: tf * self._idf(self._df(grama)) for grama, tf in contagem.items()}
+        norma = math.sqrt(sum(peso * peso for peso in pesos.values())) or 1.0
+        return pesos, norma
+
+    def _cosseno(self, pesos_consulta, norma_consulta, documento):
+        vetor = self.vetores.get(documento)
+        if vetor is None:
+            vetor = self._vetor(contar_ngramas(self.chaves[documento]))
+            self.vetores[documento] = vetor
+        pesos, norma = vetor
+        produto = sum(peso * pesos_consulta.get(grama, 0.0) for grama, peso in pesos.items())
+        return produto / (norma * norma_consulta)
+
+    def buscar(self, texto_normalizado, k=3, limiar=LIMIAR_CONFIANCA):
+        if not self.chaves or not texto_normalizado:
+            return []
+        chave_cache = (texto_normalizado, k, limiar)
+        resultados = self.cache.get(chave_cache)
+        if resultados is None:
+            contar("cache_aproximada_falhas")
+            resultados = self._buscar(texto_normalizado, k, limiar)
+            if len(self.cache) >= TAMANHO_CACHE:
+                self.cache.clear()
+            self.cache[chave_cache] = resultados
+        else:
+            contar("cache_aproximada_acertos")
+        return list(resultados)
+
+    def _buscar(self, texto_normalizado, k, limiar):
+        pesos_consulta, norma_consulta = self._vetor(contar_ngramas(texto_normalizado))
+
+        # Primeira fase: soma aproximada sobre os postings dos trigramas mais
+        # raros da entrada, dentro do orçamento
+        selecionados = []
+        total = 0
+        for grama in sorted(pesos_consulta, key=self._df):
+            df = self._df(grama)
+            if df == 0:
+                continue
+            if selecionados and total + df > ORCAMENTO_POSTINGS:
+                break
+            selecionados.append((self.vocabulario[grama], pesos_consulta[grama]))
+            total += df
+        if not selecionados:
+            return []
+        limite = max(k, CANDIDATOS_RECALCULO)
+        if len(self.chaves) >= MINIMO_NUMPY and _carregar_numpy() is not None:
+            candidatos = self._candidatos_numpy(selecionados, limite)
+        else:
+            candidatos = self._candidatos_python(selecionados, limite)
+
+        # Segunda fase: cosseno completo só para os candidatos
+        resultados = []
+        for documento in candidatos:
+            pontuacao = self._cosseno(pesos_consulta, norma_consulta, documento)
+            if pontuacao >= limiar:
+                resultados.append((self.chaves[documento], pontuacao))
+        resultados.sort(key=lambda par: -par[1])
+        return resultados[:k]
+
+    def _candidatos_numpy(self, selecionados, limite):
+        listas = [np.frombuffer(self.postings[id_grama], dtype=np.uint32)
+                  for id_grama, _ in selecionados]
+        pesos = np.array([peso for _, peso in selecionados])
+        documentos = np.concatenate(listas)
+        contribuicoes = np.repeat(pesos, [len(lista) for lista in listas])
+        unicos, inverso = np.unique(documentos, return_inverse=True)
+        somas = np.bincount(inverso, weights=contribuicoes)
+        somas /= np.frombuffer(self.tamanhos, dtype=np.float64)[unicos]
+        if len(somas) > limite:
+            melhores = np.argpartition(-somas, limite)[:limite]
+        else:
+            melhores = np.arange(len(somas))
+        return [int(documento) for documento in unicos[melhores]]
+
+    def _candidatos_python(self, selecionados, limite):
+        somas = {}
+        for id_grama, peso in selecionados:
+            for documento in self.postings[id_grama]:
+                somas[documento] = somas.get(documento, 0.0) + peso
+        ordem = sorted(somas, key=lambda doc: -somas[doc] / self.tamanhos[doc])
+        return ordem[:limite]
@@ -0,0 +1,106 @@
+from collections import Counter, deque
+
+from ia_v_indice import normalizar_chave
+
+# Janela das últimas trocas da conversa. As trocas ficam num buffer circular
+# (deque) limitado por número de turnos e/ou de caracteres; o que sai da
+# janela não é perdido, vira um resumo compacto (quantos turnos, temas e
+# emoções). Adicionar uma troca custa O(1) qualquer que seja o tamanho da
+# janela. Cada troca já entra formatada, com o total de caracteres mantido à
+# parte; o texto do contexto só é juntado quando alguém pede, uma vez por
+# mudança na janela.
+MAXIMO_TEMAS_RESUMO = 50
+TAMANHO_MINIMO_TEMA = 4
+PALAVRAS_VAZIAS = {
+    "voce", "isso", "essa", "esse", "esta", "este", "aqui", "para", "como",
+    "qual", "quem", "quando", "onde", "porque", "sobre", "muito", "mais",
+    "tambem", "entao", "estou", "tenho", "gosto", "minha", "meus", "suas", "seus"
+}
+
+
+def formatar_troca(pergunta, resposta):
+    return f"Você: {pergunta}\nV: {resposta}\n"
+
+
+class ContextoRolante:
+    def __init__(self, maximo_turnos=5, maximo_caracteres=None):
+        self.maximo_turnos = maximo_turnos
+        self.maximo_caracteres = maximo_caracteres
+        # Cada item é (pergunta, resposta, texto já formatado)
+        self.trocas = deque()
+        self.caracteres = 0
+        self.resumo_turnos = 0
+        self.resumo_temas = Counter()
+        self.resumo_emocoes = Counter()
+        self.emocoes = deque()
+        # Último texto montado; None quando a janela mudou depois dele
+        self._texto = ""
+
+    def __len__(self):
+        return len(self.trocas)
+
+    def __iter__(self):
+        for pergunta, resposta, _ in self.trocas:
+            yield pergunta, resposta
+
+    def adicionar(self, pergunta, resposta, emocao=None):
+        texto = formatar_troca(pergunta, resposta)
+        self.trocas.append((pergunta, resposta, texto))
+        self.emocoes.append(emocao)
+        self.caracteres += len(texto)
+        self._texto = None
+        while self.trocas and self._excede():
+            self._expulsar()
+
+    def _excede(self):
+        if self.maximo_turnos is not None and len(self.trocas) > self.maximo_turnos:
+            return True
+        if self.maximo_caracteres is not None and self.caracteres > self.maximo_caracteres:
+            # Mantém pelo menos a troca mais recente
+            return len(self.trocas) > 1
+        return False
+
+    def _expulsar(self):
+        pergunta, _, texto = self.trocas.popleft()
+        emocao = self.emocoes.popleft()
+        self.caracteres -= len(texto)
+        self.resumo_turnos += 1
+        if emocao:
+            self.resumo_emocoes[emocao] += 1
+        for palavra in normalizar_chave(pergunta).split():
+            if len(palavra) >= TAMANHO_MINIMO_TEMA and palavra not in PALAVRAS_VAZIAS:
+                self.resumo_temas[palavra] += 1
+        if len(self.resumo_temas) > 2 * MAXIMO_TEMAS_RESUMO:
+            self.resumo_temas = Counter(dict(self.resumo_temas.most_common(MAXIMO_TEMAS_RESUMO)))
+
+    def renderizar(self):
+        if self._texto is None:
+            self._texto = "".join(texto for _, _, texto in self.trocas)
+        return self._texto
+
+    def resumo(self):
+        return {
+            "turnos": self.resumo_turnos,
+            "temas": dict(self.resumo_temas.most_common(MAXIMO_TEMAS_RESUMO)),
+            "emocoes": dict(self.resumo_emocoes)
+        }
+
+    def para_dados(self):
+        return {
+            "trocas": [[pergunta, resposta, emocao] for (pergunta, resposta, _), emocao
+                       in zip(self.trocas, self.emocoes)],
+            "resumo": self.resumo()
+        }
+
+    @classmethod
+    def de_dados(cls, dados, maximo_turnos=5, maximo_caracteres=None):
+        contexto = cls(maximo_turnos, maximo_caracteres)
+        if isinstance(dados, list):
+            dados = {"trocas": dados}
+        resumo = dados.get("resumo", {})
+        contexto.resumo_turnos = resumo.get("turnos", 0)
+        contexto.resumo_temas.update(resumo.get("temas", {}))
+        contexto.resumo_emocoes.update(resumo.get("emocoes", {}))
+        for troca in dados.get("trocas", []):
+            contexto.adicionar(*troca[:3])
+        return contexto
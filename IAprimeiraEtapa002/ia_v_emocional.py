@@ -2,28 +2,58 @@ import json
 import os
 import random
 from datetime import datetime
-import unicodedata
+from ia_v_armazenamento import TabelaRespostas, banco_configurado
+from ia_v_compartilhado import IndiceCompartilhado
+from ia_v_diario import Diario, migrar_historico
+from ia_v_fatos import TOKENS_PERGUNTA, fatos_da_base, responder_fato
+from ia_v_intencoes import Roteador, ler_aprendizado
+from ia_v_emocoes import classificar
+from ia_v_mapeado import TabelaMapeada, base_configurada
+from ia_v_lexico import rotulos, ultimo
+from ia_v_indice import IndiceAprendizados, tabela_respostas, texto_resposta
+from ia_v_metricas import etapa, executar_com_perfil
+from ia_v_personas import decorar
+from ia_v_preferencias import preferencias_da_memoria
+from ia_v_turno import preparar
+from ia_v_persistencia import GRAVADOR
 
 CAMINHO_MEMORIA = "memoria.json"
 CAMINHO_APRENDIZADOS = "aprendizados.json"
 
+# Gerador de números aleatórios das respostas; o modo em lote fixa a semente
+aleatorio = random.Random()
+
+# Com IA_V_ARMAZENAMENTO=sqlite tudo fica no banco em vez dos arquivos JSON
+BANCO = banco_configurado()
+# Com IA_V_ARMAZENAMENTO=mapeado as respostas ficam em aprendizados.base
+BASE = base_configurada()
+
 def carregar_memoria():
-    if os.path.exists(CAMINHO_MEMORIA):
+    if BANCO is not None:
+        memoria = BANCO.carregar_memoria()
+        if memoria is not None:
+            return memoria
+    elif os.path.exists(CAMINHO_MEMORIA):
         with open(CAMINHO_MEMORIA, "r", encoding="utf-8") as f:
             return json.load(f)
-    else:
-        return {
-            "nome_usuario": "",
-            "preferencias": [],
-            "personalidade": "gentil",
-            "historico": []
-        }
+    return {
+        "nome_usuario": "",
+        "preferencias": [],
+        "personalidade": "gentil"
+    }
 
+# As funções salvar_* só marcam o arquivo; a gravação acontece em segundo plano
 def salvar_memoria(memoria):
-    with open(CAMINHO_MEMORIA, "w", encoding="utf-8") as f:
-        json.dump(memoria, f, ensure_ascii=False, indent=4)
+    if BANCO is not None:
+        BANCO.salvar_memoria(memoria, gravador=GRAVADOR)
+        return
+    GRAVADOR.marcar(CAMINHO_MEMORIA, memoria, indent=4)
 
 def carregar_aprendizados():
+    if BANCO is not None:
+        return TabelaRespostas(BANCO)
+    if BASE is not None:
+        return TabelaMapeada(BASE)
     if os.path.exists(CAMINHO_APRENDIZADOS):
         with open(CAMINHO_APRENDIZADOS, "r", encoding="utf-8") as f:
             dados = json.load(f)
@@ -35,47 +65,32 @@ def carregar_aprendizados():
     else:
         return {}
 
-def salvar_aprendizados(aprendizados):
-    with open(CAMINHO_APRENDIZADOS, "w", encoding="utf-8") as f:
-        json.dump(aprendizados, f, ensure_ascii=False, indent=4)
-
-def detectar_emocao(texto):
-    texto = texto.lower()
-    if any(p in texto for p in ["triste", "chateado", "deprimido", "infeliz", "mal"]):
-        return "triste"
-    elif any(p in texto for p in ["feliz", "alegre", "animado", "contente", "bom"]):
-        return "feliz"
-    elif any(p in texto for p in ["raiva", "irritado", "bravo", "chateado"]):
-        return "irritado"
-    else:
-        return "neutra"
+# Os detectores recebem o texto ou o Turno já preparado (ia_v_turno)
+def detectar_emocao(entrada):
+    return classificar(entrada)
 
 def atualizar_preferencias(entrada, memoria):
-    entrada_lower = entrada.lower()
-    prefs = memoria.get("preferencias", [])
-    if "gosto de" in entrada_lower:
-        item = entrada_lower.split("gosto de")[-1].strip()
-        if item and item not in prefs:
-            prefs.append(item)
-            memoria["preferencias"] = prefs
+    turno = preparar(entrada)
+    achado = ultimo(turno.achados, "preferencia")
+    if achado is None:
+        return None
+    item = turno.minusculo[achado.fim:].strip()
+    # Temas citados depois de "gosto de" (ex.: "assistir futebol" -> futebol)
+    temas = {outro.rotulo for outro in turno.achados if outro.categoria == "tema" and outro.inicio >= achado.fim}
+    prefs = preferencias_da_memoria(memoria)
+    if achado.rotulo == "positiva":
+        if prefs.adicionar(item, True, temas):
             return f"Que legal saber que você gosta de {item}!"
-    elif "não gosto de" in entrada_lower:
-        item = entrada_lower.split("não gosto de")[-1].strip()
-        if item and item not in prefs:
-            prefs.append(f"não {item}")
-            memoria["preferencias"] = prefs
+    elif achado.rotulo == "negativa":
+        if prefs.adicionar(item, False, temas):
             return f"Entendi, vou lembrar que você não gosta de {item}."
     return None
 
-def remover_acentos(txt):
-    return ''.join(c for c in unicodedata.normalize('NFD', txt)
-                   if unicodedata.category(c) != 'Mn').lower()
-
 def responder_data(entrada):
-    entrada_sem_acentos = remover_acentos(entrada)
+    palavras = rotulos(preparar(entrada).achados, "data")
     # Se contém "dia" e "hoje" ou palavras tipo "qual" e "data", responde data
-    if ( "dia" in entrada_sem_acentos and "hoje" in entrada_sem_acentos ) or \
-       ("qual" in entrada_sem_acentos or "data" in entrada_sem_acentos):
+    if ("dia" in palavras and "hoje" in palavras) or \
+       ("qual" in palavras or "data" in palavras):
         dias_semana = [
             "segunda-feira", "terça-feira", "quarta-feira",
             "quinta-feira", "sexta-feira", "sábado", "domingo"
@@ -85,53 +100,111 @@ def responder_data(entrada):
         return f"Hoje é {dia_semana}, {hoje.strftime('%d/%m/%Y')}."
     return None
 
-def gerar_resposta(entrada, aprendizados, memoria):
-    entrada_lower = entrada.lower()
-    nome = memoria.get("nome_usuario", "")
-    personalidade = memoria.get("personalidade", "gentil")
-    emocao = detectar_emocao(entrada)
-
-    resposta_pref = atualizar_preferencias(entrada, memoria)
-    if resposta_pref:
-        return resposta_pref
-
-    resposta_data = responder_data(entrada)
-    if resposta_data:
-        return resposta_data
-
-    # Busca resposta aprendida
-    for chave in aprendizados:
-        if chave.lower() == entrada_lower:
-            resposta = aprendizados[chave]
-            break
-    else:
-        respostas_padrao = [
-            "Desculpa, ainda não sei responder isso.",
-            "Pode me ensinar a responder essa pergunta?",
-            "Interessante, me fale mais!",
-            "Não entendi muito bem, pode explicar?"
-        ]
-        resposta = random.choice(respostas_padrao)
-
-    if emocao == "triste":
-        resposta = "Poxa, sinto muito que você esteja assim. " + resposta
-    elif emocao == "feliz":
-        resposta = "Que bom ouvir isso! " + resposta
-    elif emocao == "irritado":
-        resposta = "Calma, vamos tentar resolver isso juntos. " + resposta
-
-    if personalidade == "gentil":
-        resposta = resposta + " Estou aqui para ajudar!"
-    elif personalidade == "animada":
-        resposta = "😄 " + resposta + " Que legal!"
-    elif personalidade == "curiosa":
-        resposta = "Hmm, que curioso... " + resposta
-
+# As intenções de um turno, em ordem de prioridade (ia_v_intencoes). Cada uma
+# recebe o Turno e o contexto montado por gerar_resposta; None passa a vez.
+ROTEADOR = Roteador()
+RESPOSTAS_PADRAO = [
+    "Desculpa, ainda não sei responder isso.",
+    "Pode me ensinar a responder essa pergunta?",
+    "Interessante, me fale mais!",
+    "Não entendi muito bem, pode explicar?"
+]
+
+@ROTEADOR.intencao("aprender", prioridade=0, tokens=["aprenda"], padrao=r"^aprenda\s*:")
+def intencao_aprender(turno, contexto):
+    resposta, contexto["aprendeu"] = aprender(turno, contexto["indice"])
     return resposta
 
+@ROTEADOR.intencao("preferencias", prioridade=10, achados=["preferencia"])
+def intencao_preferencias(turno, contexto):
+    return atualizar_preferencias(turno, contexto["memoria"])
+
+# "qual é/o que é X" com um fato sobre X. Uma resposta ensinada para essa
+# mesma pergunta vem antes do fato (quem responde é a busca); o fato vem antes
+# das respostas aproximadas
+@ROTEADOR.intencao("fatos", prioridade=20, tokens=TOKENS_PERGUNTA)
+def intencao_fatos(turno, contexto):
+    if contexto["indice"].buscar(turno) is not None:
+        return None
+    return responder_fato(turno, fatos_da_base(contexto["aprendizados"], BANCO))
+
+@ROTEADOR.intencao("data", prioridade=30, achados=["data"])
+def intencao_data(turno, contexto):
+    return responder_data(turno)
+
+# Busca resposta aprendida; emoção e personalidade vêm de personas.json
+@ROTEADOR.intencao("busca", prioridade=40)
+def intencao_busca(turno, contexto):
+    aprendida = contexto["indice"].buscar_resposta(turno)
+    if aprendida is None:
+        return None
+    resposta, _ = texto_resposta(aprendida)
+    return decorar(resposta, contexto["personalidade"], emocao=contexto["emocao"])
+
+@ROTEADOR.intencao("padrao", prioridade=100)
+def intencao_padrao(turno, contexto):
+    return decorar(aleatorio.choice(RESPOSTAS_PADRAO), contexto["personalidade"], emocao=contexto["emocao"])
+
+def gerar_resposta(entrada, aprendizados, memoria, indice=None, contexto=None):
+    # Em contexto (se passado) ficam a intenção que respondeu e se algo foi aprendido
+    with etapa("resposta.analise"):
+        turno = preparar(entrada)
+        emocao = detectar_emocao(turno)
+    if indice is None:
+        indice = IndiceAprendizados(tabela_respostas(aprendizados))
+    if contexto is None:
+        contexto = {}
+    contexto.update(aprendizados=aprendizados, memoria=memoria, indice=indice, emocao=emocao,
+                    personalidade=memoria.get("personalidade", "gentil"), aprendeu=False)
+    return ROTEADOR.despachar(turno, contexto)
+
+def aprender(entrada, indice):
+    # Trata "aprenda: pergunta | resposta" (ou "pergunta = resposta"). Devolve
+    # a resposta da V (None se a entrada não é esse comando) e se algo novo
+    # foi aprendido
+    turno = preparar(entrada)
+    if not turno.minusculo.startswith("aprenda:"):
+        return None, False
+    aprendizado = turno.texto[len("aprenda:"):].strip()
+    if not aprendizado:
+        return "O que você quer que eu aprenda? Use: aprenda: pergunta | resposta", False
+    par = ler_aprendizado(aprendizado)
+    if par is None:
+        return "Para ensinar, use o formato: aprenda: pergunta | resposta", False
+    chave, valor = par
+    indice.adicionar(chave, valor)
+    return "Aprendi isso, obrigado!", True
+
+def criar_motor(aprendizados, memoria, indice):
+    # Processa um turno sem terminal e sem perguntas de feedback. A intenção
+    # que respondeu o último turno fica em responder.intencao
+    def responder(entrada):
+        contexto = {}
+        resposta = gerar_resposta(entrada, aprendizados, memoria, indice, contexto)
+        responder.intencao = contexto["intencao"]
+        return resposta, contexto["aprendeu"]
+    responder.intencao = None
+    return responder
+
+def carregar_base():
+    # Aprendizados e índice. A conversa só chama isto na primeira mensagem, então
+    # a saudação não espera pelo tamanho da base
+    aprendizados = carregar_aprendizados()
+    if BANCO is not None:
+        return aprendizados, BANCO.indice()
+    if BASE is not None:
+        return aprendizados, BASE.indice()
+    return aprendizados, IndiceCompartilhado(tabela_respostas(aprendizados), CAMINHO_APRENDIZADOS, GRAVADOR, aprendizados)
+
 def iniciar_conversa():
     memoria = carregar_memoria()
-    aprendizados = carregar_aprendizados()
+    aprendizados = indice = None
+    if BANCO is not None:
+        diario = BANCO.diario()
+    else:
+        if migrar_historico(memoria):
+            salvar_memoria(memoria)
+        diario = Diario()
 
     if not memoria.get("nome_usuario"):
         memoria["nome_usuario"] = input("Qual o seu nome? ").strip()
@@ -142,42 +215,39 @@ def iniciar_conversa():
 
     while True:
         entrada = input("Você: ").strip()
-        if entrada.lower() in ["tchau", "sair", "adeus"]:
+        turno = preparar(entrada)
+        if turno.minusculo in ["tchau", "sair", "adeus"]:
             print(f"V: Até mais, {nome}! Foi bom conversar com você.")
+            GRAVADOR.executar(diario.fechar)
             break
 
-        if entrada.lower().startswith("aprenda:"):
-            aprendizado = entrada[len("aprenda:"):].strip()
-            if aprendizado:
-                if "|" in aprendizado:
-                    chave, valor = aprendizado.split("|", 1)
-                    chave = chave.strip()
-                    valor = valor.strip()
-                    aprendizados[chave] = valor
-                    salvar_aprendizados(aprendizados)
-                    print("V: Aprendi isso, obrigado!")
-                else:
-                    print("V: Para ensinar, use o formato: aprenda: pergunta | resposta")
-            else:
-                print("V: O que você quer que eu aprenda? Use: aprenda: pergunta | resposta")
-            continue
+        if indice is None:
+            with etapa("conversa.carregar_base"):
+                aprendizados, indice = carregar_base()
 
-        resposta = gerar_resposta(entrada, aprendizados, memoria)
+        with etapa("conversa.resposta"):
+            contexto = {}
+            resposta = gerar_resposta(turno, aprendizados, memoria, indice, contexto)
         print("V:", resposta)
+        if contexto["intencao"] == "aprender":
+            if contexto["aprendeu"]:
+                indice.salvar()
+            continue
 
         feedback = input("Essa resposta está boa? (s/n): ").strip().lower()
         if feedback == "n":
             nova_resposta = input("Como você gostaria que eu respondesse? ").strip()
-            aprendizados[entrada] = nova_resposta
-            salvar_aprendizados(aprendizados)
+            indice.adicionar(entrada, nova_resposta)
+            indice.salvar()
             print("V: Obrigada! Vou lembrar disso.")
 
-        memoria.setdefault("historico", []).append({
-            "pergunta": entrada,
-            "resposta": resposta,
-            "data": datetime.now().isoformat()
-        })
-        salvar_memoria(memoria)
+        with etapa("conversa.salvar"):
+            GRAVADOR.executar(diario.anexar, {
+                "pergunta": entrada,
+                "resposta": resposta,
+                "data": datetime.now().isoformat()
+            })
+            salvar_memoria(memoria)
 
 if __name__ == "__main__":
-    iniciar_conversa()
+    executar_com_perfil(iniciar_conversa)
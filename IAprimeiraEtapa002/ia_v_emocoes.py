@@ -0,0 +1,313 @@
+import json
+import math
+import os
+import re
+import zlib
+from array import array
+from itertools import chain, islice
+from ia_v_lexico import dobrar
+from ia_v_metricas import contar
+from ia_v_turno import Turno
+
+# NumPy é opcional e só é importado no primeiro lote grande o bastante
+np = None
+_numpy_pendente = True
+
+
+# Classificador de emoção (Naive Bayes multinomial) no lugar das listas de
+# palavras. As características são as palavras sem acentos, os pares de
+# palavras vizinhas e, depois de uma negação, as palavras seguintes marcadas
+# ("não estou bem" -> "~estou", "~bem"), todas espalhadas por hashing numa
+# tabela de 2**BITS posições por emoção. Só as palavras passam pelo crc32 (e
+# por um memo); pares e negações combinam os códigos das palavras, sem montar
+# textos novos. Cada posição guarda a contagem e o log já calculado, então
+# aprender um exemplo novo só mexe nas posições dele.
+#
+# O modelo aprende só com os exemplos de emocoes.json. As emoções gravadas nos
+# aprendizados vieram do detector antigo, por palavras, e só entram no treino
+# quando pedido (ia_v_manutencao reindexar --treinar-com-base). Quando nenhuma
+# emoção ganha da segunda colocada por MARGEM_MINIMA, a frase fica neutra. Em
+# lote, o NumPy classifica milhares de frases de uma vez.
+CAMINHO_EMOCOES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "emocoes.json")
+ROTULOS = ("neutra", "feliz", "triste", "irritado")
+NEUTRA = "neutra"
+# Rótulos antigos que são a mesma emoção
+SINONIMOS = {"neutro": "neutra", "irritada": "irritado", "": "neutra"}
+BITS = 16
+# Pequena para que uma palavra vista no treino pese mais que as que não foram
+SUAVIZACAO = 0.1
+NEGACOES = frozenset(["nao", "nem", "nunca", "jamais", "sem"])
+ALCANCE_NEGACAO = 3
+# Diferença mínima de log-probabilidade entre a primeira e a segunda emoção
+# (cerca de 2,7 vezes mais provável); abaixo disso a frase é neutra
+MARGEM_MINIMA = 1.0
+# Combinação dos códigos das palavras para os pares e as negações
+MULTIPLICADOR_PAR = 1000003
+MARCA_NEGACAO = 0x5BD1E995
+# Quantos registros rotulados da base entram no treino (os mais recentes)
+LIMITE_EXEMPLOS_BASE = 20000
+TAMANHO_MEMO = 200000
+# Abaixo disso classificar uma frase por vez sai mais barato que montar os vetores
+MINIMO_NUMPY = 64
+_PALAVRA = re.compile(r"\w+")
+
+
+def _carregar_numpy():
+    global np, _numpy_pendente
+    if _numpy_pendente:
+        _numpy_pendente = False
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            np = None
+    return np
+
+
+def normalizar_emocao(rotulo):
+    # O rótulo canônico, ou None se não é uma emoção conhecida
+    if rotulo is None:
+        return None
+    rotulo = str(rotulo).strip().lower()
+    rotulo = SINONIMOS.get(rotulo, rotulo)
+    return rotulo if rotulo in ROTULOS else None
+
+
+def palavras(entrada):
+    # As mesmas palavras de Turno.tokens, sem montar o Turno inteiro
+    if isinstance(entrada, Turno):
+        return entrada.tokens
+    return _PALAVRA.findall(dobrar(entrada))
+
+
+def _codigo(palavra):
+    # crc32 e não hash(): o hash de str muda a cada processo
+    return zlib.crc32(palavra.encode("utf-8"))
+
+
+class ClassificadorEmocoes:
+    def __init__(self, rotulos=ROTULOS, bits=BITS, suavizacao=SUAVIZACAO, margem=MARGEM_MINIMA):
+        self.rotulos = tuple(rotulos)
+        self.margem = margem
+        self.posicao_rotulo = {rotulo: posicao for posicao, rotulo in enumerate(self.rotulos)}
+        self.mascara = (1 << bits) - 1
+        self.dimensao = 1 << bits
+        self.suavizacao = suavizacao
+        # Por emoção: contagem de cada posição e log(contagem + suavização)
+        self.contagens = [array("d", bytes(8 * self.dimensao)) for _ in self.rotulos]
+        self.pesos = [array("d", [math.log(suavizacao)]) * self.dimensao for _ in self.rotulos]
+        self.totais = [0.0] * len(self.rotulos)
+        self.documentos = [0] * len(self.rotulos)
+        self.normas = [0.0] * len(self.rotulos)
+        self.priores = [0.0] * len(self.rotulos)
+        self._recalcular()
+        # palavra -> código
+        self.memo = {}
+        # Emoções já previstas em lote para as próximas frases (ver prever())
+        self.previstas = {}
+        self.vistas = None
+
+    def __len__(self):
+        return sum(self.documentos)
+
+    def __getstate__(self):
+        # Para mandar o modelo a outros processos: memo, previsões e vistas do
+        # NumPy são refeitos lá
+        estado = dict(self.__dict__)
+        estado.update(memo={}, previstas={}, vistas=None)
+        return estado
+
+    def _recalcular(self):
+        total = sum(self.documentos)
+        for posicao in range(len(self.rotulos)):
+            self.normas[posicao] = math.log(self.totais[posicao] + self.suavizacao * self.dimensao)
+            self.priores[posicao] = math.log((self.documentos[posicao] + 1) / (total + len(self.rotulos)))
+
+    def codigos(self, tokens):
+        memo = self.memo
+        if len(memo) > TAMANHO_MEMO:
+            memo.clear()
+        return [memo.get(token) or memo.setdefault(token, _codigo(token)) for token in tokens]
+
+    def negacoes(self, tokens, codigos):
+        resultado = []
+        if NEGACOES.isdisjoint(tokens):
+            return resultado
+        restantes = 0
+        for token, codigo in zip(tokens, codigos):
+            if token in NEGACOES:
+                restantes = ALCANCE_NEGACAO
+            elif restantes:
+                resultado.append((codigo ^ MARCA_NEGACAO) & self.mascara)
+                restantes -= 1
+        return resultado
+
+    def posicoes(self, entrada):
+        tokens = palavras(entrada)
+        codigos = self.codigos(tokens)
+        mascara = self.mascara
+        resultado = [codigo & mascara for codigo in codigos]
+        resultado.extend([(a * MULTIPLICADOR_PAR + b) & mascara for a, b in zip(codigos, codigos[1:])])
+        resultado.extend(self.negacoes(tokens, codigos))
+        return resultado
+
+    def atualizar(self, entrada, rotulo):
+        # Aprende um exemplo. Devolve False se o rótulo não é uma emoção conhecida
+        posicao_rotulo = self.posicao_rotulo.get(normalizar_emocao(rotulo))
+        if posicao_rotulo is None:
+            return False
+        posicoes = self.posicoes(entrada)
+        contagens = self.contagens[posicao_rotulo]
+        pesos = self.pesos[posicao_rotulo]
+        for posicao in posicoes:
+            contagens[posicao] += 1
+            pesos[posicao] = math.log(contagens[posicao] + self.suavizacao)
+        self.totais[posicao_rotulo] += len(posicoes)
+        self.documentos[posicao_rotulo] += 1
+        self._recalcular()
+        self.previstas.clear()
+        return True
+
+    def treinar(self, exemplos):
+        total = 0
+        for texto, rotulo in exemplos:
+            total += self.atualizar(texto, rotulo)
+        contar("emocoes_treinadas", total)
+        return total
+
+    def _escolher(self, posicoes):
+        if not posicoes:
+            return NEUTRA
+        melhor = None
+        melhor_pontos = segundo_pontos = None
+        for pesos, norma, prior, rotulo in zip(self.pesos, self.normas, self.priores, self.rotulos):
+            pontos = sum(map(pesos.__getitem__, posicoes)) - len(posicoes) * norma + prior
+            if melhor_pontos is None or pontos > melhor_pontos:
+                segundo_pontos = melhor_pontos
+                melhor, melhor_pontos = rotulo, pontos
+            elif segundo_pontos is None or pontos > segundo_pontos:
+                segundo_pontos = pontos
+        if segundo_pontos is not None and melhor_pontos - segundo_pontos < self.margem:
+            return NEUTRA
+        return melhor
+
+    def classificar(self, entrada):
+        texto = entrada.texto if isinstance(entrada, Turno) else entrada
+        rotulo = self.previstas.get(texto)
+        if rotulo is not None:
+            return rotulo
+        return self._escolher(self.posicoes(entrada))
+
+    def classificar_lote(self, entradas):
+        entradas = list(entradas)
+        if len(entradas) < MINIMO_NUMPY or _carregar_numpy() is None:
+            return [self.classificar(entrada) for entrada in entradas]
+        if self.vistas is None:
+            # As vistas dividem a memória com os arrays, então continuam
+            # valendo depois de atualizar()
+            self.vistas = [np.frombuffer(pesos, dtype=np.float64) for pesos in self.pesos]
+        quantidade = len(entradas)
+        # Em Python só as palavras viram códigos; os pares são montados em
+        # vetor, com a mesma conta de posicoes()
+        listas_tokens = [palavras(entrada) for entrada in entradas]
+        listas = [self.codigos(tokens) for tokens in listas_tokens]
+        palavras_por_frase = np.fromiter(map(len, listas), dtype=np.intp, count=quantidade)
+        codigos = np.fromiter(chain.from_iterable(listas), dtype=np.int64, count=int(palavras_por_frase.sum()))
+        frases = np.repeat(np.arange(quantidade), palavras_por_frase)
+        mesma_frase = frases[:-1] == frases[1:]
+        pares = (codigos[:-1][mesma_frase] * MULTIPLICADOR_PAR + codigos[1:][mesma_frase]) & self.mascara
+        extras = [self.negacoes(tokens, lista) for tokens, lista in zip(listas_tokens, listas)]
+        extras_por_frase = np.fromiter(map(len, extras), dtype=np.intp, count=quantidade)
+        posicoes = np.concatenate([
+            codigos & self.mascara, pares,
+            np.fromiter(chain.from_iterable(extras), dtype=np.int64, count=int(extras_por_frase.sum()))
+        ])
+        # A frase de cada característica, para somar os pesos por frase
+        donos = np.concatenate([frases, frases[1:][mesma_frase], np.repeat(np.arange(quantidade), extras_por_frase)])
+        tamanhos = palavras_por_frase + np.maximum(palavras_por_frase - 1, 0) + extras_por_frase
+        pontos = np.empty((len(self.rotulos), quantidade))
+        for posicao, vista in enumerate(self.vistas):
+            somas = np.bincount(donos, weights=vista[posicoes], minlength=quantidade)
+            pontos[posicao] = somas - tamanhos * self.normas[posicao] + self.priores[posicao]
+        escolhas = pontos.argmax(axis=0)
+        duvidosas = tamanhos == 0
+        if len(self.rotulos) > 1:
+            primeiros = np.partition(pontos, -2, axis=0)
+            duvidosas |= primeiros[-1] - primeiros[-2] < self.margem
+        escolhas[duvidosas] = self.posicao_rotulo[NEUTRA]
+        return [self.rotulos[escolha] for escolha in escolhas.tolist()]
+
+    def prever(self, textos):
+        # Classifica um lote de uma vez e guarda o resultado para as chamadas
+        # de classificar() que vierem com esses textos. Vale até o próximo
+        # prever() ou até o modelo aprender algo.
+        textos = list(textos)
+        self.previstas = dict(zip(textos, self.classificar_lote(textos)))
+        return textos
+
+
+def exemplos_do_arquivo(caminho=CAMINHO_EMOCOES):
+    with open(caminho, "r", encoding="utf-8") as f:
+        dados = json.load(f)
+    for rotulo, frases in dados.get("exemplos", {}).items():
+        for frase in frases:
+            yield frase, rotulo
+
+
+def exemplos_rotulados(aprendizados, limite=LIMITE_EXEMPLOS_BASE):
+    # (texto, emoção) dos registros da base que guardam a emoção: respostas
+    # aprendidas (pergunta e resposta juntas), gostos, antipatias e fatos
+    if not isinstance(aprendizados, dict):
+        return
+    respostas = aprendizados.get("respostas")
+    if isinstance(respostas, dict):
+        for pergunta, valor in islice(reversed(respostas.items()), limite):
+            if isinstance(valor, dict) and valor.get("emocao"):
+                yield f"{pergunta} {valor.get('texto', '')}", valor["emocao"]
+    for chave in ("gostos", "antipatias"):
+        for item in aprendizados.get(chave) or []:
+            if isinstance(item, dict) and item.get("emocao"):
+                yield str(item.get("item", "")), item["emocao"]
+    for fato in aprendizados.get("fatos") or []:
+        if isinstance(fato, dict) and fato.get("emocao"):
+            yield f"{fato.get('sujeito', '')} {fato.get('predicado', '')}", fato["emocao"]
+
+
+def carregar_classificador(caminho=CAMINHO_EMOCOES):
+    classificador = ClassificadorEmocoes()
+    classificador.treinar(exemplos_do_arquivo(caminho))
+    return classificador
+
+
+CLASSIFICADOR = carregar_classificador()
+_base_treinada = False
+
+
+def classificar(entrada):
+    return CLASSIFICADOR.classificar(entrada)
+
+
+def classificar_lote(entradas):
+    return CLASSIFICADOR.classificar_lote(entradas)
+
+
+def prever(textos):
+    return CLASSIFICADOR.prever(textos)
+
+
+def treinar_com(exemplos):
+    return CLASSIFICADOR.treinar(exemplos)
+
+
+def treinar_com_base(aprendizados, banco=None, limite=LIMITE_EXEMPLOS_BASE):
+    # Treina com as emoções gravadas na base, uma vez por processo. Só a
+    # manutenção chama, quando pedido: os rótulos antigos vieram das listas de
+    # palavras e ensinariam os mesmos erros. No banco só os registros usados
+    # são lidos.
+    global _base_treinada
+    if _base_treinada:
+        return 0
+    _base_treinada = True
+    if banco is not None:
+        aprendizados = banco.amostra_rotulada(limite)
+    return treinar_com(exemplos_rotulados(aprendizados, limite))
@@ -0,0 +1,96 @@
+import re
+from collections import namedtuple
+from ia_v_metricas import contar, etapa
+from ia_v_turno import normalizar_chave, preparar
+
+# Roteador de intenções. Cada variante registra as funções que respondem um
+# turno (aprender, preferências, data, busca...) com uma prioridade e os
+# gatilhos que as tornam candidatas:
+#
+#   tokens   palavras do turno, sem acentos ("aprenda", "qual")
+#   achados  categorias do léxico ("data") ou (categoria, rótulo)
+#   padrao   regex que ainda precisa casar no texto sem acentos do turno
+#
+# Uma intenção sem tokens nem achados é candidata em todo turno (a busca nos
+# aprendizados, a resposta padrão). As tabelas token -> intenções e achado ->
+# intenções são montadas no registro, então um turno só consulta os próprios
+# tokens e achados: registrar mais intenções não muda o custo de um turno que
+# não aciona nenhuma delas. As candidatas rodam em ordem de prioridade (menor
+# primeiro) e a primeira que devolver algo diferente de None responde; o nome
+# dela fica em contexto["intencao"].
+Intencao = namedtuple("Intencao", ["nome", "funcao", "ordem", "padrao", "etapa", "contador"])
+
+# "aprenda: pergunta | resposta" ou "aprenda: pergunta = resposta"; a barra
+# tem precedência, para respostas que têm "="
+SEPARADORES_APRENDA = ("|", "=")
+
+
+class Roteador:
+    def __init__(self):
+        self.intencoes = {}
+        self._por_token = {}
+        self._por_achado = {}
+        self._sempre = []
+
+    def registrar(self, nome, funcao, prioridade=50, tokens=(), achados=(), padrao=None):
+        if nome in self.intencoes:
+            raise ValueError(f"intenção repetida: {nome}")
+        if isinstance(padrao, str):
+            padrao = re.compile(padrao)
+        intencao = Intencao(nome, funcao, (prioridade, len(self.intencoes)), padrao,
+                            f"resposta.{nome}", f"intencoes.{nome}")
+        self.intencoes[nome] = intencao
+        for token in tokens:
+            self._por_token.setdefault(normalizar_chave(token), []).append(intencao)
+        for achado in achados:
+            self._por_achado.setdefault(achado, []).append(intencao)
+        if not tokens and not achados:
+            self._sempre.append(intencao)
+            self._sempre.sort(key=lambda candidata: candidata.ordem)
+        return funcao
+
+    def intencao(self, nome, **opcoes):
+        # Como registrar(), mas para usar como decorador
+        def decorador(funcao):
+            return self.registrar(nome, funcao, **opcoes)
+        return decorador
+
+    def candidatas(self, entrada):
+        turno = preparar(entrada)
+        acionadas = set()
+        for token in turno.tokens:
+            acionadas.update(self._por_token.get(token, ()))
+        for achado in turno.achados:
+            acionadas.update(self._por_achado.get(achado.categoria, ()))
+            acionadas.update(self._por_achado.get((achado.categoria, achado.rotulo), ()))
+        if not acionadas:
+            return self._sempre
+        return sorted(acionadas.union(self._sempre), key=lambda candidata: candidata.ordem)
+
+    def despachar(self, entrada, contexto):
+        turno = preparar(entrada)
+        for intencao in self.candidatas(turno):
+            if intencao.padrao is not None and intencao.padrao.search(turno.dobrado) is None:
+                continue
+            with etapa(intencao.etapa):
+                resposta = intencao.funcao(turno, contexto)
+            if resposta is not None:
+                contar(intencao.contador)
+                contexto["intencao"] = intencao.nome
+                return resposta
+        contexto["intencao"] = None
+        return None
+
+
+def ler_aprendizado(texto):
+    # (pergunta, resposta) do que vem depois de "aprenda:", ou None se faltar
+    # o separador ou um dos lados
+    for separador in SEPARADORES_APRENDA:
+        if separador in texto:
+            chave, _, valor = texto.partition(separador)
+            chave = chave.strip()
+            valor = valor.strip()
+            if chave and valor:
+                return chave, valor
+            return None
+    return None
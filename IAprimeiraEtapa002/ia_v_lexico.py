@@ -0,0 +1,162 @@
+import json
+import os
+import unicodedata
+from collections import namedtuple
+
+# Reconhecimento de palavras-chave em uma única passada. Todos os léxicos
+# (modos, preferências, data, temas, saudações, saída, gatilhos do terminal)
+# ficam em lexico.json e são compilados uma vez num autômato Aho-Corasick.
+# Cada achado traz a categoria e o rótulo do léxico de onde veio.
+CAMINHO_LEXICO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "lexico.json")
+
+Achado = namedtuple("Achado", ["categoria", "rotulo", "padrao", "inicio", "fim"])
+
+
+def _tabela_acentos():
+    # Troca cada letra acentuada pela letra base sem mudar o tamanho do texto,
+    # para que as posições dos achados valham também para texto.lower()
+    tabela = {}
+    for codigo in range(0xC0, 0x250):
+        caractere = chr(codigo)
+        base = ''.join(c for c in unicodedata.normalize('NFD', caractere)
+                       if unicodedata.category(c) != 'Mn')
+        if len(base) == 1 and base != caractere:
+            tabela[codigo] = base
+    return tabela
+
+
+TABELA_ACENTOS = _tabela_acentos()
+# A mesma troca no Latin-1, para bytes.translate(): bem mais rápido que
+# str.translate() com um dicionário
+_TABELA_LATIN1 = bytes(ord(TABELA_ACENTOS.get(codigo, chr(codigo))) for codigo in range(256))
+
+
+def dobrar(texto):
+    return dobrar_minusculo(texto.lower())
+
+
+def dobrar_minusculo(minusculo):
+    if minusculo.isascii():
+        return minusculo
+    try:
+        return minusculo.encode("latin-1").translate(_TABELA_LATIN1).decode("latin-1")
+    except UnicodeEncodeError:
+        return minusculo.translate(TABELA_ACENTOS)
+
+
+def _eh_palavra(caractere):
+    return caractere.isalnum() or caractere == "_"
+
+
+class Lexico:
+    def __init__(self, lexicos):
+        # Estado 0 é a raiz; cada estado tem suas transições, o link de falha
+        # e os padrões que terminam nele
+        self.transicoes = [{}]
+        self.falhas = [0]
+        self.saidas = [[]]
+        for categoria, rotulos in lexicos.items():
+            for rotulo, padroes in rotulos.items():
+                for padrao in padroes:
+                    self._inserir(dobrar(padrao), (categoria, rotulo, padrao))
+        self._ligar_falhas()
+
+    def _inserir(self, padrao, informacao):
+        if not padrao:
+            return
+        estado = 0
+        for caractere in padrao:
+            proximo = self.transicoes[estado].get(caractere)
+            if proximo is None:
+                proximo = len(self.transicoes)
+                self.transicoes[estado][caractere] = proximo
+                self.transicoes.append({})
+                self.falhas.append(0)
+                self.saidas.append([])
+            estado = proximo
+        self.saidas[estado].append((len(padrao),) + informacao)
+
+    def _ligar_falhas(self):
+        fila = list(self.transicoes[0].values())
+        posicao = 0
+        while posicao < len(fila):
+            estado = fila[posicao]
+            posicao += 1
+            for caractere, proximo in self.transicoes[estado].items():
+                fila.append(proximo)
+                falha = self.falhas[estado]
+                while falha and caractere not in self.transicoes[falha]:
+                    falha = self.falhas[falha]
+                destino = self.transicoes[falha].get(caractere, 0)
+                self.falhas[proximo] = destino if destino != proximo else 0
+                self.saidas[proximo] = self.saidas[proximo] + self.saidas[self.falhas[proximo]]
+
+    def analisar(self, texto):
+        # As posições se referem a texto.lower()
+        return self.analisar_dobrado(dobrar(texto))
+
+    def analisar_dobrado(self, dobrado):
+        # Para quem já tem o texto dobrado (ia_v_turno)
+        tamanho = len(dobrado)
+        transicoes = self.transicoes
+        falhas = self.falhas
+        saidas = self.saidas
+        achados = []
+        estado = 0
+        for fim, caractere in enumerate(dobrado, 1):
+            while estado and caractere not in transicoes[estado]:
+                estado = falhas[estado]
+            estado = transicoes[estado].get(caractere, 0)
+            if not saidas[estado]:
+                continue
+            # Só conta o padrão se ele começa e termina em limite de palavra
+            if fim < tamanho and _eh_palavra(dobrado[fim]):
+                continue
+            for comprimento, categoria, rotulo, padrao in saidas[estado]:
+                inicio = fim - comprimento
+                if inicio > 0 and _eh_palavra(dobrado[inicio - 1]):
+                    continue
+                achados.append(Achado(categoria, rotulo, padrao, inicio, fim))
+        return _remover_contidos(achados)
+
+
+def _remover_contidos(achados):
+    # Dentro de uma mesma categoria o achado mais longo vence: "não gosto de"
+    # não conta também como "gosto de". Em ordem de início (o mais longo
+    # primeiro), um achado está contido se algum anterior da categoria termina
+    # depois dele, ou no mesmo ponto tendo começado antes; basta guardar, por
+    # categoria, o maior fim visto e onde começou quem chegou a ele
+    if len(achados) < 2:
+        return achados
+    ordem = sorted(range(len(achados)), key=lambda i: (achados[i].inicio, achados[i].inicio - achados[i].fim))
+    maiores = {}
+    contidos = set()
+    for posicao in ordem:
+        achado = achados[posicao]
+        maior = maiores.get(achado.categoria)
+        if maior is not None and (maior[0] > achado.fim or maior[0] == achado.fim and maior[1] < achado.inicio):
+            contidos.add(posicao)
+        elif maior is None or achado.fim > maior[0]:
+            maiores[achado.categoria] = (achado.fim, achado.inicio)
+    return [achado for posicao, achado in enumerate(achados) if posicao not in contidos]
+
+
+def carregar_lexico(caminho=CAMINHO_LEXICO):
+    with open(caminho, "r", encoding="utf-8") as f:
+        return Lexico(json.load(f))
+
+
+LEXICO = carregar_lexico()
+
+
+def analisar(texto):
+    return LEXICO.analisar(texto)
+
+
+def rotulos(achados, categoria):
+    return {achado.rotulo for achado in achados if achado.categoria == categoria}
+
+
+def ultimo(achados, categoria):
+    encontrados = [achado for achado in achados if achado.categoria == categoria]
+    return encontrados[-1] if encontrados else None
@@ -0,0 +1,243 @@
+import argparse
+import re
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+
+# Instrumentação das etapas de um turno. O código marca trechos com
+#
+#   with etapa("resposta.busca"):
+#       ...
+#
+# e conta eventos com contar("buscas"). Desligado (o padrão), etapa() devolve
+# sempre o mesmo contexto vazio e contar() retorna na primeira linha, então o
+# custo é o de uma chamada. Ligado, cada etapa vira um histograma de
+# latência e cada contador um total, tudo em memória no REGISTRO.
+#
+#   python ia_v_emocional.py --profile
+#   python ia_v_emocional.py --profile --pstats perfil.pstats --prometheus metricas.prom
+
+# Limites dos baldes do histograma, em microssegundos (1-2-5 por década)
+LIMITES_US = [multiplo * 10 ** decada for decada in range(7) for multiplo in (1, 2, 5)]
+LINHAS_PSTATS = 15
+PREFIXO_PROMETHEUS = "ia_v"
+_NULO = nullcontext()
+_INVALIDOS_PROMETHEUS = re.compile(r"[^a-zA-Z0-9_]")
+
+
+class Histograma:
+    def __init__(self):
+        # Um balde a mais para o que passar do último limite
+        self.baldes = [0] * (len(LIMITES_US) + 1)
+        self.total = 0
+        self.soma_us = 0.0
+        self.maximo_us = 0.0
+
+    def registrar(self, duracao_us):
+        self.baldes[bisect_left(LIMITES_US, duracao_us)] += 1
+        self.total += 1
+        self.soma_us += duracao_us
+        if duracao_us > self.maximo_us:
+            self.maximo_us = duracao_us
+
+    def percentil(self, fracao):
+        # Estimado pelo limite do balde onde o percentil cai (nunca acima do máximo)
+        if not self.total:
+            return 0.0
+        alvo = fracao * self.total
+        acumulado = 0
+        for posicao, quantidade in enumerate(self.baldes):
+            acumulado += quantidade
+            if acumulado >= alvo:
+                if posicao < len(LIMITES_US):
+                    return min(LIMITES_US[posicao], self.maximo_us)
+                break
+        return self.maximo_us
+
+    def media(self):
+        return self.soma_us / self.total if self.total else 0.0
+
+
+class _Cronometro:
+    __slots__ = ("registro", "nome", "inicio")
+
+    def __init__(self, registro, nome):
+        self.registro = registro
+        self.nome = nome
+
+    def __enter__(self):
+        self.inicio = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, tipo, valor, rastro):
+        self.registro.registrar(self.nome, (time.perf_counter_ns() - self.inicio) / 1000)
+        return False
+
+
+class Registro:
+    def __init__(self):
+        self.ativo = False
+        self.histogramas = {}
+        self.contadores = {}
+        # A gravação em segundo plano também registra, de outra thread
+        self._trava = threading.Lock()
+
+    def ligar(self):
+        self.ativo = True
+
+    def desligar(self):
+        self.ativo = False
+
+    def limpar(self):
+        with self._trava:
+            self.histogramas.clear()
+            self.contadores.clear()
+
+    def etapa(self, nome):
+        if not self.ativo:
+            return _NULO
+        return _Cronometro(self, nome)
+
+    def registrar(self, nome, duracao_us):
+        with self._trava:
+            histograma = self.histogramas.get(nome)
+            if histograma is None:
+                histograma = self.histogramas[nome] = Histograma()
+            histograma.registrar(duracao_us)
+
+    def contar(self, nome, quantidade=1):
+        if not self.ativo:
+            return
+        with self._trava:
+            self.contadores[nome] = self.contadores.get(nome, 0) + quantidade
+
+    def relatorio(self):
+        linhas = []
+        if self.histogramas:
+            largura = max(len(nome) for nome in self.histogramas)
+            linhas.append(f"{'etapa':<{largura}} {'n':>8} {'média':>10} {'p50':>10} "
+                          f"{'p90':>10} {'p99':>10} {'máx':>10}  (µs)")
+            for nome, histograma in sorted(self.histogramas.items()):
+                linhas.append(
+                    f"{nome:<{largura}} {histograma.total:>8} {histograma.media():>10.1f} "
+                    f"{histograma.percentil(0.5):>10.0f} {histograma.percentil(0.9):>10.0f} "
+                    f"{histograma.percentil(0.99):>10.0f} {histograma.maximo_us:>10.0f}"
+                )
+            for nome, histograma in sorted(self.histogramas.items()):
+                linhas.append("")
+                linhas.append(nome)
+                linhas.extend(_barras(histograma))
+        if self.contadores:
+            linhas.append("")
+            largura = max(len(nome) for nome in self.contadores)
+            for nome, valor in sorted(self.contadores.items()):
+                linhas.append(f"{nome:<{largura}} {valor:>12}")
+        return "\n".join(linhas)
+
+    def prometheus(self):
+        # Formato de texto do Prometheus: um histograma com a etapa como rótulo
+        # (em segundos, como manda a convenção) e um contador por nome
+        nome_histograma = f"{PREFIXO_PROMETHEUS}_etapa_segundos"
+        linhas = []
+        with self._trava:
+            histogramas = sorted(self.histogramas.items())
+            contadores = sorted(self.contadores.items())
+        if histogramas:
+            linhas.append(f"# HELP {nome_histograma} Duração de cada etapa do turno.")
+            linhas.append(f"# TYPE {nome_histograma} histogram")
+        for nome, histograma in histogramas:
+            rotulo = f'etapa="{nome}"'
+            acumulado = 0
+            for limite, quantidade in zip(LIMITES_US, histograma.baldes):
+                acumulado += quantidade
+                linhas.append(f'{nome_histograma}_bucket{{{rotulo},le="{limite / 1e6:g}"}} {acumulado}')
+            linhas.append(f'{nome_histograma}_bucket{{{rotulo},le="+Inf"}} {histograma.total}')
+            linhas.append(f"{nome_histograma}_sum{{{rotulo}}} {histograma.soma_us / 1e6:.9f}")
+            linhas.append(f"{nome_histograma}_count{{{rotulo}}} {histograma.total}")
+        for nome, valor in contadores:
+            metrica = f"{PREFIXO_PROMETHEUS}_{_INVALIDOS_PROMETHEUS.sub('_', nome)}_total"
+            linhas.append(f"# TYPE {metrica} counter")
+            linhas.append(f"{metrica} {valor}")
+        return "\n".join(linhas) + "\n"
+
+    def exportar_prometheus(self, caminho):
+        # Importado aqui porque ia_v_persistencia também usa este módulo
+        from ia_v_persistencia import gravar_atomico
+        gravar_atomico(caminho, self.prometheus())
+
+
+def _barras(histograma, largura=40):
+    # Só os baldes entre o primeiro e o último que receberam algo
+    usados = [posicao for posicao, quantidade in enumerate(histograma.baldes) if quantidade]
+    if not usados:
+        return []
+    maior = max(histograma.baldes)
+    linhas = []
+    for posicao in range(usados[0], usados[-1] + 1):
+        quantidade = histograma.baldes[posicao]
+        if posicao < len(LIMITES_US):
+            limite = f"<= {LIMITES_US[posicao]:g}"
+        else:
+            limite = f"> {LIMITES_US[-1]:g}"
+        barra = "#" * max(1 if quantidade else 0, round(largura * quantidade / maior))
+        linhas.append(f"  {limite:>12} µs {quantidade:>8} {barra}")
+    return linhas
+
+
+REGISTRO = Registro()
+etapa = REGISTRO.etapa
+contar = REGISTRO.contar
+
+
+def adicionar_argumentos(parser):
+    parser.add_argument("--profile", action="store_true",
+                        help="mede cada etapa e mostra os histogramas de latência na saída")
+    parser.add_argument("--pstats", metavar="ARQUIVO",
+                        help="roda sob o cProfile e grava as estatísticas (pstats) no arquivo")
+    parser.add_argument("--prometheus", metavar="ARQUIVO",
+                        help="grava as métricas na saída em formato de texto do Prometheus")
+
+
+@contextmanager
+def perfil(args, saida=None):
+    # Liga o registro conforme os argumentos de adicionar_argumentos e, na
+    # saída (inclusive por erro ou Ctrl+C), mostra e grava os resultados
+    if saida is None:
+        saida = sys.stderr
+    if not (args.profile or args.pstats or args.prometheus):
+        yield
+        return
+    REGISTRO.ligar()
+    perfilador = None
+    if args.pstats:
+        import cProfile
+        perfilador = cProfile.Profile()
+        perfilador.enable()
+    try:
+        yield
+    finally:
+        if perfilador is not None:
+            perfilador.disable()
+            perfilador.dump_stats(args.pstats)
+        # Grava o que ainda está pendente para que a gravação entre nas métricas
+        from ia_v_persistencia import GRAVADOR
+        GRAVADOR.descarregar()
+        if args.profile:
+            print(REGISTRO.relatorio(), file=saida)
+            if perfilador is not None:
+                import pstats
+                print("", file=saida)
+                pstats.Stats(perfilador, stream=saida).sort_stats("cumulative").print_stats(LINHAS_PSTATS)
+        if args.prometheus:
+            REGISTRO.exportar_prometheus(args.prometheus)
+
+
+def executar_com_perfil(funcao, argumentos=None):
+    # Ponto de entrada das conversas no terminal: aceita só as opções de perfil
+    parser = argparse.ArgumentParser(description="Conversa com a V no terminal.")
+    adicionar_argumentos(parser)
+    args = parser.parse_args(argumentos)
+    with perfil(args):
+        funcao()
@@ -0,0 +1,239 @@
+import atexit
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from collections import deque
+from ia_v_metricas import contar, etapa
+
+# Gravação em segundo plano. Quem altera a memória ou os aprendizados só marca
+# o arquivo como sujo; uma thread grava depois, juntando várias alterações
+# numa gravação só, feita INTERVALO_GRAVACAO segundos depois da primeira
+# alteração (ou antes, se juntar MAXIMO_ALTERACOES). Cada arquivo é gravado no
+# máximo uma vez a cada INTERVALO_MINIMO segundos, por mais rápido que seja o
+# bate-papo, e sempre por arquivo temporário + fsync + rename, então um arquivo
+# nunca fica pela metade.
+# Tudo que está pendente é gravado na saída do programa e em SIGTERM/SIGHUP.
+INTERVALO_GRAVACAO = 2.0
+INTERVALO_MINIMO = 1.0
+MAXIMO_ALTERACOES = 100
+TENTATIVAS_SERIALIZAR = 5
+
+
+def gravar_atomico(caminho, texto):
+    diretorio = os.path.dirname(os.path.abspath(caminho))
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        f.write(texto)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporario, caminho)
+    # Garante que o rename também chegou ao disco
+    if hasattr(os, "O_DIRECTORY"):
+        descritor = os.open(diretorio, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(descritor)
+        finally:
+            os.close(descritor)
+
+
+def serializar(fonte, indent=None):
+    # A fonte pode ser o próprio dicionário ou uma função que o devolve. Se
+    # outra thread alterar o dicionário no meio, tenta de novo.
+    for tentativa in range(TENTATIVAS_SERIALIZAR):
+        try:
+            dados = fonte() if callable(fonte) else fonte
+            return json.dumps(dados, ensure_ascii=False, indent=indent)
+        except RuntimeError:
+            time.sleep(0.001 * (tentativa + 1))
+    return None
+
+
+class GravadorAtrasado:
+    def __init__(self, intervalo=INTERVALO_GRAVACAO, intervalo_minimo=INTERVALO_MINIMO,
+                 maximo_alteracoes=MAXIMO_ALTERACOES):
+        self.intervalo = intervalo
+        self.intervalo_minimo = intervalo_minimo
+        self.maximo_alteracoes = maximo_alteracoes
+        # Reentrantes porque o tratador de sinal pode descarregar no meio de
+        # um marcar() da thread principal. Quem segura _gravando nunca espera
+        # por _condicao: o tratador pode estar com _condicao, esperando a
+        # gravação da thread terminar
+        self._condicao = threading.Condition(threading.RLock())
+        # Só uma gravação por vez, seja da thread ou de descarregar()
+        self._gravando = threading.RLock()
+        # caminho -> [fonte, indent]; a ordem é a da última marcação, então o
+        # que foi marcado por último (o índice depois dos aprendizados) é
+        # gravado por último
+        self._sujos = {}
+        self._alteracoes = 0
+        self._desde = None
+        self._ultima_rodada = float("-inf")
+        self._tarefas = deque()
+        self._thread = None
+        self._sinais_instalados = False
+        self._parar = False
+        self.gravacoes = 0
+        self.bytes_gravados = 0
+        self.falhas = 0
+
+    def marcar(self, caminho, fonte, indent=None):
+        with self._condicao:
+            self._sujos.pop(caminho, None)
+            self._sujos[caminho] = [fonte, indent]
+            self._alteracoes += 1
+            if self._desde is None:
+                self._desde = time.monotonic()
+            contar("marcacoes")
+            parado = self._parar
+            self._iniciar()
+            if self._alteracoes == 1 or self._alteracoes >= self.maximo_alteracoes:
+                self._condicao.notify()
+        if parado:
+            # Depois de fechar() não há mais thread: grava na hora
+            self.descarregar()
+
+    def executar(self, funcao, *argumentos):
+        # Tarefas avulsas (como anexar ao diário) rodam na mesma thread, na ordem
+        with self._condicao:
+            self._tarefas.append((funcao, argumentos))
+            parado = self._parar
+            self._iniciar()
+            self._condicao.notify()
+        if parado:
+            self.descarregar()
+
+    def pendentes(self):
+        with self._condicao:
+            return len(self._sujos) + len(self._tarefas)
+
+    def _iniciar(self):
+        if not self._sinais_instalados:
+            self._instalar_sinais()
+        if self._thread is not None or self._parar:
+            return
+        self._thread = threading.Thread(target=self._laco, name="ia_v_gravador", daemon=True)
+        self._thread.start()
+        atexit.register(self.fechar)
+
+    def _instalar_sinais(self):
+        # Só a thread principal pode instalar tratadores; se a primeira
+        # marcação vier de outra thread, tenta de novo na próxima
+        if threading.current_thread() is not threading.main_thread():
+            return
+        self._sinais_instalados = True
+        for nome in ("SIGTERM", "SIGHUP"):
+            sinal = getattr(signal, nome, None)
+            # Não toma o lugar de um tratador que outra parte do programa instalou
+            if sinal is None or signal.getsignal(sinal) is not signal.SIG_DFL:
+                continue
+            signal.signal(sinal, self._ao_receber_sinal)
+
+    def _ao_receber_sinal(self, sinal, quadro):
+        # Não espera a thread (fechar() faz join): ela pode precisar de um
+        # lock que o código interrompido pelo sinal está segurando. Só pede
+        # para ela parar e grava o que está pendente aqui mesmo
+        with self._condicao:
+            self._parar = True
+            self._condicao.notify()
+        self.descarregar()
+        signal.signal(sinal, signal.SIG_DFL)
+        os.kill(os.getpid(), sinal)
+
+    def _espera(self, agora):
+        # Quanto falta para a próxima rodada de gravação (None: nada pendente).
+        # Todos os arquivos sujos são gravados juntos, no máximo uma rodada a
+        # cada intervalo_minimo.
+        if not self._sujos:
+            return None
+        if self._alteracoes >= self.maximo_alteracoes:
+            vence = agora
+        else:
+            vence = self._desde + self.intervalo
+        return max(0.0, max(vence, self._ultima_rodada + self.intervalo_minimo) - agora)
+
+    def _retirar(self):
+        itens = list(self._sujos.items())
+        self._sujos.clear()
+        self._alteracoes = 0
+        self._desde = None
+        return itens
+
+    def _laco(self):
+        while True:
+            with self._condicao:
+                while True:
+                    if self._parar:
+                        return
+                    tarefas = list(self._tarefas)
+                    self._tarefas.clear()
+                    espera = self._espera(time.monotonic())
+                    if tarefas or espera == 0.0:
+                        break
+                    self._condicao.wait(espera)
+                itens = self._retirar() if espera == 0.0 else []
+            self._processar(tarefas, itens)
+
+    def _processar(self, tarefas, itens):
+        falhas = []
+        with self._gravando:
+            for funcao, argumentos in tarefas:
+                try:
+                    with etapa("gravador.tarefa"):
+                        funcao(*argumentos)
+                except Exception as erro:
+                    self.falhas += 1
+                    contar("falhas_gravacao")
+                    print(f"Aviso: tarefa de gravação falhou: {erro}", file=sys.stderr)
+            for caminho, (fonte, indent) in itens:
+                try:
+                    with etapa("gravador.arquivo"):
+                        texto = serializar(fonte, indent)
+                        if texto is None:
+                            raise RuntimeError("os dados mudaram durante todas as tentativas")
+                        gravar_atomico(caminho, texto)
+                except (OSError, RuntimeError) as erro:
+                    self.falhas += 1
+                    contar("falhas_gravacao")
+                    print(f"Aviso: não consegui gravar {caminho}: {erro}", file=sys.stderr)
+                    falhas.append((caminho, fonte, indent))
+                    continue
+                tamanho = len(texto.encode("utf-8"))
+                self.gravacoes += 1
+                self.bytes_gravados += tamanho
+                contar("gravacoes")
+                contar("bytes_gravados", tamanho)
+        # Já sem _gravando (ver __init__)
+        if itens:
+            with self._condicao:
+                self._ultima_rodada = time.monotonic()
+                # O que falhou volta para a fila, a menos que já tenha sido
+                # marcado de novo
+                for caminho, fonte, indent in falhas:
+                    if caminho not in self._sujos:
+                        self._sujos[caminho] = [fonte, indent]
+                        self._alteracoes += 1
+                        if self._desde is None:
+                            self._desde = time.monotonic()
+
+    def descarregar(self):
+        # Grava agora tudo o que está pendente, sem esperar a política de tempo
+        with self._condicao:
+            tarefas = list(self._tarefas)
+            self._tarefas.clear()
+            itens = self._retirar()
+        self._processar(tarefas, itens)
+
+    def fechar(self):
+        with self._condicao:
+            self._parar = True
+            self._condicao.notify()
+            thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        self.descarregar()
+
+
+GRAVADOR = GravadorAtrasado()
@@ -2,126 +2,211 @@ import json
 import os
 import random
 from datetime import datetime
+from ia_v_armazenamento import TabelaRespostas, banco_configurado
+from ia_v_compartilhado import IndiceCompartilhado
+from ia_v_contexto import ContextoRolante
+from ia_v_fatos import TOKENS_PERGUNTA, fatos_da_base, responder_fato
+from ia_v_intencoes import Roteador, ler_aprendizado
+from ia_v_emocoes import NEUTRA, classificar, normalizar_emocao
+from ia_v_mapeado import TabelaMapeada, base_configurada
+from ia_v_lexico import rotulos
+from ia_v_indice import tabela_respostas, texto_resposta
+from ia_v_metricas import etapa, executar_com_perfil
+from ia_v_personas import escolher_modo, resposta_do_modo
+from ia_v_persistencia import GRAVADOR
+from ia_v_turno import preparar
 
 CAMINHO_MEMORIA = "memoria.json"
 CAMINHO_APRENDIZADOS = "aprendizados.json"
 
-# Modo inicial
-modo_atual = "sério"
-historico_conversa = []
+# Gerador de números aleatórios das respostas; o modo em lote fixa a semente
+aleatorio = random.Random()
+
+# Com IA_V_ARMAZENAMENTO=sqlite tudo fica no banco em vez dos arquivos JSON
+BANCO = banco_configurado()
+# Com IA_V_ARMAZENAMENTO=mapeado as respostas ficam em aprendizados.base
+BASE = base_configurada()
+
+# Tamanho da janela de contexto (em turnos e, opcionalmente, em caracteres)
+JANELA_TURNOS = 5
+JANELA_CARACTERES = None
+
+# Estado de uma conversa: modo atual e últimas trocas. O terminal usa
+# estado_terminal; quem atende várias conversas cria um estado para cada uma
+def novo_estado():
+    return {"modo": "sério", "historico": ContextoRolante(JANELA_TURNOS, JANELA_CARACTERES)}
+
+estado_terminal = novo_estado()
 
 def carregar_memoria():
-    if os.path.exists(CAMINHO_MEMORIA):
+    if BANCO is not None:
+        memoria = BANCO.carregar_memoria()
+        if memoria is not None:
+            return memoria
+    elif os.path.exists(CAMINHO_MEMORIA):
         with open(CAMINHO_MEMORIA, "r", encoding="utf-8") as f:
             return json.load(f)
-    return {"nome_usuario": "", "humor": "neutro"}
+    return {"nome_usuario": "", "humor": NEUTRA}
 
+# As funções salvar_* só marcam o arquivo; a gravação acontece em segundo plano
 def salvar_memoria(memoria):
-    with open(CAMINHO_MEMORIA, "w", encoding="utf-8") as f:
-        json.dump(memoria, f, ensure_ascii=False, indent=4)
+    if BANCO is not None:
+        BANCO.salvar_memoria(memoria, gravador=GRAVADOR)
+        return
+    GRAVADOR.marcar(CAMINHO_MEMORIA, memoria, indent=4)
 
 def carregar_aprendizados():
+    if BANCO is not None:
+        return TabelaRespostas(BANCO)
+    if BASE is not None:
+        return TabelaMapeada(BASE)
     if os.path.exists(CAMINHO_APRENDIZADOS):
         with open(CAMINHO_APRENDIZADOS, "r", encoding="utf-8") as f:
             return json.load(f)
     return {}
 
-def salvar_aprendizados(aprendizados):
-    with open(CAMINHO_APRENDIZADOS, "w", encoding="utf-8") as f:
-        json.dump(aprendizados, f, ensure_ascii=False, indent=4)
-
-def detectar_modo(entrada):
-    global modo_atual
-    entrada_lower = entrada.lower()
-    if any(p in entrada_lower for p in ["sério", "modo sério"]):
-        modo_atual = "sério"
-    elif any(p in entrada_lower for p in ["criativo", "modo criativo"]):
-        modo_atual = "criativo"
+# Os detectores recebem o texto ou o Turno já preparado (ia_v_turno)
+def detectar_modo(entrada, estado=None):
+    if estado is None:
+        estado = estado_terminal
+    modo = escolher_modo(rotulos(preparar(entrada).achados, "modo"))
+    if modo is not None:
+        estado["modo"] = modo
 
 def analisar_humor(entrada):
-    positivo = ["feliz", "ótimo", "bom", "maravilhoso"]
-    negativo = ["triste", "mal", "péssimo", "horrível"]
-    if any(p in entrada.lower() for p in positivo):
-        return "feliz"
-    elif any(p in entrada.lower() for p in negativo):
-        return "triste"
-    return "neutro"
-
-def atualizar_historico(pergunta, resposta):
-    historico_conversa.append((pergunta, resposta))
-    if len(historico_conversa) > 5:
-        historico_conversa.pop(0)
-
-def montar_contexto():
-    contexto = ""
-    for pergunta, resposta in historico_conversa:
-        contexto += f"Você: {pergunta}\nV: {resposta}\n"
-    return contexto
-
-def gerar_resposta(entrada, memoria):
-    global modo_atual
-    nome = memoria.get("nome_usuario", "usuário")
-    humor = memoria.get("humor", "neutro")
-    contexto = montar_contexto()
-
-    # Comando especial de aprendizado
-    if entrada.lower().startswith("aprenda"):
-        partes = entrada.split(":", 1)
-        if len(partes) == 2:
-            chave_valor = partes[1].split("=")
-            if len(chave_valor) == 2:
-                chave = chave_valor[0].strip()
-                valor = chave_valor[1].strip()
-                aprendizados[chave] = valor
-                salvar_aprendizados(aprendizados)
-                resposta = f"Aprendi que '{chave}' significa '{valor}'. Obrigada por me ensinar, {nome}!"
-                atualizar_historico(entrada, resposta)
-                return resposta
-            return "Formato inválido. Use: aprenda: chave = valor"
-        return "Quer me ensinar algo? Use: aprenda: chave = valor"
-
-    # Respostas aprendidas
-    if entrada in aprendizados:
-        resposta = aprendizados[entrada]
-        atualizar_historico(entrada, resposta)
-        return resposta
-
-    # Detectar mudança de modo
-    detectar_modo(entrada)
-
-    # Resposta com base no modo
-    if modo_atual == "criativo":
-        respostas = [
-            f"Ah, isso me lembra de quando eu era uma assassina cibernética... Bons tempos, né, {nome}?",
-            f"Você já pensou que talvez o tempo não exista? De qualquer forma, {entrada} é bem curioso!",
-            f"Haha, adorei isso! Me conta mais, {nome}!",
-            f"Ok... isso foi aleatório, mas eu curto. Manda mais!"
-        ]
-    else:  # modo sério
-        respostas = [
-            f"Entendi. Você mencionou: '{entrada}'. Pode me explicar melhor?",
-            f"Certo, {nome}. Me fale mais sobre isso.",
-            f"Estou registrando isso. É importante para você?",
-            f"Interessante... vamos aprofundar nessa ideia."
-        ]
-
-    # Respostas automáticas para perguntas conhecidas
-    if "que dia é hoje" in entrada.lower():
+    return classificar(entrada)
+
+def atualizar_historico(pergunta, resposta, estado=None, emocao=None):
+    if estado is None:
+        estado = estado_terminal
+    estado["historico"].adicionar(pergunta, resposta, emocao)
+
+def montar_contexto(estado=None):
+    if estado is None:
+        estado = estado_terminal
+    return estado["historico"].renderizar()
+
+def aprender(entrada, nome, indice, estado=None):
+    # Trata "aprenda: chave = valor" (ou "chave | valor"). Devolve a resposta
+    # da V (None se a entrada não é esse comando) e se algo novo foi aprendido
+    turno = preparar(entrada)
+    if not turno.minusculo.startswith("aprenda"):
+        return None, False
+    partes = turno.texto.split(":", 1)
+    if len(partes) == 2:
+        par = ler_aprendizado(partes[1])
+        if par is not None:
+            chave, valor = par
+            indice.adicionar(chave, valor)
+            resposta = f"Aprendi que '{chave}' significa '{valor}'. Obrigada por me ensinar, {nome}!"
+            atualizar_historico(turno.texto, resposta, estado)
+            return resposta, True
+        return "Formato inválido. Use: aprenda: chave = valor", False
+    return "Quer me ensinar algo? Use: aprenda: chave = valor", False
+
+# As intenções de um turno, em ordem de prioridade (ia_v_intencoes). Cada uma
+# recebe o Turno e o contexto montado por gerar_resposta; None passa a vez.
+ROTEADOR = Roteador()
+
+# Comando especial de aprendizado
+@ROTEADOR.intencao("aprender", prioridade=0, tokens=["aprenda"], padrao=r"^aprenda")
+def intencao_aprender(turno, contexto):
+    resposta, contexto["aprendeu"] = aprender(turno, contexto["nome"], contexto["indice"], contexto["estado"])
+    if contexto["aprendeu"]:
+        contexto["indice"].salvar()
+    return resposta
+
+# "qual é/o que é X" com um fato sobre X. Uma resposta ensinada para essa
+# mesma pergunta vem antes do fato (quem responde é a busca); o fato vem antes
+# das respostas aproximadas
+@ROTEADOR.intencao("fatos", prioridade=20, tokens=TOKENS_PERGUNTA)
+def intencao_fatos(turno, contexto):
+    if contexto["indice"].buscar(turno) is not None:
+        return None
+    return responder_fato(turno, fatos_da_base(contexto["aprendizados"], BANCO))
+
+# Respostas aprendidas
+@ROTEADOR.intencao("busca", prioridade=40)
+def intencao_busca(turno, contexto):
+    aprendida = contexto["indice"].buscar_resposta(turno)
+    if aprendida is None:
+        return None
+    return texto_resposta(aprendida)[0]
+
+# Detectar mudança de modo; não responde, só muda o modo antes da resposta
+@ROTEADOR.intencao("modo", prioridade=45, achados=["modo"])
+def intencao_modo(turno, contexto):
+    detectar_modo(turno, contexto["estado"])
+    return None
+
+# Respostas automáticas para perguntas conhecidas
+@ROTEADOR.intencao("data", prioridade=50, achados=["pergunta"])
+def intencao_data(turno, contexto):
+    perguntas = rotulos(turno.achados, "pergunta")
+    if "que_dia_e_hoje" in perguntas:
         data = datetime.now().strftime("%d/%m/%Y")
-        resposta = f"Hoje é {data}."
-    elif "que horas são" in entrada.lower():
+        return f"Hoje é {data}."
+    if "que_horas_sao" in perguntas:
         hora = datetime.now().strftime("%H:%M")
-        resposta = f"Agora são {hora}."
-    else:
-        resposta = random.choice(respostas)
-
-    atualizar_historico(entrada, resposta)
+        return f"Agora são {hora}."
+    return None
+
+# Resposta com base no modo; as listas ficam em personas.json
+@ROTEADOR.intencao("modo_padrao", prioridade=100)
+def intencao_modo_padrao(turno, contexto):
+    return resposta_do_modo(contexto["estado"]["modo"], aleatorio, nome=contexto["nome"], entrada=turno.texto)
+
+def gerar_resposta(entrada, aprendizados, memoria, indice, estado=None, contexto=None):
+    # Em contexto (se passado) ficam a intenção que respondeu e se algo foi aprendido
+    if estado is None:
+        estado = estado_terminal
+    turno = preparar(entrada)
+    if contexto is None:
+        contexto = {}
+    # Memórias antigas guardam "neutro"
+    humor = normalizar_emocao(memoria.get("humor")) or NEUTRA
+    contexto.update(aprendizados=aprendizados, memoria=memoria, indice=indice, estado=estado,
+                    nome=memoria.get("nome_usuario", "usuário"), aprendeu=False)
+    resposta = ROTEADOR.despachar(turno, contexto)
+
+    # O aprender já registra a própria troca no histórico
+    if contexto["intencao"] != "aprender":
+        with etapa("resposta.contexto"):
+            atualizar_historico(turno.texto, resposta, estado, humor)
     return resposta
 
+def criar_motor(aprendizados, memoria, indice, estado=None):
+    # Processa um turno sem terminal. Cada motor tem seu próprio estado de
+    # conversa (qualquer objeto com "modo" e "historico", como uma Sessao) e
+    # usa os aprendizados e o índice recebidos aqui. A intenção que respondeu
+    # o último turno fica em responder.intencao
+    if estado is None:
+        estado = novo_estado()
+
+    def responder(entrada):
+        turno = preparar(entrada)
+        memoria["humor"] = analisar_humor(turno)
+        contexto = {}
+        resposta = gerar_resposta(turno, aprendizados, memoria, indice, estado, contexto)
+        responder.intencao = contexto["intencao"]
+        return resposta, contexto["aprendeu"]
+    responder.estado = estado
+    responder.intencao = None
+    return responder
+
+def carregar_base():
+    # Aprendizados e índice. A conversa só chama isto na primeira mensagem, então
+    # a saudação não espera pelo tamanho da base
+    aprendizados = carregar_aprendizados()
+    if BANCO is not None:
+        return aprendizados, BANCO.indice()
+    if BASE is not None:
+        return aprendizados, BASE.indice()
+    return aprendizados, IndiceCompartilhado(tabela_respostas(aprendizados), CAMINHO_APRENDIZADOS, GRAVADOR, aprendizados)
+
 def iniciar_conversa():
-    global aprendizados
     memoria = carregar_memoria()
-    aprendizados = carregar_aprendizados()
+    aprendizados = indice = None
 
     if not memoria.get("nome_usuario"):
         nome = input("Olá! Qual é o seu nome? ")
@@ -134,17 +219,25 @@ def iniciar_conversa():
 
     while True:
         entrada = input("Você: ").strip()
-        if entrada.lower() in ["tchau", "sair", "adeus"]:
+        turno = preparar(entrada)
+        if turno.minusculo in ["tchau", "sair", "adeus"]:
             print(f"V: Até mais, {nome}! Foi bom conversar com você.")
             break
 
-        # Analisar e atualizar humor
-        humor_detectado = analisar_humor(entrada)
-        memoria["humor"] = humor_detectado
-        salvar_memoria(memoria)
+        if indice is None:
+            with etapa("conversa.carregar_base"):
+                aprendizados, indice = carregar_base()
 
-        resposta = gerar_resposta(entrada, memoria)
+        # Analisar e atualizar humor
+        with etapa("conversa.analise"):
+            humor_detectado = analisar_humor(turno)
+            memoria["humor"] = humor_detectado
+        with etapa("conversa.salvar"):
+            salvar_memoria(memoria)
+
+        with etapa("conversa.resposta"):
+            resposta = gerar_resposta(turno, aprendizados, memoria, indice)
         print("V:", resposta)
 
 if __name__ == "__main__":
-    iniciar_conversa()
+    executar_com_perfil(iniciar_conversa)
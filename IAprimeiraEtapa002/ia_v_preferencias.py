@@ -0,0 +1,110 @@
+from bisect import bisect_left
+
+from ia_v_lexico import rotulos
+from ia_v_turno import normalizar_chave, preparar
+
+# Preferências do usuário com polaridade. Continuam sendo uma lista de textos
+# ("pizza", "não futebol") porque é isso que vai para o JSON, para as sessões e
+# para o banco, mas a lista carrega junto conjuntos indexados pelo item
+# normalizado e a contagem de itens por tema. Os temas saem da categoria
+# "tema" de lexico.json (palavra-chave -> tema, compilada junto com os outros
+# léxicos), então "gosto de assistir futebol" conta para o tema "futebol".
+#
+# Cada item guarda o número de ordem em que entrou; como a lista segue essa
+# ordem, remover() acha a posição por busca binária nos números ainda
+# presentes, sem comparar textos um a um.
+#
+# A lista só deve ser alterada por adicionar()/remover(); quem a substitui
+# por uma lista comum faz o índice ser remontado no próximo uso.
+PREFIXO_NEGATIVA = "não "
+
+
+def separar_polaridade(texto):
+    # "não futebol" -> ("futebol", False); "pizza" -> ("pizza", True)
+    partes = str(texto).split(None, 1)
+    if len(partes) == 2 and normalizar_chave(partes[0]) == "nao":
+        return partes[1], False
+    return str(texto).strip(), True
+
+
+def temas_do_texto(texto):
+    return rotulos(preparar(texto).achados, "tema")
+
+
+class Preferencias(list):
+    def __init__(self, itens=()):
+        super().__init__()
+        # normalizado -> (texto guardado na lista, temas do item, número de ordem)
+        self.positivas = {}
+        self.negativas = {}
+        # tema -> quantos itens daquela polaridade caem nele
+        self.temas = {}
+        self.temas_negativos = {}
+        # Números de ordem dos itens da lista, na mesma ordem (crescente)
+        self.ordem = []
+        self.proximo = 0
+        for texto in itens:
+            item, positiva = separar_polaridade(texto)
+            self.adicionar(item, positiva)
+
+    def _conjuntos(self, positiva):
+        if positiva:
+            return self.positivas, self.temas
+        return self.negativas, self.temas_negativos
+
+    def adicionar(self, item, positiva=True, temas=None):
+        # Devolve True se algo mudou. Um item com a polaridade oposta é trocado.
+        normalizado = normalizar_chave(item)
+        if not normalizado:
+            return False
+        itens, _ = self._conjuntos(positiva)
+        if normalizado in itens:
+            return False
+        self.remover(item, not positiva)
+        if temas is None:
+            temas = temas_do_texto(item)
+        texto = item if positiva else PREFIXO_NEGATIVA + item
+        itens[normalizado] = (texto, frozenset(temas), self.proximo)
+        self.ordem.append(self.proximo)
+        self.proximo += 1
+        _, contagem = self._conjuntos(positiva)
+        for tema in temas:
+            contagem[tema] = contagem.get(tema, 0) + 1
+        self.append(texto)
+        return True
+
+    def remover(self, item, positiva=True):
+        itens, contagem = self._conjuntos(positiva)
+        guardado = itens.pop(normalizar_chave(item), None)
+        if guardado is None:
+            return False
+        _, temas, numero = guardado
+        for tema in temas:
+            contagem[tema] -= 1
+            if not contagem[tema]:
+                del contagem[tema]
+        posicao = bisect_left(self.ordem, numero)
+        del self.ordem[posicao]
+        del self[posicao]
+        return True
+
+    def gosta(self, item):
+        return normalizar_chave(item) in self.positivas
+
+    def nao_gosta(self, item):
+        return normalizar_chave(item) in self.negativas
+
+    def gosta_do_tema(self, tema):
+        return tema in self.temas
+
+    def temas_gostados(self):
+        return self.temas.keys()
+
+
+def preferencias_da_memoria(memoria):
+    # Troca a lista da memória (ou da sessão) por uma Preferencias na primeira vez
+    prefs = memoria.get("preferencias")
+    if not isinstance(prefs, Preferencias):
+        prefs = Preferencias(prefs or [])
+        memoria["preferencias"] = prefs
+    return prefs
@@ -0,0 +1,408 @@
+import argparse
+import json
+import lzma
+import os
+import sys
+import zlib
+from bisect import bisect_left, bisect_right
+from collections import Counter, namedtuple
+from datetime import datetime, timedelta
+from ia_v_persistencia import gravar_atomico
+from ia_v_turno import normalizar_chave
+
+# Retenção do histórico. O diário (ia_v_diario) e a tabela historico do banco
+# só crescem; a manutenção "arquivar" (ia_v_manutencao) aplica uma Politica e
+# tira do histórico quente os turnos mais antigos, que vêm para o arquivo.
+#
+# O arquivo é uma pasta com segmentos comprimidos (arquivo-000001.dat) e um
+# índice (indice.jsonl). Os turnos de cada dia viram um bloco comprimido à
+# parte, gravado em colunas: todas as datas, todas as perguntas, todas as
+# respostas... As respostas repetem as mesmas decorações da persona (" Estou
+# aqui para ajudar!"), e lado a lado a repetição cai dentro da janela do
+# compressor (lzma, ou os 32 KB do zlib). Cada linha do índice descreve um
+# bloco: dia, segmento, posição, tamanho, formato e o resumo do dia (turnos,
+# primeiro e último horário, emoções, perguntas mais frequentes). O resumo e a
+# escolha dos blocos de um período só leem o índice; só os blocos dos dias
+# pedidos são descomprimidos.
+#
+#   python ia_v_retencao.py resumo --de 2026-01-01 --ate 2026-01-31
+#   python ia_v_retencao.py consultar --de 2026-01-01 --ate 2026-01-07
+CAMINHO_ARQUIVO = "historico-arquivo"
+ARQUIVO_INDICE = "indice.jsonl"
+# Existe enquanto um arquivamento não terminou (ver gravar)
+ARQUIVO_PENDENTE = "pendente.json"
+PREFIXO_SEGMENTO = "arquivo-"
+SUFIXO_SEGMENTO = ".dat"
+TAMANHO_MAXIMO_SEGMENTO = 16 * 1024 * 1024
+FORMATOS = ("lzma", "zlib")
+PERGUNTAS_NO_RESUMO = 5
+# Turnos sem data ficam no dia do turno anterior; os primeiros, neste
+SEM_DATA = "0000-00-00"
+# Ordem das colunas no bloco; outras chaves vêm depois, em ordem alfabética
+COLUNAS = ("data", "usuario", "emocao", "pergunta", "resposta")
+
+# O que fica no histórico quente: no máximo `turnos` turnos, nenhum com mais
+# de `dias` dias e no máximo `bytes` bytes. None é sem limite.
+Politica = namedtuple("Politica", ["turnos", "dias", "bytes"], defaults=(None, None, None))
+
+
+def ler_data(texto):
+    # A data de um turno como datetime local sem fuso, ou None
+    if not isinstance(texto, str):
+        return None
+    try:
+        data = datetime.fromisoformat(texto)
+    except ValueError:
+        return None
+    if data.tzinfo is not None:
+        data = data.astimezone().replace(tzinfo=None)
+    return data
+
+
+def intervalo_datas(de=None, ate=None):
+    # (início, fim) para filtrar por --de/--ate: fim é exclusivo, e um --ate
+    # só com o dia (AAAA-MM-DD) inclui o dia inteiro. None é sem limite
+    inicio = fim = None
+    if de:
+        inicio = ler_data(de)
+        if inicio is None:
+            raise ValueError(f"data inválida: {de}")
+    if ate:
+        fim = ler_data(ate)
+        if fim is None:
+            raise ValueError(f"data inválida: {ate}")
+        fim += timedelta(days=1) if len(ate.strip()) == 10 else timedelta(microseconds=1)
+    return inicio, fim
+
+
+def quantos_arquivar(tamanhos, datas, politica, agora=None):
+    # Quantos dos turnos mais antigos saem do histórico quente. tamanhos: os
+    # bytes de cada turno, do mais antigo ao mais novo; datas: as datas dos
+    # mesmos turnos, percorridas só com limite de dias e só até o primeiro
+    # turno dentro do limite
+    total = len(tamanhos)
+    quantidade = 0
+    if politica.turnos is not None:
+        quantidade = max(quantidade, total - politica.turnos)
+    if politica.bytes is not None:
+        sobra = sum(tamanhos)
+        corte = 0
+        while corte < total and sobra > politica.bytes:
+            sobra -= tamanhos[corte]
+            corte += 1
+        quantidade = max(quantidade, corte)
+    if politica.dias is not None:
+        limite = (agora or datetime.now()) - timedelta(days=politica.dias)
+        corte = 0
+        for data in datas:
+            data = ler_data(data)
+            if data is not None and data >= limite:
+                break
+            corte += 1
+        quantidade = max(quantidade, corte)
+    return min(quantidade, total)
+
+
+def agrupar_por_dia(registros):
+    # (dia, turnos) para cada sequência de turnos do mesmo dia. Só um dia fica
+    # na memória; se as datas vão e voltam, o dia ganha mais de um bloco
+    dia = SEM_DATA
+    grupo = []
+    for registro in registros:
+        data = ler_data(registro.get("data"))
+        if data is not None and data.date().isoformat() != dia:
+            if grupo:
+                yield dia, grupo
+            dia = data.date().isoformat()
+            grupo = []
+        grupo.append(registro)
+    if grupo:
+        yield dia, grupo
+
+
+def em_colunas(registros):
+    colunas = {}
+    ausentes = {}
+    extras = sorted({chave for registro in registros for chave in registro} - set(COLUNAS))
+    for chave in list(COLUNAS) + extras:
+        valores = []
+        faltando = []
+        for posicao, registro in enumerate(registros):
+            if chave in registro:
+                valores.append(registro[chave])
+            else:
+                faltando.append(posicao)
+        if not valores:
+            continue
+        colunas[chave] = valores
+        if faltando:
+            ausentes[chave] = faltando
+    return {"turnos": len(registros), "colunas": colunas, "ausentes": ausentes}
+
+
+def de_colunas(bloco):
+    registros = [{} for _ in range(bloco["turnos"])]
+    for chave, valores in bloco["colunas"].items():
+        faltando = set(bloco["ausentes"].get(chave, ()))
+        valores = iter(valores)
+        for posicao, registro in enumerate(registros):
+            if posicao not in faltando:
+                registro[chave] = next(valores)
+    return registros
+
+
+def comprimir(dados, formato):
+    if formato == "lzma":
+        return lzma.compress(dados, preset=9)
+    if formato == "zlib":
+        return zlib.compress(dados, 9)
+    raise ValueError(f"formato desconhecido: {formato}")
+
+
+def descomprimir(dados, formato):
+    if formato == "lzma":
+        return lzma.decompress(dados)
+    if formato == "zlib":
+        return zlib.decompress(dados)
+    raise ValueError(f"formato desconhecido: {formato}")
+
+
+def resumir(registros):
+    datas = sorted(registro["data"] for registro in registros if isinstance(registro.get("data"), str))
+    emocoes = Counter(str(registro["emocao"]) for registro in registros if registro.get("emocao"))
+    perguntas = Counter(normalizar_chave(str(registro.get("pergunta", ""))) for registro in registros)
+    perguntas.pop("", None)
+    return {
+        "turnos": len(registros),
+        "primeiro": datas[0] if datas else None,
+        "ultimo": datas[-1] if datas else None,
+        "emocoes": dict(emocoes.most_common()),
+        "perguntas": perguntas.most_common(PERGUNTAS_NO_RESUMO)
+    }
+
+
+def juntar_resumos(resumos):
+    # Um dia arquivado em mais de uma vez tem um bloco por vez. As perguntas
+    # mais frequentes do dia saem das de cada bloco, então são aproximadas
+    primeiros = [resumo["primeiro"] for resumo in resumos if resumo["primeiro"]]
+    ultimos = [resumo["ultimo"] for resumo in resumos if resumo["ultimo"]]
+    emocoes = Counter()
+    perguntas = Counter()
+    for resumo in resumos:
+        emocoes.update(resumo["emocoes"])
+        perguntas.update(dict(resumo["perguntas"]))
+    return {
+        "turnos": sum(resumo["turnos"] for resumo in resumos),
+        "primeiro": min(primeiros) if primeiros else None,
+        "ultimo": max(ultimos) if ultimos else None,
+        "emocoes": dict(emocoes.most_common()),
+        "perguntas": perguntas.most_common(PERGUNTAS_NO_RESUMO)
+    }
+
+
+def nome_segmento(numero):
+    return f"{PREFIXO_SEGMENTO}{numero:06d}{SUFIXO_SEGMENTO}"
+
+
+def _sincronizar_pasta(diretorio):
+    if hasattr(os, "O_DIRECTORY"):
+        descritor = os.open(diretorio, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(descritor)
+        finally:
+            os.close(descritor)
+
+
+class ArquivoHistorico:
+    def __init__(self, diretorio=CAMINHO_ARQUIVO, tamanho_maximo=TAMANHO_MAXIMO_SEGMENTO):
+        self.diretorio = diretorio
+        self.tamanho_maximo = tamanho_maximo
+        self._blocos = None
+        self._dias = None
+
+    def _caminho(self, nome):
+        return os.path.join(self.diretorio, nome)
+
+    def segmentos(self):
+        if not os.path.isdir(self.diretorio):
+            return []
+        numeros = []
+        for nome in os.listdir(self.diretorio):
+            if nome.startswith(PREFIXO_SEGMENTO) and nome.endswith(SUFIXO_SEGMENTO):
+                miolo = nome[len(PREFIXO_SEGMENTO):-len(SUFIXO_SEGMENTO)]
+                if miolo.isdigit():
+                    numeros.append(int(miolo))
+        return sorted(numeros)
+
+    def blocos(self):
+        # As linhas do índice em ordem de dia (e, no mesmo dia, de gravação)
+        if self._blocos is None:
+            blocos = []
+            caminho = self._caminho(ARQUIVO_INDICE)
+            if os.path.exists(caminho):
+                with open(caminho, "r", encoding="utf-8") as f:
+                    for linha in f:
+                        try:
+                            blocos.append(json.loads(linha))
+                        except ValueError:
+                            # Linha cortada no fim: o arquivamento não terminou
+                            break
+            blocos.sort(key=lambda bloco: bloco["dia"])
+            self._blocos = blocos
+            self._dias = [bloco["dia"] for bloco in blocos]
+        return self._blocos
+
+    def periodo(self, de=None, ate=None):
+        # Os blocos com dia entre `de` e `ate` ("AAAA-MM-DD", inclusive)
+        blocos = self.blocos()
+        inicio = bisect_left(self._dias, de) if de else 0
+        fim = bisect_right(self._dias, ate) if ate else len(blocos)
+        return blocos[inicio:fim]
+
+    def resumos(self, de=None, ate=None):
+        # {dia: resumo} sem descomprimir nada
+        por_dia = {}
+        for bloco in self.periodo(de, ate):
+            por_dia.setdefault(bloco["dia"], []).append(bloco["resumo"])
+        return {dia: resumos[0] if len(resumos) == 1 else juntar_resumos(resumos)
+                for dia, resumos in por_dia.items()}
+
+    def ler(self, de=None, ate=None):
+        # Os turnos do período, em ordem de dia
+        abertos = {}
+        try:
+            for bloco in self.periodo(de, ate):
+                f = abertos.get(bloco["segmento"])
+                if f is None:
+                    f = abertos[bloco["segmento"]] = open(self._caminho(nome_segmento(bloco["segmento"])), "rb")
+                f.seek(bloco["inicio"])
+                dados = descomprimir(f.read(bloco["tamanho"]), bloco["formato"])
+                yield from de_colunas(json.loads(dados))
+        finally:
+            for f in abertos.values():
+                f.close()
+
+    def pendente(self):
+        # O que gravar() deixou para confirmar ou desfazer, ou None
+        try:
+            with open(self._caminho(ARQUIVO_PENDENTE), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def gravar(self, registros, formato="lzma", origem=None):
+        # Arquiva os turnos, um bloco por dia. Antes de escrever, pendente.json
+        # guarda os tamanhos atuais e `origem` (o que quem chamou precisa para
+        # terminar o trabalho do seu lado); com tudo escrito e no disco, passa a
+        # "gravado". Quem chama apaga os turnos do histórico quente e então
+        # chama confirmar(); uma interrupção antes de "gravado" se resolve com
+        # desfazer().
+        if formato not in FORMATOS:
+            raise ValueError(f"formato desconhecido: {formato}")
+        if self.pendente() is not None:
+            raise RuntimeError(f"{self.diretorio}: há um arquivamento pendente")
+        os.makedirs(self.diretorio, exist_ok=True)
+        caminho_indice = self._caminho(ARQUIVO_INDICE)
+        segmentos = self.segmentos()
+        numero = segmentos[-1] if segmentos else 1
+        caminho = self._caminho(nome_segmento(numero))
+        tamanho = os.path.getsize(caminho) if os.path.exists(caminho) else 0
+        pendente = {
+            "fase": "gravando",
+            "indice": os.path.getsize(caminho_indice) if os.path.exists(caminho_indice) else 0,
+            "segmento": numero,
+            "tamanho": tamanho,
+            "origem": origem
+        }
+        gravar_atomico(self._caminho(ARQUIVO_PENDENTE), json.dumps(pendente))
+
+        linhas = []
+        bruto = comprimido = 0
+        segmento = open(caminho, "ab")
+        try:
+            for dia, registros_dia in agrupar_por_dia(registros):
+                dados = json.dumps(em_colunas(registros_dia), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+                bloco = comprimir(dados, formato)
+                if tamanho and tamanho + len(bloco) > self.tamanho_maximo:
+                    segmento.flush()
+                    os.fsync(segmento.fileno())
+                    segmento.close()
+                    numero += 1
+                    tamanho = 0
+                    segmento = open(self._caminho(nome_segmento(numero)), "ab")
+                segmento.write(bloco)
+                linhas.append(json.dumps({
+                    "dia": dia,
+                    "segmento": numero,
+                    "inicio": tamanho,
+                    "tamanho": len(bloco),
+                    "formato": formato,
+                    "bruto": len(dados),
+                    "resumo": resumir(registros_dia)
+                }, ensure_ascii=False) + "\n")
+                tamanho += len(bloco)
+                bruto += len(dados)
+                comprimido += len(bloco)
+            segmento.flush()
+            os.fsync(segmento.fileno())
+        finally:
+            segmento.close()
+        with open(caminho_indice, "a", encoding="utf-8") as f:
+            f.writelines(linhas)
+            f.flush()
+            os.fsync(f.fileno())
+        _sincronizar_pasta(self.diretorio)
+        pendente["fase"] = "gravado"
+        gravar_atomico(self._caminho(ARQUIVO_PENDENTE), json.dumps(pendente))
+        self._blocos = None
+        return len(linhas), bruto, comprimido
+
+    def confirmar(self):
+        caminho = self._caminho(ARQUIVO_PENDENTE)
+        if os.path.exists(caminho):
+            os.remove(caminho)
+
+    def desfazer(self):
+        # Volta índice e segmentos aos tamanhos de antes do gravar() pendente
+        pendente = self.pendente()
+        if pendente is None:
+            return
+        caminho_indice = self._caminho(ARQUIVO_INDICE)
+        if os.path.exists(caminho_indice):
+            os.truncate(caminho_indice, pendente["indice"])
+        for numero in self.segmentos():
+            caminho = self._caminho(nome_segmento(numero))
+            if numero > pendente["segmento"]:
+                os.remove(caminho)
+            elif numero == pendente["segmento"]:
+                os.truncate(caminho, pendente["tamanho"])
+        self._blocos = None
+        self.confirmar()
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Consulta o arquivo do histórico da V.")
+    parser.add_argument("--arquivo", default=CAMINHO_ARQUIVO, help="pasta do arquivo")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+    for nome, ajuda in (("resumo", "um resumo por dia, só pelo índice"),
+                        ("consultar", "os turnos arquivados, em JSONL")):
+        comando = comandos.add_parser(nome, help=ajuda)
+        comando.add_argument("--de", help="primeiro dia (AAAA-MM-DD)")
+        comando.add_argument("--ate", help="último dia (AAAA-MM-DD)")
+    args = parser.parse_args(argumentos)
+
+    arquivo = ArquivoHistorico(args.arquivo)
+    if args.comando == "resumo":
+        for dia, resumo in arquivo.resumos(args.de, args.ate).items():
+            print(json.dumps({"dia": dia, **resumo}, ensure_ascii=False))
+        blocos = arquivo.periodo(args.de, args.ate)
+        bruto = sum(bloco["bruto"] for bloco in blocos)
+        comprimido = sum(bloco["tamanho"] for bloco in blocos)
+        print(f"{len(blocos)} blocos, {bruto} bytes em {comprimido} comprimidos", file=sys.stderr)
+    else:
+        for registro in arquivo.ler(args.de, args.ate):
+            print(json.dumps(registro, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
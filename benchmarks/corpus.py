@@ -0,0 +1,228 @@
+import argparse
+import json
+import random
+import sys
+
+# Corpus sintético em português para os benchmarks: frases de conversa (com
+# acentos, emoções, gostos, perguntas de data) e pares pergunta/resposta para
+# a base de aprendizados, de 10 até milhões. Tudo sai de uma semente, então o
+# mesmo tamanho gera sempre o mesmo corpus.
+#
+#   python corpus.py --pares 100000 --saida aprendizados.json
+#   python corpus.py --frases 5000 > frases.txt
+SUJEITOS = [
+    "a água", "o café", "o pão de queijo", "a música", "o cinema", "o futebol",
+    "a programação", "o violão", "a praia", "o ônibus", "a física", "o açúcar",
+    "a história do Brasil", "o coração", "a pizza", "o chocolate", "a lua",
+    "o vulcão", "a eleição", "o avião", "a saúde", "o xadrez", "a poesia",
+    "o trânsito", "a memória", "o relógio", "a floresta", "o céu", "a maçã",
+    "o joão", "a cidade", "o país", "a família", "o médico", "a ciência"
+]
+PERGUNTAS = [
+    "o que é {}", "como funciona {}", "por que {} é importante", "você conhece {}",
+    "me fala sobre {}", "qual a origem de {}", "onde fica {}", "quem inventou {}",
+    "para que serve {}", "você gosta de {}", "qual é a melhor parte de {}",
+    "é verdade que {} faz mal", "como eu explico {} para uma criança"
+]
+COMPLEMENTOS = [
+    "", " hoje", " de verdade", " no Brasil", " em São Paulo", " na prática",
+    " de manhã", " à noite", " no inverno", " sem açúcar", " pra você", " agora"
+]
+RESPOSTAS = [
+    "Boa pergunta! {} é um assunto fascinante.", "Sobre {}, ainda estou aprendendo.",
+    "Dizem que {} muda a vida das pessoas.", "{} é mais interessante do que parece.",
+    "Eu adoro falar de {}!", "Hmm, {} me lembra uma história antiga."
+]
+EMOCOES = ["triste", "feliz", "irritado", "cansado", "animado", "neutro"]
+FRASES = [
+    "oi", "olá, tudo bem?", "bom dia!", "que dia é hoje?", "qual a data de hoje",
+    "que horas são", "hoje é que dia?", "eu gosto de {tema}", "não gosto de {tema}",
+    "estou {emocao} hoje", "tô muito {emocao}", "me sinto {emocao} com {tema}",
+    "modo criativo", "modo sério", "você é incrível", "você é chata",
+    "por que o céu é azul?", "me conta uma coisa sobre {tema}", "{pergunta}",
+    "{pergunta}", "{pergunta}", "aprenda: {pergunta} | {resposta}"
+]
+TEMAS = ["futebol", "cinema", "tecnologia", "música", "café", "pizza", "viagens", "xadrez", "poesia"]
+# Frases rotuladas por emoção, para medir o classificador. Há de propósito
+# frases que as listas de palavras antigas erram: "bom dia" (neutra),
+# "mal posso esperar" (feliz), "não estou feliz" (triste), "chateado com" (irritado).
+FRASES_EMOCAO = {
+    "feliz": [
+        "estou {intensidade} feliz {quando}", "tô {intensidade} animada com {tema}",
+        "que alegria, {evento_bom}", "{evento_bom}!", "mal posso esperar pelo {tema}",
+        "me sinto ótimo {quando}", "adorei {tema}", "o {tema} foi bom demais",
+        "hoje foi um dia maravilhoso", "que notícia boa sobre {tema}", "fiquei contente com {tema}",
+        "estou de bom humor {quando}", "nossa, amei {tema}"
+    ],
+    "triste": [
+        "estou {intensidade} triste {quando}", "não estou bem {quando}", "me sinto mal com {tema}",
+        "não estou feliz com {tema}", "estou pra baixo {quando}", "{evento_ruim}",
+        "que dia horrível", "estou desanimado com {tema}", "tô com saudade de {tema}",
+        "não tô nada bem", "me sinto sozinha {quando}", "fiquei arrasado, {evento_ruim}"
+    ],
+    "irritado": [
+        "estou {intensidade} irritado com {tema}", "que raiva de {tema}", "estou chateado com {tema}",
+        "isso me irrita demais", "tô bravo {quando}", "que saco esse {tema}", "odeio {tema} {quando}",
+        "estou de saco cheio de {tema}", "você não entende nada", "que absurdo, {evento_ruim}",
+        "para de falar de {tema}", "já falei mil vezes sobre {tema}"
+    ],
+    "neutra": [
+        "bom dia", "boa noite, tudo bem?", "{pergunta}", "{pergunta}", "que dia é hoje?", "que horas são",
+        "me fala sobre {tema}", "eu gosto de {tema}", "não gosto de {tema}", "modo criativo",
+        "o que é {tema}", "é verdade que {tema} faz mal", "isso é bom para a saúde?",
+        "vou ver {tema} {quando}", "bom, me conta de {tema}"
+    ]
+}
+INTENSIDADES = ["", "muito", "bem", "super", "um pouco", "tão"]
+QUANDOS = ["", "hoje", "agora", "de manhã", "essa semana", "desde ontem"]
+EVENTOS_BONS = ["passei na prova", "consegui o emprego", "ganhamos o jogo", "vou viajar amanhã"]
+EVENTOS_RUINS = ["perdi o emprego", "reprovei na prova", "meu gato morreu", "perdemos o jogo"]
+VIZINHAS = {
+    "a": "qsz", "e": "wrd", "i": "uok", "o": "ipl", "u": "yi", "s": "adw",
+    "r": "etf", "t": "ryg", "n": "bm", "m": "n", "c": "xv", "d": "sfe", "l": "kp"
+}
+SEM_ACENTO = str.maketrans("áàâãéêíóôõúüçÁÀÂÃÉÊÍÓÔÕÚÜÇ", "aaaaeeiooouucAAAAEEIOOOUUC")
+
+
+def pergunta_numero(numero):
+    # Cada número vira uma pergunta diferente (base mista sobre as listas);
+    # acima da quantidade de combinações entra um sufixo numérico
+    numero, sujeito = divmod(numero, len(SUJEITOS))
+    numero, modelo = divmod(numero, len(PERGUNTAS))
+    numero, complemento = divmod(numero, len(COMPLEMENTOS))
+    texto = PERGUNTAS[modelo].format(SUJEITOS[sujeito]) + COMPLEMENTOS[complemento]
+    if numero:
+        texto += f" {numero}"
+    return texto + "?"
+
+
+def resposta_numero(numero):
+    sujeito = SUJEITOS[numero % len(SUJEITOS)]
+    return RESPOSTAS[numero % len(RESPOSTAS)].format(sujeito[0].upper() + sujeito[1:])
+
+
+def gerar_pares(quantidade, semente=0):
+    # Pares únicos, embaralhados de forma determinística
+    aleatorio = random.Random(semente)
+    total = max(quantidade, len(SUJEITOS) * len(PERGUNTAS) * len(COMPLEMENTOS))
+    passo = _coprimo(total, aleatorio)
+    inicio = aleatorio.randrange(total)
+    for i in range(quantidade):
+        numero = (inicio + i * passo) % total
+        yield pergunta_numero(numero), resposta_numero(numero)
+
+
+def _coprimo(total, aleatorio):
+    while True:
+        passo = aleatorio.randrange(1, total) if total > 1 else 1
+        a, b = passo, total
+        while b:
+            a, b = b, a % b
+        if a == 1:
+            return passo
+
+
+def com_erro(texto, aleatorio, chance=0.5):
+    # Erros de digitação comuns: tirar acentos, trocar letras vizinhas no
+    # teclado, engolir ou dobrar uma letra, mudar maiúsculas
+    if aleatorio.random() >= chance or len(texto) < 4:
+        return texto
+    operacao = aleatorio.randrange(5)
+    posicao = aleatorio.randrange(1, len(texto) - 1)
+    letra = texto[posicao]
+    if operacao == 0:
+        return texto.translate(SEM_ACENTO)
+    if operacao == 1 and letra.lower() in VIZINHAS:
+        return texto[:posicao] + aleatorio.choice(VIZINHAS[letra.lower()]) + texto[posicao + 1:]
+    if operacao == 2:
+        return texto[:posicao] + texto[posicao + 1:]
+    if operacao == 3:
+        return texto[:posicao] + letra + texto[posicao:]
+    return texto.upper() if aleatorio.random() < 0.5 else texto.capitalize()
+
+
+def gerar_frases(quantidade, pares=0, semente=0, chance_erro=0.3):
+    # Frases de usuário. Com "pares" as perguntas saem da mesma base que
+    # gerar_pares(pares) cria, então parte delas acerta algo aprendido.
+    aleatorio = random.Random(semente + 1)
+    for _ in range(quantidade):
+        modelo = aleatorio.choice(FRASES)
+        if pares:
+            numero = aleatorio.randrange(pares)
+            pergunta = pergunta_numero(numero)
+        else:
+            numero = aleatorio.randrange(10 ** 6)
+            pergunta = pergunta_numero(numero)
+        frase = modelo.format(
+            tema=aleatorio.choice(TEMAS),
+            emocao=aleatorio.choice(EMOCOES),
+            pergunta=pergunta,
+            resposta=resposta_numero(numero)
+        )
+        if not frase.startswith("aprenda:"):
+            frase = com_erro(frase, aleatorio, chance_erro)
+        yield frase
+
+
+def gerar_frases_emocao(quantidade, semente=0, chance_erro=0.3):
+    # (frase, emoção) com as mesmas variações e erros de gerar_frases
+    aleatorio = random.Random(semente + 3)
+    rotulos = sorted(FRASES_EMOCAO)
+    for _ in range(quantidade):
+        rotulo = aleatorio.choice(rotulos)
+        frase = aleatorio.choice(FRASES_EMOCAO[rotulo]).format(
+            tema=aleatorio.choice(TEMAS),
+            intensidade=aleatorio.choice(INTENSIDADES),
+            quando=aleatorio.choice(QUANDOS),
+            evento_bom=aleatorio.choice(EVENTOS_BONS),
+            evento_ruim=aleatorio.choice(EVENTOS_RUINS),
+            pergunta=pergunta_numero(aleatorio.randrange(10 ** 6))
+        )
+        yield com_erro(" ".join(frase.split()), aleatorio, chance_erro), rotulo
+
+
+def perguntas_da_base(pares, quantidade, semente=0, chance_erro=0.3):
+    # Consultas a uma base gerada por gerar_pares: exatas, com erro ou novas
+    chaves = [pergunta for pergunta, _ in gerar_pares(min(pares, 100000), semente)]
+    aleatorio = random.Random(semente + 2)
+    for _ in range(quantidade):
+        if chaves and aleatorio.random() < 0.8:
+            yield com_erro(aleatorio.choice(chaves), aleatorio, chance_erro)
+        else:
+            yield pergunta_numero(pares + aleatorio.randrange(10 ** 6))
+
+
+def montar_aprendizados(pares, formato="simples"):
+    # "simples": {pergunta: resposta}; "respostas": o formato da variante de
+    # personalidade, com texto e emoção dentro de "respostas"
+    if formato == "respostas":
+        return {
+            "respostas": {pergunta: {"texto": resposta, "emocao": "neutra"} for pergunta, resposta in pares}
+        }
+    return dict(pares)
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Gera o corpus sintético dos benchmarks.")
+    parser.add_argument("--pares", type=int, default=0, help="pares pergunta/resposta aprendidos")
+    parser.add_argument("--frases", type=int, default=0, help="frases de usuário, uma por linha")
+    parser.add_argument("--formato", choices=["simples", "respostas"], default="simples")
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--saida", default="-")
+    args = parser.parse_args(argumentos)
+
+    saida = sys.stdout if args.saida == "-" else open(args.saida, "w", encoding="utf-8")
+    try:
+        if args.frases:
+            for frase in gerar_frases(args.frases, args.pares, args.semente):
+                saida.write(frase + "\n")
+        else:
+            aprendizados = montar_aprendizados(gerar_pares(args.pares, args.semente), args.formato)
+            json.dump(aprendizados, saida, ensure_ascii=False, indent=4)
+    finally:
+        if saida is not sys.stdout:
+            saida.close()
+
+
+if __name__ == "__main__":
+    main()
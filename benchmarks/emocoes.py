@@ -0,0 +1,113 @@
+import argparse
+import os
+import sys
+import time
+
+from corpus import gerar_frases, gerar_frases_emocao
+
+# Compara o classificador de emoção (ia_v_emocoes) com as listas de palavras
+# que ele substituiu, num conjunto separado do treino, e mede quantas frases
+# por segundo ele classifica em lote e uma a uma. O treino e o teste gerados
+# saem dos mesmos modelos de frase (corpus.py); emocoes_reais.json são frases
+# escritas à mão, fora de emocoes.json e dos modelos, e mostram como ele se
+# sai com frases de verdade.
+#
+#   python benchmarks/emocoes.py
+#   python benchmarks/emocoes.py --frases 50000 --vazao 200000
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASTA = "IAprimeiraEtapa"
+CAMINHO_REAIS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "emocoes_reais.json")
+FRASES = 20000
+PROPORCAO_TESTE = 0.2
+VAZAO = 100000
+# As listas de lexico.json antes do classificador, na ordem em que eram testadas
+PALAVRAS_ANTIGAS = [
+    ("triste", {"triste", "chateado", "deprimido", "infeliz", "mal"}),
+    ("feliz", {"feliz", "alegre", "animado", "contente", "bom"}),
+    ("irritado", {"raiva", "irritado", "bravo", "chateado"})
+]
+
+
+def por_palavras(frase):
+    from ia_v_emocoes import palavras
+    encontradas = set(palavras(frase))
+    for rotulo, lista in PALAVRAS_ANTIGAS:
+        if not lista.isdisjoint(encontradas):
+            return rotulo
+    return "neutra"
+
+
+def acuracia(previstos, rotulos):
+    return sum(p == r for p, r in zip(previstos, rotulos)) / len(rotulos)
+
+
+def revocacao(previstos, rotulos):
+    acertos = {}
+    totais = {}
+    for previsto, rotulo in zip(previstos, rotulos):
+        totais[rotulo] = totais.get(rotulo, 0) + 1
+        acertos[rotulo] = acertos.get(rotulo, 0) + (previsto == rotulo)
+    return {rotulo: acertos[rotulo] / totais[rotulo] for rotulo in sorted(totais)}
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Acurácia e vazão do classificador de emoção.")
+    parser.add_argument("--frases", type=int, default=FRASES, help="frases rotuladas geradas")
+    parser.add_argument("--teste", type=float, default=PROPORCAO_TESTE,
+                        help="fração separada para o teste (não entra no treino)")
+    parser.add_argument("--vazao", type=int, default=VAZAO, help="frases na medida de vazão")
+    parser.add_argument("--semente", type=int, default=0)
+    args = parser.parse_args(argumentos)
+
+    sys.path.insert(0, os.path.join(RAIZ, PASTA))
+    from ia_v_emocoes import ClassificadorEmocoes, exemplos_do_arquivo
+
+    exemplos = list(gerar_frases_emocao(args.frases, args.semente))
+    corte = int(len(exemplos) * (1 - args.teste))
+    treino, teste = exemplos[:corte], exemplos[corte:]
+    frases_teste = [frase for frase, _ in teste]
+    rotulos_teste = [rotulo for _, rotulo in teste]
+
+    so_arquivo = ClassificadorEmocoes()
+    so_arquivo.treinar(exemplos_do_arquivo())
+    treinado = ClassificadorEmocoes()
+    treinado.treinar(exemplos_do_arquivo())
+    treinado.treinar(treino)
+
+    metodos = [
+        ("palavras (antigo)", [por_palavras(frase) for frase in frases_teste]),
+        ("emocoes.json", so_arquivo.classificar_lote(frases_teste)),
+        ("emocoes.json + treino", treinado.classificar_lote(frases_teste))
+    ]
+    print(f"{len(treino)} frases de treino, {len(teste)} de teste")
+    for nome, previstos in metodos:
+        detalhes = " ".join(f"{rotulo}={valor:.2f}" for rotulo, valor in revocacao(previstos, rotulos_teste).items())
+        print(f"{nome:<24} acurácia {acuracia(previstos, rotulos_teste):.3f}  revocação {detalhes}")
+
+    reais = list(exemplos_do_arquivo(CAMINHO_REAIS))
+    frases_reais = [frase for frase, _ in reais]
+    rotulos_reais = [rotulo for _, rotulo in reais]
+    print(f"{len(reais)} frases reais (emocoes_reais.json)")
+    for nome, previstos in [("palavras (antigo)", [por_palavras(frase) for frase in frases_reais]),
+                            ("emocoes.json", so_arquivo.classificar_lote(frases_reais))]:
+        detalhes = " ".join(f"{rotulo}={valor:.2f}" for rotulo, valor in revocacao(previstos, rotulos_reais).items())
+        print(f"{nome:<24} acurácia {acuracia(previstos, rotulos_reais):.3f}  revocação {detalhes}")
+
+    frases = list(gerar_frases(args.vazao, semente=args.semente))
+    inicio = time.perf_counter()
+    treinado.classificar_lote(frases)
+    lote = time.perf_counter() - inicio
+    amostra = frases[:min(len(frases), 20000)]
+    inicio = time.perf_counter()
+    for frase in amostra:
+        treinado.classificar(frase)
+    uma_a_uma = time.perf_counter() - inicio
+    print(f"vazão em lote: {len(frases) / lote:.0f} frases/s; uma a uma: {len(amostra) / uma_a_uma:.0f} frases/s")
+
+    if acuracia(metodos[-1][1], rotulos_teste) <= acuracia(metodos[0][1], rotulos_teste):
+        print("o classificador não superou as listas de palavras", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+import argparse
+import importlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from corpus import gerar_frases, gerar_pares, montar_aprendizados, perguntas_da_base
+
+# Benchmarks do caminho de resposta das duas pastas (IAprimeiraEtapa e
+# IAprimeiraEtapa002). Cada pasta roda num processo separado, porque os
+# módulos têm os mesmos nomes, dentro de uma pasta temporária, para nada ser
+# gravado nos arquivos de verdade. Mede a distribuição de latência de cada
+# função, do turno inteiro (criar_motor) por tamanho da base de aprendizados e
+# da gravação por tamanho do histórico. O resultado é um JSON que pode ser
+# comparado com uma linha de base:
+#
+#   python benchmarks/medir.py --saida base.json
+#   python benchmarks/medir.py --comparar base.json --tolerancia 0.25
+#   python benchmarks/medir.py --escalas 10 1000 100000 1000000
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASTAS = ["IAprimeiraEtapa", "IAprimeiraEtapa002"]
+MODULOS = {"emocional": "ia_v_emocional", "personalidade": "ia_v_personalidade_v"}
+ESCALAS = [10, 1000, 100000]
+HISTORICOS = [10, 10000, 1000000]
+REPETICOES = 2000
+# Gravações do arquivo inteiro são caras; mede menos vezes
+REPETICOES_GRAVACAO = 5
+# Buscas no histórico somam listas longas nos históricos grandes
+REPETICOES_BUSCA = 200
+TOLERANCIA = 0.25
+# A cauda oscila muito mais que a mediana de uma execução para outra
+TOLERANCIA_P99 = 1.0
+# Diferenças menores que isso (em microssegundos) são ruído, não regressão
+DIFERENCA_MINIMA_US = 5.0
+VERSAO_RESULTADOS = 1
+
+
+def resumir(tempos_ns):
+    tempos = sorted(tempos_ns)
+    n = len(tempos)
+
+    def percentil(p):
+        return tempos[min(n - 1, int(n * p))] / 1000
+
+    return {
+        "n": n,
+        "media_us": sum(tempos) / n / 1000,
+        "p50_us": percentil(0.50),
+        "p90_us": percentil(0.90),
+        "p99_us": percentil(0.99),
+        "max_us": tempos[-1] / 1000
+    }
+
+
+def cronometrar(funcao, argumentos):
+    # Uma medida por chamada, para ter a distribuição e não só a média
+    relogio = time.perf_counter_ns
+    tempos = []
+    for argumento in argumentos:
+        inicio = relogio()
+        funcao(*argumento)
+        tempos.append(relogio() - inicio)
+    return resumir(tempos)
+
+
+def preencher_diario(diretorio, quantidade):
+    # Escreve o histórico direto nos segmentos, bem mais rápido que anexar um a um
+    from ia_v_diario import TAMANHO_MAXIMO_SEGMENTO, nome_segmento
+    os.makedirs(diretorio, exist_ok=True)
+    frases = list(gerar_frases(1000))
+    numero = 1
+    tamanho = 0
+    arquivo = open(os.path.join(diretorio, nome_segmento(numero)), "w", encoding="utf-8")
+    for i in range(quantidade):
+        linha = json.dumps({
+            "pergunta": frases[i % len(frases)],
+            "resposta": "Interessante, me fale mais!",
+            "data": "2025-08-10T02:27:13.918476"
+        }, ensure_ascii=False) + "\n"
+        tamanho_linha = len(linha.encode("utf-8"))
+        if tamanho and tamanho + tamanho_linha > TAMANHO_MAXIMO_SEGMENTO:
+            arquivo.close()
+            numero += 1
+            tamanho = 0
+            arquivo = open(os.path.join(diretorio, nome_segmento(numero)), "w", encoding="utf-8")
+        arquivo.write(linha)
+        tamanho += tamanho_linha
+    arquivo.close()
+
+
+def montar_base(modulo, pares):
+    from ia_v_indice import IndiceAprendizados, tabela_respostas
+    formato = "respostas" if hasattr(modulo, "carregar_json") else "simples"
+    aprendizados = montar_aprendizados(pares, formato)
+    tabela = tabela_respostas(aprendizados)
+    inicio = time.perf_counter_ns()
+    indice = IndiceAprendizados(tabela)
+    construcao = time.perf_counter_ns() - inicio
+    return aprendizados, indice, construcao
+
+
+def medir_funcoes(modulo, repeticoes):
+    from ia_v_turno import _preparar, remover_acentos
+    frases = [(frase,) for frase in gerar_frases(repeticoes, semente=7)]
+    resultados = {}
+    # Sem o LRU, para medir o custo de preparar um turno novo
+    resultados["preparar"] = cronometrar(_preparar.__wrapped__, frases)
+    resultados["remover_acentos"] = cronometrar(remover_acentos, frases)
+    for nome in ("detectar_emocao", "responder_data", "analisar_humor"):
+        if hasattr(modulo, nome):
+            resultados[nome] = cronometrar(getattr(modulo, nome), frases)
+    if hasattr(modulo, "atualizar_preferencias"):
+        memoria = {"nome_usuario": "ana", "preferencias": []}
+        resultados["atualizar_preferencias"] = cronometrar(
+            modulo.atualizar_preferencias, [(frase, memoria) for (frase,) in frases])
+    if hasattr(modulo, "detectar_modo"):
+        estado = modulo.novo_estado()
+        resultados["detectar_modo"] = cronometrar(
+            modulo.detectar_modo, [(frase, estado) for (frase,) in frases])
+    return resultados
+
+
+def medir_escala(modulo, escala, repeticoes):
+    from ia_v_persistencia import gravar_atomico, serializar
+    pares = list(gerar_pares(escala))
+    aprendizados, indice, construcao = montar_base(modulo, pares)
+    memoria = {"nome_usuario": "ana", "preferencias": [], "personalidade": "gentil", "humor": "neutra"}
+    resultados = {"indice_construcao": resumir([construcao])}
+
+    consultas = list(perguntas_da_base(escala, repeticoes, semente=3))
+    if hasattr(modulo, "novo_estado"):
+        estado = modulo.novo_estado()
+        resultados["gerar_resposta"] = cronometrar(
+            modulo.gerar_resposta, [(consulta, aprendizados, memoria, indice, estado) for consulta in consultas])
+        responder = modulo.criar_motor(aprendizados, memoria, indice, modulo.novo_estado())
+    else:
+        resultados["gerar_resposta"] = cronometrar(
+            modulo.gerar_resposta, [(consulta, aprendizados, memoria, indice) for consulta in consultas])
+        responder = modulo.criar_motor(aprendizados, memoria, indice)
+
+    frases = [(frase,) for frase in gerar_frases(repeticoes, pares=escala, semente=5)]
+    resultados["turno"] = cronometrar(responder, frases)
+
+    # Custo de gravar a base inteira, como faz a thread de gravação
+    caminho = os.path.join(os.getcwd(), f"aprendizados_{escala}.json")
+    vezes = REPETICOES_GRAVACAO if escala >= 100000 else 20
+    resultados["gravar_aprendizados"] = cronometrar(
+        lambda: gravar_atomico(caminho, serializar(aprendizados, 4)), [()] * vezes)
+    os.remove(caminho)
+    return resultados
+
+
+def medir_base_mapeada(escala, repeticoes):
+    # Os mesmos pares de medir_escala no arquivo de ia_v_mapeado: compilar,
+    # abrir e a busca exata (acertos e perguntas que não estão na base)
+    from ia_v_mapeado import BaseMapeada, codificar, compilar
+    from ia_v_turno import normalizar_chave
+    unicas = {normalizar_chave(pergunta): (pergunta, resposta) for pergunta, resposta in gerar_pares(escala)}
+    caminho = os.path.join(os.getcwd(), f"aprendizados_{escala}.base")
+    inicio = time.perf_counter_ns()
+    compilar(caminho, (codificar(normalizada, *par) for normalizada, par in unicas.items()), len(unicas))
+    resultados = {"base_mapeada_compilar": resumir([time.perf_counter_ns() - inicio])}
+    inicio = time.perf_counter_ns()
+    base = BaseMapeada(caminho)
+    resultados["base_mapeada_abrir"] = resumir([time.perf_counter_ns() - inicio])
+    consultas = [(normalizar_chave(consulta),) for consulta in perguntas_da_base(escala, repeticoes, chance_erro=0)]
+    resultados["base_mapeada_buscar"] = cronometrar(base.buscar, consultas)
+    base.fechar()
+    os.remove(caminho)
+    os.remove(base.caminho_delta)
+    return resultados
+
+
+def medir_historico(modulo, tamanho, repeticoes):
+    from ia_v_busca_historico import BuscaHistorico
+    from ia_v_diario import Diario, HistoricoMapeado
+    # O mesmo histórico serve para as duas variantes da pasta
+    diretorio = os.path.join(os.getcwd(), f"historico_{tamanho}")
+    if not os.path.isdir(diretorio):
+        preencher_diario(diretorio, tamanho)
+    resultados = {}
+
+    inicio = time.perf_counter_ns()
+    historico = HistoricoMapeado(diretorio)
+    historico.recentes(5)
+    resultados["historico_primeira_leitura"] = resumir([time.perf_counter_ns() - inicio])
+    resultados["historico_recentes"] = cronometrar(historico.recentes, [(5,)] * repeticoes)
+
+    # O índice de busca é montado uma vez por histórico (fica gravado ao lado
+    # dos segmentos); mede a busca com ele em dia
+    busca = BuscaHistorico(diretorio)
+    busca.atualizar()
+    consultas = [(frase,) for frase in gerar_frases(min(repeticoes, REPETICOES_BUSCA), semente=11)]
+    resultados["historico_busca"] = cronometrar(busca.buscar, consultas)
+
+    diario = Diario(diretorio)
+    registro = {"pergunta": "oi", "resposta": "Olá! Tudo bem?", "data": datetime.now().isoformat()}
+    resultados["diario_anexar"] = cronometrar(diario.anexar, [(registro,)] * repeticoes)
+    diario.fechar()
+
+    if hasattr(modulo, "salvar_memoria"):
+        memoria = {"nome_usuario": "ana", "preferencias": ["pizza"], "personalidade": "gentil"}
+        resultados["salvar_memoria"] = cronometrar(modulo.salvar_memoria, [(memoria,)] * repeticoes)
+    elif hasattr(modulo, "salvar_json"):
+        memoria = {"nome_usuario": "ana", "preferencias": ["pizza"], "personalidade": "gentil"}
+        resultados["salvar_memoria"] = cronometrar(
+            modulo.salvar_json, [(modulo.CAMINHO_MEMORIA, memoria)] * repeticoes)
+    return resultados
+
+
+def medir_pasta(pasta, escalas, historicos, repeticoes):
+    # Roda dentro do processo filho: importa os módulos da pasta e trabalha
+    # numa pasta temporária
+    sys.path.insert(0, os.path.join(RAIZ, pasta))
+    os.environ.pop("IA_V_ARMAZENAMENTO", None)
+    trabalho = tempfile.mkdtemp(prefix="ia_v_bench_")
+    os.chdir(trabalho)
+    resultados = {}
+    try:
+        for variante, nome_modulo in MODULOS.items():
+            modulo = importlib.import_module(nome_modulo)
+            modulo.aleatorio.seed(0)
+            prefixo = f"{pasta}/{variante}"
+            for nome, resumo in medir_funcoes(modulo, repeticoes).items():
+                resultados[f"{prefixo}/{nome}"] = resumo
+            for escala in escalas:
+                for nome, resumo in medir_escala(modulo, escala, repeticoes).items():
+                    resultados[f"{prefixo}/{nome}/base={escala}"] = resumo
+            for tamanho in historicos:
+                for nome, resumo in medir_historico(modulo, tamanho, repeticoes).items():
+                    resultados[f"{prefixo}/{nome}/historico={tamanho}"] = resumo
+        for escala in escalas:
+            for nome, resumo in medir_base_mapeada(escala, repeticoes).items():
+                resultados[f"{pasta}/{nome}/base={escala}"] = resumo
+        from ia_v_persistencia import GRAVADOR
+        GRAVADOR.fechar()
+    finally:
+        os.chdir(RAIZ)
+        shutil.rmtree(trabalho, ignore_errors=True)
+    return resultados
+
+
+def rodar(pastas, escalas, historicos, repeticoes):
+    resultados = {}
+    for pasta in pastas:
+        print(f"medindo {pasta}...", file=sys.stderr)
+        comando = [sys.executable, os.path.abspath(__file__), "--interno", pasta,
+                   "--escalas", *map(str, escalas), "--historicos", *map(str, historicos),
+                   "--repeticoes", str(repeticoes)]
+        saida = subprocess.run(comando, check=True, stdout=subprocess.PIPE).stdout
+        resultados.update(json.loads(saida))
+    return {
+        "versao": VERSAO_RESULTADOS,
+        "data": datetime.now().isoformat(),
+        "ambiente": {
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "processador": platform.processor() or platform.machine()
+        },
+        "parametros": {"escalas": escalas, "historicos": historicos, "repeticoes": repeticoes},
+        "resultados": resultados
+    }
+
+
+def comparar(atual, base, tolerancia=TOLERANCIA, tolerancia_p99=TOLERANCIA_P99,
+             diferenca_minima=DIFERENCA_MINIMA_US):
+    # Compara p50 e p99 de cada medida que existe nos dois arquivos e devolve
+    # as que pioraram mais que a tolerância
+    regressoes = []
+    for chave, novo in sorted(atual["resultados"].items()):
+        antigo = base.get("resultados", {}).get(chave)
+        if antigo is None:
+            continue
+        for campo, folga in (("p50_us", tolerancia), ("p99_us", tolerancia_p99)):
+            if campo not in novo or campo not in antigo:
+                continue
+            limite = antigo[campo] * (1 + folga)
+            if novo[campo] > limite and novo[campo] - antigo[campo] > diferenca_minima:
+                regressoes.append((chave, campo, antigo[campo], novo[campo]))
+    return regressoes
+
+
+def imprimir(resultados, arquivo=sys.stderr):
+    largura = max((len(chave) for chave in resultados), default=10)
+    print(f"{'medida':<{largura}} {'p50 µs':>12} {'p99 µs':>12} {'n':>6}", file=arquivo)
+    for chave, resumo in sorted(resultados.items()):
+        print(f"{chave:<{largura}} {resumo['p50_us']:>12.2f} {resumo['p99_us']:>12.2f} {resumo['n']:>6}",
+              file=arquivo)
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Benchmarks do caminho de resposta da V.")
+    parser.add_argument("--pastas", nargs="+", default=PASTAS, choices=PASTAS)
+    parser.add_argument("--escalas", nargs="+", type=int, default=ESCALAS,
+                        help="tamanhos da base de aprendizados")
+    parser.add_argument("--historicos", nargs="+", type=int, default=HISTORICOS,
+                        help="tamanhos do histórico para medir a gravação")
+    parser.add_argument("--repeticoes", type=int, default=REPETICOES, help="chamadas por medida")
+    parser.add_argument("--saida", default="resultados_benchmark.json")
+    parser.add_argument("--comparar", metavar="BASE", help="JSON de uma execução anterior")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA,
+                        help="piora relativa aceita no p50 antes de falhar (0.25 = 25%%)")
+    parser.add_argument("--tolerancia-p99", type=float, default=TOLERANCIA_P99,
+                        help="piora relativa aceita no p99")
+    parser.add_argument("--interno", metavar="PASTA", help=argparse.SUPPRESS)
+    args = parser.parse_args(argumentos)
+
+    if args.interno:
+        # O que os módulos imprimirem vai para stderr; stdout leva só o JSON
+        saida = sys.stdout
+        sys.stdout = sys.stderr
+        resultados = medir_pasta(args.interno, args.escalas, args.historicos, args.repeticoes)
+        json.dump(resultados, saida)
+        return
+
+    atual = rodar(args.pastas, args.escalas, args.historicos, args.repeticoes)
+    with open(args.saida, "w", encoding="utf-8") as f:
+        json.dump(atual, f, ensure_ascii=False, indent=2)
+    imprimir(atual["resultados"])
+    print(f"resultados em {args.saida}", file=sys.stderr)
+
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            base = json.load(f)
+        if base.get("parametros", {}).get("repeticoes") != args.repeticoes:
+            print("aviso: a base foi medida com outro número de repetições", file=sys.stderr)
+        regressoes = comparar(atual, base, args.tolerancia, args.tolerancia_p99)
+        for chave, campo, antigo, novo in regressoes:
+            print(f"REGRESSÃO {chave} {campo}: {antigo:.2f} -> {novo:.2f} µs "
+                  f"(+{(novo / antigo - 1) * 100 if antigo else float('inf'):.0f}%)", file=sys.stderr)
+        if regressoes:
+            sys.exit(1)
+        print(f"sem regressões acima de {args.tolerancia:.0%}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
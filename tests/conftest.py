@@ -0,0 +1,49 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+# Os testes importam os módulos de IAprimeiraEtapa. Os arquivos que só existem
+# numa versão diferente em IAprimeiraEtapa002 (ia_v_personalidade_v) são
+# carregados pelo caminho, com outro nome, pela fixture `variante`; os
+# módulos que eles importam são os mesmos nas duas pastas. Os de benchmarks
+# (corpus, medir) também são importados direto.
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(RAIZ, "IAprimeiraEtapa"))
+sys.path.append(os.path.join(RAIZ, "benchmarks"))
+os.environ.pop("IA_V_ARMAZENAMENTO", None)
+
+VARIANTES = [
+    ("IAprimeiraEtapa", "ia_v_emocional"),
+    ("IAprimeiraEtapa", "ia_v_personalidade_v"),
+    ("IAprimeiraEtapa002", "ia_v_personalidade_v"),
+]
+
+
+@pytest.fixture(autouse=True)
+def pasta_temporaria(tmp_path, monkeypatch):
+    # memoria.json, aprendizados.json, o diário... ficam fora do repositório
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def carregar_variante(pasta, nome):
+    apelido = f"{nome}__{pasta}"
+    if apelido not in sys.modules:
+        spec = importlib.util.spec_from_file_location(apelido, os.path.join(RAIZ, pasta, f"{nome}.py"))
+        modulo = importlib.util.module_from_spec(spec)
+        sys.modules[apelido] = modulo
+        spec.loader.exec_module(modulo)
+    return sys.modules[apelido]
+
+
+@pytest.fixture(params=VARIANTES, ids=[f"{pasta}/{nome}" for pasta, nome in VARIANTES])
+def variante(request):
+    return carregar_variante(*request.param)
+
+
+def criar_motor(modulo, aprendizados, memoria, indice, estado=None):
+    if hasattr(modulo, "novo_estado"):
+        return modulo.criar_motor(aprendizados, memoria, indice, estado or modulo.novo_estado())
+    return modulo.criar_motor(aprendizados, memoria, indice)
@@ -0,0 +1,99 @@
+import json
+import os
+
+from ia_v_armazenamento import BancoV
+
+
+def gravar(caminho, dados):
+    with open(caminho, "w", encoding="utf-8") as f:
+        json.dump(dados, f, ensure_ascii=False)
+
+
+def contar(banco, tabela):
+    return banco.conexao.execute(f"SELECT COUNT(*) FROM {tabela}").fetchone()[0]
+
+
+def test_importar_de_novo_nao_duplica():
+    historico = [
+        {"pergunta": "oi", "resposta": "Olá!", "data": "2024-01-01T10:00:00"},
+        {"pergunta": "tudo bem?", "resposta": "Tudo!", "data": "2024-01-01T10:00:05"}
+    ]
+    aprendizados = {
+        "respostas": {"o que é água": {"texto": "É H2O.", "emocao": "neutra"}},
+        "gostos": [{"item": "pizza", "emocao": "feliz"}, "café"],
+        "antipatias": ["chuva"],
+        "fatos": [{"sujeito": "o sol", "predicado": "uma estrela", "quando": "2024-01-01T10:00:00"},
+                  {"sujeito": "a lua", "predicado": "um satélite"}]
+    }
+    gravar("memoria.json", {"nome_usuario": "ana", "historico": historico})
+    gravar("aprendizados.json", aprendizados)
+    banco = BancoV("ia_v.db")
+    try:
+        banco.importar_pasta(".")
+        # Os dois arquivos mudam de assinatura: um turno novo e uma emoção nova
+        historico.append({"pergunta": "tchau", "resposta": "Até mais!", "data": "2024-01-01T10:01:00"})
+        gravar("memoria.json", {"nome_usuario": "ana", "historico": historico})
+        aprendizados["gostos"][0]["emocao"] = "neutra"
+        gravar("aprendizados.json", aprendizados)
+        for nome in ("memoria.json", "aprendizados.json"):
+            os.utime(nome, ns=(0, os.stat(nome).st_mtime_ns + 10 ** 9))
+        contagem = banco.importar_pasta(".")
+
+        assert contagem["memoria"] == 2
+        assert [r["pergunta"] for r in banco.historico_recente()] == ["oi", "tudo bem?", "tchau"]
+        assert contar(banco, "respostas") == 1
+        assert contar(banco, "gostos") == 3
+        assert banco.conexao.execute("SELECT emocao FROM gostos WHERE item = 'pizza'").fetchone() == ("neutra",)
+        assert contar(banco, "fatos") == 2
+    finally:
+        banco.fechar()
+
+
+class Fila:
+    # Gravador que só guarda as tarefas; o teste decide quando rodar
+    def __init__(self):
+        self.tarefas = []
+
+    def executar(self, funcao, *argumentos):
+        self.tarefas.append((funcao, argumentos))
+
+    def rodar(self):
+        tarefas, self.tarefas = self.tarefas, []
+        for funcao, argumentos in tarefas:
+            funcao(*argumentos)
+
+
+def test_memoria_gravada_pelo_gravador():
+    banco = BancoV("ia_v.db")
+    try:
+        fila = Fila()
+        memoria = {"nome_usuario": "ana", "humor": "feliz", "preferencias": ["pizza"]}
+        banco.salvar_memoria(memoria, gravador=fila)
+        memoria["preferencias"].append("café")
+        banco.salvar_memoria(memoria, gravador=fila)
+        # Nada gravado ainda, e uma tarefa só para as duas chamadas
+        assert contar(banco, "usuarios") == 0
+        assert len(fila.tarefas) == 1
+        # A cópia foi feita na chamada: mudar a memória depois não muda o que é gravado
+        memoria["preferencias"].append("chuva")
+        fila.rodar()
+        assert banco.carregar_memoria()["preferencias"] == ["pizza", "café"]
+        assert banco.carregar_memoria()["nome_usuario"] == "ana"
+
+        comandos = []
+        banco.conexao.set_trace_callback(comandos.append)
+        memoria["preferencias"].pop()
+        memoria["humor"] = "triste"
+        banco.salvar_memoria(memoria, gravador=fila)
+        fila.rodar()
+        # As preferências não mudaram: só o usuário foi atualizado
+        assert not [comando for comando in comandos if "DELETE" in comando or "INTO preferencias" in comando]
+        assert banco.carregar_memoria()["humor"] == "triste"
+
+        # Gravar direto descarta a cópia pendente, que é mais antiga
+        banco.salvar_memoria({"preferencias": ["sushi"]}, gravador=fila)
+        banco.salvar_memoria({"preferencias": ["massa"]})
+        fila.rodar()
+        assert banco.carregar_memoria()["preferencias"] == ["massa"]
+    finally:
+        banco.fechar()
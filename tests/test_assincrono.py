@@ -0,0 +1,90 @@
+import asyncio
+import io
+import os
+
+import ia_v_assincrono
+from ia_v_assincrono import Agenda, LeitorEntrada
+
+
+def test_agenda_dispara_em_ordem_com_um_alarme():
+    async def rodar():
+        agenda = Agenda()
+        disparos = []
+        agenda.agendar(0.03, disparos.append, "c")
+        agenda.agendar(0.01, disparos.append, "a")
+        # Vencem juntos: a ordem de criação desempata
+        quando = agenda.loop.time() + 0.02
+        agenda.agendar_em(quando, disparos.append, "b1")
+        agenda.agendar_em(quando, disparos.append, "b2")
+        cancelado = agenda.agendar(0.015, disparos.append, "x")
+        cancelado.cancelar()
+        assert len(agenda) == 4
+        assert agenda.alarme_quando == agenda.heap[0][0]
+        await asyncio.sleep(0.06)
+        assert disparos == ["a", "b1", "b2", "c"]
+        assert cancelado.cancelado and not cancelado.disparado
+        assert len(agenda) == 0 and agenda.alarme is None
+        agenda.fechar()
+
+    asyncio.run(rodar())
+
+
+def test_cancelados_sao_compactados(monkeypatch):
+    monkeypatch.setattr(ia_v_assincrono, "MINIMO_COMPACTAR", 4)
+
+    async def rodar():
+        agenda = Agenda()
+        temporizadores = [agenda.agendar(10 + numero, lambda: None) for numero in range(10)]
+        for temporizador in temporizadores[:6]:
+            temporizador.cancelar()
+        # Passou da metade: o heap foi refeito só com os vivos
+        assert len(agenda.heap) == 4 and agenda.cancelados == 0
+        assert len(agenda) == 4
+        agenda.fechar()
+        assert all(temporizador.cancelado for temporizador in temporizadores)
+
+    asyncio.run(rodar())
+
+
+def test_erro_num_temporizador_nao_para_os_outros():
+    async def rodar():
+        agenda = Agenda()
+        erros = []
+        agenda.loop.set_exception_handler(lambda loop, contexto: erros.append(contexto["exception"]))
+        disparos = []
+        agenda.agendar(0.01, lambda: 1 / 0)
+        agenda.agendar(0.01, disparos.append, "depois")
+        await asyncio.sleep(0.03)
+        assert disparos == ["depois"]
+        assert isinstance(erros[0], ZeroDivisionError)
+
+    asyncio.run(rodar())
+
+
+def test_leitor_de_pipe():
+    leitura, escrita = os.pipe()
+
+    async def rodar():
+        with os.fdopen(leitura, "rb", buffering=0) as arquivo:
+            leitor = LeitorEntrada(arquivo)
+            assert leitor.descritor == leitura
+            os.write(escrita, "olá\r\nmeia ".encode("utf-8"))
+            assert await asyncio.wait_for(leitor.ler(), 1) == "olá"
+            os.write(escrita, b"linha\nsem fim")
+            os.close(escrita)
+            assert await asyncio.wait_for(leitor.ler(), 1) == "meia linha"
+            assert await asyncio.wait_for(leitor.ler(), 1) == "sem fim"
+            assert await asyncio.wait_for(leitor.ler(), 1) is None
+            assert await asyncio.wait_for(leitor.ler(), 1) is None
+            assert leitor.descritor is None
+
+    asyncio.run(rodar())
+
+
+def test_leitor_sem_descritor_usa_thread():
+    async def rodar():
+        leitor = LeitorEntrada(io.StringIO("um\r\ndois\n"))
+        assert leitor.descritor is None
+        assert [await asyncio.wait_for(leitor.ler(), 1) for _ in range(3)] == ["um", "dois", None]
+
+    asyncio.run(rodar())
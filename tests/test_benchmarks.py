@@ -0,0 +1,40 @@
+from corpus import gerar_frases, gerar_pares, perguntas_da_base
+from medir import comparar, resumir
+
+
+def test_corpus_sai_da_semente():
+    pares = list(gerar_pares(5000, semente=3))
+    assert pares == list(gerar_pares(5000, semente=3))
+    assert pares != list(gerar_pares(5000, semente=4))
+    assert len({pergunta for pergunta, _ in pares}) == 5000
+    # Mais pares que combinações das listas: o sufixo numérico mantém únicos
+    assert len({pergunta for pergunta, _ in gerar_pares(100000)}) == 100000
+    assert list(gerar_frases(200, pares=50, semente=1)) == list(gerar_frases(200, pares=50, semente=1))
+    assert list(perguntas_da_base(50, 200)) == list(perguntas_da_base(50, 200))
+
+
+def test_resumir():
+    resumo = resumir([1000 * numero for numero in range(1, 101)])
+    assert resumo["n"] == 100
+    assert resumo["p50_us"] == 51
+    assert resumo["p99_us"] == 100
+    assert resumo["max_us"] == 100
+    assert resumo["media_us"] == 50.5
+
+
+def test_comparar_so_acusa_regressao_acima_da_folga():
+    base = {"resultados": {
+        "rapida": {"p50_us": 10.0, "p99_us": 20.0},
+        "lenta": {"p50_us": 100.0, "p99_us": 200.0},
+        "removida": {"p50_us": 1.0, "p99_us": 1.0},
+    }}
+    atual = {"resultados": {
+        # 40% pior, mas só 4 µs: ruído
+        "rapida": {"p50_us": 14.0, "p99_us": 20.0},
+        "lenta": {"p50_us": 130.0, "p99_us": 390.0},
+        "nova": {"p50_us": 1000.0, "p99_us": 1000.0},
+    }}
+    assert comparar(atual, base) == [("lenta", "p50_us", 100.0, 130.0)]
+    assert comparar(atual, base, tolerancia=0.5) == []
+    assert comparar(atual, base, tolerancia_p99=0.5) == [("lenta", "p50_us", 100.0, 130.0),
+                                                         ("lenta", "p99_us", 200.0, 390.0)]
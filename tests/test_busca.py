@@ -0,0 +1,52 @@
+import pytest
+
+from ia_v_busca import LIMIAR_CONFIANCA, BuscaAproximada
+from ia_v_indice import IndiceAprendizados
+
+PERGUNTAS = ["como voce esta", "qual e o seu nome", "onde voce mora", "me conta uma piada"]
+
+
+@pytest.fixture
+def busca():
+    return BuscaAproximada(PERGUNTAS)
+
+
+def test_erro_de_digitacao_passa_do_limiar(busca):
+    resultados = busca.buscar("como voce eta")
+    assert [chave for chave, _ in resultados] == ["como voce esta"]
+    assert resultados[0][1] >= LIMIAR_CONFIANCA
+    assert busca.buscar("como voce esta")[0][1] == pytest.approx(1.0)
+
+
+def test_abaixo_do_limiar_fica_de_fora(busca):
+    # "onde voce mora" divide trigramas com a entrada, mas pouco
+    pontuacoes = dict(busca.buscar("como voce eta", k=4, limiar=0.0))
+    assert 0 < pontuacoes["onde voce mora"] < LIMIAR_CONFIANCA
+    assert busca.buscar("previsao do tempo") == []
+    assert busca.buscar("previsao do tempo", limiar=0.0) == []
+    # O limiar é inclusivo e cada chamada usa o seu
+    melhor = pontuacoes["como voce esta"]
+    assert busca.buscar("como voce eta", limiar=melhor)[0][0] == "como voce esta"
+    assert busca.buscar("como voce eta", limiar=melhor + 0.01) == []
+
+
+def test_k_limita_os_resultados_em_ordem(busca):
+    resultados = busca.buscar("como voce eta", k=2, limiar=0.0)
+    assert len(resultados) == 2
+    assert resultados[0][1] >= resultados[1][1]
+
+
+def test_pergunta_aprendida_depois_aparece(busca):
+    assert busca.buscar("qual a cor do ceu") == []
+    busca.adicionar("qual e a cor do ceu")
+    assert busca.buscar("qual a cor do ceu")[0][0] == "qual e a cor do ceu"
+
+
+def test_resposta_aproximada_so_depois_da_exata():
+    indice = IndiceAprendizados({"Como você está?": "bem", "Qual é o seu nome?": "IA"})
+    assert indice.aproximada is None
+    assert indice.buscar_resposta("como voce esta") == "bem"
+    # A exata não monta o índice de trigramas
+    assert indice.aproximada is None
+    assert indice.buscar_resposta("qual o seu nome") == "IA"
+    assert indice.buscar_resposta("previsão do tempo") is None
@@ -0,0 +1,151 @@
+import math
+import os
+from collections import Counter
+
+import ia_v_busca_historico
+from ia_v_busca_historico import B, K1, BuscaHistorico, SegmentoBusca, caminho_busca, palavras_do_turno
+from ia_v_diario import Diario, listar_segmentos, nome_segmento
+from ia_v_turno import normalizar_chave
+
+
+def anexar(diretorio, registros):
+    diario = Diario(diretorio)
+    for registro in registros:
+        diario.anexar(registro)
+    diario.fechar()
+
+
+def turno(numero, texto):
+    return {"pergunta": f"pergunta {numero} {texto}", "resposta": f"resposta {numero}",
+            "data": f"2026-09-{numero % 28 + 1:02d}T10:00:00"}
+
+
+def caminho_indice(diretorio):
+    return caminho_busca(os.path.join(diretorio, nome_segmento(listar_segmentos(diretorio)[-1])))
+
+
+def resultados(busca, texto, **filtros):
+    return [(registro["pergunta"], registro["pontuacao"]) for registro in busca.buscar(texto, **filtros)]
+
+
+def reconstruir(diretorio):
+    for numero in listar_segmentos(diretorio):
+        os.remove(caminho_busca(os.path.join(diretorio, nome_segmento(numero))))
+    return BuscaHistorico(diretorio)
+
+
+def test_turnos_novos_vao_para_o_fim_do_indice():
+    anexar("historico", [turno(numero, "pizza" if numero % 3 else "massa") for numero in range(30)])
+    busca = BuscaHistorico("historico")
+    busca.buscar("pizza")
+    indice = caminho_indice("historico")
+    antes = os.stat(indice)
+    for numero in range(30, 33):
+        anexar("historico", [turno(numero, "massa fresca")])
+        busca.buscar("massa")
+    depois = os.stat(indice)
+    # O mesmo arquivo, só maior: nada foi regravado
+    assert depois.st_ino == antes.st_ino
+    assert depois.st_size > antes.st_size
+    assert list(busca.segmentos.values())[0].blocos == 3
+    # Quem abre de novo aplica os blocos e chega ao mesmo índice
+    recarregada = BuscaHistorico("historico")
+    for texto in ("massa", "massa fresca", "pizza", "pergunta 31"):
+        assert resultados(recarregada, texto) == resultados(busca, texto) == resultados(reconstruir("historico"), texto)
+
+
+def test_cauda_grande_regrava_o_indice_juntado():
+    anexar("historico", [turno(0, "pizza")])
+    busca = BuscaHistorico("historico")
+    busca.buscar("pizza")
+    indice = caminho_indice("historico")
+    anexar("historico", [turno(numero, "massa") for numero in range(1, 20)])
+    busca.buscar("massa")
+    segmento = list(busca.segmentos.values())[0]
+    # Os turnos novos eram maiores que o índice: foi tudo regravado
+    assert segmento.blocos == 0
+    assert os.path.getsize(indice) == segmento.fim == segmento.tamanho_base
+    assert len(SegmentoBusca(segmento.caminho)) == 20
+
+
+def test_bloco_cortado_e_ignorado():
+    anexar("historico", [turno(numero, "pizza") for numero in range(30)])
+    busca = BuscaHistorico("historico")
+    busca.buscar("pizza")
+    anexar("historico", [turno(30, "massa")])
+    busca.buscar("massa")
+    anexar("historico", [turno(31, "massa")])
+    busca.buscar("massa")
+    esperado = resultados(busca, "massa")
+    indice = caminho_indice("historico")
+    # Gravação interrompida no meio do último bloco
+    with open(indice, "r+b") as f:
+        f.truncate(os.path.getsize(indice) - 3)
+    segmento = SegmentoBusca(os.path.join("historico", nome_segmento(1)))
+    assert len(segmento) == 31
+    # O turno que faltou vem do segmento, e a gravação seguinte regrava tudo
+    recarregada = BuscaHistorico("historico")
+    assert resultados(recarregada, "massa") == esperado
+    assert list(recarregada.segmentos.values())[0].blocos == 0
+    assert len(SegmentoBusca(segmento.caminho)) == 32
+
+
+def bm25(registros, texto, k1=K1, b=B):
+    # A conta direta, turno a turno, para comparar com o índice
+    documentos = [Counter(palavras_do_turno(registro)) for registro in registros]
+    media = sum(sum(documento.values()) for documento in documentos) / len(documentos)
+    pontos = [0.0] * len(documentos)
+    for termo in set(normalizar_chave(texto).split()):
+        frequencia = sum(termo in documento for documento in documentos)
+        if not frequencia:
+            continue
+        idf = math.log(1 + (len(documentos) - frequencia + 0.5) / (frequencia + 0.5))
+        for numero, documento in enumerate(documentos):
+            if documento[termo]:
+                tamanho = sum(documento.values())
+                pontos[numero] += idf * documento[termo] * (k1 + 1) / (
+                    documento[termo] + k1 * (1 - b + b * tamanho / media))
+    return pontos
+
+
+REGISTROS = [
+    {"pergunta": "gosto de pizza de calabresa", "resposta": "pizza é ótima", "data": "2026-08-30T22:00:00"},
+    {"pergunta": "vamos ao cinema", "resposta": "qual filme?", "data": "2026-09-01T09:00:00"},
+    {"pergunta": "pizza ou massa hoje", "resposta": "pizza", "data": "2026-09-10T12:00:00"},
+    {"pergunta": "pizza", "resposta": "pizza pizza", "data": "2026-09-30T23:59:00"},
+    {"pergunta": "pizza sem data", "resposta": "ok"},
+    {"pergunta": "massa fresca com molho", "resposta": "boa ideia", "data": "2026-10-01T00:00:00"},
+    {"pergunta": "uma pizza grande de calabresa e uma massa", "resposta": "anotado", "data": "2026-10-02T08:00:00"},
+]
+
+
+def test_bm25_ordena_e_filtra_por_data(monkeypatch):
+    diario = Diario("historico", tamanho_maximo=200)
+    for registro in REGISTROS:
+        diario.anexar(registro)
+    diario.fechar()
+    assert len(listar_segmentos("historico")) > 1
+    busca = BuscaHistorico("historico")
+    esperado = bm25(REGISTROS, "pizza calabresa")
+    ordem = sorted(range(len(REGISTROS)), key=lambda numero: -esperado[numero])
+    ordem = [numero for numero in ordem if esperado[numero]]
+    achados = busca.buscar("Pizza, calabresa!")
+    assert [registro["pergunta"] for registro in achados] == [REGISTROS[numero]["pergunta"] for numero in ordem]
+    assert [registro["pontuacao"] for registro in achados] == [round(esperado[numero], 4) for numero in ordem]
+    assert busca.buscar("pizza", limite=2) == busca.buscar("pizza")[:2]
+    assert busca.buscar("sushi") == []
+
+    # --ate só com o dia inclui o dia inteiro; turnos sem data ficam de fora
+    setembro = busca.buscar("pizza", de="2026-09-01", ate="2026-09-30")
+    assert [registro["pergunta"] for registro in setembro] == ["pizza", "pizza ou massa hoje"]
+    # O filtro só escolhe os turnos: a pontuação é a do diário inteiro
+    assert setembro[0]["pontuacao"] == round(bm25(REGISTROS, "pizza")[3], 4)
+    assert [registro["pergunta"] for registro in busca.buscar("massa", de="2026-10-01")] == [
+        "massa fresca com molho", "uma pizza grande de calabresa e uma massa"]
+    assert busca.buscar("cinema", ate="2026-08-31") == []
+
+    # Com NumPy (se houver) o resultado é o mesmo
+    if ia_v_busca_historico._carregar_numpy() is not None:
+        monkeypatch.setattr(ia_v_busca_historico, "MINIMO_NUMPY", 0)
+        assert BuscaHistorico("historico").buscar("Pizza, calabresa!") == achados
+        assert BuscaHistorico("historico").buscar("pizza", de="2026-09-01", ate="2026-09-30") == setembro
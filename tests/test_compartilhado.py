@@ -0,0 +1,150 @@
+import atexit
+import json
+
+import pytest
+
+import ia_v_compartilhado
+from ia_v_compartilhado import IndiceCompartilhado, caminho_registro
+from ia_v_indice import caminho_indice, tabela_respostas
+
+CAMINHO = "aprendizados.json"
+
+
+@pytest.fixture
+def abrir(monkeypatch):
+    # Cada chamada é um processo que acabou de carregar o aprendizados.json;
+    # todos são fechados ainda na pasta temporária
+    abertos = []
+    recargas = []
+    recarregar = IndiceCompartilhado._recarregar
+
+    def contando(indice, base):
+        recargas.append(base)
+        recarregar(indice, base)
+
+    monkeypatch.setattr(IndiceCompartilhado, "_recarregar", contando)
+
+    def abrir(dados=None, gravador=None):
+        if dados is None:
+            with open(CAMINHO, "r", encoding="utf-8") as f:
+                dados = json.load(f)
+        indice = IndiceCompartilhado(tabela_respostas(dados), CAMINHO, gravador, dados, maximo_registro=2,
+                                     adiado=gravador is not None)
+        atexit.unregister(indice.fechar)
+        abertos.append(indice)
+        return indice
+
+    abrir.recargas = recargas
+    yield abrir
+    for indice in abertos:
+        indice.fechar()
+
+
+def aprender(indice, chave, valor):
+    indice.adicionar(chave, valor)
+    indice.salvar()
+
+
+def test_abre_sem_reler_depois_de_compactar(abrir):
+    with open(CAMINHO, "w", encoding="utf-8") as f:
+        json.dump({"respostas": {"oi": "Olá!"}}, f)
+    primeiro = abrir()
+    aprender(primeiro, "tchau", "Até mais!")
+    aprender(primeiro, "bom dia", "Bom dia!")
+    # O registro chegou a maximo_registro: aprendizados.json e índice regravados
+    assert primeiro.base == 2
+    with open(caminho_indice(CAMINHO), "r", encoding="utf-8") as f:
+        assert json.load(f)["sequencia"] == 2
+
+    segundo = abrir()
+    assert abrir.recargas == []
+    assert segundo.sequencia == 2
+    assert segundo.buscar("bom dia") == "Bom dia!"
+
+
+def test_copia_lida_antes_da_compactacao(abrir):
+    with open(CAMINHO, "w", encoding="utf-8") as f:
+        json.dump({"respostas": {"oi": "Olá!", "tchau": "Até mais!"}}, f)
+    primeiro = abrir()
+    with open(CAMINHO, "r", encoding="utf-8") as f:
+        antiga = json.load(f)
+    # Só regrava chaves que já existiam: o total do índice continua batendo
+    aprender(primeiro, "oi", "Oi de novo!")
+    aprender(primeiro, "tchau", "Tchau!")
+
+    segundo = abrir(antiga)
+    assert segundo.buscar("oi") == "Oi de novo!"
+    assert segundo.buscar("tchau") == "Tchau!"
+
+
+def test_indice_sem_sequencia_rele_o_arquivo(abrir):
+    with open(CAMINHO, "w", encoding="utf-8") as f:
+        json.dump({"respostas": {"oi": "Olá!"}}, f)
+    primeiro = abrir()
+    aprender(primeiro, "tchau", "Até mais!")
+    aprender(primeiro, "bom dia", "Bom dia!")
+    # Como o índice que a manutenção grava: sem a sequência
+    with open(caminho_indice(CAMINHO), "r", encoding="utf-8") as f:
+        dados = json.load(f)
+    del dados["sequencia"]
+    with open(caminho_indice(CAMINHO), "w", encoding="utf-8") as f:
+        json.dump(dados, f)
+
+    segundo = abrir()
+    assert abrir.recargas == [2]
+    assert segundo.buscar("bom dia") == "Bom dia!"
+    abrir()
+    assert abrir.recargas == [2]
+
+
+class Fila:
+    # Faz o papel do GRAVADOR: as tarefas só rodam quando o teste manda
+    def __init__(self):
+        self.tarefas = []
+
+    def executar(self, funcao, *argumentos):
+        self.tarefas.append((funcao, argumentos))
+
+    def rodar(self):
+        while self.tarefas:
+            funcao, argumentos = self.tarefas.pop(0)
+            funcao(*argumentos)
+
+
+def linhas_do_registro():
+    with open(caminho_registro(CAMINHO), "rb") as f:
+        return len(f.readlines()) - 1
+
+
+def test_adiado_nao_toca_o_disco_de_quem_responde(abrir, monkeypatch):
+    with open(CAMINHO, "w", encoding="utf-8") as f:
+        json.dump({"respostas": {"oi": "Olá!"}}, f)
+    fila = Fila()
+    servidor = abrir(gravador=fila)
+    terminal = abrir()
+
+    def sem_disco(*argumentos, **nomeados):
+        raise AssertionError("disco no loop")
+
+    with monkeypatch.context() as m:
+        for nome in ("stat", "fstat"):
+            m.setattr(ia_v_compartilhado.os, nome, sem_disco)
+        m.setattr(ia_v_compartilhado, "open", sem_disco, raising=False)
+        servidor.adicionar("tchau", "Até mais!")
+        assert servidor.buscar("tchau") == "Até mais!"
+        assert servidor.buscar_resposta("tchau!") == "Até mais!"
+    assert linhas_do_registro() == 0
+
+    # Outro processo aprende a mesma pergunta antes da linha daqui ir para o
+    # registro: a daqui vem depois e continua valendo
+    aprender(terminal, "tchau", "Tchau do terminal")
+    aprender(terminal, "bom dia", "Bom dia!")
+    fila.rodar()
+    assert servidor.buscar("tchau") == "Até mais!"
+    assert servidor.buscar("bom dia") == "Bom dia!"
+    assert terminal.buscar("tchau") == "Até mais!"
+    # A conferência do registro também roda no gravador
+    aprender(terminal, "boa noite", "Boa noite!")
+    assert servidor.buscar("boa noite") is None
+    fila.rodar()
+    assert servidor.buscar("boa noite") == "Boa noite!"
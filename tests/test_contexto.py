@@ -0,0 +1,49 @@
+from ia_v_contexto import ContextoRolante, formatar_troca
+
+
+def test_limite_de_turnos_expulsa_os_mais_antigos():
+    contexto = ContextoRolante(maximo_turnos=2)
+    contexto.adicionar("gosto de pizza", "legal", "feliz")
+    contexto.adicionar("minha cachorra fugiu", "que pena", "triste")
+    contexto.adicionar("achei a cachorra", "oba", "feliz")
+    assert list(contexto) == [("minha cachorra fugiu", "que pena"), ("achei a cachorra", "oba")]
+    assert contexto.renderizar() == formatar_troca("minha cachorra fugiu", "que pena") + formatar_troca(
+        "achei a cachorra", "oba")
+    # O que saiu vira resumo; "gosto" é palavra vazia
+    assert contexto.resumo() == {"turnos": 1, "temas": {"pizza": 1}, "emocoes": {"feliz": 1}}
+
+
+def test_limite_de_caracteres():
+    troca = len(formatar_troca("abc", "def"))
+    contexto = ContextoRolante(maximo_turnos=None, maximo_caracteres=2 * troca)
+    for pergunta in ("abc", "ghi", "jkl"):
+        contexto.adicionar(pergunta, "def")
+    assert [pergunta for pergunta, _ in contexto] == ["ghi", "jkl"]
+    assert contexto.caracteres == 2 * troca
+    # Uma troca maior que o limite inteiro fica sozinha, mas fica
+    contexto.adicionar("x" * 3 * troca, "def")
+    assert len(contexto) == 1
+    assert contexto.resumo()["turnos"] == 3
+
+
+def test_renderizar_acompanha_a_janela():
+    contexto = ContextoRolante(maximo_turnos=1)
+    assert contexto.renderizar() == ""
+    contexto.adicionar("oi", "olá")
+    assert contexto.renderizar() == formatar_troca("oi", "olá")
+    contexto.adicionar("tudo bem", "sim")
+    assert contexto.renderizar() == formatar_troca("tudo bem", "sim")
+
+
+def test_volta_dos_dados_com_o_resumo():
+    contexto = ContextoRolante(maximo_turnos=2)
+    for numero in range(5):
+        contexto.adicionar(f"falando de viagem {numero}", "ok", "neutra")
+    copia = ContextoRolante.de_dados(contexto.para_dados(), maximo_turnos=2)
+    assert list(copia) == list(contexto)
+    assert copia.resumo() == contexto.resumo() == {"turnos": 3, "temas": {"falando": 3, "viagem": 3},
+                                                   "emocoes": {"neutra": 3}}
+    # Um limite menor ao carregar expulsa para o resumo
+    menor = ContextoRolante.de_dados(contexto.para_dados(), maximo_turnos=1)
+    assert len(menor) == 1
+    assert menor.resumo()["turnos"] == 4
@@ -0,0 +1,109 @@
+import json
+import os
+
+import pytest
+
+from ia_v_diario import (ARQUIVO_MIGRACAO, Diario, HistoricoMapeado, caminho_offsets, listar_segmentos,
+                         migrar_historico, nome_segmento)
+
+
+def turnos(quantidade, inicio=0):
+    return [{"pergunta": f"p{numero}", "resposta": f"r{numero}"} for numero in range(inicio, inicio + quantidade)]
+
+
+def test_anexar_troca_de_segmento_e_le_em_ordem():
+    diario = Diario("historico", tamanho_maximo=100)
+    for registro in turnos(9):
+        diario.anexar(registro)
+    # Lido antes de fechar: o que foi anexado já está no disco
+    assert list(diario.ler()) == turnos(9)
+    diario.fechar()
+    segmentos = listar_segmentos("historico")
+    assert len(segmentos) > 1
+    for numero in segmentos:
+        assert os.path.getsize(diario.caminho_segmento(numero)) <= 100
+    # Um Diario aberto de novo continua no último segmento, que ainda tem espaço
+    diario = Diario("historico", tamanho_maximo=100)
+    diario.anexar({"pergunta": "p9", "resposta": "r9"})
+    diario.fechar()
+    assert listar_segmentos("historico") == segmentos
+    assert list(Diario("historico").ler()) == turnos(10)
+
+
+def test_migrar_historico_da_memoria():
+    memoria = {"nome": "Ana", "historico": turnos(5) + ["lixo"]}
+    assert migrar_historico(memoria, tamanho_maximo=60)
+    assert memoria == {"nome": "Ana"}
+    assert list(Diario().ler()) == turnos(5)
+    assert not os.path.exists("historico.tmp")
+    # Sem "historico" na memória não há o que migrar
+    assert not migrar_historico(memoria)
+
+
+def test_migrar_de_novo_nao_duplica():
+    # A memória com o histórico não chegou a ser regravada: a mesma migração
+    # roda de novo na próxima inicialização
+    assert migrar_historico({"historico": turnos(5)}, tamanho_maximo=60)
+    assert migrar_historico({"historico": turnos(5)}, tamanho_maximo=60)
+    assert list(Diario().ler()) == turnos(5)
+
+
+def test_migrar_para_diario_existente_anexa_no_fim():
+    diario = Diario()
+    diario.anexar({"pergunta": "do servidor", "resposta": "ok"})
+    diario.fechar()
+    migrar_historico({"historico": turnos(3)})
+    assert [registro["pergunta"] for registro in Diario().ler()] == ["do servidor", "p0", "p1", "p2"]
+    with open(os.path.join("historico", ARQUIVO_MIGRACAO), encoding="utf-8") as f:
+        assert json.load(f)["segmentos"] == [2]
+    migrar_historico({"historico": turnos(3)})
+    assert len(list(Diario().ler())) == 4
+
+
+def test_migracao_interrompida_grava_so_o_que_faltou():
+    migrar_historico({"historico": turnos(1)})
+    historico = turnos(6, inicio=1)
+    migrar_historico({"historico": historico}, tamanho_maximo=60)
+    ultimo = listar_segmentos("historico")[-1]
+    # A marca foi gravada e o último segmento não chegou ao disco
+    os.remove(os.path.join("historico", nome_segmento(ultimo)))
+    migrar_historico({"historico": historico}, tamanho_maximo=60)
+    assert list(Diario().ler()) == turnos(7)
+
+
+def test_historico_mapeado_le_so_as_linhas_pedidas():
+    diario = Diario("historico", tamanho_maximo=100)
+    for registro in turnos(9):
+        diario.anexar(registro)
+    historico = diario.historico()
+    assert len(historico) == 9
+    assert historico[0] == turnos(1)[0]
+    assert historico[-1] == historico[8] == {"pergunta": "p8", "resposta": "r8"}
+    with pytest.raises(IndexError):
+        historico[9]
+    assert historico.recentes(3) == turnos(3, inicio=6)
+    assert historico.recentes(50) == list(historico) == turnos(9)
+    # Cada segmento ganhou o seu .idx
+    for numero in historico.segmentos:
+        assert os.path.exists(caminho_offsets(diario.caminho_segmento(numero)))
+    diario.fechar()
+
+
+def test_offsets_estendidos_quando_o_segmento_cresce():
+    diario = Diario("historico")
+    diario.anexar({"pergunta": "p0", "resposta": "r0"})
+    assert len(diario.historico()) == 1
+    caminho = diario.caminho_segmento(1)
+    tamanho_idx = os.path.getsize(caminho_offsets(caminho))
+    diario.anexar({"pergunta": "p1", "resposta": "r1"})
+    diario.fechar()
+    # Uma linha ainda sendo escrita não conta
+    with open(caminho, "a", encoding="utf-8") as f:
+        f.write('{"pergunta": "p2"')
+    historico = HistoricoMapeado("historico")
+    assert list(historico) == turnos(2)
+    assert os.path.getsize(caminho_offsets(caminho)) == tamanho_idx + 8
+    # Um .idx que aponta além do segmento (o segmento foi trocado) é refeito
+    with open(caminho, "w", encoding="utf-8") as f:
+        f.write('{"pergunta": "nova", "resposta": "r"}\n')
+    assert HistoricoMapeado("historico").recentes(5) == [{"pergunta": "nova", "resposta": "r"}]
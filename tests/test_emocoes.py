@@ -0,0 +1,64 @@
+import atexit
+import json
+import os
+
+import pytest
+
+from conftest import RAIZ
+from ia_v_emocoes import ClassificadorEmocoes, exemplos_do_arquivo, treinar_com_base
+import ia_v_emocoes
+from ia_v_persistencia import GRAVADOR
+
+# Frases escritas à mão, fora de emocoes.json e dos modelos de corpus.py
+REAIS = list(exemplos_do_arquivo(os.path.join(RAIZ, "benchmarks", "emocoes_reais.json")))
+MINIMO_ACERTOS = 0.85
+
+
+@pytest.fixture(scope="module")
+def classificador():
+    classificador = ClassificadorEmocoes()
+    classificador.treinar(exemplos_do_arquivo())
+    return classificador
+
+
+def test_nenhuma_frase_de_treino_no_conjunto_separado():
+    treino = {frase for frase, _ in exemplos_do_arquivo()}
+    assert treino.isdisjoint(frase for frase, _ in REAIS)
+
+
+@pytest.mark.parametrize("frase", ["voce legal", "estou com fome", "meu amigo joão gosta de mim"])
+def test_frases_neutras_ficam_neutras(classificador, frase):
+    assert classificador.classificar(frase) == "neutra"
+
+
+def test_acertos_nas_frases_reais(classificador):
+    frases = [frase for frase, _ in REAIS]
+    previstos = [classificador.classificar(frase) for frase in frases]
+    # O lote (NumPy, quando há) aplica a mesma margem
+    assert classificador.classificar_lote(frases * 2)[:len(frases)] == previstos
+    erradas = [(frase, rotulo, previsto) for (frase, rotulo), previsto in zip(REAIS, previstos) if previsto != rotulo]
+    assert [errada for errada in erradas if errada[1] == "neutra"] == []
+    assert 1 - len(erradas) / len(REAIS) >= MINIMO_ACERTOS, erradas
+
+
+def test_emocao_clara_passa_da_margem(classificador):
+    assert classificador.classificar("estou muito triste com tudo") == "triste"
+    assert classificador.classificar("que raiva dessa fila") == "irritado"
+    assert classificador.classificar("fiquei feliz demais com o presente") == "feliz"
+
+
+def test_rotulos_gravados_so_treinam_quando_pedido(variante, monkeypatch):
+    # As emoções gravadas vieram das listas de palavras: carregar a base não
+    # treina com elas, só a manutenção com --treinar-com-base
+    monkeypatch.setattr(ia_v_emocoes, "_base_treinada", False)
+    monkeypatch.setattr(ia_v_emocoes, "CLASSIFICADOR", ClassificadorEmocoes())
+    aprendizados = {"respostas": {"estou com fome": {"texto": "Vamos comer!", "emocao": "triste"}}}
+    with open("aprendizados.json", "w", encoding="utf-8") as f:
+        json.dump(aprendizados, f)
+    _, indice = variante.carregar_base()
+    # Fecha agora, ainda na pasta temporária, e não na saída do pytest
+    indice.fechar()
+    atexit.unregister(indice.fechar)
+    GRAVADOR.descarregar()
+    assert len(ia_v_emocoes.CLASSIFICADOR) == 0
+    assert treinar_com_base(aprendizados) == 1
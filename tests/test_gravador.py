@@ -0,0 +1,41 @@
+import json
+import signal
+import threading
+
+import ia_v_persistencia
+from ia_v_persistencia import GravadorAtrasado
+
+
+def test_sinal_durante_marcar_nao_trava(tmp_path, monkeypatch):
+    sinais = []
+    monkeypatch.setattr(ia_v_persistencia.signal, "signal", lambda *argumentos: None)
+    monkeypatch.setattr(ia_v_persistencia.os, "kill", lambda pid, sinal: sinais.append(sinal))
+
+    gravador = GravadorAtrasado(intervalo=0, intervalo_minimo=0, maximo_alteracoes=1)
+    entrou, liberar = threading.Event(), threading.Event()
+
+    def bloquear():
+        entrou.set()
+        liberar.wait(5)
+
+    # A thread do gravador fica no meio de uma gravação, segurando _gravando
+    with gravador._condicao:
+        gravador.executar(bloquear)
+        gravador.marcar(str(tmp_path / "a.json"), {"a": 1})
+    assert entrou.wait(5)
+
+    # O sinal chega enquanto a thread principal está dentro de marcar(),
+    # segurando _condicao, e a gravação da thread termina logo depois
+    def interrompido():
+        with gravador._condicao:
+            gravador.marcar(str(tmp_path / "b.json"), {"b": 2})
+            liberar.set()
+            gravador._ao_receber_sinal(signal.SIGTERM, None)
+
+    principal = threading.Thread(target=interrompido, daemon=True)
+    principal.start()
+    principal.join(5)
+
+    assert not principal.is_alive()
+    assert sinais == [signal.SIGTERM]
+    assert json.loads((tmp_path / "b.json").read_text(encoding="utf-8")) == {"b": 2}
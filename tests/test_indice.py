@@ -0,0 +1,44 @@
+import json
+
+import ia_v_indice
+from ia_v_indice import IndiceAprendizados, caminho_indice
+
+CAMINHO = "aprendizados.json"
+
+
+def gravar(tabela):
+    with open(CAMINHO, "w", encoding="utf-8") as f:
+        json.dump(tabela, f, ensure_ascii=False)
+    return tabela
+
+
+def test_forma_canonica_acha_a_pergunta():
+    indice = IndiceAprendizados({"Como você está?": "bem", "qual seu nome": "IA"})
+    assert indice.buscar("como voce esta") == "bem"
+    assert indice.buscar("  COMO   VOCÊ ESTÁ!! ") == "bem"
+    assert indice.buscar("Qual seu nome?") == "IA"
+    assert indice.buscar("como vai") is None
+    indice.adicionar("Bom dia", "olá")
+    assert indice.buscar("bom dia!") == "olá"
+
+
+def test_indice_gravado_vale_enquanto_o_arquivo_nao_muda(monkeypatch):
+    tabela = gravar({"Como você está?": "bem"})
+    IndiceAprendizados(tabela, CAMINHO)
+    with open(caminho_indice(CAMINHO), encoding="utf-8") as f:
+        assert json.load(f)["chaves"] == {"como voce esta": "Como você está?"}
+    reconstruidos = []
+    reconstruir = IndiceAprendizados.reconstruir
+    monkeypatch.setattr(IndiceAprendizados, "reconstruir",
+                        lambda self: reconstruidos.append(1) or reconstruir(self))
+    assert IndiceAprendizados(tabela, CAMINHO).buscar("como voce esta") == "bem"
+    assert not reconstruidos
+    # Outro processo regravou os aprendizados: a assinatura não bate mais
+    tabela = gravar({"Como você está?": "bem", "Bom dia": "olá"})
+    indice = IndiceAprendizados(tabela, CAMINHO)
+    assert reconstruidos == [1]
+    assert indice.buscar("bom dia") == "olá"
+    # Um .indice.json de outra versão também é refeito
+    monkeypatch.setattr(ia_v_indice, "VERSAO_INDICE", ia_v_indice.VERSAO_INDICE + 1)
+    IndiceAprendizados(tabela, CAMINHO)
+    assert reconstruidos == [1, 1]
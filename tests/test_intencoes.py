@@ -0,0 +1,86 @@
+import pytest
+
+from conftest import criar_motor
+from ia_v_indice import IndiceAprendizados, tabela_respostas
+from ia_v_intencoes import Roteador, ler_aprendizado
+
+
+def montar(variante, respostas, fatos):
+    aprendizados = {"respostas": dict(respostas), "fatos": list(fatos)}
+    indice = IndiceAprendizados(tabela_respostas(aprendizados))
+    return criar_motor(variante, aprendizados, {"nome_usuario": "ana", "preferencias": []}, indice)
+
+
+def test_resposta_ensinada_vem_antes_do_fato(variante):
+    responder = montar(variante, {"o que é água": "É H2O, a molécula da vida."},
+                       [{"sujeito": "água", "predicado": "um líquido"}])
+    resposta, _ = responder("o que é água")
+    assert "H2O" in resposta
+    assert "líquido" not in resposta
+    assert responder.intencao == "busca"
+
+
+def test_fato_responde_sem_resposta_ensinada(variante):
+    responder = montar(variante, {"o que é água": "É H2O, a molécula da vida."},
+                       [{"sujeito": "o sol", "predicado": "uma estrela"}])
+    resposta, _ = responder("o que é o sol?")
+    assert resposta == "O sol é uma estrela."
+    assert responder.intencao == "fatos"
+
+
+def test_motores_no_mesmo_processo_tem_bases_separadas(variante):
+    # Dois servidores (ou motores) no mesmo processo, cada um com a sua base
+    primeiro = montar(variante, {"senha do cofre": "A senha é azul."}, [])
+    segundo = montar(variante, {"senha do cofre": "A senha é verde."}, [])
+    assert "azul" in primeiro("senha do cofre")[0]
+    assert "verde" in segundo("senha do cofre")[0]
+    # O que um aprende não aparece no outro
+    _, aprendeu = primeiro("aprenda: código do cofre = 1234")
+    assert aprendeu
+    assert "1234" in primeiro("código do cofre")[0]
+    assert "1234" not in segundo("código do cofre")[0]
+
+
+def test_roteador_por_prioridade_e_gatilho():
+    roteador = Roteador()
+    chamadas = []
+
+    def responder_com(nome, resposta=None):
+        def funcao(turno, contexto):
+            chamadas.append(nome)
+            return resposta
+        return funcao
+
+    roteador.registrar("padrao", responder_com("padrao", "não sei"), prioridade=100)
+    roteador.registrar("busca", responder_com("busca"), prioridade=90)
+    roteador.registrar("aprender", responder_com("aprender", "aprendi"), prioridade=0, tokens=["aprenda"],
+                       padrao=r"^aprenda\s*:")
+    roteador.registrar("data", responder_com("data", "hoje"), achados=["data"])
+    roteador.registrar("gosto", responder_com("gosto"), achados=[("preferencia", "positiva")])
+    with pytest.raises(ValueError):
+        roteador.registrar("data", responder_com("data"))
+
+    contexto = {}
+    assert roteador.despachar("Aprenda: oi = olá", contexto) == "aprendi"
+    assert contexto["intencao"] == "aprender" and chamadas == ["aprender"]
+    # O token aciona a intenção, mas o padrão não casa
+    chamadas.clear()
+    assert roteador.despachar("eu aprenda isso", contexto) == "não sei"
+    assert chamadas == ["busca", "padrao"]
+    chamadas.clear()
+    assert roteador.despachar("gosto de pizza", contexto) == "não sei"
+    assert chamadas == ["gosto", "busca", "padrao"]
+    assert [intencao.nome for intencao in roteador.candidatas("tudo bem?")] == ["busca", "padrao"]
+    # Uma frase sem gatilho que devolve None em todas fica sem intenção
+    vazio = Roteador()
+    vazio.registrar("busca", responder_com("busca"))
+    assert vazio.despachar("oi", contexto) is None
+    assert contexto["intencao"] is None
+
+
+def test_ler_aprendizado():
+    assert ler_aprendizado(" capital = Brasília ") == ("capital", "Brasília")
+    # A barra vem antes do igual
+    assert ler_aprendizado("1 + 1 = ? | 2") == ("1 + 1 = ?", "2")
+    assert ler_aprendizado("pergunta sem resposta =") is None
+    assert ler_aprendizado("sem separador") is None
@@ -0,0 +1,47 @@
+import pytest
+
+from ia_v_lexico import Lexico, rotulos, ultimo
+
+
+@pytest.fixture
+def lexico():
+    return Lexico({
+        "preferencia": {"gosta": ["gosto de"], "nao_gosta": ["não gosto de"]},
+        "animal": {"gato": ["gato"], "cachorro": ["cão", "cachorro"]},
+        "tema": {"pets": ["gato preto", "preto"], "cores": ["preto e branco"]},
+        "clima": {"sol": ["sol"]},
+    })
+
+
+def spans(achados):
+    return [(achado.categoria, achado.rotulo, achado.inicio, achado.fim) for achado in achados]
+
+
+def test_so_palavras_inteiras(lexico):
+    assert lexico.analisar("gatos e girassol") == []
+    assert lexico.analisar("um gato_preto") == []
+    assert spans(lexico.analisar("gato, sol!")) == [("animal", "gato", 0, 4), ("clima", "sol", 6, 9)]
+    assert spans(lexico.analisar("sol")) == [("clima", "sol", 0, 3)]
+
+
+def test_acentos_e_maiusculas_dobrados(lexico):
+    # As posições valem para texto.lower()
+    texto = "O CÃO e o cao"
+    assert spans(lexico.analisar(texto)) == [("animal", "cachorro", 2, 5), ("animal", "cachorro", 10, 13)]
+    assert [achado.padrao for achado in lexico.analisar(texto)] == ["cão", "cão"]
+    assert rotulos(lexico.analisar("Nao gosto de chuva"), "preferencia") == {"nao_gosta"}
+
+
+def test_o_mais_longo_da_categoria_vence(lexico):
+    achados = lexico.analisar("não gosto de gato")
+    # "gosto de" está dentro de "não gosto de"; "gato" é de outra categoria
+    assert spans(achados) == [("preferencia", "nao_gosta", 0, 12), ("animal", "gato", 13, 17)]
+
+
+def test_sobrepostos_sem_conter_ficam_os_dois(lexico):
+    achados = lexico.analisar("gato preto e branco")
+    # "gato preto" e "preto e branco" se cruzam; "preto" está dentro dos dois.
+    # "gato" é de outra categoria e fica
+    assert spans(achados) == [("animal", "gato", 0, 4), ("tema", "pets", 0, 10), ("tema", "cores", 5, 19)]
+    assert ultimo(achados, "tema").rotulo == "cores"
+    assert ultimo(achados, "clima") is None
@@ -0,0 +1,44 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import RAIZ, VARIANTES
+
+FALAS = [
+    "oi",
+    "estou muito feliz hoje",
+    "me conta alguma coisa",
+    "aprenda: senha do cofre = 1234",
+    "senha do cofre",
+    "não gosto de chuva",
+    "que coisa estranha",
+    "estou triste e cansado",
+    "tchau",
+]
+
+
+def rodar(pasta, variante, semente, semente_hash):
+    ambiente = dict(os.environ, PYTHONHASHSEED=str(semente_hash))
+    comando = [sys.executable, os.path.join(RAIZ, pasta, "ia_v_lote.py"), "falas.txt",
+               "--variante", variante, "--semente", str(semente)]
+    resultado = subprocess.run(comando, env=ambiente, capture_output=True, text=True, check=True)
+    return [json.loads(linha) for linha in resultado.stdout.splitlines()]
+
+
+@pytest.mark.parametrize("pasta, variante", [
+    (pasta, "emocional" if nome == "ia_v_emocional" else "personalidade") for pasta, nome in VARIANTES
+])
+def test_mesma_semente_mesmas_respostas(pasta, variante):
+    with open("falas.txt", "w", encoding="utf-8") as f:
+        f.write("\n".join(FALAS) + "\n")
+    primeira = rodar(pasta, variante, 7, 1)
+    # Outro processo, com outra ordem de hash para conjuntos e dicionários
+    assert rodar(pasta, variante, 7, 2) == primeira
+    assert [registro["entrada"] for registro in primeira] == FALAS
+    assert [registro["n"] for registro in primeira] == list(range(1, len(FALAS) + 1))
+    assert primeira[3].get("aprendeu") and "1234" in primeira[4]["resposta"]
+    # Sem --salvar nada vai para o disco
+    assert sorted(os.listdir()) == ["falas.txt"]
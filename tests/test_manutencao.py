@@ -0,0 +1,138 @@
+import json
+import os
+
+import pytest
+
+import ia_v_manutencao
+from ia_v_diario import Diario, HistoricoMapeado, listar_segmentos, nome_segmento
+from ia_v_emocoes import ROTULOS
+from ia_v_indice import caminho_indice
+from ia_v_manutencao import (CAMINHO_APRENDIZADOS, PODADO_RETENCAO, SUFIXO_TRABALHO, arquivar_diario, reescrever_respostas,
+                              reescrever_segmento, reindexar)
+from ia_v_retencao import ArquivoHistorico, Politica
+
+TURNOS = 10
+FICAM = 4
+
+
+@pytest.fixture
+def diario():
+    diario = Diario("historico", tamanho_maximo=200)
+    for numero in range(TURNOS):
+        diario.anexar({"pergunta": f"p{numero}", "resposta": f"r{numero}", "data": f"2024-01-{numero + 1:02d}T10:00:00"})
+    diario.fechar()
+    return "historico"
+
+
+def perguntas(diretorio):
+    return [registro["pergunta"] for registro in HistoricoMapeado(diretorio)]
+
+
+def test_diario_alterado_durante_o_arquivamento_desfaz(diario, monkeypatch):
+    arquivo = ArquivoHistorico("arquivo")
+    gravar = arquivo.gravar
+
+    def gravar_e_escrever(*argumentos, **nomeados):
+        resultado = gravar(*argumentos, **nomeados)
+        # Um terminal anexa um turno enquanto o arquivo é gravado
+        escritor = Diario(diario)
+        escritor.anexar({"pergunta": "nova", "resposta": "ok"})
+        escritor.fechar()
+        return resultado
+
+    monkeypatch.setattr(arquivo, "gravar", gravar_e_escrever)
+    with pytest.raises(RuntimeError):
+        arquivar_diario(diario, arquivo, Politica(turnos=FICAM))
+    assert arquivo.pendente() is None
+    assert list(arquivo.ler()) == []
+    assert perguntas(diario) == [f"p{numero}" for numero in range(TURNOS)] + ["nova"]
+
+
+def test_retomar_depois_da_poda_nao_arquiva_de_novo(diario, monkeypatch):
+    arquivo = ArquivoHistorico("arquivo")
+    trocar = ia_v_manutencao._trocar_pasta
+
+    def interromper(atual, nova):
+        # Para depois de pôr o diário podado no lugar, antes de confirmar
+        trocar(atual, nova)
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(ia_v_manutencao, "_trocar_pasta", interromper)
+    with pytest.raises(KeyboardInterrupt):
+        arquivar_diario(diario, arquivo, Politica(turnos=FICAM))
+    monkeypatch.setattr(ia_v_manutencao, "_trocar_pasta", trocar)
+    assert arquivo.pendente() is not None
+
+    assert arquivar_diario(diario, arquivo, Politica(turnos=FICAM)) == 0
+    assert arquivo.pendente() is None
+    assert not os.path.exists(os.path.join(diario, PODADO_RETENCAO))
+    assert [registro["pergunta"] for registro in arquivo.ler()] == [f"p{numero}" for numero in range(TURNOS - FICAM)]
+    assert perguntas(diario) == [f"p{numero}" for numero in range(TURNOS - FICAM, TURNOS)]
+
+
+def interromper_na(monkeypatch, funcao, chamada):
+    # Faz `funcao` parar com KeyboardInterrupt na chamada número `chamada` (0:
+    # nunca) e devolve a lista dos argumentos de cada chamada que rodou
+    chamadas = []
+
+    def contar(*argumentos):
+        if len(chamadas) + 1 == chamada:
+            raise KeyboardInterrupt
+        chamadas.append(argumentos)
+        return funcao(*argumentos)
+
+    monkeypatch.setattr(ia_v_manutencao, funcao.__name__, contar)
+    return chamadas
+
+
+def test_reindexar_historico_continua_de_onde_parou(diario, monkeypatch):
+    segmentos = listar_segmentos(diario)
+    assert len(segmentos) > 2
+    interromper_na(monkeypatch, reescrever_segmento, 2)
+    with pytest.raises(KeyboardInterrupt):
+        reindexar(processos=1, alvos=("historico",))
+    assert os.path.isdir(diario + SUFIXO_TRABALHO)
+    assert "emocao" not in HistoricoMapeado(diario)[0]
+
+    chamadas = interromper_na(monkeypatch, reescrever_segmento, 0)
+    assert reindexar(processos=1, alvos=("historico",)) == {"historico": TURNOS}
+    # Só os segmentos que faltavam foram reescritos
+    assert [os.path.basename(origem) for origem, _ in chamadas] == [nome_segmento(numero) for numero in segmentos[1:]]
+    assert not os.path.exists(diario + SUFIXO_TRABALHO)
+    historico = HistoricoMapeado(diario)
+    assert perguntas(diario) == [f"p{numero}" for numero in range(TURNOS)]
+    assert all("emocao" in registro for registro in historico)
+
+
+def test_reindexar_aprendizados_continua_de_onde_parou(monkeypatch):
+    respostas = {f"Pergunta {numero}?": {"texto": f"resposta {numero}", "emocao": "antiga"} for numero in range(7)}
+    with open(CAMINHO_APRENDIZADOS, "w", encoding="utf-8") as f:
+        json.dump({"respostas": respostas}, f)
+    interromper_na(monkeypatch, reescrever_respostas, 3)
+    with pytest.raises(KeyboardInterrupt):
+        reindexar(processos=1, alvos=("aprendizados",), bloco=2)
+
+    chamadas = interromper_na(monkeypatch, reescrever_respostas, 0)
+    assert reindexar(processos=1, alvos=("aprendizados",), bloco=2) == {"aprendizados": 7}
+    # Os dois primeiros blocos já estavam prontos
+    assert [[pergunta for pergunta, _ in pares] for pares, _ in chamadas] == [
+        ["Pergunta 4?", "Pergunta 5?"], ["Pergunta 6?"]]
+    with open(CAMINHO_APRENDIZADOS, encoding="utf-8") as f:
+        novas = json.load(f)["respostas"]
+    assert list(novas) == list(respostas)
+    # Todas rotuladas de novo, também as dos blocos da primeira execução
+    assert all(valor["emocao"] in ROTULOS for valor in novas.values())
+    with open(caminho_indice(CAMINHO_APRENDIZADOS), encoding="utf-8") as f:
+        assert json.load(f)["chaves"]["pergunta 6"] == "Pergunta 6?"
+
+
+def test_reindexar_recomeca_se_a_origem_mudou(diario, monkeypatch):
+    interromper_na(monkeypatch, reescrever_segmento, 2)
+    with pytest.raises(KeyboardInterrupt):
+        reindexar(processos=1, alvos=("historico",))
+    escritor = Diario(diario, tamanho_maximo=200)
+    escritor.anexar({"pergunta": "nova", "resposta": "ok"})
+    escritor.fechar()
+    chamadas = interromper_na(monkeypatch, reescrever_segmento, 0)
+    assert reindexar(processos=1, alvos=("historico",)) == {"historico": TURNOS + 1}
+    assert len(chamadas) == len(listar_segmentos(diario))
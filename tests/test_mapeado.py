@@ -0,0 +1,118 @@
+import json
+import os
+
+import pytest
+
+from ia_v_mapeado import SUFIXO_DELTA, SUFIXO_JUNTANDO, BaseMapeada, compilar_de_json
+
+CAMINHO = "aprendizados.base"
+
+
+class Fila:
+    # Gravador que só guarda as tarefas; o teste decide quando rodar
+    def __init__(self):
+        self.tarefas = []
+
+    def executar(self, funcao, *argumentos):
+        self.tarefas.append((funcao, argumentos))
+
+    def rodar(self):
+        tarefas, self.tarefas = self.tarefas, []
+        for funcao, argumentos in tarefas:
+            funcao(*argumentos)
+
+
+@pytest.fixture
+def abrir():
+    abertas = []
+
+    def abrir(maximo_delta=100, gravador=None):
+        base = BaseMapeada(CAMINHO, maximo_delta, gravador or Fila())
+        abertas.append(base)
+        return base
+
+    yield abrir
+    for base in abertas:
+        base.fechar()
+
+
+def compilar_exemplo():
+    with open("aprendizados.json", "w", encoding="utf-8") as f:
+        json.dump({"respostas": {"Qual a capital do Brasil?": {"texto": "Brasília"},
+                                 "qual a capital do brasil": {"texto": "Brasília!"},
+                                 "Bom dia": {"texto": "Olá"}}}, f)
+    return compilar_de_json("aprendizados.json", CAMINHO)
+
+
+def test_compilar_e_buscar(abrir):
+    # Perguntas com a mesma forma normalizada viram uma entrada: a última
+    assert compilar_exemplo() == 2
+    base = abrir()
+    assert len(base) == 2
+    assert base.buscar("qual a capital do brasil") == ("qual a capital do brasil", {"texto": "Brasília!"})
+    assert base.buscar("bom dia") == ("Bom dia", {"texto": "Olá"})
+    assert base.buscar("boa noite") is None
+    indice = base.indice()
+    assert indice.buscar("Bom dia!") == {"texto": "Olá"}
+    assert indice.buscar_resposta("BOM DIA") == {"texto": "Olá"}
+    # Sem busca aproximada no modo mapeado
+    assert indice.buscar_aproximado("bom diaa") == []
+    assert indice.buscar_resposta("bom diaa") is None
+
+
+def test_delta_reaberto(abrir):
+    compilar_exemplo()
+    base = abrir()
+    indice = base.indice()
+    indice.adicionar("Boa noite", {"texto": "Durma bem"})
+    indice.adicionar("Bom dia!", {"texto": "Bom dia!"})
+    del indice.tabela["qual a capital do brasil"]
+    assert len(base) == 2
+    assert sorted(indice.tabela) == ["Boa noite", "Bom dia!"]
+    base.fechar()
+    # Uma linha cortada no fim do delta é ignorada
+    with open(CAMINHO + SUFIXO_DELTA, "a", encoding="utf-8") as f:
+        f.write('["Até logo", {"tex')
+    base = abrir()
+    assert len(base) == 2
+    assert base.buscar("boa noite") == ("Boa noite", {"texto": "Durma bem"})
+    assert base.buscar("bom dia") == ("Bom dia!", {"texto": "Bom dia!"})
+    assert base.buscar("qual a capital do brasil") is None
+    assert base.arquivo.total == 2
+
+
+def test_compactar_e_reabrir(abrir):
+    compilar_exemplo()
+    fila = Fila()
+    base = abrir(maximo_delta=2, gravador=fila)
+    base.gravar("Boa noite", {"texto": "Durma bem"})
+    assert fila.tarefas == []
+    base.gravar("qual a capital do brasil", None)
+    # O delta chegou ao máximo: a compactação foi marcada uma vez só
+    base.gravar("Boa tarde", {"texto": "Oi"})
+    assert len(fila.tarefas) == 1
+    fila.rodar()
+    assert base.delta == {} and base.juntando is None
+    assert base.arquivo.total == len(base) == 3
+    assert os.path.getsize(CAMINHO + SUFIXO_DELTA) == 0
+    assert not os.path.exists(CAMINHO + SUFIXO_DELTA + SUFIXO_JUNTANDO)
+    base.fechar()
+    base = abrir()
+    assert sorted(base.chaves()) == ["Boa noite", "Boa tarde", "Bom dia"]
+    assert base.buscar("qual a capital do brasil") is None
+
+
+def test_compactacao_interrompida(abrir):
+    compilar_exemplo()
+    base = abrir()
+    base.gravar("Boa noite", {"texto": "Durma bem"})
+    base.fechar()
+    # Parou depois de separar o delta, antes de trocar o arquivo
+    os.replace(CAMINHO + SUFIXO_DELTA, CAMINHO + SUFIXO_DELTA + SUFIXO_JUNTANDO)
+    base = abrir()
+    base.gravar("Boa noite", {"texto": "Boa noite!"})
+    assert base.buscar("boa noite") == ("Boa noite", {"texto": "Boa noite!"})
+    assert len(base) == 3
+    assert base.compactar()
+    base.fechar()
+    assert abrir().buscar("boa noite") == ("Boa noite", {"texto": "Boa noite!"})
@@ -0,0 +1,43 @@
+from ia_v_metricas import LIMITES_US, Histograma, Registro
+
+
+def test_percentil_pelo_limite_do_balde():
+    histograma = Histograma()
+    assert histograma.percentil(0.5) == 0.0
+    # 90 chamadas de ~3 µs (balde até 5) e 10 de ~150 µs (balde até 200)
+    for _ in range(90):
+        histograma.registrar(3)
+    for _ in range(10):
+        histograma.registrar(150)
+    assert histograma.percentil(0.5) == 5
+    assert histograma.percentil(0.9) == 5
+    # Nunca acima do maior valor visto
+    assert histograma.percentil(0.95) == histograma.percentil(0.99) == 150
+    assert histograma.media() == 17.7
+
+
+def test_percentil_alem_do_ultimo_balde():
+    histograma = Histograma()
+    histograma.registrar(1)
+    histograma.registrar(LIMITES_US[-1] * 3)
+    assert histograma.baldes[-1] == 1
+    assert histograma.percentil(0.5) == 1
+    assert histograma.percentil(0.99) == LIMITES_US[-1] * 3
+
+
+def test_registro_desligado_nao_mede():
+    registro = Registro()
+    with registro.etapa("turno"):
+        pass
+    registro.contar("buscas")
+    assert registro.histogramas == {} and registro.contadores == {}
+    registro.ligar()
+    for _ in range(3):
+        with registro.etapa("turno"):
+            pass
+    registro.contar("buscas", 2)
+    assert registro.histogramas["turno"].total == 3
+    assert registro.contadores == {"buscas": 2}
+    texto = registro.prometheus()
+    assert 'ia_v_etapa_segundos_bucket{etapa="turno",le="+Inf"} 3' in texto
+    assert "ia_v_buscas_total 2" in texto
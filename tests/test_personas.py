@@ -0,0 +1,60 @@
+import random
+
+import pytest
+
+from ia_v_personas import PERSONAS, Personas
+
+CONFIG = {
+    "personas": {"animada": {"prefixo": "😄 ", "sufixo": " Que legal!"}},
+    "modo_padrao": "sério",
+    "modos": {
+        "sério": {"respostas": ["Certo, {nome}."]},
+        "criativo": {"prefixo": "[{c}] ", "respostas": ["Você disse {entrada}!"]},
+    },
+    "emocoes": {"triste": {"prefixo": "Poxa. "}, "feliz": {"prefixo": "Oba! "}, "neutra": {}},
+}
+
+
+@pytest.fixture
+def personas():
+    return Personas(CONFIG)
+
+
+def test_modelo_de_cada_combinacao(personas):
+    assert personas.decorar("Oi.", "animada", "sério", "triste") == "😄 Poxa. Oi. Que legal!"
+    assert personas.decorar("Oi.", "animada", "criativo", "feliz") == "😄 [{c}] Oba! Oi. Que legal!"
+    assert personas.decorar("Oi.") == "Oi."
+    # As chaves do texto e do arquivo não são campos do format()
+    assert personas.decorar("{x}", emocao="neutra") == "{x}"
+
+
+def test_desconhecidos_nao_decoram(personas):
+    assert personas.decorar("Oi.", "rabugenta", "sério", "triste") == "Poxa. Oi."
+    assert personas.decorar("Oi.", "animada", "dormindo", "enjoado") == "😄 Oi. Que legal!"
+    assert personas.modelo("animada", "sério", "feliz") is personas.modelos[("animada", "sério", "feliz")]
+
+
+def test_escolhas_pela_ordem_do_arquivo(personas):
+    assert personas.escolher_emocao("feliz", "triste") == "triste"
+    assert personas.escolher_emocao("neutra", None, "outra") == "neutra"
+    assert personas.escolher_emocao("outra") is None
+    assert personas.escolher_modo({"criativo", "sério"}) == "sério"
+    assert personas.escolher_modo(set()) is None
+
+
+def test_respostas_do_modo(personas):
+    aleatorio = random.Random(0)
+    assert personas.responder("criativo", aleatorio, nome="Ana", entrada="oi") == "[{c}] Você disse oi!"
+    # Modo sem respostas usa o padrão
+    assert personas.responder(None, aleatorio, nome="Ana", entrada="oi") == "Certo, Ana."
+
+
+def test_campo_desconhecido_e_recusado():
+    config = dict(CONFIG, modos={"sério": {"respostas": ["Oi, {usuario}."]}})
+    with pytest.raises(ValueError, match="usuario"):
+        Personas(config)
+
+
+def test_arquivo_do_repositorio_carrega():
+    assert PERSONAS.modo_padrao in PERSONAS.respostas
+    assert PERSONAS.decorar("Oi.", "gentil", "sério", "neutra") == "Oi. Estou aqui para ajudar!"
@@ -0,0 +1,56 @@
+import json
+
+from ia_v_preferencias import Preferencias, preferencias_da_memoria, separar_polaridade
+
+
+def test_polaridade_do_texto():
+    assert separar_polaridade("não futebol") == ("futebol", False)
+    assert separar_polaridade("Nao jogo de futebol") == ("jogo de futebol", False)
+    assert separar_polaridade(" pizza ") == ("pizza", True)
+    assert separar_polaridade("notícias") == ("notícias", True)
+
+
+def test_trocar_a_polaridade():
+    prefs = Preferencias(["pizza", "assistir futebol"])
+    assert prefs.gosta("Pizza") and prefs.gosta_do_tema("futebol")
+    assert prefs.adicionar("futebol", False)
+    # Um item com a polaridade oposta sai; outro do mesmo tema continua
+    assert prefs == ["pizza", "assistir futebol", "não futebol"]
+    assert prefs.nao_gosta("futebol") and not prefs.gosta("futebol")
+    assert prefs.temas == {"futebol": 1} and prefs.temas_negativos == {"futebol": 1}
+    assert prefs.adicionar("assistir futebol", False)
+    assert prefs == ["pizza", "não futebol", "não assistir futebol"]
+    assert "futebol" not in prefs.temas_gostados()
+    assert prefs.temas_negativos == {"futebol": 2}
+    # De volta: o item vai para o fim da lista
+    assert prefs.adicionar("futebol")
+    assert prefs == ["pizza", "não assistir futebol", "futebol"]
+    # A mesma preferência de novo não muda nada
+    assert not prefs.adicionar("FUTEBOL")
+    assert not prefs.adicionar("")
+
+
+def test_remover_mantem_lista_e_indices():
+    prefs = Preferencias(["pizza", "não filmes", "café", "xadrez"])
+    assert not prefs.remover("filmes")
+    assert prefs.remover("filmes", False)
+    assert prefs.remover("Café")
+    assert not prefs.remover("café")
+    assert prefs == ["pizza", "xadrez"]
+    assert prefs.temas_negativos == {}
+    assert "cafe" not in prefs.positivas
+    prefs.adicionar("sushi")
+    assert prefs.remover("xadrez")
+    assert prefs == ["pizza", "sushi"]
+    assert prefs.ordem == sorted(prefs.ordem) and len(prefs.ordem) == 2
+    # Vai para o JSON como a lista de textos de sempre
+    assert json.loads(json.dumps(prefs)) == ["pizza", "sushi"]
+
+
+def test_lista_comum_na_memoria_vira_preferencias():
+    memoria = {"preferencias": ["pizza", "não chuva"]}
+    prefs = preferencias_da_memoria(memoria)
+    assert memoria["preferencias"] is prefs
+    assert prefs.nao_gosta("chuva")
+    assert preferencias_da_memoria(memoria) is prefs
+    assert preferencias_da_memoria({}) == []
@@ -0,0 +1,161 @@
+import asyncio
+import json
+import os
+import sys
+import time
+
+CLIENTES = {"ana": ("criativo", "pizza"), "bruno": ("sério", "xadrez")}
+MENSAGENS = 20
+TEXTO = "me conta uma coisa"
+# Carga: muitas conexões abertas ao mesmo tempo, e limites folgados para
+# máquinas lentas de CI (o --carga do servidor mede com mais rigor)
+CLIENTES_CARGA = 500
+MENSAGENS_CARGA = 3
+P99_PROCESSAMENTO = 0.05
+P99_IDA_E_VOLTA = 5.0
+
+
+def respostas_do_modo(modulo, modo, nome):
+    pasta = os.path.dirname(modulo.__file__)
+    with open(os.path.join(pasta, "personas.json"), "r", encoding="utf-8") as f:
+        modelos = json.load(f)["modos"][modo]["respostas"]
+    return {modelo.format(nome=nome, entrada=TEXTO) for modelo in modelos}
+
+
+def abrir_servidor(variante, monkeypatch):
+    # O servidor importa a variante pelo nome de sempre
+    nome_modulo = variante.__name__.split("__")[0]
+    monkeypatch.setitem(sys.modules, nome_modulo, variante)
+    from ia_v_servidor import ServidorV
+    return ServidorV("emocional" if nome_modulo == "ia_v_emocional" else "personalidade", salvar=False)
+
+
+def percentil_99(tempos):
+    tempos = sorted(tempos)
+    return tempos[int(len(tempos) * 0.99) - 1]
+
+
+def test_sessoes_simultaneas_nao_misturam_estado(variante, monkeypatch):
+    servidor = abrir_servidor(variante, monkeypatch)
+    tem_modo = hasattr(variante, "novo_estado")
+    tem_preferencias = hasattr(variante, "atualizar_preferencias")
+
+    async def conversar():
+        rede = await asyncio.start_server(servidor.atender, "127.0.0.1", 0)
+        porta = rede.sockets[0].getsockname()[1]
+        conexoes = {}
+        for nome in CLIENTES:
+            conexoes[nome] = await asyncio.open_connection("127.0.0.1", porta)
+
+        async def enviar(nome, pedido):
+            leitor, escritor = conexoes[nome]
+            escritor.write(json.dumps(pedido).encode("utf-8") + b"\n")
+            await escritor.drain()
+            return json.loads(await leitor.readline())
+
+        for nome, (modo, gosto) in CLIENTES.items():
+            await enviar(nome, {"usuario": nome, "texto": f"modo {modo}"})
+            await enviar(nome, {"texto": f"eu gosto de {gosto}"})
+        # As duas conversas alternam turnos, abertas ao mesmo tempo
+        respostas = {nome: [] for nome in CLIENTES}
+        for _ in range(MENSAGENS):
+            pedidos = [enviar(nome, {"texto": TEXTO}) for nome in CLIENTES]
+            for nome, resposta in zip(CLIENTES, await asyncio.gather(*pedidos)):
+                respostas[nome].append(resposta)
+        estados = {nome: await enviar(nome, {"tipo": "estado"}) for nome in CLIENTES}
+        for _, escritor in conexoes.values():
+            escritor.close()
+        rede.close()
+        await rede.wait_closed()
+        await servidor.fechar()
+        return respostas, estados
+
+    respostas, estados = asyncio.run(conversar())
+    for nome, (modo, gosto) in CLIENTES.items():
+        estado = estados[nome]
+        assert estado["memoria"]["nome_usuario"] == nome
+        assert estado["modo"] == (modo if tem_modo else None)
+        assert estado["memoria"]["preferencias"] == ([gosto] if tem_preferencias else [])
+        if tem_modo:
+            # A resposta sem intenção própria vem da lista do modo desta
+            # conversa, com o nome deste usuário
+            possiveis = respostas_do_modo(variante, modo, nome)
+            assert all(resposta["resposta"] in possiveis for resposta in respostas[nome])
+
+
+def test_abrir_conversa_despeja_pelo_limite_de_bytes(variante, monkeypatch):
+    servidor = abrir_servidor(variante, monkeypatch)
+    # Longe do limite de quantidade, mas qualquer sessão passa do de bytes
+    servidor.sessoes.maximo_bytes = 1
+
+    async def conversar():
+        for numero in range(5):
+            conversa = await servidor.abrir_conversa(f"usuario{numero}")
+            # Só fica a sessão presa a esta conversa
+            assert list(servidor.sessoes.ativas) == [f"usuario{numero}"]
+            servidor.fechar_conversa(conversa)
+        await servidor.fechar()
+
+    asyncio.run(conversar())
+    assert servidor.sessoes.despejadas == 5
+
+
+def test_carga_sem_estado_misturado(variante, monkeypatch):
+    servidor = abrir_servidor(variante, monkeypatch)
+    tem_modo = hasattr(variante, "novo_estado")
+    tem_preferencias = hasattr(variante, "atualizar_preferencias")
+    possiveis = {}
+    if tem_modo:
+        possiveis = {(modo, numero): respostas_do_modo(variante, modo, f"cliente{numero}")
+                     for numero in range(CLIENTES_CARGA) for modo in ("criativo", "sério")}
+    idas_e_voltas = []
+
+    async def conversar():
+        rede = await asyncio.start_server(servidor.atender, "127.0.0.1", 0)
+        porta = rede.sockets[0].getsockname()[1]
+        todos_conectados = asyncio.Event()
+        conectados = []
+
+        async def cliente(numero):
+            leitor, escritor = await asyncio.open_connection("127.0.0.1", porta)
+            conectados.append(numero)
+            if len(conectados) == CLIENTES_CARGA:
+                todos_conectados.set()
+            # Ninguém fala antes de todas as conexões estarem abertas
+            await todos_conectados.wait()
+
+            async def enviar(pedido):
+                inicio = time.perf_counter()
+                escritor.write(json.dumps(pedido).encode("utf-8") + b"\n")
+                await escritor.drain()
+                resposta = json.loads(await leitor.readline())
+                idas_e_voltas.append(time.perf_counter() - inicio)
+                return resposta
+
+            modo = "criativo" if numero % 2 else "sério"
+            await enviar({"usuario": f"cliente{numero}", "texto": f"modo {modo}"})
+            await enviar({"texto": f"eu gosto de tema{numero}"})
+            respostas = [await enviar({"texto": TEXTO}) for _ in range(MENSAGENS_CARGA)]
+            estado = await enviar({"tipo": "estado"})
+            escritor.close()
+            return numero, modo, respostas, estado
+
+        resultados = await asyncio.gather(*(cliente(numero) for numero in range(CLIENTES_CARGA)))
+        rede.close()
+        await rede.wait_closed()
+        await servidor.fechar()
+        return resultados
+
+    misturados = []
+    for numero, modo, respostas, estado in asyncio.run(conversar()):
+        certo = (estado["memoria"]["nome_usuario"] == f"cliente{numero}" and
+                 estado["modo"] == (modo if tem_modo else None) and
+                 estado["memoria"]["preferencias"] == ([f"tema{numero}"] if tem_preferencias else []))
+        if tem_modo:
+            certo = certo and all(resposta["resposta"] in possiveis[modo, numero] for resposta in respostas)
+        if not certo:
+            misturados.append(numero)
+    assert misturados == []
+    assert len(servidor.tempos_turno) == CLIENTES_CARGA * (MENSAGENS_CARGA + 2)
+    assert percentil_99(servidor.tempos_turno) < P99_PROCESSAMENTO
+    assert percentil_99(idas_e_voltas) < P99_IDA_E_VOLTA
@@ -0,0 +1,39 @@
+import unicodedata
+
+import pytest
+
+from ia_v_turno import Turno, chave_de, normalizar_chave, preparar, remover_acentos
+
+
+def remover_acentos_nfd(texto):
+    # A versão antiga, caractere por caractere
+    return "".join(c for c in unicodedata.normalize("NFD", texto) if unicodedata.category(c) != "Mn").lower()
+
+
+@pytest.mark.parametrize("texto", ["Ação É Ótima", "simples", "Ŝo ĉi tio Ǆ", "ñandú ÇÃO ß", "café ☕ 日本"])
+def test_remover_acentos_igual_ao_nfd(texto):
+    assert remover_acentos(texto) == remover_acentos_nfd(texto)
+
+
+def test_normalizar_chave():
+    assert normalizar_chave("  Como você está?! ") == "como voce esta"
+    assert normalizar_chave("«Olá»… tudo—bem") == "ola tudo bem"
+    assert normalizar_chave("???") == ""
+
+
+def test_turno_preparado_uma_vez():
+    turno = preparar("Não GOSTO de Futebol, João!")
+    assert preparar("Não GOSTO de Futebol, João!") is turno
+    assert preparar(turno) is turno
+    assert turno.minusculo == "não gosto de futebol, joão!"
+    assert turno.dobrado == "nao gosto de futebol, joao!"
+    assert turno.chave == chave_de(turno) == chave_de(turno.texto) == "nao gosto de futebol joao"
+    assert turno.tokens == ("nao", "gosto", "de", "futebol", "joao")
+    # As posições valem no texto em minúsculas
+    assert [turno.minusculo[inicio:fim] for inicio, fim in turno.posicoes] == [
+        "não", "gosto", "de", "futebol", "joão"]
+    assert {(achado.categoria, achado.rotulo) for achado in turno.achados} >= {
+        ("preferencia", "negativa"), ("tema", "futebol")}
+    with pytest.raises(AttributeError):
+        turno.texto = "outro"
+    assert isinstance(turno, Turno)